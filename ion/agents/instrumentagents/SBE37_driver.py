@@ -21,6 +21,8 @@ from ion.core.process.process import ProcessFactory
 from ion.agents.instrumentagents.instrument_connection import InstrumentConnection
 from ion.agents.instrumentagents.instrument_driver import InstrumentDriver
 from ion.agents.instrumentagents.instrument_driver import InstrumentDriverClient
+from ion.agents.instrumentagents.instrument_driver import LineFramer
+from ion.agents.instrumentagents.instrument_driver import LineParser
 from ion.agents.instrumentagents.instrument_fsm import InstrumentFSM
 from ion.agents.instrumentagents.instrument_constants import DriverCommand
 from ion.agents.instrumentagents.instrument_constants import DriverState
@@ -32,6 +34,7 @@ from ion.agents.instrumentagents.instrument_constants import DriverParameter
 from ion.agents.instrumentagents.instrument_constants import MetadataParameter
 from ion.agents.instrumentagents.instrument_constants import DriverCapability
 from ion.agents.instrumentagents.instrument_constants import ObservatoryState
+from ion.agents.instrumentagents.instrument_constants import driver_observatory_states
 from ion.agents.instrumentagents.instrument_constants import BaseEnum
 from ion.agents.instrumentagents.instrument_constants import InstErrorCode
 from ion.core.exception import ApplicationError
@@ -186,7 +189,7 @@ class DriverException(ApplicationError):
     """
     
     
-class DeviceIOParser:
+class DeviceIOParser(LineParser):
     """
     A class for matching a pattern in a string line of device output and
     extracting parameter or data values from it, and optionally a method for
@@ -194,20 +197,10 @@ class DeviceIOParser:
     command.
     """
     def __init__(self,pattern,getval,tostring=None):
-        self.pattern = pattern
-        self.regex = re.compile(pattern)
+        LineParser.__init__(self,pattern,getval)
         self.value = None
-        self.getval = getval
         self.tostring = tostring
         
-    def parse(self,line):
-        
-        match = self.regex.match(line)
-        if match:
-            return self.getval(match)
-        else:
-            return None
-        
     
 ###############################################################################
 # Seabird Electronics 37-SMP MicroCAT driver.
@@ -253,18 +246,18 @@ class SBE37Driver(InstrumentDriver):
         """
         self._instrument_connection = None
                 
-        """
-        A string holding incomming line fragment not yet terminated by a
-        newline.
-        """
-        self._line_buffer = ''
-
         """
         The queue holding completed line strings for processing by state
         handlers. This holds command responses and may be of variable length
         depending on the command and state.
         """
         self._data_lines = []
+
+        """
+        The samples parsed from completed lines and not yet collected by
+        the state handlers.
+        """
+        self._samples = []
                 
         """
         A queue of samples collected and parsed form the output buffer
@@ -323,6 +316,14 @@ class SBE37Driver(InstrumentDriver):
         self._sample_pattern += r'(, *(\d+)-(\d+)-(\d+), *(\d+):(\d+):(\d+))?'        
         self._sample_parser = DeviceIOParser(self._sample_pattern,
                                              self._get_sample)
+
+        """
+        Frames incomming fragments into lines, keeping a fragment not yet
+        terminated by a newline or prompt, and parses the sample lines.
+        """
+        self._line_framer = LineFramer(SBE37Prompt.NEWLINE,
+                    prompts=[SBE37Prompt.PROMPT,SBE37Prompt.BAD_COMMAND],
+                    parsers=[self._sample_parser])
         
         """
         A looping call that is used to periodically send a newline to the
@@ -1014,7 +1015,7 @@ class SBE37Driver(InstrumentDriver):
             yield self.send(self.proc_supid,'driver_event_occurred',content)                                    
 
             # Clear data lines and sample buffer.
-            self._data_lines = []
+            self._clear_data_lines()
             self._sample_buffer = []
             
             # Get the prompt and send start command without waiting for
@@ -1025,7 +1026,7 @@ class SBE37Driver(InstrumentDriver):
         elif event == SBE37Event.EXIT:            
 
             # Clear data lines and sample buffer.
-            self._data_lines = []
+            self._clear_data_lines()
             self._sample_buffer = []
                   
         elif event == SBE37Event.STOP_AUTOSAMPLE:
@@ -1180,57 +1181,36 @@ class SBE37Driver(InstrumentDriver):
         if IO_LOG:
             self._logfile.write(dataFrag)
 
-        # Add the fragment to the line buffer.
-        self._line_buffer += dataFrag
-
-        new_lines = False
-   
-        # If the line buffer has newlines, extract complete lines and add
-        # to the data buffer. Keep the tail fragment if any in the line buffer
-        # to append further incomming data to.
-        if SBE37Prompt.NEWLINE in self._line_buffer:
-            lines = self._line_buffer.split(SBE37Prompt.NEWLINE)
-            self._line_buffer = lines[-1]
-            self._data_lines += lines[0:-1]
-            new_lines = True
-
-        # If the linebuffer ends with a prompt, extract and append the
-        # prefix data to the data buffer. Keep the prompt in the line buffer.
-        if self._line_buffer.endswith(SBE37Prompt.PROMPT):
-            self._data_lines.append(self._line_buffer.replace(SBE37Prompt.PROMPT,''))
-            self._line_buffer = SBE37Prompt.PROMPT
-            new_lines = True
-
-        # If the line buffer ends with a bad command prompt, extract and
-        # append the prefix data to the data buffer. Keep the prompt in the
-        # line buffer.
-        elif self._line_buffer.endswith(SBE37Prompt.BAD_COMMAND):
-            self._data_lines.append(self._line_buffer.
-                                    replace(SBE37Prompt.BAD_COMMAND,''))
-            self._line_buffer = SBE37Prompt.BAD_COMMAND
-            new_lines = True
+        # Frame the fragment. Complete lines are added to the data buffer
+        # and sample lines parsed. Output ending with a prompt is framed,
+        # keeping the prompt as the line buffer.
+        (lines,samples) = self._line_framer.feed(dataFrag)
+        self._data_lines += lines
+        self._samples += samples
+        line_buffer = self._line_framer.tail()
 
         # If new complete lines are detected, send an EVENT_DATA_RECEIVED.
-        if new_lines and self._fsm.get_current_state() == SBE37State.AUTOSAMPLE:
+        if (lines or samples) and \
+                self._fsm.get_current_state() == SBE37State.AUTOSAMPLE:
             yield self._fsm.on_event_async(SBE37Event.DATA_RECEIVED)
         
         # If a normal or bad command prompt is detected, send an
         # EVENT_PROMPTED
-        if self._line_buffer == SBE37Prompt.PROMPT:
+        if line_buffer == SBE37Prompt.PROMPT:
             if self._prompt_acquired_deferred:
                 d,self._prompt_acquired_deferred = \
                                     self._prompt_acquired_deferred, None
                 self._stop_wakeup()
                 d.callback(SBE37Prompt.PROMPT)
             
-        elif self._line_buffer == SBE37Prompt.BAD_COMMAND:
+        elif line_buffer == SBE37Prompt.BAD_COMMAND:
             if self._prompt_acquired_deferred:
                 d,self._prompt_acquired_deferred = \
                                     self._prompt_acquired_deferred, None
                 self._stop_wakeup()
                 d.callback(SBE37Prompt.BAD_COMMAND)
         
-        elif self._line_buffer == '' and len(self._data_lines)>0 and \
+        elif line_buffer == '' and len(self._data_lines)>0 and \
             self._data_lines[-1] == SBE37Prompt.PROMPT:
             if self._autosample_prompt_acquired_deferred:
                 d,self._autosample_prompt_acquired_deferred = \
@@ -1926,41 +1906,7 @@ class SBE37Driver(InstrumentDriver):
         """
         
         curstate = self._fsm.get_current_state()
-        if curstate == SBE37State.DISCONNECTED:
-            return ObservatoryState.NONE
-        
-        elif curstate == SBE37State.CONNECTING:
-            return ObservatoryState.NONE
-
-        elif curstate == SBE37State.DISCONNECTING:
-            return ObservatoryState.NONE
-
-        elif curstate == SBE37State.ACQUIRE_SAMPLE:
-            return ObservatoryState.ACQUIRING
-
-        elif curstate == SBE37State.CONNECTED:
-            return ObservatoryState.STANDBY
-
-        elif curstate == SBE37State.CALIBRATE:
-            return ObservatoryState.CALIBRATING
-
-        elif curstate == SBE37State.AUTOSAMPLE:
-            return ObservatoryState.STREAMING
-
-        elif curstate == SBE37State.SET:
-            return ObservatoryState.UPDATING
-
-        elif curstate == SBE37State.TEST:
-            return ObservatoryState.TESTING
-
-        elif curstate == SBE37State.UNCONFIGURED:
-            return ObservatoryState.NONE
-
-        elif curstate == SBE37State.UPDATE_PARAMS:
-            return ObservatoryState.UPDATING
-
-        else:
-            return ObservatoryState.UNKNOWN
+        return driver_observatory_states.get(curstate, ObservatoryState.UNKNOWN)
 
     def _get_parameters(self,params):
         """
@@ -2136,7 +2082,7 @@ class SBE37Driver(InstrumentDriver):
         reply = {'success':None,'result':None}        
 
         # Clear data lines.
-        self._data_lines = []
+        self._clear_data_lines()
         
         # Acquire prompt.
         prompt = yield self._get_prompt()
@@ -2155,7 +2101,7 @@ class SBE37Driver(InstrumentDriver):
             reply['result'] = samples
         
         # Clear data lines.    
-        self._data_lines = []
+        self._clear_data_lines()
         
         defer.returnValue(reply)
         
@@ -2169,7 +2115,7 @@ class SBE37Driver(InstrumentDriver):
         self._debug_print('updating parameters')
         
         # Clear data lines.
-        self._data_lines = []
+        self._clear_data_lines()
         
         # Get prompt, issue device status command, issue device calibration
         # status command. Await prompt for each.
@@ -2182,7 +2128,7 @@ class SBE37Driver(InstrumentDriver):
         self._read_param_values(self._data_lines)
         
         # Clear data lines.
-        self._data_lines = []
+        self._clear_data_lines()
         
         defer.returnValue(None)
 
@@ -2310,24 +2256,25 @@ class SBE37Driver(InstrumentDriver):
         
     def _parse_sample_output(self):
         """
-        Parse data buffer and extract all sample output lines. Remove
-        sample output lines from the data buffer, and return a list of
-        samples.
+        Collect the samples parsed from the sample output lines since the
+        last call. Sample lines are parsed as they are framed and are not
+        added to the data buffer.
         @retval A list of data sample dictionaries.
         """
-        samples = []
-        new_data_lines = []
-        for line in self._data_lines:
-            sample_data = self._sample_parser.parse(line)
-            if sample_data != None:
-                samples.append(sample_data)
-            else:
-                new_data_lines.append(line)
-        self._data_lines = new_data_lines
+        samples = self._samples
+        self._samples = []
         
         return samples
 
 
+    def _clear_data_lines(self):
+        """
+        Clear the data buffer and the samples not yet collected.
+        """
+        self._data_lines = []
+        self._samples = []
+
+
     def _read_param_values(self,lines):
         """
         Extract all parameter values from device status update output.
@@ -14,6 +14,8 @@ import ion.util.ionlog
 from ion.core.process.process import ProcessFactory
 from ion.agents.instrumentagents.instrument_driver import InstrumentDriver
 from ion.agents.instrumentagents.instrument_driver import InstrumentDriverClient
+from ion.agents.instrumentagents.instrument_driver import LineFramer
+from ion.agents.instrumentagents.instrument_driver import LineParser
 from ion.agents.instrumentagents.instrument_fsm import InstrumentFSM
 from ion.agents.instrumentagents.instrument_constants \
     import DriverCommand, DriverCapability, DriverStatus,\
@@ -27,7 +29,7 @@ from ion.agents.instrumentagents.instrument_constants import InstErrorCode
 from ion.core.exception import ApplicationError
 
 import ion.agents.instrumentagents.helper_NMEA0183 as NMEA
-from twisted.protocols import basic
+from twisted.internet import protocol
 from twisted.internet.serialport import SerialPort
 from serial import PARITY_NONE, PARITY_EVEN, PARITY_ODD
 from serial import STOPBITS_ONE, STOPBITS_TWO
@@ -813,7 +815,7 @@ class NMEADeviceDriver(InstrumentDriver):
 
         try:
             print '          ***** Attempting serial connection....'
-            self._serConnection =  SerialPort(NMEA0183Protocol(),
+            self._serConnection =  SerialPort(self.protocol,
                                               self._port,
                                               reactor,
                                               baudrate=self._baudrate,
@@ -1427,7 +1429,7 @@ class NMEADeviceDriver(InstrumentDriver):
         Set the configuration to an initialized, unconfigured state.
         """
 
-        self.protocol = NMEA0183Protocol()
+        self.protocol = NMEA0183Protocol(self)
         self._port = None
         self._baudrate = None
         self._bytesize = None
@@ -1810,43 +1812,61 @@ class NMEADeviceDriver(InstrumentDriver):
                 print                       data
 
 
-class NMEA0183Protocol(basic.LineReceiver):
+class NMEA0183Protocol(protocol.Protocol):
 
-    def __init__(self):
+    def __init__(self, driver):
+        """
+        @param driver the NMEADeviceDriver receiving the sentences.
+        """
         self._serialReadMode = "OFF"
+        self._driver = driver
 
-    def lineReceived(self, line):
+        # Frame serial data into lines and keep the valid NMEA sentences.
+        self._framer = LineFramer(NMEADevicePrompt.NEWLINE,
+                                  parsers=[LineParser(r'^\$', self._get_sentence)])
+
+    def _get_sentence(self, match):
+        """
+        @retval the NMEAString of a line starting a sentence, None if the
+            sentence is not valid.
         """
-        Called by the twisted framework when a serial line is received.
-        Override of basic.LineReceiver method.
-        Takes serial line from serial port and sends it through
+        nmeaLine = NMEA.NMEAString(match.string)
+        if NMEA.NMEAErrorCode.is_ok(nmeaLine.IsValid()):
+            return nmeaLine
+        return None
+
+    def dataReceived(self, data):
+        """
+        Called by the twisted framework when serial data is received.
+        Frames the data into lines and sends the valid NMEA sentences through
         the parsing pipeline.
-        Sends EVENT_DATA_RECEIVED if a good NMEA line came in.
+        Sends one EVENT_DATA_RECEIVED for the good NMEA lines in the data.
         """
         self._serialReadMode = "ON"
         if self._serialReadMode == "OFF":
             print "||||| NMEA data received: OFF"
             return
 
-        # Write the read-in line to the IO log if the log is enabled
+        # Write the read-in data to the IO log if the log is enabled
         if IO_LOG:
-            NMEADeviceDriver._logfile.write(line)
-
-        nmeaLine = NMEA.NMEAString(line)
-        lineStatus = nmeaLine.IsValid()
-
-        if NMEA.NMEAErrorCode.is_ok(lineStatus):
+            self._driver._logfile.write(data)
 
-            # If a valid sentence was received:
-            #       - Store the setence
-            #       - send a data received event
-            NMEADeviceDriver.data_lines.insert(0, nmeaLine)
-            NMEADeviceDriver.fsm.on_event(NMEADeviceEvent.DATA_RECEIVED)
-            print "||||| NMEA data received: %s" % nmeaLine
+        (lines, sentences) = self._framer.feed(data)
+        if not sentences:
+            return
 
         if self._serialReadMode == "1":
+            sentences = sentences[:1]
             self._serialReadMode = "OFF"
 
+        # If valid sentences were received:
+        #       - Store the setences, the driver pops the oldest first
+        #       - send a data received event
+        for nmeaLine in sentences:
+            self._driver._data_lines.insert(0, nmeaLine)
+            print "||||| NMEA data received: %s" % nmeaLine.nmeaStr
+        self._driver.fsm.on_event(NMEADeviceEvent.DATA_RECEIVED)
+
 
 class NMEADeviceDriverClient(InstrumentDriverClient):
     """
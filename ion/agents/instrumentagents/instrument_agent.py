@@ -19,6 +19,7 @@ except:
 
 import ion.util.procutils as pu
 import ion.util.ionlog
+from ion.core import ioninit
 from ion.core.process.process import Process
 from ion.core.process.process import ProcessClient
 from ion.core.process.process import ProcessFactory
@@ -34,6 +35,7 @@ from ion.agents.instrumentagents.instrument_fsm import InstrumentFSM
 from ion.agents.instrumentagents.instrument_constants import *
 
 log = ion.util.ionlog.getLogger(__name__)
+CONF = ioninit.config(__name__)
 
 DEBUG_PRINT = True if os.environ.get('DEBUG_PRINT',None) == 'True' else False
 
@@ -257,6 +259,48 @@ class InstrumentAgent(Process):
         """
         self._data_buffer_limit = 0
 
+        """
+        Receipt times of the samples in the data buffer.
+        """
+        self._data_buffer_times = []
+
+        """
+        Maximum age in seconds of a buffered sample. The buffer is published
+        when its oldest sample reaches half this age, samples published later
+        than this age are counted as delayed.
+        """
+        self._data_buffer_max_age = float(CONF.getValue('data_buffer_max_age',
+                                                        2.0))
+
+        """
+        Maximum number of samples held in the data buffer while publication
+        fails. The oldest samples are dropped beyond it.
+        """
+        self._data_buffer_max_samples = int(CONF.getValue(
+                                        'data_buffer_max_samples', 10000))
+
+        """
+        A twisted delayed function call that publishes the data buffer when
+        its oldest sample reaches the age limit.
+        """
+        self._data_flush_call = None
+
+        """
+        Counts of the samples published, published later than the maximum
+        age, and dropped.
+        """
+        self._sample_counters = {
+            'published': 0,
+            'delayed': 0,
+            'dropped': 0
+        }
+
+        """
+        The observatory state of the driver, followed from the driver state
+        change announcements. None until the driver state is known.
+        """
+        self._observatory_state = None
+
         """
         A dict of device capabilities that is read from the driver upon
         driver construction. The dict persists whether we are connected to
@@ -301,6 +345,23 @@ class InstrumentAgent(Process):
         # Set initial state.
         self._fsm.start(AgentState.UNINITIALIZED)
 
+    @defer.inlineCallbacks
+    def plc_terminate(self):
+        """
+        Process lifecycle termination. Buffered samples are published, the
+        ones which can not be are dropped.
+        """
+        yield self._publish_data_buffer()
+
+        # A failed publication leaves the samples buffered for a retry.
+        self._cancel_data_flush()
+        if len(self._data_buffer) > 0:
+            log.warn('Dropping %d unpublished samples on termination' %
+                     len(self._data_buffer))
+            self._sample_counters['dropped'] += len(self._data_buffer)
+            self._data_buffer = []
+            self._data_buffer_times = []
+
     ###########################################################################
     #   State handlers.
     ###########################################################################
@@ -1631,6 +1692,12 @@ class InstrumentAgent(Process):
                     result[AgentStatus.BUFFER_SIZE] = \
                         (InstErrorCode.OK, self._get_buffer_size())
 
+                # Published, delayed and dropped sample counts.
+                if arg == AgentStatus.SAMPLE_COUNTERS or arg == \
+                    AgentStatus.ALL:
+                    result[AgentStatus.SAMPLE_COUNTERS] = \
+                        (InstErrorCode.OK, self._sample_counters.copy())
+
                 # Agent software version.
                 if arg == AgentStatus.AGENT_VERSION or arg == AgentStatus.ALL:
                     result[AgentStatus.AGENT_VERSION] = \
@@ -2382,38 +2449,33 @@ class InstrumentAgent(Process):
         # If data received, coordinate buffering and publishing.
         if type == DriverAnnouncement.DATA_RECEIVED:
 
+            # Buffered samples are published under their own transducer.
+            if len(self._data_buffer) > 0 and \
+                transducer != self._prev_data_transducer:
+                yield self._publish_data_buffer()
+
             # Remember the transducer in case we need to transmit at a time
             # other than these events.
             self._prev_data_transducer = transducer
 
-            # Get the driver observatory state.
-            key = (DriverChannel.INSTRUMENT, DriverStatus.OBSERVATORY_STATE)
-            reply = yield self._driver_client.get_status([key])
-            success = reply['success']
-            result = reply['result']
-            obs_status = result.get(key, None)
-            strval = ''
-            json_val = None
+            # The observatory state is followed from the state change
+            # announcements, ask the driver only if it is not yet known.
+            if self._observatory_state == None:
+                yield self._get_observatory_state()
 
             # If in streaming mode, buffer data and publish at intervals.
-            if InstErrorCode.is_ok(success) and obs_status != None:
-                if obs_status[1] == ObservatoryState.STREAMING:
-                    self._data_buffer.append(value)
-                    if len(self._data_buffer) > self._data_buffer_limit:
-                        # strval = self._get_data_string(self._data_buffer)
-                        json_val = json.dumps(self._data_buffer)
-                        self._data_buffer = []
-
-                # If not in streaming mode, always publish data upon receipt.
+            if self._observatory_state == ObservatoryState.STREAMING:
+                self._data_buffer.append(value)
+                self._data_buffer_times.append(time.time())
+                if len(self._data_buffer) > self._data_buffer_limit:
+                    yield self._publish_data_buffer()
                 else:
-                    #strval = self._get_data_string(value)
-                    json_val = json.dumps([value])
+                    self._schedule_data_flush()
 
-            #if len(strval) > 0:
-            if json_val != None:
-                origin = "%s.%s" % (transducer, self.event_publisher_origin)
-                yield self._data_publisher.create_and_publish_event(\
-                    origin=origin, data_block=json_val)
+            # If not in streaming mode, always publish data upon receipt.
+            else:
+                yield self._publish_samples(transducer, [value])
+                self._sample_counters['published'] += 1
 
         # Driver configuration changed, publish config.
         elif type == DriverAnnouncement.CONFIG_CHANGE:
@@ -2436,18 +2498,14 @@ class InstrumentAgent(Process):
         elif type == DriverAnnouncement.ERROR:
             pass
 
-        # If the driver state changed, publish any buffered data remaining.
+        # If the driver state changed, follow the observatory state and
+        # publish any buffered data remaining.
         elif type == DriverAnnouncement.STATE_CHANGE:
-            json_val = None
+            # A driver specific state is looked up from the driver.
+            self._observatory_state = driver_observatory_states.get(value,
+                                                                    None)
             if len(self._data_buffer) > 0:
-                #strval = self._get_data_string(self._data_buffer)
-                json_val = json.dumps(self._data_buffer)
-                #if len(strval) > 0:
-                if json_val != None:
-                    origin = "%s.%s" % (self._prev_data_transducer,
-                                        self.event_publisher_origin)
-                    yield self._log_publisher.create_and_publish_event(origin=\
-                                                origin, description=json_val)
+                yield self._publish_data_buffer()
 
         elif type == DriverAnnouncement.EVENT_OCCURRED:
             pass
@@ -2457,6 +2515,100 @@ class InstrumentAgent(Process):
 
         self._debug_print_driver_event(type, transducer, value)
 
+    @defer.inlineCallbacks
+    def _get_observatory_state(self):
+        """
+        Get the observatory state from the driver. The state stays unknown if
+        the driver does not report it.
+        """
+        key = (DriverChannel.INSTRUMENT, DriverStatus.OBSERVATORY_STATE)
+        reply = yield self._driver_client.get_status([key])
+        success = reply['success']
+        result = reply['result']
+        obs_status = result.get(key, None)
+
+        if InstErrorCode.is_ok(success) and obs_status != None:
+            self._observatory_state = obs_status[1]
+
+    @defer.inlineCallbacks
+    def _publish_samples(self, transducer, samples):
+        """
+        Publish a list of samples in a data event.
+        @param transducer The transducer producing the samples.
+        @param samples A list of sample values.
+        """
+        json_val = json.dumps(samples)
+        origin = "%s.%s" % (transducer, self.event_publisher_origin)
+        yield self._data_publisher.create_and_publish_event(origin=origin,
+                                                        data_block=json_val)
+
+    @defer.inlineCallbacks
+    def _publish_data_buffer(self):
+        """
+        Publish the buffered samples in one data event. If publication fails
+        the samples are kept for the next attempt, up to the buffer maximum.
+        """
+        self._cancel_data_flush()
+        if len(self._data_buffer) == 0:
+            return
+
+        samples = self._data_buffer
+        times = self._data_buffer_times
+        self._data_buffer = []
+        self._data_buffer_times = []
+
+        try:
+            yield self._publish_samples(self._prev_data_transducer, samples)
+
+        except Exception, ex:
+            log.exception('Error publishing %d buffered samples' %
+                          len(samples))
+            self._data_buffer = samples + self._data_buffer
+            self._data_buffer_times = times + self._data_buffer_times
+            excess = len(self._data_buffer) - self._data_buffer_max_samples
+            if excess > 0:
+                del self._data_buffer[:excess]
+                del self._data_buffer_times[:excess]
+                self._sample_counters['dropped'] += excess
+            # The samples may already be old, do not retry at once.
+            self._schedule_data_flush(self._data_buffer_max_age / 2.0)
+            return
+
+        now = time.time()
+        delayed = [t for t in times if now - t > self._data_buffer_max_age]
+        self._sample_counters['published'] += len(samples)
+        self._sample_counters['delayed'] += len(delayed)
+
+    def _schedule_data_flush(self, min_delay=0.0):
+        """
+        Publish the data buffer when its oldest sample reaches half the
+        maximum age, leaving the other half for the publication.
+        @param min_delay The least delay in seconds, used to retry a failed
+            publication.
+        """
+        if self._data_flush_call != None or len(self._data_buffer) == 0:
+            return
+
+        age = time.time() - self._data_buffer_times[0]
+        delay = max(min_delay, self._data_buffer_max_age / 2.0 - age)
+        self._data_flush_call = reactor.callLater(delay,
+                                                  self._flush_data_buffer)
+
+    def _cancel_data_flush(self):
+        if self._data_flush_call != None:
+            if self._data_flush_call.active():
+                self._data_flush_call.cancel()
+            self._data_flush_call = None
+
+    def _flush_data_buffer(self):
+        """
+        Publish the data buffer from the delayed call.
+        """
+        self._data_flush_call = None
+        d = self._publish_data_buffer()
+        d.addErrback(lambda failure: log.error(
+            'Error publishing the data buffer: %s' % str(failure)))
+
     @defer.inlineCallbacks
     def op_publish(self, content, headers, msg):
         """
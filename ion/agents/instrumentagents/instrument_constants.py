@@ -162,6 +162,25 @@ class ObservatoryState(BaseEnum):
     ACQUIRING = 'OBSERVATORY_STATUS_ACQUIRING'
     UNKNOWN = 'OBSERVATORY_STATUS_UNKNOWN'
 
+"""
+Observatory state of the common driver states. Used by the drivers to report
+their observatory state and by the agent to follow it from the driver state
+change announcements.
+"""
+driver_observatory_states = {
+    DriverState.UNCONFIGURED: ObservatoryState.NONE,
+    DriverState.DISCONNECTED: ObservatoryState.NONE,
+    DriverState.CONNECTING: ObservatoryState.NONE,
+    DriverState.DISCONNECTING: ObservatoryState.NONE,
+    DriverState.CONNECTED: ObservatoryState.STANDBY,
+    DriverState.ACQUIRE_SAMPLE: ObservatoryState.ACQUIRING,
+    DriverState.UPDATE_PARAMS: ObservatoryState.UPDATING,
+    DriverState.SET: ObservatoryState.UPDATING,
+    DriverState.AUTOSAMPLE: ObservatoryState.STREAMING,
+    DriverState.TEST: ObservatoryState.TESTING,
+    DriverState.CALIBRATE: ObservatoryState.CALIBRATING
+}
+
 
 ###############################################################################
 # Instrument agent constants.
@@ -256,6 +275,7 @@ class AgentStatus(BaseEnum):
     BUFFER_SIZE = 'AGENT_STATUS_BUFFER_SIZE'
     AGENT_VERSION = 'AGENT_STATUS_AGENT_VERSION'
     PENDING_TRANSACTIONS = 'AGENT_STATUS_PENDING_TRANSACTIONS'
+    SAMPLE_COUNTERS = 'AGENT_STATUS_SAMPLE_COUNTERS'
     ALL = 'AGENT_STATUS_ALL'
 
 """
@@ -7,6 +7,7 @@
 @brief Instrument driver and client base classes.
 """
 
+import re
 
 from twisted.internet import defer, reactor
 
@@ -17,6 +18,139 @@ from ion.core.process.process import Process, ProcessClient
 
 log = ion.util.ionlog.getLogger(__name__)
 
+try:
+    _new_frame_buffer = bytearray
+except NameError:
+    # Python 2.5 has no bytearray, frame an immutable string instead.
+    _new_frame_buffer = str
+
+
+class LineParser(object):
+    """
+    Matches a line of device output with a regular expression compiled once
+    and converts the match into a value.
+    """
+    def __init__(self, pattern, getval, flags=0):
+        """
+        @param pattern the regular expression matched at the start of a line.
+        @param getval a callable converting the match object into a value.
+        """
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        self.getval = getval
+
+    def parse(self, line):
+        """
+        @retval the value of the line, or None if it does not match.
+        """
+        match = self.regex.match(line)
+        if match:
+            return self.getval(match)
+        else:
+            return None
+
+
+class LineFramer(object):
+    """
+    Frames the fragments of device output into lines for drivers.
+
+    Fragments are appended to a byte buffer. The consumed head of the buffer
+    is skipped by an offset and reclaimed once it dominates the buffer, so
+    adding a fragment does not copy the pending data. The buffer is scanned
+    for newlines only from where the previous scan stopped, so a long output
+    arriving in many fragments is scanned once. Each complete line is given
+    to the parsers in order, and the value of the first one matching it is
+    a sample. Output ending with a prompt is framed as a line and the prompt
+    is kept as the pending tail, for drivers waiting on the prompt.
+    """
+
+    def __init__(self, newline='\r\n', prompts=None, parsers=None,
+                 on_samples=None, compact_size=4096):
+        """
+        @param newline the line terminator of the device.
+        @param prompts a list of device prompts, ending unterminated output.
+            The longest prompt ending the output is the one kept.
+        @param parsers a list of LineParser objects for sample lines.
+        @param on_samples a callable given the list of samples framed from
+            each fragment holding any.
+        @param compact_size the consumed bytes which may be kept in the
+            buffer before it is reclaimed.
+        """
+        self.newline = newline
+        # Longest first, so a prompt ending with another prompt is found.
+        self.prompts = sorted(prompts or [], key=len, reverse=True)
+        self.parsers = list(parsers or [])
+        self.on_samples = on_samples
+        self.compact_size = compact_size
+        self.clear()
+
+    def clear(self):
+        """
+        Discard all pending output.
+        """
+        self._buffer = _new_frame_buffer()
+        self._start = 0         # First byte not yet framed.
+        self._scan = 0          # Where to continue looking for a newline.
+
+    def tail(self):
+        """
+        @retval the pending output not terminated by a newline.
+        """
+        return str(self._buffer[self._start:])
+
+    def feed(self, data):
+        """
+        Add a fragment of device output and frame the lines it completes.
+        @param data a string fragment of device output.
+        @retval a tuple (lines, samples) of the new lines not matched by a
+            parser and the values parsed from the matched ones.
+        """
+        self._buffer += data
+        buffer = self._buffer
+        newline = self.newline
+        raw_lines = []
+
+        while True:
+            end = buffer.find(newline, self._scan)
+            if end < 0:
+                # A newline may be split between this and the next fragment.
+                self._scan = max(self._start, len(buffer) - len(newline) + 1)
+                break
+            raw_lines.append(str(buffer[self._start:end]))
+            self._start = self._scan = end + len(newline)
+
+        # Output ending with a prompt is framed, the prompt is kept.
+        pending = len(buffer) - self._start
+        for prompt in self.prompts:
+            if pending > len(prompt) and buffer.endswith(prompt):
+                prompt_start = len(buffer) - len(prompt)
+                raw_lines.append(str(buffer[self._start:prompt_start]))
+                self._start = prompt_start
+                self._scan = max(self._scan, self._start)
+                break
+
+        if self._start >= self.compact_size and \
+            self._start * 2 >= len(buffer):
+            self._scan -= self._start
+            self._buffer = buffer[self._start:]
+            self._start = 0
+
+        lines = []
+        samples = []
+        for line in raw_lines:
+            for parser in self.parsers:
+                value = parser.parse(line)
+                if value != None:
+                    samples.append(value)
+                    break
+            else:
+                lines.append(line)
+
+        if samples and self.on_samples:
+            self.on_samples(samples)
+
+        return (lines, samples)
+
 
 class InstrumentDriver(Process):
     """
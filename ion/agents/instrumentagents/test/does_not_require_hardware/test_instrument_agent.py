@@ -30,6 +30,13 @@ from ion.agents.instrumentagents.instrument_constants import InstrumentCapabilit
 from ion.agents.instrumentagents.instrument_constants import AgentState
 from ion.agents.instrumentagents.instrument_constants import MetadataParameter
 from ion.agents.instrumentagents.instrument_constants import InstErrorCode
+from ion.agents.instrumentagents.instrument_constants import DriverAnnouncement
+from ion.agents.instrumentagents.instrument_constants import DriverState
+from ion.agents.instrumentagents.instrument_constants import ObservatoryState
+try:
+    import json
+except:
+    import simplejson as json
 
 class TestInstrumentAgent(IonTestCase):
 
@@ -881,5 +888,196 @@ class TestInstrumentAgent(IonTestCase):
         #print testsub.msgs[0]
         #print testsub.msgs[0]['content']
         #self.assertEqual(testsub.msgs[0]['content'].name, u"Transaction ended!")
-        
-        
\ No newline at end of file
+
+
+class FakeDriverClient(object):
+    """
+    Reports a fixed observatory state and counts the status requests.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.get_status_calls = 0
+
+    def get_status(self, keys):
+        self.get_status_calls += 1
+        result = {}
+        for key in keys:
+            result[key] = (InstErrorCode.OK, self.state)
+        return defer.succeed({'success':InstErrorCode.OK, 'result':result})
+
+
+class FakeDataPublisher(object):
+    """
+    Records the samples of the published data events, or fails to publish.
+    """
+    def __init__(self):
+        self.events = []
+        self.fail = False
+
+    def create_and_publish_event(self, **kwargs):
+        if self.fail:
+            return defer.fail(Exception('Publication failed'))
+        self.events.append(json.loads(kwargs['data_block']))
+        return defer.succeed(None)
+
+
+class TestInstrumentAgentDataBuffer(IonTestCase):
+    """
+    Test the observatory state and data buffering of the agent on driver
+    announcements, with a fake driver client and data publisher.
+    """
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield self._start_container()
+        processes = [
+            {'name':'instrument_agent','module':'ion.agents.instrumentagents.instrument_agent','class':'InstrumentAgent'}
+        ]
+
+        self.sup = yield self._spawn_processes(processes)
+        self.svc_id = yield self.sup.get_child_id('instrument_agent')
+        self.ia_client = instrument_agent.InstrumentAgentClient(proc=self.sup,target=self.svc_id)
+
+        self.agent = self._get_procinstance(self.svc_id)
+        self.driver_client = FakeDriverClient(ObservatoryState.STREAMING)
+        self.publisher = FakeDataPublisher()
+        self.agent._driver_client = self.driver_client
+        self.agent._data_publisher = self.publisher
+        self.agent._is_child_process = lambda name: True
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        self.agent._cancel_data_flush()
+        yield self._stop_container()
+
+    def _announce(self, type, value, transducer='instrument'):
+        content = {'type':type, 'transducer':transducer, 'value':value}
+        return self.agent.op_driver_event_occurred(content,
+                                        {'sender-name':'driver'}, None)
+
+    @defer.inlineCallbacks
+    def test_state_from_announcements(self):
+        """
+        Test the driver is asked for its state only while it is unknown.
+        """
+        self.agent._data_buffer_limit = 100
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.AUTOSAMPLE)
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_1')
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_2')
+        self.assertEqual(self.driver_client.get_status_calls, 0)
+        self.assertEqual(self.agent._data_buffer, ['sample_1', 'sample_2'])
+
+        # The buffer is published on a state change.
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.CONNECTED)
+        self.assertEqual(self.publisher.events, [['sample_1', 'sample_2']])
+
+        # Not streaming, samples are published on receipt.
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_3')
+        self.assertEqual(self.publisher.events[-1], ['sample_3'])
+        self.assertEqual(self.driver_client.get_status_calls, 0)
+
+        # A driver specific state is looked up once.
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             'DRIVER_SPECIFIC_STATE')
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_4')
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_5')
+        self.assertEqual(self.driver_client.get_status_calls, 1)
+        self.assertEqual(self.agent._data_buffer, ['sample_4', 'sample_5'])
+
+    @defer.inlineCallbacks
+    def test_flush_by_size(self):
+        """
+        Test the buffer is published when it holds more than the buffer size.
+        """
+        self.agent._data_buffer_limit = 2
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.AUTOSAMPLE)
+
+        for i in range(3):
+            yield self._announce(DriverAnnouncement.DATA_RECEIVED,
+                                 'sample_%d' % i)
+        self.assertEqual(self.publisher.events,
+                         [['sample_0', 'sample_1', 'sample_2']])
+        self.assertEqual(self.agent._data_buffer, [])
+        self.assertEqual(self.agent._sample_counters['published'], 3)
+
+    @defer.inlineCallbacks
+    def test_flush_by_age(self):
+        """
+        Test the buffer is published when its oldest sample reaches half the
+        maximum age.
+        """
+        self.agent._data_buffer_limit = 100
+        self.agent._data_buffer_max_age = 0.4
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.AUTOSAMPLE)
+
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_0')
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_1')
+        self.assertEqual(self.publisher.events, [])
+
+        yield pu.asleep(0.5)
+        self.assertEqual(self.publisher.events, [['sample_0', 'sample_1']])
+        self.assertEqual(self.agent._sample_counters['published'], 2)
+        self.assertEqual(self.agent._sample_counters['delayed'], 0)
+
+    @defer.inlineCallbacks
+    def test_failed_publish(self):
+        """
+        Test samples are kept after a failed publication, the oldest beyond
+        the maximum are dropped, and the counters.
+        """
+        self.agent._data_buffer_limit = 0
+        self.agent._data_buffer_max_samples = 2
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.AUTOSAMPLE)
+
+        self.publisher.fail = True
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_0')
+        self.assertEqual(self.agent._data_buffer, ['sample_0'])
+
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_1')
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_2')
+        self.assertEqual(self.agent._data_buffer, ['sample_1', 'sample_2'])
+        self.assertEqual(self.agent._sample_counters['dropped'], 1)
+
+        # The kept samples are published with the next one. The oldest has
+        # been held longer than the maximum age.
+        self.publisher.fail = False
+        self.agent._data_buffer_times[0] -= \
+            2 * self.agent._data_buffer_max_age
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_3')
+        self.assertEqual(self.publisher.events,
+                         [['sample_1', 'sample_2', 'sample_3']])
+        self.assertEqual(self.agent._data_buffer, [])
+
+        reply = yield self.ia_client.get_observatory_status(
+                                    [AgentStatus.SAMPLE_COUNTERS], 'none')
+        self.assert_(InstErrorCode.is_ok(reply['success']))
+        counters = reply['result'][AgentStatus.SAMPLE_COUNTERS][1]
+        self.assertEqual(counters,
+                         {'published':3, 'delayed':1, 'dropped':1})
+
+    @defer.inlineCallbacks
+    def test_terminate(self):
+        """
+        Test buffered samples are published on termination, and only the ones
+        which can not be are dropped.
+        """
+        self.agent._data_buffer_limit = 100
+        yield self._announce(DriverAnnouncement.STATE_CHANGE,
+                             DriverState.AUTOSAMPLE)
+
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_0')
+        yield self.agent.plc_terminate()
+        self.assertEqual(self.publisher.events, [['sample_0']])
+        self.assertEqual(self.agent._sample_counters['dropped'], 0)
+
+        self.publisher.fail = True
+        yield self._announce(DriverAnnouncement.DATA_RECEIVED, 'sample_1')
+        yield self.agent.plc_terminate()
+        self.assertEqual(self.agent._data_buffer, [])
+        self.assertEqual(self.agent._data_flush_call, None)
+        self.assertEqual(self.agent._sample_counters['dropped'], 1)
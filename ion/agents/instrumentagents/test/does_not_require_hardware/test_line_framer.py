@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+@file ion/agents/instrumentagents/test/does_not_require_hardware/test_line_framer.py
+@brief Test cases for the framing of device output by instrument drivers.
+"""
+
+from twisted.trial import unittest
+
+from ion.agents.instrumentagents.instrument_driver import LineFramer
+from ion.agents.instrumentagents.instrument_driver import LineParser
+
+
+class TestLineFramer(unittest.TestCase):
+    """
+    Test the LineFramer frames lines split across fragments, prompts and
+    sample lines.
+    """
+
+    def setUp(self):
+        self.batches = []
+        parser = LineParser(r'^(-?\d+\.\d+), *(-?\d+\.\d+)',
+                            lambda match: float(match.group(1)))
+        self.framer = LineFramer('\r\n', prompts=['S>', '?cmd S>'],
+                                 parsers=[parser],
+                                 on_samples=self.batches.append,
+                                 compact_size=8)
+
+    def test_fragments(self):
+        self.assertEqual(self.framer.feed('status'), ([], []))
+        self.assertEqual(self.framer.feed(' ok\r'), ([], []))
+        self.assertEqual(self.framer.feed('\n20.1, 0.5\r\n21.'),
+                         (['status ok'], [20.1]))
+        self.assertEqual(self.framer.tail(), '21.')
+        self.assertEqual(self.framer.feed('5, 0.4\r\n22.5, 0.3\r\n'),
+                         ([], [21.5, 22.5]))
+        self.assertEqual(self.framer.tail(), '')
+        self.assertEqual(self.batches, [[20.1], [21.5, 22.5]])
+
+    def test_prompts(self):
+        self.assertEqual(self.framer.feed('ds\r\nvbatt = 9.0\r\nS'),
+                         (['ds', 'vbatt = 9.0'], []))
+        self.assertEqual(self.framer.feed('>'), ([], []))
+        self.assertEqual(self.framer.tail(), 'S>')
+
+        # The prompt is kept until the output after it is framed.
+        self.assertEqual(self.framer.feed('ts\r\n20.1, 0.5\r\nS>'),
+                         (['S>ts'], [20.1]))
+        self.assertEqual(self.framer.tail(), 'S>')
+
+        # The longest prompt is kept, whatever the order they are given in.
+        self.framer.clear()
+        self.assertEqual(self.framer.feed('junk?cmd S>'), (['junk'], []))
+        self.assertEqual(self.framer.tail(), '?cmd S>')
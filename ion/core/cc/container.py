@@ -26,6 +26,7 @@ from ion.core.cc.container_api import IContainer
 from ion.core.id import Id
 from ion.core.intercept.interceptor_system import InterceptorSystem
 from ion.core.messaging.exchange import ExchangeManager
+from ion.core.object.blob_intern import BlobInternStore
 from ion.core.pack.application import AppLoader
 from ion.core.pack.app_manager import AppManager
 from ion.core.process.proc_manager import ProcessManager, Process
@@ -73,6 +74,9 @@ class Container(BasicLifecycleObject):
         # InterceptorSystem
         self.interceptor_system = None
 
+        # Content addressed blobs shared by the workbenches of all processes in the container
+        self.blob_intern = BlobInternStore()
+
     @defer.inlineCallbacks
     def on_initialize(self, config, *args, **kwargs):
         """
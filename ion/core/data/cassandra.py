@@ -39,6 +39,8 @@ CONF = ioninit.config(__name__)
 
 
 cassandra_timeout = CONF.getValue('CassandraTimeout',10.0)
+# The most index queries an expanded IN predicate may have outstanding at once
+cassandra_in_query_limit = CONF.getValue('CassandraInQueryLimit',8)
 class CassandraError(Exception):
     """
     An exception class for ION Cassandra Client errors
@@ -63,7 +65,7 @@ class CassandraStore(TCPConnection):
      - column family: Like a database table. 
     """
 
-    implements(store.IStore)
+    implements(store.ILinkIndexStore)
 
     def __init__(self, persistent_technology, persistent_archive, credentials, cache):
         """
@@ -113,6 +115,70 @@ class CassandraStore(TCPConnection):
             value = None
         defer.returnValue(value)
 
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        @brief Return the values for a list of keys in a single multiget request
+        @param keys list of keys
+        @retval Deferred that fires with a dictionary of key to value, None if not found
+        """
+        result = yield self._multi_get_column(keys, 'value')
+        defer.returnValue(result)
+
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def multi_get_child_links(self, keys):
+        """
+        @brief Return the child link index stored next to the value for a list of keys
+        @param keys list of keys
+        @retval Deferred that fires with a dictionary of key to link index, None if not found
+        """
+        result = yield self._multi_get_column(keys, 'child_links')
+        defer.returnValue(result)
+
+    @defer.inlineCallbacks
+    def _multi_get_column(self, keys, column):
+        keys = list(keys)
+        result = dict.fromkeys(keys)
+        if keys:
+            rows = yield self.client.multiget(keys, self._cache_name, column=column)
+            for key, columns in rows.iteritems():
+                if columns:
+                    result[key] = columns[0].column.value
+        defer.returnValue(result)
+
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def multi_put(self, items, child_links=None):
+        """
+        @brief Write many key/value pairs in a single batch mutation
+        @param items dictionary of key to value
+        @param child_links optional dictionary of key to child link index, written in the same rows
+        @retval Deferred for success
+        """
+        if not items:
+            return
+        child_links = child_links or {}
+        mutations = {}
+        for key, value in items.iteritems():
+            columns = {"value": value, "has_key":"1"}
+            if key in child_links:
+                columns["child_links"] = child_links[key]
+            mutations[key] = {self._cache_name: columns}
+        yield self.client.batch_mutate(mutations)
+
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def put_child_links(self, key, links):
+        """
+        @brief Write the child link index of a value into the same row as the value
+        @param key Lookup key
+        @param links The encoded link index
+        @retval Deferred for success
+        """
+        yield self.client.insert(key, self._cache_name, links, column='child_links')
+
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
     def put(self, key, value):
@@ -194,6 +260,7 @@ class CassandraIndexedStore(CassandraStore):
         """   
         CassandraStore.__init__(self, persistent_technology, persistent_archive, credentials, cache)  
         self._query_attribute_names = None
+        self._in_query_semaphore = defer.DeferredSemaphore(max(1, int(cassandra_in_query_limit)))
             
         
     @timeout(cassandra_timeout)
@@ -218,6 +285,32 @@ class CassandraIndexedStore(CassandraStore):
         
         yield self.client.batch_insert(key, self._cache_name, index_cols)
 
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def multi_put(self, items, index_attributes=None, index_updates=None):
+        """
+        @brief Write many rows and index updates in a single batch mutation
+        @param items dictionary of key to value
+        @param index_attributes optional dictionary of key to the index attributes of the new row
+        @param index_updates optional dictionary of existing key to an update of its index attributes
+        """
+        index_attributes = index_attributes or {}
+        index_updates = index_updates or {}
+
+        mutations = {}
+        for key, value in items.iteritems():
+            index_cols = dict(index_attributes.get(key) or {})
+            yield self._check_index(index_cols)
+            index_cols.update({"value":value, "has_key":"1"})
+            mutations[key] = {self._cache_name: index_cols}
+
+        for key, attributes in index_updates.iteritems():
+            yield self._check_index(attributes)
+            mutations.setdefault(key, {self._cache_name: {}})[self._cache_name].update(attributes)
+
+        if mutations:
+            yield self.client.batch_mutate(mutations)
+
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
     def update_index(self, key, index_attributes):
@@ -284,21 +377,47 @@ class CassandraIndexedStore(CassandraStore):
                 new_pred = IndexOperator.EQ
             elif query_tuple[2] == Query.GT:
                 new_pred = IndexOperator.GT
+            elif query_tuple[2] == Query.GTE:
+                new_pred = IndexOperator.GTE
+            elif query_tuple[2] == Query.LT:
+                new_pred = IndexOperator.LT
+            elif query_tuple[2] == Query.LTE:
+                new_pred = IndexOperator.LTE
             else:
                 raise CassandraError("Illegal predicate value")
             args = {'column_name':query_tuple[0], 'op':new_pred, 'value': query_tuple[1]}
             return IndexExpression(**args)
-        selection_predicates = map(fix_preds, predicates)
-        #log.debug("Calling get_indexed_slices selection_predicate %s " % (selection_predicates,))
-        
-        rows = yield self.client.get_indexed_slices(self._cache_name, selection_predicates, count=row_count)
-        #log.info("Got rows back")
+        # Cassandra has no in operator - expand each in predicate into one equal to query per value
+        selections = [[]]
+        for query_tuple in predicates:
+            if query_tuple[2] == Query.IN:
+                name, values = query_tuple[0], sorted(set(query_tuple[1]))
+                selections = [selection + [(name, value, Query.EQ)] for selection in selections for value in values]
+            else:
+                for selection in selections:
+                    selection.append(query_tuple)
+
         result ={}
-        for row in rows:
-            row_vals = {}
-            for column in row.columns:
-                row_vals[column.column.name] = column.column.value
-            result[row.key] = row_vals
+        if not selections:
+            defer.returnValue(result)
+
+        # The queries for the values are made concurrently - at most cassandra_in_query_limit at a time
+        deferreds = []
+        for selection in selections:
+            selection_predicates = map(fix_preds, selection)
+            #log.debug("Calling get_indexed_slices selection_predicate %s " % (selection_predicates,))
+            deferreds.append(self._in_query_semaphore.run(self.client.get_indexed_slices, self._cache_name, selection_predicates, count=row_count))
+
+        results = yield defer.DeferredList(deferreds, consumeErrors=True)
+        #log.info("Got rows back")
+        for success, rows in results:
+            if not success:
+                rows.raiseException()
+            for row in rows:
+                row_vals = {}
+                for column in row.columns:
+                    row_vals[column.column.name] = column.column.value
+                result[row.key] = row_vals
 
         defer.returnValue(result)
         
@@ -92,13 +92,26 @@ class IndexStoreService(ServiceProcess):
         log.debug("In op_query: request %s" % request)
 
         query_predicates = Query()    
+        in_values = {}
         for attr in request.attrs:
-            if attr.predicate_type == Query.EQ:
+            if attr.predicate_type == Query.IN:
+                # The client sends one attribute for each value of an in predicate
+                in_values.setdefault(attr.attribute_name, []).append(attr.attribute_value)
+            elif attr.predicate_type == Query.EQ:
                 query_predicates.add_predicate_eq(attr.attribute_name, attr.attribute_value)
             elif attr.predicate_type == Query.GT:
                 query_predicates.add_predicate_gt(attr.attribute_name, attr.attribute_value)
+            elif attr.predicate_type == Query.GTE:
+                query_predicates.add_predicate_gte(attr.attribute_name, attr.attribute_value)
+            elif attr.predicate_type == Query.LT:
+                query_predicates.add_predicate_lt(attr.attribute_name, attr.attribute_value)
+            elif attr.predicate_type == Query.LTE:
+                query_predicates.add_predicate_lte(attr.attribute_name, attr.attribute_value)
             else:
                 raise IndexStoreServiceException("Unhandled predicate type: %s " % (attr.predicate_type,))
+
+        for name, values in in_values.iteritems():
+            query_predicates.add_predicate_in(name, values)
                 
         results = yield self._indexed_store.query(query_predicates)
         #Now we have to put these back into a response
@@ -112,9 +125,12 @@ class IndexStoreService(ServiceProcess):
             r.key = key
 
 
-            r.value = row.pop('value')
+            # The rows are not copies - do not modify them
+            r.value = row['value']
 
             for name, val in row.items():
+                if name == 'value':
+                    continue
                 col = r.cols.add()
                 col.column_name = name
                 col.column_value = val
@@ -234,10 +250,13 @@ class IndexStoreServiceClient(ServiceClient):
         request = yield self.mc.create_instance(QUERY_ATTRIBUTES_TYPE)
 
         for attr_key,attr_value,pred_type in query_predicates.get_predicates():
-            attr = request.attrs.add()                
-            attr.attribute_name = str(attr_key)
-            attr.attribute_value = str(attr_value)
-            attr.predicate_type = str(pred_type)
+            # An in predicate is sent as one attribute for each of its values
+            values = attr_value if pred_type == Query.IN else [attr_value]
+            for value in values:
+                attr = request.attrs.add()
+                attr.attribute_name = str(attr_key)
+                attr.attribute_value = str(value)
+                attr.predicate_type = str(pred_type)
 
         (result, headers, msg) = yield self.rpc_send('query', request)
 
@@ -312,6 +331,33 @@ class IndexStoreServiceClient(ServiceClient):
             defer.returnValue(result.value)
         else:
             defer.returnValue(None)
+
+    @defer.inlineCallbacks
+    def multi_put(self, items, index_attributes=None, index_updates=None):
+        """
+        @see IIndexStore.multi_put
+        @note The service has no batch operation - the puts are sent concurrently.
+        """
+        log.info("Called Index Store Service client: multi_put")
+        index_attributes = index_attributes or {}
+        def_list = [self.put(key, value, index_attributes.get(key)) for key, value in items.iteritems()]
+        yield defer.DeferredList(def_list, fireOnOneErrback=True, consumeErrors=True)
+
+        if index_updates:
+            def_list = [self.update_index(key, attributes) for key, attributes in index_updates.iteritems()]
+            yield defer.DeferredList(def_list, fireOnOneErrback=True, consumeErrors=True)
+
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        @see IStore.multi_get
+        @note The service has no batch operation - the gets are sent concurrently.
+        """
+        log.info("Called Index Store Service client: multi_get")
+        keys = list(keys)
+        result_list = yield defer.DeferredList([self.get(key) for key in keys], fireOnOneErrback=True, consumeErrors=True)
+        defer.returnValue(dict((key, value) for key, (success, value) in zip(keys, result_list)))
+
         
     @defer.inlineCallbacks
     def remove(self, key):
@@ -9,6 +9,7 @@
         in memory implementation
 """
 import os
+from bisect import bisect_left, bisect_right, insort
 from zope.interface import Interface
 from zope.interface import implements
 
@@ -49,15 +50,55 @@ class IStore(Interface):
      
         """
 
+    def multi_get(keys):
+        """
+        @param keys  a list of immutable keys
+        @retval Deferred, for a dictionary of key to value, the value is None if not existing.
+        """
+
+    def multi_put(items):
+        """
+        @param items  a dictionary of immutable keys to values, written in one batch
+        @retval Deferred, for success of this operation
+        """
+
+
+class ILinkIndexStore(IStore):
+    """
+    Interface for stores which can keep a child link index next to each value.
+    The index is an opaque string written and read by the caller.
+    """
+
+    def put_child_links(key, links):
+        """
+        @param key  an immutable key associated with a value
+        @param links  a string encoding the child links of the value
+        @retval Deferred, for success of this operation
+        """
+
+    def multi_get_child_links(keys):
+        """
+        @param keys  a list of immutable keys
+        @retval Deferred, for a dictionary of key to link index, the index is None if not existing.
+        """
+
+    def multi_put(items, child_links=None):
+        """
+        @param items  a dictionary of immutable keys to values, written in one batch
+        @param child_links  an optional dictionary of keys to link indices, written in the same batch
+        @retval Deferred, for success of this operation
+        """
+
 class Store(object):
     """
     Memory implementation of an asynchronous key/value store, using a dict.
     Simulates typical usage of using a client connection to a backend
     technology.
     """
-    implements(IStore)
+    implements(ILinkIndexStore)
 
     kvs = {}
+    links = {}
 
     def __init__(self, *args, **kwargs):
         pass
@@ -81,7 +122,37 @@ class Store(object):
         # could test for existance of key. this will error otherwise
         if self.kvs.has_key(key):
             del self.kvs[key]
+        self.links.pop(key, None)
         return defer.succeed(None)
+
+    def multi_get(self, keys):
+        """
+        @see IStore.multi_get
+        """
+        kvs = self.kvs
+        return defer.succeed(dict((key, kvs.get(key, None)) for key in keys))
+
+    def multi_put(self, items, child_links=None):
+        """
+        @see ILinkIndexStore.multi_put
+        """
+        self.kvs.update(items)
+        if child_links:
+            self.links.update(child_links)
+        return defer.succeed(None)
+
+    def put_child_links(self, key, links):
+        """
+        @see ILinkIndexStore.put_child_links
+        """
+        return defer.maybeDeferred(self.links.update, {key:links})
+
+    def multi_get_child_links(self, keys):
+        """
+        @see ILinkIndexStore.multi_get_child_links
+        """
+        links = self.links
+        return defer.succeed(dict((key, links.get(key, None)) for key in keys))
     
        
     def has_key(self, key):
@@ -126,7 +197,8 @@ class IIndexStore(IStore):
     def query(query_predicates):
         """
         Search for rows in the Cassandra instance.
-        @param query_predicates is a store.Query object
+        @param query_predicates is a store.Query object. An in predicate matches any of a list of values so that
+        one query can stand in for an equal to query per value.
         @retVal a thrift representation of the rows returned by the query.
         """
         
@@ -135,6 +207,14 @@ class IIndexStore(IStore):
         @param key  an immutable key associated with a value
         @param index_attributes an update to the dictionary of attributes by which to index this value of this key
         """        
+
+    def multi_put(items, index_attributes=None, index_updates=None):
+        """
+        @param items  a dictionary of immutable keys to values
+        @param index_attributes  an optional dictionary of keys in items to the attributes by which to index them
+        @param index_updates  an optional dictionary of existing keys to an update of their index attributes
+        @retval Deferred, for success of this operation - all rows are written in one batch
+        """
     
     def has_key(key):
         """
@@ -170,11 +250,20 @@ class IndexStore(object):
     
     self.indices is an index to map attribute names to attribute values to keys
         {attr_names:{attr_value: set( keys)}}.
+
+    self.sorted_indices holds the distinct values of each attribute in sorted order along with the index
+    they were sorted from - it is rebuilt if that index is replaced
+        {attr_names:(index, [attr_value, ...])}
+    so that range predicates bisect the values instead of scanning them.
+
+    Rows are replaced rather than modified so the rows returned by query are not copied. The caller
+    must not modify them.
     """
     implements(IIndexStore)
 
     kvs = {}
     indices = {}
+    sorted_indices = {}
 
     def __init__(self, *args, **kwargs):
         #self.kvs = {}
@@ -203,7 +292,9 @@ class IndexStore(object):
         """
         if index_attributes is None:
             index_attributes = {}
-            
+
+        # The row is replaced - drop the index entries of the old one
+        self._discard_row(key)
         self._update_index(key, index_attributes)
                         
         return defer.maybeDeferred(self.kvs.update, {key: dict({"value":value},**index_attributes)})        
@@ -213,9 +304,26 @@ class IndexStore(object):
         @see IStore.remove
         """
         # could test for existence of key. this will error otherwise
-        if self.kvs.has_key(key):
-            del self.kvs[key]            
+        self._discard_row(key)
+        self.kvs.pop(key, None)
         return defer.succeed(None)
+
+    def _discard_row(self, key):
+        row = self.kvs.get(key)
+        if row is not None:
+            for k, v in row.iteritems():
+                if k in self.indices:
+                    self._index_discard(k, v, key)
+
+    def multi_get(self, keys):
+        """
+        @see IStore.multi_get
+        """
+        result = {}
+        for key in keys:
+            row = self.kvs.get(key, None)
+            result[key] = None if row is None else row.get("value")
+        return defer.succeed(result)
         
     def query(self, query_predicates):
         """
@@ -228,80 +336,206 @@ class IndexStore(object):
         @retVal A data structure representing Cassandra rows. See the class
         docstring for the description of the data structure.
         """
-        log.debug("In query: predicates %s" % query_predicates)
+        log.debug("In query: predicates %s", query_predicates)
 
         predicates = query_predicates.get_predicates()
 
-        eq_filter = lambda x: x[2] == Query.EQ
-        preds_eq = filter(eq_filter, predicates)
-        keys = set()
-        if len(preds_eq) == 0:
+        if not [p for p in predicates if p[2] in (Query.EQ, Query.IN)]:
             raise IndexStoreError('Invalid arguments to IndexStore - must provide at least one equal to operator for search!')
-        else:
-            k,v,pred = preds_eq.pop()
-            kindex = self.indices.get(k, None)
-            if kindex:
-                keys.update(kindex.get(v,set()))
-
-        for k,v,p in predicates:
-
-            kindex = self.indices.get(k,None)
-            if p == Query.EQ:
-                
-                if kindex:
-                    keys.intersection_update(kindex.get(v,set()))
-            elif p == Query.GT:
-                
-                matches = set()
-                for attr_val in kindex.keys():
-                    if attr_val > v:
-                        matches.update(kindex.get(attr_val,set()))
-                keys.intersection_update(matches)
 
-        #log.debug("keys: "+ str(keys))
+        eq_sets, ranges, filters, value_filters = self._plan_query(predicates)
+
+        kvs = self.kvs
         result = {}
-        for k in keys:
-            # This is stupid, but now remove effectively works - delete keys are no longer visible!
-            if self.kvs.has_key(k):
-                result[k] = self.kvs.get(k).copy()
+        if eq_sets is None:
+            # Two different values for the same attribute, or none of the equal predicates is indexed
+            return defer.succeed(result)
+
+        # Start from the smallest posting set - intersection iterates the smaller of two sets
+        eq_sets.sort(key=len)
+        keys = eq_sets[0]
+        for posting in eq_sets[1:]:
+            if not keys:
+                break
+            keys = keys.intersection(posting)
+
+        for k, low, low_inclusive, high, high_inclusive in ranges:
+            if not keys:
+                break
+
+            values = self._sorted_values(k)
+            if low is None:
+                start = 0
+            elif low_inclusive:
+                start = bisect_left(values, low)
+            else:
+                start = bisect_right(values, low)
+
+            if high is None:
+                stop = len(values)
+            elif high_inclusive:
+                stop = bisect_right(values, high)
+            else:
+                stop = bisect_left(values, high)
+
+            # Collect the keys in the range only if there are fewer of them than candidates - otherwise
+            # it is cheaper to check the value in each candidate row
+            kindex = self.indices[k]
+            limit = len(keys)
+            postings = []
+            count = 0
+            for i in xrange(start, stop):
+                posting = kindex.get(values[i], _EMPTY)
+                count += len(posting)
+                if count >= limit:
+                    postings = None
+                    break
+                postings.append(posting)
+
+            if postings is None:
+                filters.append((k, low, low_inclusive, high, high_inclusive))
+            else:
+                matches = set()
+                for posting in postings:
+                    matches.update(posting)
+                keys = keys.intersection(matches)
 
-        log.debug("Query Results: %s" % result)
+        for key in keys:
+            # This is stupid, but now remove effectively works - delete keys are no longer visible!
+            row = kvs.get(key)
+            if row is None:
+                continue
+
+            for k, values in value_filters:
+                if k not in row or row[k] not in values:
+                    break
+            else:
+                for k, low, low_inclusive, high, high_inclusive in filters:
+                    if not _in_range(row, k, low, low_inclusive, high, high_inclusive):
+                        break
+                else:
+                    result[key] = row
+
+        log.debug("Query Results: %s", result)
+
+        return defer.succeed(result)
+
+    def _plan_query(self, predicates):
+        """
+        Sort the predicates into the posting sets of the equal and in predicates on indexed attributes, a range
+        for each other indexed attribute and filters on the rows for the attributes which are not indexed.
+        @retval (eq_sets, ranges, filters, value_filters) - eq_sets is None if no row can match
+        """
+        eq_values = {}
+        bounds = {}
+        for k, v, p in predicates:
+            if p in (Query.EQ, Query.IN):
+                values = frozenset([v]) if p == Query.EQ else frozenset(v)
+                if k in eq_values:
+                    values = eq_values[k].intersection(values)
+                if not values:
+                    return None, None, None, None
+                eq_values[k] = values
+                continue
+
+            low, low_inclusive, high, high_inclusive = bounds.get(k, (None, False, None, False))
+            if p in (Query.GT, Query.GTE):
+                inclusive = p == Query.GTE
+                if low is None or v > low or (v == low and not inclusive):
+                    low, low_inclusive = v, inclusive
+            elif p in (Query.LT, Query.LTE):
+                inclusive = p == Query.LTE
+                if high is None or v < high or (v == high and not inclusive):
+                    high, high_inclusive = v, inclusive
+            else:
+                raise IndexStoreError('Invalid predicate in query: %s' % str(p))
+            bounds[k] = (low, low_inclusive, high, high_inclusive)
+
+        # The equal predicate already picks the values - keep the ones in range
+        for k, (low, low_inclusive, high, high_inclusive) in bounds.items():
+            if k in eq_values:
+                values = frozenset([v for v in eq_values[k] if _in_range({k:v}, k, low, low_inclusive, high, high_inclusive)])
+                if not values:
+                    return None, None, None, None
+                eq_values[k] = values
+                del bounds[k]
+
+        eq_sets = []
+        value_filters = []
+        for k, values in eq_values.iteritems():
+            kindex = self.indices.get(k, None)
+            if kindex is None:
+                value_filters.append((k, values))
+            elif len(values) == 1:
+                for v in values:
+                    eq_sets.append(kindex.get(v, _EMPTY))
+            else:
+                posting = set()
+                for v in values:
+                    posting.update(kindex.get(v, _EMPTY))
+                eq_sets.append(posting)
+
+        if not eq_sets:
+            return None, None, None, None
+
+        ranges = []
+        filters = []
+        for k, (low, low_inclusive, high, high_inclusive) in bounds.iteritems():
+            if k in self.indices:
+                ranges.append((k, low, low_inclusive, high, high_inclusive))
+            else:
+                filters.append((k, low, low_inclusive, high, high_inclusive))
+
+        return eq_sets, ranges, filters, value_filters
+
+    def _sorted_values(self, k):
+        kindex = self.indices[k]
+        entry = self.sorted_indices.get(k)
+        if entry is None or entry[0] is not kindex:
+            # The index was cleared or replaced
+            entry = (kindex, sorted(kindex.keys()))
+            self.sorted_indices[k] = entry
+        return entry[1]
+
+    def _index_add(self, k, v, key):
+        kindex = self.indices[k]
+        keys = kindex.get(v)
+        if keys is None:
+            values = self._sorted_values(k)
+            keys = kindex[v] = set()
+            insort(values, v)
+        keys.add(key)
+
+    def _index_discard(self, k, v, key):
+        kindex = self.indices[k]
+        keys = kindex.get(v)
+        if keys is None:
+            return
+
+        keys.discard(key)
+        if not keys:
+            values = self._sorted_values(k)
+            del kindex[v]
+            i = bisect_left(values, v)
+            if i < len(values) and values[i] == v:
+                del values[i]
 
-        return defer.succeed(result)                
-    
     def _update_index(self, key, index_attributes):
-        log.debug("In _update_index: key %s index_attributes %s" % (key,index_attributes))
+        log.debug("In _update_index: key %s index_attributes %s", key, index_attributes)
         #Ensure that we are updating attributes that are indexed.
-        query_attribute_names = set(self.indices.keys())
-        index_attribute_names = set(index_attributes.keys())
-        
-        if not index_attribute_names.issubset(query_attribute_names):
-            bad_attrs = index_attribute_names.difference(query_attribute_names)
-            raise IndexStoreError("These attributes: %s %s %s"  % (",".join(bad_attrs),os.linesep,"are not indexed."))
+        for k in index_attributes:
+            if k not in self.indices:
+                bad_attrs = set(index_attributes.keys()).difference(self.indices.keys())
+                raise IndexStoreError("These attributes: %s %s %s"  % (",".join(bad_attrs),os.linesep,"are not indexed."))
 
         current_attrs = self.kvs.get(key)
         if current_attrs is not None:
-
-            changed_attrs = {}
-            for k in index_attributes.keys():
+            for k in index_attributes:
                 if current_attrs.has_key(k):
-                    changed_attrs[k] = current_attrs.get(k)
+                    self._index_discard(k, current_attrs[k], key)
 
-
-            for k,v in changed_attrs.items():
-                kindex = self.indices.get(k)
-                # Create a set of keys if it does not already exist
-                kindex[v].discard(key)
-
-
-        for k, v in index_attributes.items():
-            kindex = self.indices.get(k, None)
-            #if not kindex:
-            #    kindex = {}
-            #    self.indices[k] = kindex
-            # Create a set of keys if it does not already exist
-            kindex[v] = kindex.get(v, set())
-            kindex[v].add(key)
+        for k, v in index_attributes.iteritems():
+            self._index_add(k, v, key)
     
 
     def update_index(self, key, index_attributes):
@@ -315,7 +549,25 @@ class IndexStore(object):
         """
         log.debug("In update_index")
         self._update_index(key, index_attributes)
-        self.kvs[key].update(index_attributes)
+
+        # Replace the row - rows returned by query are not copies
+        row = dict(self.kvs[key])
+        row.update(index_attributes)
+        self.kvs[key] = row
+        return defer.succeed(None)
+
+    def multi_put(self, items, index_attributes=None, index_updates=None):
+        """
+        @see IIndexStore.multi_put
+        """
+        index_attributes = index_attributes or {}
+        for key, value in items.iteritems():
+            self.put(key, value, index_attributes.get(key))
+
+        if index_updates:
+            for key, attributes in index_updates.iteritems():
+                self.update_index(key, attributes)
+
         return defer.succeed(None)
     
     def has_key(self, key):
@@ -332,6 +584,23 @@ class IndexStore(object):
         """
         return defer.maybeDeferred(self.indices.keys)
 
+_EMPTY = frozenset()
+
+def _in_range(row, k, low, low_inclusive, high, high_inclusive):
+    """
+    Check the value of attribute k of a row against the bounds of a range
+    """
+    if k not in row:
+        return False
+
+    v = row[k]
+    if low is not None and (v < low or (v == low and not low_inclusive)):
+        return False
+    if high is not None and (v > high or (v == high and not high_inclusive)):
+        return False
+    return True
+
+
 class Query:
     """
     Class that holds the predicates used to query an IndexStore.
@@ -339,6 +608,10 @@ class Query:
     
     EQ = "EQ"
     GT = "GT"
+    GTE = "GTE"
+    LT = "LT"
+    LTE = "LTE"
+    IN = "IN"
     def __init__(self):
         self._predicates = []
 
@@ -354,6 +627,28 @@ class Query:
     
     def add_predicate_gt(self, name, value):
         self._predicates.append((name,value,Query.GT))
+
+    def add_predicate_gte(self, name, value):
+        self._predicates.append((name,value,Query.GTE))
+
+    def add_predicate_lt(self, name, value):
+        self._predicates.append((name,value,Query.LT))
+
+    def add_predicate_lte(self, name, value):
+        self._predicates.append((name,value,Query.LTE))
+
+    def add_predicate_range(self, name, low, high):
+        """
+        Match values from low up to but not including high
+        """
+        self.add_predicate_gte(name, low)
+        self.add_predicate_lt(name, high)
+
+    def add_predicate_in(self, name, values):
+        """
+        Match any of the values - one query in place of an equal to query for each value
+        """
+        self._predicates.append((name,list(values),Query.IN))
         
     def get_predicates(self):
         return self._predicates    
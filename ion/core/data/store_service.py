@@ -188,6 +188,28 @@ class StoreServiceClient(ServiceClient):
             defer.returnValue(result.value)
         else:
             defer.returnValue(None)
+
+    @defer.inlineCallbacks
+    def multi_put(self, items):
+        """
+        @see IStore.multi_put
+        @note The service has no batch operation - the puts are sent concurrently.
+        """
+        log.info("Called Store Service client: multi_put")
+        def_list = [self.put(key, value) for key, value in items.iteritems()]
+        yield defer.DeferredList(def_list, fireOnOneErrback=True, consumeErrors=True)
+
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        @see IStore.multi_get
+        @note The service has no batch operation - the gets are sent concurrently.
+        """
+        log.info("Called Store Service client: multi_get")
+        keys = list(keys)
+        result_list = yield defer.DeferredList([self.get(key) for key in keys], fireOnOneErrback=True, consumeErrors=True)
+        defer.returnValue(dict((key, value) for key, (success, value) in zip(keys, result_list)))
+
         
     @defer.inlineCallbacks
     def remove(self, key):
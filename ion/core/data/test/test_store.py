@@ -95,6 +95,29 @@ class IStoreTest(unittest.TestCase):
         defer.returnValue(None)
 
 
+    @defer.inlineCallbacks
+    def test_multi_get(self):
+        other_key = object_utils.sha1bin(str(uuid4()))
+        yield self.ds.put(self.key, self.value)
+        yield self.ds.put(other_key, self.key)
+
+        missing_key = object_utils.sha1bin(str(uuid4()))
+        result = yield self.ds.multi_get([self.key, other_key, missing_key])
+        self.assertEqual(result, {self.key:self.value, other_key:self.key, missing_key:None})
+
+        result = yield self.ds.multi_get([])
+        self.assertEqual(result, {})
+
+    @defer.inlineCallbacks
+    def test_multi_put(self):
+        other_key = object_utils.sha1bin(str(uuid4()))
+        yield self.ds.multi_put({self.key:self.value, other_key:self.key})
+
+        result = yield self.ds.multi_get([self.key, other_key])
+        self.assertEqual(result, {self.key:self.value, other_key:self.key})
+
+        yield self.ds.multi_put({})
+
     @defer.inlineCallbacks
     def test_has_key(self):
         yield self.ds.put(self.key, self.value)
@@ -296,6 +319,55 @@ class IndexStoreTest(IStoreTest):
 
 
 
+    # Tests a range of birth dates and state == UT
+    @defer.inlineCallbacks
+    def test_query_range_and_eq(self):
+
+        query = Query()
+        query.add_predicate_range('birth_date', '1968', '1975')
+        query.add_predicate_eq('state', 'UT')
+        rows = yield self.ds.query(query)
+
+        log.info("Rows returned %s " % (rows,))
+        self.assertEqual(rows.keys(), ['htayler'])
+        self.assertEqual(rows['htayler']['value'], self.binary_value3)
+
+        query = Query()
+        query.add_predicate_gt('birth_date', '1968')
+        query.add_predicate_lte('birth_date', '1975')
+        query.add_predicate_eq('state', 'UT')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows.keys(), ['bsanderson'])
+
+        query = Query()
+        query.add_predicate_lt('birth_date', '1968')
+        query.add_predicate_eq('state', 'UT')
+        rows = yield self.ds.query(query)
+        self.assertEqual(len(rows), 0)
+
+
+    @defer.inlineCallbacks
+    def test_query_in(self):
+
+        query = Query()
+        query.add_predicate_in('full_name', ['Brandon Sanderson', 'Howard Tayler', 'Nobody'])
+        rows = yield self.ds.query(query)
+        self.assertEqual(sorted(rows.keys()), ['bsanderson', 'htayler'])
+
+        query = Query()
+        query.add_predicate_in('full_name', ['Brandon Sanderson', 'Howard Tayler', 'Patrick Rothfuss'])
+        query.add_predicate_eq('state', 'UT')
+        query.add_predicate_gt('birth_date', '1970')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows.keys(), ['bsanderson'])
+        self.assertEqual(rows['bsanderson']['value'], self.binary_value1)
+
+        query = Query()
+        query.add_predicate_in('full_name', ['Nobody', 'Somebody'])
+        rows = yield self.ds.query(query)
+        self.assertEqual(len(rows), 0)
+
+
     @defer.inlineCallbacks
     def put_stuff_for_tests(self):
         """
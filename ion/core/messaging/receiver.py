@@ -29,6 +29,14 @@ from ion.core.exception import IonError
 # processing, eg. to retaining user-id from request message
 from ion.core.ioninit import request
 
+CONF = ioninit.config(__name__)
+
+# 'thread' hops through the reactor thread pool for every message (legacy);
+# 'reactor' dispatches directly in the reactor thread.
+DISPATCH_THREAD = 'thread'
+DISPATCH_REACTOR = 'reactor'
+CF_dispatch_mode = CONF.getValue('dispatch_mode', DISPATCH_THREAD)
+CF_max_concurrent = CONF.getValue('max_concurrent', 0)
 
 class ReceiverError(IonError):
     """
@@ -63,7 +71,7 @@ class Receiver(BasicLifecycleObject):
     rec_messages = {}
     rec_shutoff = False
 
-    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None):
+    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None, dispatch_mode=None, max_concurrent=None):
         """
         @param label descriptive label for the receiver
         @param name the actual exchange name. Used for routing
@@ -76,6 +84,9 @@ class Receiver(BasicLifecycleObject):
         @param consumer_config  Additional Consumer configuration params. Used by _init_receiver, these params take precedence over any
                                 other config.
         @param publisher_config Additional Publisher configuration params, used by send()
+        @param dispatch_mode    'thread' or 'reactor'. None uses the configured default.
+        @param max_concurrent   Maximum number of messages processed at the same time in 'reactor' mode.
+                                0 means unlimited. None uses the configured default.
         """
         BasicLifecycleObject.__init__(self)
 
@@ -90,6 +101,16 @@ class Receiver(BasicLifecycleObject):
         self.consumer_config  = consumer_config if consumer_config is not None else {}
         self.publisher_config = publisher_config if publisher_config is not None else {}
 
+        self.dispatch_mode = dispatch_mode if dispatch_mode is not None else CF_dispatch_mode
+        if self.dispatch_mode not in (DISPATCH_THREAD, DISPATCH_REACTOR):
+            raise ReceiverError('Invalid receiver dispatch mode: "%s"' % self.dispatch_mode)
+
+        self.max_concurrent = max_concurrent if max_concurrent is not None else CF_max_concurrent
+        # Limits the number of messages in flight in reactor dispatch mode
+        self._dispatch_semaphore = None
+        if self.max_concurrent > 0:
+            self._dispatch_semaphore = defer.DeferredSemaphore(self.max_concurrent)
+
         self.handlers = []
         self.error_handlers = []
         self.consumer = None
@@ -199,7 +220,6 @@ class Receiver(BasicLifecycleObject):
     def add_error_handler(self, callback):
         self.error_handlers.append(callback)
 
-    @defer.inlineCallbacks
     def receive(self, msg):
         """
         @brief entry point for received messages; callback from Carrot. All
@@ -207,13 +227,47 @@ class Receiver(BasicLifecycleObject):
         @note is called from carrot as normal method; no return expected
         @param msg instance of carrot.backends.txamqp.Message
         """
+        if self.dispatch_mode == DISPATCH_REACTOR:
+            return self._reactor_receive(msg)
 
+        return self._thread_receive(msg)
+
+    @defer.inlineCallbacks
+    def _thread_receive(self, msg):
+        """
+        @brief Legacy dispatch: hop through the reactor thread pool for each message.
+        """
         # Wrapping the handler in a thread to allow thread-local context during message processing.
         def do_receive_and_wait():
             threads.blockingCallFromThread(reactor, self._do_receive, msg)
 
         yield threads.deferToThread(do_receive_and_wait)
 
+    def _reactor_receive(self, msg):
+        """
+        @brief Dispatch directly in the reactor thread.
+        @note blockingCallFromThread runs _do_receive in the reactor thread anyway, so the
+        request context seen by the handlers is the reactor thread's in both modes. The
+        workbench context of each message is tracked by its conv-id (see _pop_workbench_context)
+        so interleaved messages do not pop each other's context.
+        """
+        if self._dispatch_semaphore is not None:
+            return self._dispatch_semaphore.run(self._do_receive, msg)
+
+        return self._do_receive(msg)
+
+    @staticmethod
+    def _pop_workbench_context(current_context, convid):
+        """
+        @brief Remove the most recent entry for convid from the workbench context stack.
+        Falls back to popping the top of the stack if the conv-id is not found.
+        """
+        for i in xrange(len(current_context) - 1, -1, -1):
+            if current_context[i] == convid:
+                return current_context.pop(i)
+
+        return current_context.pop()
+
     @defer.inlineCallbacks
     def _do_receive(self, msg):
         """
@@ -341,13 +395,13 @@ class Receiver(BasicLifecycleObject):
 
                     if protocol != 'rpc':
                         # if it is not an rpc conversation - set the context
-                        workbench_context = current_context.pop()
+                        workbench_context = self._pop_workbench_context(current_context, convid)
                         log.info('Popping Non RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
 
                     elif performative == 'request':
                         # if it is an rpc request - set the context
 
-                        workbench_context = current_context.pop()
+                        workbench_context = self._pop_workbench_context(current_context, convid)
                         log.info('Popping RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
 
                         # if it is an RPC result message - do not set the context!
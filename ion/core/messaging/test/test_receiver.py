@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/test/test_receiver.py
+@test ion.core.messaging.receiver dispatch modes
+"""
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core.messaging import receiver
+from ion.core.messaging.receiver import Receiver, ReceiverError
+import ion.util.procutils as pu
+
+
+class FakeMessage(object):
+    """
+    Minimal stand in for a carrot message
+    """
+    def __init__(self, payload):
+        self.payload = payload
+        self._state = 'RECEIVED'
+
+    def ack(self):
+        self._state = 'ACK'
+        return defer.succeed(None)
+
+
+class ReceiverDispatchTest(unittest.TestCase):
+
+    def test_invalid_mode(self):
+        self.assertRaises(ReceiverError, Receiver, 'bad_mode', dispatch_mode='greenlet')
+
+    @defer.inlineCallbacks
+    def test_reactor_dispatch(self):
+
+        received = []
+        def handler(data, msg):
+            received.append(data['conv-id'])
+            return msg.ack()
+
+        rec = Receiver('test_reactor', raw=True, handler=handler, dispatch_mode=receiver.DISPATCH_REACTOR)
+        for i in range(5):
+            yield rec.receive(FakeMessage({'conv-id':'conv_%d' % i, 'protocol':'rpc', 'performative':'request'}))
+
+        self.assertEqual(received, ['conv_%d' % i for i in range(5)])
+        self.assertEqual(rec.processing_messages, {})
+
+    @defer.inlineCallbacks
+    def test_max_concurrent(self):
+
+        state = {'active':0, 'peak':0}
+        @defer.inlineCallbacks
+        def handler(data, msg):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            yield pu.asleep(0.01)
+            state['active'] -= 1
+            yield msg.ack()
+
+        rec = Receiver('test_limit', raw=True, handler=handler, dispatch_mode=receiver.DISPATCH_REACTOR, max_concurrent=2)
+        dl = [rec.receive(FakeMessage({'conv-id':'conv_%d' % i, 'protocol':'rpc', 'performative':'request'})) for i in range(6)]
+        yield defer.DeferredList(dl)
+
+        self.assertEqual(state['peak'], 2)
+        self.assertEqual(state['active'], 0)
+
+    def test_pop_workbench_context(self):
+
+        context = ['Test runner context!', 'conv_a', 'conv_b']
+        # Messages finishing out of order must remove their own context
+        self.assertEqual(Receiver._pop_workbench_context(context, 'conv_a'), 'conv_a')
+        self.assertEqual(context, ['Test runner context!', 'conv_b'])
+
+        self.assertEqual(Receiver._pop_workbench_context(context, 'unknown'), 'conv_b')
+        self.assertEqual(context, ['Test runner context!'])
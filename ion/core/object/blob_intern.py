@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/blob_intern.py
+@brief A container level store of content addressed structure elements shared between workbenches.
+
+Structure elements are keyed by the sha1 of their type and content so an element with a given key is
+the same in every repository of every process. The intern store keeps one copy of each element for the
+whole capability container. Repository index hashes intern the elements they hold and look in the store
+before asking the workbench to fetch an element from another process. The elements are read only once
+interned - nothing may modify them.
+
+Each entry is reference counted by the index hashes which hold it. An entry which is no longer referenced
+is kept in an LRU pool so that it can be picked up again by another repository until the byte limit
+forces it out. Elements which do not fit under the limit are not interned.
+
+Interning is off unless the byte_limit config value is set. Shared elements must never be changed in place,
+so only enable it for containers whose processes treat fetched structure elements as read only.
+"""
+from __future__ import with_statement
+
+import threading
+
+from ion.core import ioninit
+from ion.core.object.gpb_wrapper import FramedStructureElement
+from ion.util.cache import LRUDict
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+CONF = ioninit.config(__name__)
+
+
+class BlobInternStore(object):
+    """
+    @brief Reference counted, size limited store of immutable structure elements keyed by their sha1
+    """
+
+    def __init__(self, limit=None):
+        """
+        @param limit the maximum number of bytes held by the store. Defaults to the byte_limit config value.
+        A limit of zero, the default, disables interning.
+        """
+        if limit is None:
+            limit = int(CONF.getValue('byte_limit', 0))
+        self.limit = limit
+
+        # key -> [element, references, size] of the entries held by at least one index hash
+        self._held = {}
+        self.held_size = 0
+
+        # Entries which are not referenced, oldest first
+        self._idle = LRUDict(limit, use_size=True)
+
+        self._lock = threading.RLock()
+
+        self.reset_stats()
+
+    def _get_enabled(self):
+        return self.limit > 0
+
+    enabled = property(_get_enabled)
+
+    def __len__(self):
+        return len(self._held) + len(self._idle)
+
+    def has_key(self, key):
+        return key in self._held or key in self._idle.d
+
+    __contains__ = has_key
+
+    def keys(self):
+        """
+        @retval a list of the keys of all the elements in the store, referenced or not
+        """
+        with self._lock:
+            return self._held.keys() + self._idle.keys()
+
+    def intern(self, element):
+        """
+        @brief Add a reference to the shared copy of an element, adding the element if it is not yet stored.
+        @param element a structure element
+        @retval the shared element to use in place of the argument, or None if it could not be interned.
+        """
+        key = element.key
+        with self._lock:
+            shared = self._acquire(key)
+            if shared is not None:
+                self.deduplicated += 1
+                if element.ChildLinks and shared is not element:
+                    shared.ChildLinks.update(element.ChildLinks)
+                return shared
+
+            size = element.__sizeof__()
+            if not self._make_room(size):
+                self.rejected += 1
+                return None
+
+            # An element decoded from a framed message refers to the whole message buffer - copy out its
+            # value so that the store does not keep the message alive
+            if isinstance(element, FramedStructureElement) and not element.Materialized:
+                element._element
+
+            self._held[key] = [element, 1, size]
+            self.held_size += size
+            self.inserts += 1
+            return element
+
+    def get(self, key):
+        """
+        @brief Add a reference to a stored element
+        @retval the shared element or None if it is not stored
+        """
+        with self._lock:
+            shared = self._acquire(key)
+            if shared is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return shared
+
+    def peek(self, key):
+        """
+        @brief Look at a stored element without taking a reference to it
+        @retval the shared element or None if it is not stored
+        """
+        with self._lock:
+            entry = self._held.get(key)
+            if entry is not None:
+                return entry[0]
+
+            node = self._idle.d.get(key)
+            if node is not None:
+                return node.me[1]
+            return None
+
+    def release(self, key):
+        """
+        @brief Drop a reference taken by intern or get. The element becomes idle when it is no longer referenced.
+        """
+        with self._lock:
+            entry = self._held.get(key)
+            if entry is None:
+                return
+
+            element, refs, size = entry
+            if refs > 1:
+                entry[1] = refs - 1
+                self.saved_size -= size
+                return
+
+            del self._held[key]
+            self.held_size -= size
+            self._idle.set(key, element, size)
+            self._make_room(0)
+
+    def _acquire(self, key):
+        entry = self._held.get(key)
+        if entry is not None:
+            entry[1] += 1
+            self.saved_size += entry[2]
+            return entry[0]
+
+        if key in self._idle.d:
+            size = self._idle.d[key].size
+            element = self._idle.pop(key)
+            self._held[key] = [element, 1, size]
+            self.held_size += size
+            return element
+
+        return None
+
+    def _make_room(self, size):
+        """
+        Drop the oldest idle entries until size more bytes fit under the limit
+        @retval False if the referenced entries leave no room
+        """
+        if self.held_size + size > self.limit:
+            return False
+
+        while self.held_size + self._idle.total_size + size > self.limit:
+            oldest = self._idle.first
+            self.evicted_size += oldest.size
+            self.evictions += 1
+            del self._idle[oldest.me[0]]
+
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._held.clear()
+            self.held_size = 0
+            self._idle.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.evicted_size = 0
+        # Bytes which would be held in duplicate copies without the store
+        self.saved_size = 0
+        with self._lock:
+            for element, refs, size in self._held.itervalues():
+                self.saved_size += (refs - 1) * size
+
+    def stats(self):
+        """
+        @retval a dictionary of the reference counts, sizes and hit counts of the store.
+        saved_size is the number of bytes the shared elements save compared to one copy per reference.
+        """
+        with self._lock:
+            references = 0
+            for entry in self._held.itervalues():
+                references += entry[1]
+
+            return {'items':len(self._held),
+                    'idle_items':len(self._idle),
+                    'references':references,
+                    'size':self.held_size + self._idle.total_size,
+                    'idle_size':self._idle.total_size,
+                    'limit':self.limit,
+                    'saved_size':self.saved_size,
+                    'hits':self.hits,
+                    'misses':self.misses,
+                    'inserts':self.inserts,
+                    'deduplicated':self.deduplicated,
+                    'rejected':self.rejected,
+                    'evictions':self.evictions,
+                    'evicted_size':self.evicted_size}
@@ -16,6 +16,56 @@ import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
 
+#------------------------------------------------#
+# Name lookup of the elements of repeated fields #
+#------------------------------------------------#
+def _name_map(self, field_name):
+    """
+    Get the map from name to index for the linked elements of a repeated field (groups, attributes,
+    dimensions, variables or shape) of a CDM object. The map is built on first use and kept in the wrapper
+    until the field is changed through its container, a linked element is renamed or the wrapper is
+    invalidated.
+    """
+    maps = self._name_maps
+    if maps is None:
+        maps = {}
+        self._name_maps = maps
+
+    name_map = maps.get(field_name)
+    if name_map is None:
+        name_map = {}
+        i = 0
+        for item in getattr(self, field_name):
+            # Keep the first element with a name, like the linear search did
+            if item is not None and item.name not in name_map:
+                name_map[item.name] = i
+            i += 1
+        maps[field_name] = name_map
+
+    return name_map
+
+
+def _find_index_by_name(self, field_name, name):
+    """
+    Find the index of the element of a repeated field with the given name
+    @return: The index or -1 if no element has the name
+    """
+    idx = _name_map(self, field_name).get(name, -1)
+    if -1 == idx:
+        return idx
+
+    # Check the element we found in case it was renamed without passing through its wrapper
+    field = getattr(self, field_name)
+    if idx < len(field):
+        item = field[idx]
+        if item is not None and item.name == name:
+            return idx
+
+    # A stale map - rebuild the map of this field only
+    del self._name_maps[field_name]
+    return _name_map(self, field_name).get(name, -1)
+
+
 #-----------------------------------#
 # Wrapper_Group Specialized Methods #
 #-----------------------------------#
@@ -216,15 +266,11 @@ def _find_group_by_name(self, name=''):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = None
-    for group in self.groups:
-        if group.name == name:
-            result = group
-            break
-    if None == result:
+    idx = _find_index_by_name(self, 'groups', name)
+    if -1 == idx:
         raise OOIObjectError('Requested group name not found: "%s"' % str(name))
 
-    return result
+    return self.groups[idx]
 
 
 @_gpb_source
@@ -238,15 +284,11 @@ def _find_attribute_by_name(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = None
-    for att in self.attributes:
-        if att.name == name:
-            result = att
-            break
-    if None == result:
+    idx = _find_index_by_name(self, 'attributes', name)
+    if -1 == idx:
         raise OOIObjectError('Requested attribute name not found: "%s"' % str(name))
 
-    return result
+    return self.attributes[idx]
 
 
 @_gpb_source
@@ -259,23 +301,16 @@ def _find_dimension_by_name(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = None
-
     if self.ObjectType == CDM_VARIABLE_TYPE:
-        for dim in self.shape:
-            if dim.name == name:
-                result = dim
-                break
+        field_name = 'shape'
     else:
-        for dim in self.dimensions:
-            if dim.name == name:
-                result = dim
-                break
+        field_name = 'dimensions'
 
-    if None == result:
+    idx = _find_index_by_name(self, field_name, name)
+    if -1 == idx:
         raise OOIObjectError('Requested dimension name not found: "%s"' % str(name))
 
-    return result
+    return getattr(self, field_name)[idx]
 
 
 @_gpb_source
@@ -288,15 +323,11 @@ def _find_variable_by_name(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = None
-    for var in self.variables:
-        if var.name == name:
-            result = var
-            break
-    if None == result:
+    idx = _find_index_by_name(self, 'variables', name)
+    if -1 == idx:
         raise OOIObjectError('Requested variable name not found: "%s"' % str(name))
 
-    return result
+    return self.variables[idx]
 
 
 @_gpb_source
@@ -309,13 +340,7 @@ def _find_variable_index_by_name(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = -1
-    for i in xrange(0, len(self.variables)):
-        var = self.variables[i]
-        if var is not None and var.name == name:
-            result = i
-            break
-
+    result = _find_index_by_name(self, 'variables', name)
     if -1 == result:
         raise OOIObjectError('Requested variable not found: "%s"' % str(name))
 
@@ -332,13 +357,7 @@ def _find_attribute_index_by_name(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = -1
-    for i in xrange(0, len(self.attributes)):
-        atrib = self.attributes[i]
-        if atrib is not None and atrib.name == name:
-            result = i
-            break
-
+    result = _find_index_by_name(self, 'attributes', name)
     if -1 == result:
         raise OOIObjectError('Requested attribute not found: "%s"' % str(name))
 
@@ -355,13 +374,7 @@ def _cdm_resource_has_attribute(self, name):
     if not name:
         raise ValueError('Invalid argument "name" -- Please specify a non-empty string')
 
-    result = False
-    for att in self.attributes:
-        if att.name == name:
-            result = True
-            break
-
-    return result
+    return -1 != _find_index_by_name(self, 'attributes', name)
 
 
 @_gpb_source
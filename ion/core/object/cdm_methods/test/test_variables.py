@@ -22,7 +22,7 @@ CDM_ARRAY_STRUC_TYPE = create_type_identifier(object_id=10025, version=1)
 CDM_BOUNDED_ARRAY_TYPE = create_type_identifier(object_id=10021, version=1)
 CDM_F64_ARRAY_TYPE = create_type_identifier(object_id=10014, version=1)
 
-from ion.core.object.cdm_methods.variables import _flatten_index
+from ion.core.object.cdm_methods.variables import _flatten_index, numpy
 
 class CdmVariableTest(IonTestCase):
     """
@@ -254,6 +254,90 @@ class CdmVariableTest(IonTestCase):
                             self.assertEquals(count, val)
                             count += 1
     
+    @defer.inlineCallbacks
+    def test_GetValue_wrong_rank(self):
+        yield self.setup_1D_multiple_BA()
+
+        self.assertRaises(OOIObjectError, self.var.GetValue)
+        self.assertRaises(OOIObjectError, self.var.GetValue, 1, 2)
+
+    @defer.inlineCallbacks
+    def test_GetIntersectingBoundedArrays(self):
+        yield self.setup_1D_multiple_BA()
+
+        ba_ids = [ref.MyId for ref in self.var.content.bounded_arrays]
+
+        query = yield self.var.Repository.create_object(CDM_BOUNDED_ARRAY_TYPE)
+        query.bounds.add()
+        query.bounds[0].origin = 25
+        query.bounds[0].size = 10
+        self.assertEquals(self.var.GetIntersectingBoundedArrays(query), ba_ids[0:2])
+
+        query.bounds[0].origin = 30
+        query.bounds[0].size = 30
+        self.assertEquals(self.var.GetIntersectingBoundedArrays(query), ba_ids[1:2])
+
+        query.bounds[0].origin = 90
+        query.bounds[0].size = 10
+        self.assertEquals(self.var.GetIntersectingBoundedArrays(query), [])
+
+    @defer.inlineCallbacks
+    def test_GetValues_1D_multiple_BA(self):
+        if numpy is None:
+            raise unittest.SkipTest('GetValues requires numpy')
+        yield self.setup_1D_multiple_BA()
+
+        self.assertEquals(list(self.var.GetValues()), range(90))
+        self.assertEquals(list(self.var.GetValues(slice(25, 65, 4))), range(25, 65, 4))
+        self.assertEquals(self.var.GetValues(42), 42)
+        self.assertEquals(self.var.GetValues(-1), 89)
+
+    @defer.inlineCallbacks
+    def test_GetValues_overlapping_BA(self):
+        if numpy is None:
+            raise unittest.SkipTest('GetValues requires numpy')
+        yield self.setup_1D_multiple_BA()
+
+        # A fourth bounded array overlaps the first two - GetValue takes values from the first that holds them
+        content = self.var.content
+        ba = yield content.Repository.create_object(CDM_BOUNDED_ARRAY_TYPE)
+        arr = yield ba.Repository.create_object(CDM_F64_ARRAY_TYPE)
+        ba.bounds.add()
+        ba.bounds[0].origin = 20
+        ba.bounds[0].size = 20
+        arr.value.extend([float(val) for val in range(1020, 1040)])
+        ba.ndarray = arr
+        ref = content.bounded_arrays.add(); ref.SetLink(ba)
+
+        expected = [self.var.GetValue(i) for i in range(90)]
+        self.assertEquals(expected, range(90))
+        self.assertEquals(list(self.var.GetValues()), expected)
+        self.assertEquals(list(self.var.GetValues(slice(15, 45, 3))), expected[15:45:3])
+
+    @defer.inlineCallbacks
+    def test_GetValues_index_out_of_range(self):
+        if numpy is None:
+            raise unittest.SkipTest('GetValues requires numpy')
+        yield self.setup_1D_multiple_BA()
+
+        self.assertRaises(OOIObjectError, self.var.GetValues, 90)
+        self.assertRaises(OOIObjectError, self.var.GetValues, -91)
+        self.assertRaises(OOIObjectError, self.var.GetValues, 0, 0)
+
+    @defer.inlineCallbacks
+    def test_GetValues_3D_multiple_BA(self):
+        if numpy is None:
+            raise unittest.SkipTest('GetValues requires numpy')
+        num_arrs = 5
+        num_vals = 6
+        yield self.setup_nD_multiple_BA(3, num_arrs, num_vals)
+
+        expected = numpy.arange(num_arrs * num_vals * num_vals, dtype='float64').reshape(num_arrs, num_vals, num_vals)
+        for slices in [(slice(None), slice(None), slice(None)),
+                       (slice(1, 4), 2, slice(None, None, 2)),
+                       (3, slice(1, 5), slice(0, 6, 5))]:
+            self.assertEquals(self.var.GetValues(*slices).tolist(), expected[slices].tolist())
+
 
     def test_fail_flatten_index(self):
         self.assertRaises(AssertionError, _flatten_index, None, [])
@@ -4,18 +4,50 @@
 @brief Wrapper methods for the cdm variable object
 @author David Stuebe
 @author Tim LaRocque
-TODO: Implement get_intersecting...
 """
 
+from bisect import bisect_left
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Get the object decorator used on wrapper methods!
 from ion.core.object.object_utils import _gpb_source
 
 
-from ion.core.object.object_utils import OOIObjectError
+from ion.core.object.object_utils import OOIObjectError, CDM_ARRAY_INT32_TYPE, CDM_ARRAY_UINT32_TYPE, \
+    CDM_ARRAY_INT64_TYPE, CDM_ARRAY_UINT64_TYPE, CDM_ARRAY_FLOAT32_TYPE, CDM_ARRAY_FLOAT64_TYPE, \
+    CDM_ARRAY_STRING_TYPE, CDM_ARRAY_OPAQUE_TYPE
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
 from ion.core.object.cdm_methods import group
+from ion.util.cache import LRUDict
+
+CONF = ioninit.config(__name__)
+
+# Bounded array indices of variable contents by the sha1 id of the content
+_bounded_array_indices = LRUDict(int(CONF.getValue('bounded_array_index_cache', 1000)))
+
+# numpy dtype for each ndarray type - string and opaque arrays are held as python objects
+_NDARRAY_DTYPES = {CDM_ARRAY_INT32_TYPE.object_id:'int32',
+                   CDM_ARRAY_UINT32_TYPE.object_id:'uint32',
+                   CDM_ARRAY_INT64_TYPE.object_id:'int64',
+                   CDM_ARRAY_UINT64_TYPE.object_id:'uint64',
+                   CDM_ARRAY_FLOAT32_TYPE.object_id:'float32',
+                   CDM_ARRAY_FLOAT64_TYPE.object_id:'float64',
+                   CDM_ARRAY_STRING_TYPE.object_id:'object',
+                   CDM_ARRAY_OPAQUE_TYPE.object_id:'object'}
+
+# numpy dtype for the numeric variable data types by the name of the DataType enum value
+_VARIABLE_DTYPES = {'BYTE':'int32',
+                    'SHORT':'int32',
+                    'INT':'int32',
+                    'LONG':'int64',
+                    'FLOAT':'float32',
+                    'DOUBLE':'float64'}
 
 #--------------------------------------#
 # Wrapper_Variable Specialized Methods #
@@ -76,40 +108,100 @@ def GetValue(self, *args):
     usage for a 3Dimensional variable:
     as.getValue(1,3,9)
     """
-    
-    # @todo: Need tests for multidim arrays
-    # @todo: Check the rank outside the for loop
-    # @todo: Check to make sure args are integers!
 
-    value = None
-    
-    for ba in self.content.bounded_arrays:
-    
+    rank = len(self.shape)
+    if len(args) != rank:
+        raise OOIObjectError('GetValue requires %d indices for this variable - received %d' % (rank, len(args)))
 
-        for index, bounds in zip(args, ba.bounds):
-            if bounds.origin > index or index >= bounds.origin + bounds.size :
-                break
+    content = self.content
+    index = _get_bounded_array_index(content)
 
-        else:
-            # We now have the the ndarray of interest..  extract the value!
+    position = index.find(args)
+    if position is None:
+        return None
+
+    # Grab the value from the ndarray of the bounded array which holds the indices
+    ba = content.bounded_arrays[position]
+    return ba.ndarray.value[index.flat_index(position, args)]
 
-            # Create a list of this bounded_array's sizes and use origin to determine
-            # the given indices position in the ndarray
-            indices = []
-            shape = []
-            for index, bounds in zip(args, ba.bounds):
-                  indices.append(index - bounds.origin)  
-                  shape.append(bounds.size)  
-            
-            # Find the flattened index (make sure to apply the origin values as an offset!)
-            flattened_index = _flatten_index(indices, shape)
-            
-            # Grab the value from the ndarray
-            value = ba.ndarray.value[flattened_index]
-            break
 
+@_gpb_source
+def GetValues(self, *slices):
+    """
+    @brief Get the values in a hyperslab of the variable as a numpy array
+    @param self - a cdm variable object
+    @param slices - a slice or an integer for each dimension of the variable. Trailing dimensions which are
+    not given are taken whole. Integer indices remove the dimension from the result, like numpy indexing, and
+    must be within the length of the dimension.
+    @retval a numpy array. Values which are not held by any bounded array are NaN for floating point
+    variables and zero otherwise.
 
-    return value
+    usage for a 3Dimensional variable:
+    as.GetValues(slice(0, 10), 3, slice(None, None, 2))
+    """
+    if numpy is None:
+        raise OOIObjectError('GetValues requires the numpy package')
+
+    lengths = [dim.length for dim in self.shape]
+    if len(slices) > len(lengths):
+        raise OOIObjectError('GetValues received %d slices for a variable of rank %d' % (len(slices), len(lengths)))
+    slices = list(slices) + [slice(None)] * (len(lengths) - len(slices))
+
+    content = self.content
+    index = _get_bounded_array_index(content)
+
+    # Normalize the request to (start, step, count) in each dimension
+    request = []
+    squeeze = []
+    for dim, (item, length) in enumerate(zip(slices, lengths)):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(length)
+            if step <= 0:
+                raise OOIObjectError('GetValues does not support negative steps: %s' % str(item))
+            request.append((start, step, max(0, (stop - start + step - 1) // step)))
+        else:
+            index_value = int(item)
+            if index_value < 0:
+                index_value += length
+            if not 0 <= index_value < length:
+                raise OOIObjectError('GetValues index %s is out of range for dimension %d of length %d' % (str(item), dim, length))
+            request.append((index_value, 1, 1))
+            squeeze.append(dim)
+
+    positions = []
+    if 0 not in [count for start, step, count in request]:
+        lows = [start for start, step, count in request]
+        highs = [start + (count - 1) * step + 1 for start, step, count in request]
+        positions = index.intersecting(lows, highs)
+
+    dtype = None
+    if positions:
+        dtype = _NDARRAY_DTYPES.get(content.bounded_arrays[positions[0]].ndarray.ObjectType.object_id)
+    if dtype is None:
+        dtype = _variable_dtype(self)
+
+    result = numpy.empty([count for start, step, count in request], dtype=dtype)
+    if result.dtype.kind in 'fc':
+        result.fill(numpy.nan)
+    elif result.dtype.kind == 'O':
+        result.fill(None)
+    else:
+        result.fill(0)
+
+    # Where bounded arrays overlap the first in content order holds the value, as in GetValue - write it last
+    for position in reversed(positions):
+        strided = _strided_slices(request, index.origins[position], index.sizes[position])
+        if strided is None:
+            continue
+        target, source = strided
+
+        ba = content.bounded_arrays[position]
+        values = numpy.asarray(ba.ndarray.value[:], dtype=result.dtype).reshape(index.sizes[position])
+        result[target] = values[source]
+
+    if squeeze:
+        result = result.reshape([count for dim, (start, step, count) in enumerate(request) if dim not in squeeze])
+    return result
 
 
 @_gpb_source
@@ -117,18 +209,201 @@ def GetIntersectingBoundedArrays(self, bounded_array):
     """
     @brief get the SHA1 id of the bounded arrays which intersect the give coverage.
     @param self - a cdm variable object
-    @param bounded_array - a bounded array which specifies an index space coverage of interest
+    @param bounded_array - a bounded array which specifies an index space coverage of interest. Dimensions
+    for which it has no bounds are not restricted.
+    @retval a list of the sha1 ids of the intersecting bounded arrays in the order of the variable content
 
     usage for a 3Dimensional variable:
-    as.getValue(1,3,9)
+    ids = var.GetIntersectingBoundedArrays(ba)
     """
 
-    # Get the MyId attribute of the bounded arrays that intersect - that will be the sha1 name for that BA...
+    content = self.content
+    index = _get_bounded_array_index(content)
+
+    rank = len(self.shape)
+    lows = [None] * rank
+    highs = [None] * rank
+    for dim, bounds in enumerate(bounded_array.bounds[:rank]):
+        lows[dim] = bounds.origin
+        highs[dim] = bounds.origin + bounds.size
 
+    # Get the MyId attribute of the bounded arrays that intersect - that will be the sha1 name for that BA...
     sha1_list = []
+    for position in index.intersecting(lows, highs):
+        sha1_list.append(content.bounded_arrays[position].MyId)
     return sha1_list
 
 
+class BoundedArrayIndex(object):
+    """
+    @brief An index of the bounds of the bounded arrays in the content of a variable. The bounded arrays
+    are sorted by their origin in the first (aggregation) dimension, with the running maximum of their end
+    in that dimension, so the ones which hold an index or intersect a range are found with a binary search.
+    The strides used to flatten indices in each bounded array are computed once.
+    """
+
+    def __init__(self, bounds_list):
+        """
+        @param bounds_list a list with a list of (origin, size) tuples for each bounded array, in content order
+        """
+        self.rank = len(bounds_list[0]) if bounds_list else 0
+
+        self.origins = []
+        self.sizes = []
+        self.strides = []
+        for bounds in bounds_list:
+            if len(bounds) != self.rank:
+                raise OOIObjectError('The bounded arrays of a variable must all have the same rank')
+            origins = tuple([origin for origin, size in bounds])
+            sizes = tuple([size for origin, size in bounds])
+            self.origins.append(origins)
+            self.sizes.append(sizes)
+            self.strides.append(_strides(sizes))
+
+        if self.rank == 0:
+            # Every bounded array holds the single value of a scalar variable
+            self._order = range(len(bounds_list))
+            self._starts = [0] * len(bounds_list)
+            self._max_ends = [1] * len(bounds_list)
+            return
+
+        self._order = sorted(range(len(bounds_list)), key=lambda position: self.origins[position][0])
+        self._starts = [self.origins[position][0] for position in self._order]
+        self._max_ends = []
+        max_end = None
+        for position in self._order:
+            end = self.origins[position][0] + self.sizes[position][0]
+            if max_end is None or end > max_end:
+                max_end = end
+            self._max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self.origins)
+
+    def _candidates(self, low, high):
+        """
+        Positions of the bounded arrays which may intersect [low, high) in the first dimension
+        """
+        i = bisect_left(self._starts, high) if high is not None else len(self._starts)
+        i -= 1
+        while i >= 0:
+            if low is not None and self._max_ends[i] <= low:
+                # No bounded array before this one reaches the range
+                break
+            yield self._order[i]
+            i -= 1
+
+    def find(self, indices):
+        """
+        @param indices an index in each dimension
+        @retval the position of the first bounded array in content order which holds the indices, or None
+        """
+        if self.rank == 0:
+            return 0 if self.origins else None
+
+        found = None
+        first = indices[0]
+        for position in self._candidates(first, first + 1):
+            if found is not None and position > found:
+                continue
+            for index, origin, size in zip(indices, self.origins[position], self.sizes[position]):
+                if origin > index or index >= origin + size:
+                    break
+            else:
+                found = position
+        return found
+
+    def intersecting(self, lows, highs):
+        """
+        @param lows the first index of the range in each dimension, or None for no lower bound
+        @param highs the index after the end of the range in each dimension, or None for no upper bound
+        @retval the positions of the bounded arrays which intersect the range, in content order
+        """
+        if self.rank == 0:
+            return range(len(self.origins))
+
+        result = []
+        for position in self._candidates(lows[0], highs[0]):
+            for low, high, origin, size in zip(lows, highs, self.origins[position], self.sizes[position]):
+                if (high is not None and origin >= high) or (low is not None and origin + size <= low):
+                    break
+            else:
+                result.append(position)
+        result.sort()
+        return result
+
+    def flat_index(self, position, indices):
+        """
+        @retval the index in the flattened ndarray of a bounded array of indices which it holds
+        """
+        result = 0
+        for index, origin, stride in zip(indices, self.origins[position], self.strides[position]):
+            result += (index - origin) * stride
+        return result
+
+
+def _get_bounded_array_index(content):
+    """
+    Get the index of the bounded arrays of a variable content. The index of a content which is not modified
+    is cached by its sha1 id - it can not change and is the same in any repository.
+    """
+    cacheable = not content.Modified
+    if cacheable:
+        index = _bounded_array_indices.get(content.MyId)
+        if index is not None:
+            return index
+
+    bounds_list = []
+    for ba in content.bounded_arrays:
+        bounds_list.append([(bounds.origin, bounds.size) for bounds in ba.bounds])
+    index = BoundedArrayIndex(bounds_list)
+
+    if cacheable:
+        _bounded_array_indices.set(content.MyId, index)
+    return index
+
+
+def _variable_dtype(var):
+    """
+    The numpy dtype for the data type of a variable
+    """
+    for name, dtype in _VARIABLE_DTYPES.iteritems():
+        if var.data_type == getattr(var.DataType, name, None):
+            return dtype
+    return 'object'
+
+
+def _strides(shape):
+    """
+    The step in a flattened array between consecutive indices in each dimension of shape
+    """
+    strides = [1] * len(shape)
+    for i in range(len(shape) - 2, -1, -1):
+        strides[i] = strides[i + 1] * shape[i + 1]
+    return strides
+
+
+def _strided_slices(request, origins, sizes):
+    """
+    @param request a (start, step, count) tuple for each dimension
+    @param origins the origin of a bounded array in each dimension
+    @param sizes the size of the bounded array in each dimension
+    @retval a tuple (target slices, source slices) for the part of the request held by the bounded array,
+    or None if the request selects none of its indices
+    """
+    target = []
+    source = []
+    for (start, step, count), origin, size in zip(request, origins, sizes):
+        # The first and the last (exclusive) selected steps within the bounded array
+        first = max(0, -(-(origin - start) // step))
+        last = min(count, -(-(origin + size - start) // step))
+        if first >= last:
+            return None
+        target.append(slice(first, last))
+        source.append(slice(start + first * step - origin, start + (last - 1) * step - origin + 1, step))
+    return tuple(target), tuple(source)
+
+
 def _flatten_index(indices, shape):
     """
     Uses the given indices representing a position in a multidimensional context to determine the
@@ -141,11 +416,8 @@ def _flatten_index(indices, shape):
     assert(len(indices) == len(shape))
     
     result = 0
-    for i in range(len(indices)):
-        offset = 1
-        for j in range(i+1, len(shape)):
-            offset *= shape[j]
-        result += indices[i] * offset
+    for index, stride in zip(indices, _strides(shape)):
+        result += index * stride
     
     return result
 
@@ -6,6 +6,9 @@
 @brief Interceptor for encoding and decoding ION messages
 """
 
+import struct
+import cStringIO
+
 from twisted.internet import defer
 
 import ion.util.ionlog
@@ -20,6 +23,9 @@ from net.ooici.core.container import container_pb2
 from ion.core.object import object_utils
 from ion.core.messaging import message_client
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 ION_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=11, version=1)
 
 STRUCTURE_ELEMENT_TYPE = object_utils.create_type_identifier(object_id=1, version=1)
@@ -27,6 +33,20 @@ STRUCTURE_TYPE = object_utils.create_type_identifier(object_id=2, version=1)
 
 ION_R1_GPB = 'ION R1 GPB'
 
+# A serialized GPB container always starts with a field tag - never a zero byte
+FRAMED_CONTAINER_MAGIC = '\x00IONFC1'
+# Number of elements in the container, including the head
+FRAMED_COUNT_FORMAT = '!I'
+# key length, type object_id, type version, isleaf, value length
+FRAMED_HEADER_FORMAT = '!HiiBQ'
+FRAMED_HEADER_SIZE = struct.calcsize(FRAMED_HEADER_FORMAT)
+
+# Send the framed container format? Receivers accept either format.
+CF_framed_container = CONF.getValue('framed_container', False)
+
+# Load linked objects on first access instead of when the message is unpacked?
+CF_lazy_unpack = CONF.getValue('lazy_unpack', False)
+
 class CodecError(Exception):
     """
     An error class for problems that occur in the codec
@@ -80,11 +100,14 @@ class ObjectCodecInterceptor(EnvelopeInterceptor):
 
 
 
-def pack_structure(content):
+def pack_structure(content, framed=None):
     """
     Pack all children of the content stucture into a message.
     Return the content as a serialized container object.
+    @param framed If True use the framed container format, if False the GPB container. None uses the configured default.
     """
+    if framed is None:
+        framed = CF_framed_container
 
     repo = getattr(content, 'Repository', None)
     if repo is None:
@@ -138,8 +161,11 @@ def pack_structure(content):
 
         items = child_items
 
-    container_structure = _pack_container(root_obj_se, obj_set)
-    serialized = container_structure.SerializeToString()
+    if framed:
+        serialized = _pack_framed_container(root_obj_se, obj_set)
+    else:
+        container_structure = _pack_container(root_obj_se, obj_set)
+        serialized = container_structure.SerializeToString()
 
     log.debug('pack_structure: Packing Complete!')
 
@@ -179,10 +205,42 @@ def _pack_container(head, objects):
     log.debug('_pack_container: Packed container!')
     return cs
 
-def unpack_structure(serialized_container):
+def _pack_framed_container(head, objects):
+    """
+    Helper for the sender to write the framed container format. Each element is a fixed size header followed by
+    its key and its raw value. The values are written to the output as they are - no intermediate GPB messages.
+    """
+    log.debug('_pack_framed_container: Packing framed container head and objects!')
+    out = cStringIO.StringIO()
+    out.write(FRAMED_CONTAINER_MAGIC)
+    out.write(struct.pack(FRAMED_COUNT_FORMAT, len(objects) + 1))
+
+    for item in [head] + list(objects):
+        key = item.key
+        obj_type = item.type
+
+        if isinstance(item, gpb_wrapper.FramedStructureElement):
+            # Forward the slice of the buffer we received it in
+            value = item.value_buffer
+        else:
+            value = item.value
+
+        out.write(struct.pack(FRAMED_HEADER_FORMAT, len(key), obj_type.object_id, obj_type.version, item.isleaf, len(value)))
+        out.write(key)
+        out.write(value)
+
+    log.debug('_pack_framed_container: Packed framed container!')
+    return out.getvalue()
+
+def unpack_structure(serialized_container, lazy=None):
     """
     Take a serialized container object and load a repository with its contents
+    @param lazy If True linked objects are loaded from the index hash on first access and the arrival commit is
+    deferred until the repository needs it. None uses the configured default.
     """
+    if lazy is None:
+        lazy = CF_lazy_unpack
+
     log.debug('unpack_structure: Unpacking Structure!')
     head, obj_dict = _unpack_container(serialized_container)
 
@@ -204,16 +262,21 @@ def unpack_structure(serialized_container):
         log.debug("Codec unpack_structure has %d excluded_object_types set in field" % len(root_obj.message_object.excluded_object_types))
         excluded_types = [x.GPBMessage for x in root_obj.message_object.excluded_object_types]
 
-    # Now load the rest of the linked objects - down to the leaf nodes.
-    repo.load_links(root_obj, excluded_types)
+    if not lazy:
+        # Now load the rest of the linked objects - down to the leaf nodes.
+        repo.load_links(root_obj, excluded_types)
 
     # append the excluded object types in the repo (load links no longer does this)
     for extype in excluded_types:
         if extype not in repo.excluded_types:
             repo.excluded_types.append(extype)
 
-    # Create a commit to record the state when the message arrived
-    cref = repo.commit(comment='Message for you Sir!')
+    if lazy:
+        # The root object is not modified - the commit only records the arrival, so make it when it is needed
+        repo.defer_arrival_commit('Message for you Sir!', head)
+    else:
+        # Create a commit to record the state when the message arrived
+        cref = repo.commit(comment='Message for you Sir!')
 
 
     log.debug('unpack_structure: returning root_obj')
@@ -228,6 +291,9 @@ def _unpack_container(serialized_container):
     Returns the head object and items as wrapped structure elements
     """
 
+    if serialized_container.startswith(FRAMED_CONTAINER_MAGIC):
+        return _unpack_framed_container(serialized_container)
+
     log.debug('_unpack_container: Unpacking Container')
     # An unwrapped GPB Structure message to put stuff into!
     cs = object_utils.get_gpb_class_from_type_id(STRUCTURE_TYPE)()
@@ -252,4 +318,52 @@ def _unpack_container(serialized_container):
 
     log.debug('_unpack_container: returning head and dictionary of %d objects' % len(obj_dict))
 
-    return head, obj_dict
\ No newline at end of file
+    return head, obj_dict
+
+
+def _unpack_framed_container(serialized_container):
+    """
+    Helper for the receiver for unpacking the framed container format
+    Returns the head object and items as structure elements which reference slices of the serialized container
+    """
+    log.debug('_unpack_framed_container: Unpacking Framed Container')
+
+    total = len(serialized_container)
+    offset = len(FRAMED_CONTAINER_MAGIC)
+
+    try:
+        count, = struct.unpack_from(FRAMED_COUNT_FORMAT, serialized_container, offset)
+        offset += struct.calcsize(FRAMED_COUNT_FORMAT)
+
+        # Return arguments
+        head = None
+        obj_dict={}
+
+        for i in xrange(count):
+            key_len, object_id, version, isleaf, value_len = struct.unpack_from(FRAMED_HEADER_FORMAT, serialized_container, offset)
+            offset += FRAMED_HEADER_SIZE
+
+            key = serialized_container[offset:offset + key_len]
+            offset += key_len
+
+            if offset + value_len > total:
+                raise CodecError('Framed container is truncated!')
+
+            obj_type = object_utils.create_type_identifier(object_id=object_id, version=version)
+            wse = gpb_wrapper.FramedStructureElement(key, obj_type, bool(isleaf), serialized_container, offset, value_len)
+            offset += value_len
+
+            if head is None:
+                head = wse
+            obj_dict[wse.key] = wse
+
+    except (struct.error, object_utils.ObjectUtilException), ex:
+        log.debug('Received invalid content - framed container decode error: "%s"' % str(ex))
+        raise CodecError('Could not decode message content as a framed container structure!')
+
+    if head is None or offset != total:
+        raise CodecError('Could not decode message content as a framed container structure!')
+
+    log.debug('_unpack_framed_container: returning head and dictionary of %d objects' % len(obj_dict))
+
+    return head, obj_dict
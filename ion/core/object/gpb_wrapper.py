@@ -117,6 +117,11 @@ class EnumObject(object):
 
 
 class WrappedProperty(object):
+    """
+    Base class of the data descriptors for the fields of a Wrapper. They are on the path of every field access,
+    so they read the slots of the source wrapper directly instead of going through the Invalid and GPBMessage
+    properties.
+    """
     def __init__(self, name, doc=None, field_type=None, field_enum=None):
         self.name = name
         if doc: self.__doc__ = doc
@@ -184,11 +189,13 @@ class WrappedMessageProperty(WrappedProperty):
     """ Data descriptor (like a property) for passing through GPB properties of Type Message from the Wrapper. """
 
     def __get__(self, wrapper, objtype=None):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not get message (composite) property - %s - in a wrapper which is invalidated.' % self.name)
             # This may be the result we were looking for, in the case of a simple scalar field
-        field = getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        field = getattr(gpbMessage, self.name)
         result = wrapper._rewrap(field)
 
         if result.ObjectType == LINK_TYPE:
@@ -197,11 +204,13 @@ class WrappedMessageProperty(WrappedProperty):
         return result
 
     def _get_backdoor(self, wrapper):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not get message (composite) property - %s -in a wrapper which is invalidated.' % self.name)
             # This may be the result we were looking for, in the case of a simple scalar field
-        field = getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        field = getattr(gpbMessage, self.name)
         result = wrapper._rewrap(field)
 
         return result
@@ -228,11 +237,13 @@ class WrappedRepeatedScalarProperty(WrappedProperty):
     """ Data descriptor (like a property) for passing through GPB properties of Type Repeated Scalar from the Wrapper. """
 
     def __get__(self, wrapper, objtype=None):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not get repeated scalar property - %s - in a wrapper which is invalidated.'% self.name)
             # This may be the result we were looking for, in the case of a simple scalar field
-        field = getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        field = getattr(gpbMessage, self.name)
 
         return ScalarContainerWrapper.factory(wrapper, field)
 
@@ -247,23 +258,27 @@ class WrappedRepeatedCompositeProperty(WrappedProperty):
     """ Data descriptor (like a property) for passing through GPB properties of Type Repeated Composite from the Wrapper. """
 
     def __get__(self, wrapper, objtype=None):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not "get" from a repeated composite property - %s - in a wrapper which is invalidated.' % self.name)
 
         # This may be the result we were looking for, in the case of a simple scalar field
-        field = getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        field = getattr(gpbMessage, self.name)
 
         return ContainerWrapper.factory(wrapper, field)
 
     def _get_backdoor(self, wrapper, objtype=None):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError(
                 'Can not get_backdoor from a repeated composite property - %s - in a wrapper which is invalidated.' % self.name)
 
         # This may be the result we were looking for, in the case of a simple scalar field
-        field = getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        field = getattr(gpbMessage, self.name)
 
         return ContainerWrapper.factory(wrapper, field)
 
@@ -280,21 +295,30 @@ class WrappedScalarProperty(WrappedProperty):
 
     def __get__(self, wrapper, objtype=None):
         # This may be the result we were looking for, in the case of a simple scalar field
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not get scalar property - %s - in a wrapper which is invalidated.' % self.name)
 
-        return getattr(wrapper.GPBMessage, self.name)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        return getattr(gpbMessage, self.name)
 
     def __set__(self, wrapper, value):
-        if wrapper.Invalid:
+        source = wrapper._source
+        if source._invalid:
             log.error(wrapper.Debug())
             raise OOIObjectError('Can not set scalar property - %s -in a wrapper which is invalidated.' % self.name)
 
         if wrapper.ReadOnly:
             raise OOIObjectError('This object wrapper is read only!')
 
-        setattr(wrapper.GPBMessage, self.name, value)
+        gpbMessage = source._gpbMessage if source._bytes is None else source.GPBMessage
+        setattr(gpbMessage, self.name, value)
+
+        if self.name == 'name':
+            # The name lookup maps of the objects which link to this one may hold the old name
+            for link in wrapper.Root.ParentLinks:
+                link.Root._source._name_maps = None
 
         # Set this object and it parents to be modified
         wrapper._set_parents_modified()
@@ -308,8 +332,27 @@ class WrappedScalarProperty(WrappedProperty):
 class CommitCounter(object):
     """
     Class used to count the number of recursive calls to commit a data structure
+    and the hashing work done during a commit.
     """
     count = 0
+    serialized = 0
+    hashed = 0
+    hashed_bytes = 0
+    reused = 0
+
+    def reset(self):
+        self.count = 0
+        self.serialized = 0
+        self.hashed = 0
+        self.hashed_bytes = 0
+        self.reused = 0
+
+    def stats(self):
+        return {'visited':self.count,
+                'serialized':self.serialized,
+                'hashed':self.hashed,
+                'hashed_bytes':self.hashed_bytes,
+                'reused':self.reused}
 
 
 class WrapperType(type):
@@ -405,18 +448,16 @@ class WrapperType(type):
             # Special methods for certain object types:
             WrapperType._add_specializations(cls, obj_type, clsDict)
 
+            # The configuration is read once for each class, not for each object
+            clsDict['_str_gpbs'] = CONF.getValue('STR_GPBS', False)
+
+            # The instance attributes are the slots declared by Wrapper. Without an instance dictionary
+            # setting an unknown attribute raises an AttributeError, so attributes are validated for free.
             VALIDATE_ATTRS = CONF.getValue('VALIDATE_ATTRS', True)
             if VALIDATE_ATTRS:
-                def obj_setter(self, k, v):
-                    if self._init and not hasattr(self, k):
-                        raise AttributeError(\
-                            '''Cant add properties to the ION object wrapper for object Class "%s".\n'''
-                            '''Unknown property name - "%s"; value - "%s"''' % (self._GPBClass, k, v))
-                    super(Wrapper, self).__setattr__(k, v)
-
-                clsDict['__setattr__'] = obj_setter
-
-            clsDict['_init'] = False
+                clsDict['__slots__'] = ()
+            else:
+                clsDict['__slots__'] = ('__dict__',)
 
             clsType = WrapperType.__new__(WrapperType, clsName, (cls,), clsDict)
 
@@ -441,6 +482,8 @@ class WrapperType(type):
                         'Can not access Invalidated Object which may be left behind after a checkout or reset.')
 
                 self.Repository.set_linked_object(self, value)
+                # The name of the linked object may differ from the one it replaces
+                self.Root._source._name_maps = None
                 if not self.Modified:
                     self._set_parents_modified()
                 return
@@ -527,6 +570,8 @@ class WrapperType(type):
             clsDict['SetDimension'] = group._set_dimension
 
             clsDict['GetValue'] = variables.GetValue
+            clsDict['GetValues'] = variables.GetValues
+            clsDict['GetIntersectingBoundedArrays'] = variables.GetIntersectingBoundedArrays
 
             clsDict['MergeAttSrc'] = attribute_merge.MergeAttSrc
             clsDict['MergeAttDst'] = attribute_merge.MergeAttDst
@@ -571,6 +616,10 @@ class Wrapper(object):
 
     __metaclass__ = WrapperType
 
+    # The classes made by WrapperType add no slots of their own - see WrapperType.__call__
+    __slots__ = ('_gpbMessage', '_root', '_invalid', '_bytes', '_parent_links', '_child_links',
+                 '_derived_wrappers', '_myid', '_modified', '_read_only', '_repository', '_source',
+                 '_structure_element', '_name_maps', '__weakref__')
 
     def __init__(self, gpbMessage):
         """
@@ -657,10 +706,17 @@ class Wrapper(object):
         To avoid invalidating during when there is a hash conflict in the workspace - set the twin...
         """
 
-        self.__no_string = CONF.getValue('STR_GPBS', False)
+        self._structure_element = None # only exists in the root object
+        """
+        The structure element this object was last committed to or loaded from. If the
+        serialized value has not changed at commit time its key is reused without hashing.
+        """
 
-        # Hack to prevent setting properties in a class instance
-        self._init = True
+        self._name_maps = None
+        """
+        Maps from name to index for the elements of repeated fields of CDM objects, built
+        by the find by name methods. Cleared when a repeated field of this wrapper changes.
+        """
 
         #frame = sys._getframe(2)
         #frames = []
@@ -759,6 +815,8 @@ class Wrapper(object):
         self._child_links = None
         self._myid = None
         self._bytes = None
+        self._structure_element = None
+        self._name_maps = None
 
         # Do not clear root or Repository
 
@@ -988,9 +1046,8 @@ class Wrapper(object):
 
             return
 
-        # Create the Structure Element in which the binary blob will be stored
-        se = StructureElement()
         repo = self.Repository
+        child_keys = []
 
         for link in  self.ChildLinks:
 
@@ -1024,23 +1081,40 @@ class Wrapper(object):
                 child.RecurseCommit(structure)
 
             # Save the link info as a convience for sending!
-            se.ChildLinks.add(link.key)
-
-        se.value = self.SerializeToString()
-        #se.key = sha1hex(se.value)
+            child_keys.append(link.key)
 
-        # Structure element wrapper provides for setting type!
-        se.type = self.ObjectType
+        value = self.SerializeToString()
+        self.recurse_count.serialized += 1
 
-        # Calculate the sha1 from the serialized value and type!
-        # Sha1 is a property - not a method...
-        se.key = se.sha1
+        se = self._structure_element
+        if se is not None and se.value == value:
+            # The serialized content is unchanged - the type, key and child links must be too!
+            self.recurse_count.reused += 1
 
-        # Determine whether I am a leaf
-        if len(self.ChildLinks) is 0:
-            se.isleaf = True
         else:
-            se.isleaf = False
+            # Create the Structure Element in which the binary blob will be stored
+            se = StructureElement()
+            se.ChildLinks.update(child_keys)
+
+            se.value = value
+            #se.key = sha1hex(se.value)
+
+            # Structure element wrapper provides for setting type!
+            se.type = self.ObjectType
+
+            # Calculate the sha1 from the serialized value and type!
+            # Sha1 is a property - not a method...
+            se.key = se.sha1
+            self.recurse_count.hashed += 1
+            self.recurse_count.hashed_bytes += len(value)
+
+            # Determine whether I am a leaf
+            if len(self.ChildLinks) is 0:
+                se.isleaf = True
+            else:
+                se.isleaf = False
+
+            self._structure_element = se
 
         # Done setting up the Structure Element
         structure[se.key] = se
@@ -1163,16 +1237,19 @@ class Wrapper(object):
         '''
 
         # Check the root wrapper objects list of derived wrappers
-        if gpbMessage in self.DerivedWrappers:
-            return self.DerivedWrappers[gpbMessage]
+        root = self._root
+        derived_wrappers = root._derived_wrappers
+        inst = derived_wrappers.get(gpbMessage)
+        if inst is not None:
+            return inst
 
         # Else make a new one...
         inst = Wrapper(gpbMessage)
-        inst._root = self.Root
+        inst._root = root
         inst._invalid=False
 
         # Add it to the list of objects which derive from the root wrapper
-        self.DerivedWrappers[gpbMessage] = inst
+        derived_wrappers[gpbMessage] = inst
 
         return inst
 
@@ -1246,7 +1323,7 @@ class Wrapper(object):
             msg = '\n' +self._gpbMessage.__str__()
         '''
 
-        if not self.__no_string:
+        if not self._str_gpbs:
             return 'GPB NO STRING!'
 
         #log.critical('HOLY SHIT STILL HERE!')
@@ -1522,6 +1599,8 @@ class ContainerWrapper(object):
     It is not needed for repeated scalars!
     """
 
+    __slots__ = ('_wrapper', '_gpbcontainer', 'Repository', '_source')
+
     def __init__(self, wrapper, gpbcontainer):
         # Be careful - this is a hard link
         self._wrapper = wrapper
@@ -1581,6 +1660,12 @@ class ContainerWrapper(object):
         if source is not None:
             self._source = source
 
+    def _clear_name_maps(self):
+        """
+        The elements of the container are changing - drop the name lookup maps of the wrapper which owns it
+        """
+        self._wrapper._source._name_maps = None
+
     @GPBSourceCW
     def __setitem__(self, key, value):
         """
@@ -1598,6 +1683,7 @@ class ContainerWrapper(object):
             raise OOIObjectError(
                 'It is illegal to set a value of a repeated composite field unless it is a CASRef - Link')
 
+        self._clear_name_maps()
         self._wrapper._set_parents_modified()
 
 
@@ -1614,6 +1700,7 @@ class ContainerWrapper(object):
             raise OOIObjectError(
                 'It is illegal to set a value of a repeated composit field unless it is a CASRef - Link')
 
+        self._clear_name_maps()
         self._wrapper._set_parents_modified()
 
     @GPBSourceCW
@@ -1678,6 +1765,7 @@ class ContainerWrapper(object):
     def add(self):
         new_element = self._gpbcontainer.add()
 
+        self._clear_name_maps()
         self._wrapper._set_parents_modified()
         return self._wrapper._rewrap(new_element)
 
@@ -1696,6 +1784,7 @@ class ContainerWrapper(object):
     def __delitem__(self, key):
         """Deletes the item at the specified position."""
 
+        self._clear_name_maps()
         self._wrapper._set_parents_modified()
 
         item = self._gpbcontainer.__getitem__(key)
@@ -1778,6 +1867,8 @@ class ScalarContainerWrapper(object):
     It is not needed for repeated scalars!
     """
 
+    __slots__ = ('_wrapper', '_gpbcontainer', 'Repository', '_source')
+
     def __init__(self, wrapper, gpbcontainer):
         # Be careful - this is a hard link
         self._wrapper = wrapper
@@ -1961,6 +2052,9 @@ class StructureElement(object):
             self._element = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
         self.ChildLinks = set()
 
+        # (value, object_id, version, sha1) of the last sha1 calculation
+        self._sha1_memo = None
+
     @classmethod
     def parse_structure_element(cls, blob):
         se = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
@@ -2010,7 +2104,17 @@ class StructureElement(object):
         #################
         # This does the same thing much faster and shorter!
         #################
-        return sha1bin(sha1bin(self.value) + self.type.SerializeToString())
+        value = self._element.value
+        obj_type = self._element.type
+
+        # The element may be modified through _element, so check the memo against the current content
+        memo = self._sha1_memo
+        if memo is not None and memo[1] == obj_type.object_id and memo[2] == obj_type.version and memo[0] == value:
+            return memo[3]
+
+        sha = sha1bin(sha1bin(value) + obj_type.SerializeToString())
+        self._sha1_memo = (value, obj_type.object_id, obj_type.version, sha)
+        return sha
 
     #@property
     def _get_type(self):
@@ -2068,3 +2172,93 @@ class StructureElement(object):
         #print 'GPB Size: ', self._element.ByteSize()
 
         return self._element.ByteSize()
+
+
+class FramedStructureElement(StructureElement):
+    """
+    @brief A structure element decoded from a framed container. The value is a
+    slice of the received buffer - it is not copied until the GPB element is
+    needed, for instance to load the object or to serialize the element.
+    """
+
+    def __init__(self, key, obj_type, isleaf, buf, offset, length):
+        self._gpb_element = None
+        self._frame_key = key
+        self._frame_type = obj_type
+        self._frame_isleaf = isleaf
+        self._buf = buf
+        self._offset = offset
+        self._length = length
+
+        self.ChildLinks = set()
+        self._sha1_memo = None
+        self._frame_sha1 = None
+
+    def _get_element(self):
+        element = self._gpb_element
+        if element is None:
+            element = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
+            element.key = self._frame_key
+            element.type.object_id = self._frame_type.object_id
+            element.type.version = self._frame_type.version
+            element.isleaf = self._frame_isleaf
+            element.value = self._buf[self._offset:self._offset + self._length]
+
+            self._gpb_element = element
+            # Release the reference to the message buffer
+            self._buf = None
+
+        return element
+
+    _element = property(_get_element)
+
+    @property
+    def Materialized(self):
+        return self._gpb_element is not None
+
+    @property
+    def value_buffer(self):
+        """
+        Read only access to the raw value without copying it
+        """
+        if self._gpb_element is None:
+            return buffer(self._buf, self._offset, self._length)
+        return buffer(self._gpb_element.value)
+
+    @property
+    def sha1(self):
+        if self._gpb_element is not None:
+            return StructureElement.sha1.fget(self)
+
+        sha = self._frame_sha1
+        if sha is None:
+            sha = sha1bin(sha1bin(self.value_buffer) + self._frame_type.SerializeToString())
+            self._frame_sha1 = sha
+        return sha
+
+    def _get_type(self):
+        if self._gpb_element is None:
+            return self._frame_type
+        return self._gpb_element.type
+
+    type = property(_get_type, StructureElement._set_type)
+
+    def _get_key(self):
+        if self._gpb_element is None:
+            return self._frame_key
+        return self._gpb_element.key
+
+    key = property(_get_key, StructureElement._set_key)
+
+    def _get_isleaf(self):
+        if self._gpb_element is None:
+            return self._frame_isleaf
+        return self._gpb_element.isleaf
+
+    isleaf = property(_get_isleaf, StructureElement._set_isleaf)
+
+    def __sizeof__(self):
+        if self._gpb_element is None:
+            # Estimate of the GPB byte size without building it
+            return self._length + len(self._frame_key) + 12
+        return self._gpb_element.ByteSize()
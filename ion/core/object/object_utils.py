@@ -12,15 +12,27 @@ from net.ooici.core.type import type_pb2
 import hashlib
 import struct
 import os
+import tempfile
+from stat import S_ISDIR, S_IMODE
 from google.protobuf import message
 from google.protobuf.internal import containers
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 # Globals
 gpb_id_to_class = {}
 
+# Type ids to the module and attribute path of their class, for the classes of a registry snapshot which have
+# not been imported yet
+gpb_id_to_module = {}
+
+# First line of a registry snapshot file: format version, root package and fingerprint of the proto modules
+REGISTRY_SNAPSHOT_HEADER = 'gpb-registry 1 %s %s'
+
 class ObjectUtilException(Exception):
     """ Exceptions specific to Object Utilities. """
     pass
@@ -136,22 +148,40 @@ def create_type_identifier(object_id='', version=1):
         
     return ObjectType
 
-def build_gpb_lookup(rootpath):
+def build_gpb_lookup(rootpath, use_snapshot=True):
     """
     To be called once on package initialization.
     The given package must include a list named "protos" specifying which protocol buffer files to import.
+
+    If a registry snapshot written for the same proto modules is found, the classes are not imported here: each
+    proto module is imported on the first lookup of one of its types. Otherwise every proto module is imported,
+    and a snapshot is written for the next process.
     @param rootpath The full path of the package to import the Protocol Buffers classes from.
+    @param use_snapshot If False, the registry snapshot is not read.
     """
 
     ENUM_NAME = '_MessageTypeIdentifier'
     ENUM_ID_NAME = '_ID'
     ENUM_VERSION_NAME = '_VERSION'
     
-    global gpb_id_to_class
+    global gpb_id_to_class, gpb_id_to_module
     gpb_id_to_class = {}
+    gpb_id_to_module = {}
 
     root = __import__(rootpath)
     protos = root.protos
+
+    snapshot_path = get_registry_snapshot_path()
+    fingerprint = None
+    if snapshot_path:
+        fingerprint = get_protos_fingerprint(root, protos)
+
+    if use_snapshot and fingerprint:
+        snapshot = read_registry_snapshot(snapshot_path, rootpath, fingerprint)
+        if snapshot is not None:
+            gpb_id_to_module = snapshot
+            return
+
     for proto in protos:
         protopath = '%s.%s' % (rootpath, proto)
         m = __import__(protopath)
@@ -185,6 +215,176 @@ def build_gpb_lookup(rootpath):
                                             % (str(msg_class.__name__))
                                         raise ObjectUtilException(msg)
 
+    if fingerprint:
+        write_registry_snapshot(snapshot_path, rootpath, fingerprint, gpb_id_to_class)
+
+def get_registry_snapshot_path():
+    """
+    @retval The path of the registry snapshot file, or None if snapshots are turned off
+    """
+    path = CONF.getValue('gpb_registry_snapshot', None)
+    if path is None:
+        directory = _get_user_temp_dir()
+        if directory is None:
+            return None
+        path = os.path.join(directory, 'gpb-registry')
+    return path or None
+
+def _get_user_temp_dir():
+    """
+    A directory of the user in the temp directory, created readable only by the user. A directory of that name
+    which another user created, or which others can write, is not used.
+    @retval The directory, or None if there is no private directory for the user
+    """
+    if not hasattr(os, 'getuid'):
+        return None
+
+    directory = os.path.join(tempfile.gettempdir(), 'ion-%d' % os.getuid())
+    try:
+        os.mkdir(directory, 0700)
+    except OSError:
+        # It exists already - checked below
+        pass
+
+    try:
+        st = os.lstat(directory)
+    except OSError, ex:
+        log.debug('Could not create the user temp directory %s: %s' % (directory, str(ex)))
+        return None
+
+    if not S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or S_IMODE(st.st_mode) & 0077:
+        log.warn('Not using the temp directory %s which is not private to the user' % directory)
+        return None
+
+    return directory
+
+def get_protos_fingerprint(root, protos):
+    """
+    A fingerprint of the proto modules listed by the root package - their names and the size and modification
+    time of their files - which changes with any new version of the proto modules.
+    @retval The fingerprint, or None if a module file is not found (in a zipped egg for example)
+    """
+    fp = hashlib.sha1()
+    for proto in protos:
+        names = proto.split('.')
+        stat = None
+        for path in getattr(root, '__path__', []):
+            for ext in ('.py', '.pyc'):
+                try:
+                    stat = os.stat(os.path.join(path, *names) + ext)
+                    break
+                except OSError:
+                    pass
+            if stat is not None:
+                break
+        if stat is None:
+            return None
+        fp.update('%s %d %d\n' % (proto, stat.st_size, int(stat.st_mtime)))
+    return fp.hexdigest()
+
+def read_registry_snapshot(path, rootpath, fingerprint):
+    """
+    Read a registry snapshot written by write_registry_snapshot. The snapshot is plain text, so a bad file can
+    at worst name the wrong class; only modules in the root package are ever imported from it.
+    @retval Dictionary of type id to (module name, class path), or None if there is no snapshot for the fingerprint
+    """
+    try:
+        f = open(path)
+        try:
+            lines = f.read().splitlines()
+        finally:
+            f.close()
+    except IOError:
+        return None
+
+    if not lines or lines[0] != REGISTRY_SNAPSHOT_HEADER % (rootpath, fingerprint):
+        log.debug('No GPB registry snapshot for the current proto modules in %s' % path)
+        return None
+
+    snapshot = {}
+    try:
+        for line in lines[1:]:
+            type_id, module_name, class_path = line.split()
+            if not module_name.startswith(rootpath + '.'):
+                raise ValueError('Module %s is not in %s' % (module_name, rootpath))
+            snapshot[int(type_id)] = (module_name, class_path)
+    except ValueError, ex:
+        log.warn('Ignoring bad GPB registry snapshot %s: %s' % (path, str(ex)))
+        return None
+
+    log.debug('Read GPB registry snapshot of %d types from %s' % (len(snapshot), path))
+    return snapshot
+
+def write_registry_snapshot(path, rootpath, fingerprint, id_to_class):
+    """
+    Write the type ids and the module and attribute path of their classes to a registry snapshot. The file is
+    replaced atomically, so concurrently starting processes never read a partial snapshot.
+    """
+    lines = [REGISTRY_SNAPSHOT_HEADER % (rootpath, fingerprint)]
+    for type_id, msg_class in sorted(id_to_class.items()):
+        # Nested message classes are reached through their containing classes
+        names = []
+        descriptor = msg_class.DESCRIPTOR
+        while descriptor is not None:
+            names.insert(0, descriptor.name)
+            descriptor = descriptor.containing_type
+        lines.append('%d %s %s' % (type_id, msg_class.__module__, '.'.join(names)))
+
+    # A new file of a unique name next to the snapshot - never one which another process may have put there
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=os.path.dirname(path) or '.')
+    except (IOError, OSError), ex:
+        log.debug('Could not write GPB registry snapshot %s: %s' % (path, str(ex)))
+        return
+
+    try:
+        f = os.fdopen(fd, 'w')
+        try:
+            f.write('\n'.join(lines) + '\n')
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+    except (IOError, OSError), ex:
+        log.debug('Could not write GPB registry snapshot %s: %s' % (path, str(ex)))
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def _import_gpb_class(type_id):
+    """
+    Import the class of a type from the proto module named by the registry snapshot. If the snapshot names a
+    class of another type, it is stale - the whole lookup is rebuilt without it.
+    @retval The class
+    @throws KeyError if the type is not known
+    """
+    module_name, class_path = gpb_id_to_module.pop(type_id)
+
+    names = class_path.split('.')
+    msg_class = __import__(module_name, {}, {}, [names[0]])
+    try:
+        for name in names:
+            msg_class = getattr(msg_class, name)
+        matches = get_type_from_descriptor(msg_class.DESCRIPTOR).object_id == type_id
+    except (AttributeError, ObjectUtilException):
+        matches = False
+
+    if not matches:
+        log.warn('Stale GPB registry snapshot entry for type %d, rebuilding the lookup' % type_id)
+        build_gpb_lookup(module_name.split('.')[0], use_snapshot=False)
+        return gpb_id_to_class[type_id]
+
+    gpb_id_to_class[type_id] = msg_class
+    return msg_class
+
+def _import_all_gpb_classes():
+    """
+    Import every class of the registry snapshot which has not been imported yet
+    """
+    for type_id in gpb_id_to_module.keys():
+        if type_id in gpb_id_to_module:
+            _import_gpb_class(type_id)
+
 def get_gpb_class_from_type_id(typeid):
     """
     Get a callable google.protobuf.message.Message subclass with the given MessageTypeIdentifier enum id.
@@ -193,10 +393,12 @@ def get_gpb_class_from_type_id(typeid):
     @throws ObjectUtilException
     """
     try:
-        if isinstance(typeid, int):
+        if not isinstance(typeid, int):
+            typeid = typeid.object_id
+        try:
             return gpb_id_to_class[typeid]
-        else:
-            return gpb_id_to_class[typeid.object_id]
+        except KeyError:
+            return _import_gpb_class(typeid)
     except AttributeError, ex:
         raise ObjectUtilException('The type argument is not a valid type identifier object: "%s, type: %s "' % (str(typeid), type(typeid)))
     except KeyError, ex:
@@ -212,6 +414,7 @@ def find_type_ids(query):
 
     global type_name_cache
     if type_name_cache is None:
+        _import_all_gpb_classes()
         type_name_cache = dict((cls.__name__.lower(), cls) for cls in gpb_id_to_class.itervalues())
 
     matches = difflib.get_close_matches(query.lower(), type_name_cache.iterkeys(), cutoff=0.5)
@@ -268,16 +471,14 @@ def open_proto(typeid):
 
 
 def _gpb_source(func):
+    """
+    Decorator for the methods of a Wrapper - calls the method on the source of the wrapper after checking that
+    it is still valid. Kept to one attribute read and one check per call, it is on the path of most wrapper
+    methods and properties.
+    """
+    func_name = func.__name__
 
     def call_func(self, *args, **kwargs):
-
-        func_name = func.__name__
-        '''
-        print 'GPB SOURCE'
-        print 'func name', func_name, func
-        print 'args', args
-        print 'kwargs', kwargs
-        '''
         source = self._source
         if source._invalid:
             log.error(source.Debug())
@@ -285,32 +486,28 @@ def _gpb_source(func):
 
         return func(source, *args, **kwargs)
 
+    call_func.__name__ = func_name
+    call_func.__doc__ = func.__doc__
     return call_func
 
 def _gpb_source_root(func):
+    """
+    Decorator for the methods of a Wrapper which act on the root object - calls the method on the root of the
+    source of the wrapper after checking that it is still valid.
+    """
+    func_name = func.__name__
 
-        def call_func(self, *args, **kwargs):
-
-            func_name = func.__name__
-
-            '''
-            print 'GPB SOURCE ROOT'
-
-            print 'func name', func_name, func
-            print 'args', args
-            print 'kwargs', kwargs
-            '''
-            source = self._source
-            if source._invalid:
-                log.error(source.Debug())
-                raise OOIObjectError('Can not access Invalidated Object in function "%s"' % func_name)
-
-            source_root = source._root
-
-            return func(source_root, *args, **kwargs)
+    def call_func(self, *args, **kwargs):
+        source = self._source
+        if source._invalid:
+            log.error(source.Debug())
+            raise OOIObjectError('Can not access Invalidated Object in function "%s"' % func_name)
 
+        return func(source._root, *args, **kwargs)
 
-        return call_func
+    call_func.__name__ = func_name
+    call_func.__doc__ = func.__doc__
+    return call_func
 
 
 
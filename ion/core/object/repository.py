@@ -14,6 +14,7 @@ Refactor Merge to use a proxy repository for the readonly objects - they must li
 from ion.core.object.object_utils import ARRAY_STRUCTURE_TYPE, sha1_to_hex
 
 import weakref
+import time
 from twisted.internet import threads, reactor, defer
 
 from ion.core.object import gpb_wrapper
@@ -56,6 +57,10 @@ class IndexHash(dict):
         self._workbench_cache = None
         self._has_cache = False
 
+        # The container level blob intern store and the keys this index hash holds a reference to
+        self._interner = None
+        self._interned = set()
+
         self._size = 0
 
     def _set_cache(self,cache):
@@ -82,6 +87,59 @@ class IndexHash(dict):
 
     has_cache = property(_get_has_cache, _set_has_cache)
 
+    def _set_interner(self, interner):
+        self._release_interned()
+        self._interner = interner
+
+        # share anything already held
+        if interner is not None:
+            for key, val in self.items():
+                dict.__setitem__(self, key, self._intern(key, val))
+
+    def _get_interner(self):
+        return self._interner
+
+    interner = property(_get_interner, _set_interner)
+
+    def _intern(self, key, val):
+        """
+        Swap an element for the shared copy in the intern store, taking a reference for this index hash
+        """
+        if self._interner is None or key in self._interned:
+            return val
+
+        shared = self._interner.intern(val)
+        if shared is None:
+            return val
+
+        self._interned.add(key)
+        return shared
+
+    def _get_shared(self, key):
+        """
+        Look for an element held by another repository - first in the workbench cache then in the intern store
+        @retval the element or None
+        """
+        val = None
+        if self.has_cache:
+            val = self.cache.get(key)
+
+        if self._interner is not None and key not in self._interned:
+            shared = self._interner.get(key)
+            if shared is not None:
+                self._interned.add(key)
+                if val is None and self.has_cache:
+                    self.cache[key] = shared
+                val = shared
+
+        return val
+
+    def _release_interned(self):
+        if self._interner is not None:
+            for key in self._interned:
+                self._interner.release(key)
+        self._interned.clear()
+
 
     def __sizeof__(self):
         return self._size
@@ -92,17 +150,17 @@ class IndexHash(dict):
         if dict.has_key(self, key):
             return dict.__getitem__(self, key)
 
-        elif self.has_cache:
-            # You get it - you own it!
-            val = self.cache[key]
-            # If it does not raise a KeyError - add it
-            dict.__setitem__(self, key, val)
-            return val
-        else:
+        # You get it - you own it!
+        val = self._get_shared(key)
+        if val is None:
             raise KeyError('Key not found in index hash!')
 
+        dict.__setitem__(self, key, val)
+        return val
+
 
     def __setitem__(self, key, val):
+        val = self._intern(key, val)
         dict.__setitem__(self, key, val)
         if self.has_cache:
             self.cache[key]=val
@@ -128,30 +186,35 @@ class IndexHash(dict):
         if dict.has_key(self, key):
             return dict.__getitem__(self, key)
 
-        elif self.has_cache:
-            # You get it - you own it!
-            val = self.cache.get(key,d)
-
-            if val != d:
-                dict.__setitem__(self, key, val)
-
-            return val
-        else:
+        # You get it - you own it!
+        val = self._get_shared(key)
+        if val is None:
             return d
 
+        dict.__setitem__(self, key, val)
+        return val
+
 
     def has_key(self, key):
         """ Check to see if the Key exists """
-        if self.has_cache:
-            return dict.has_key(self, key) or self.cache.has_key(key)
-        else:
-            return dict.has_key(self, key)
+        if dict.has_key(self, key):
+            return True
+        if self.has_cache and self.cache.has_key(key):
+            return True
+        return self._interner is not None and self._interner.has_key(key)
 
     def update(self, *args, **kwargs):
         """
         D.update(E, **F) -> None.  Update D from E and F: for k in E: D[k] = E[k]
         (if E has keys else: for (k, v) in E: D[k] = v) then: for k in F: D[k] = F[k]
         """
+        if self._interner is not None:
+            items = dict(*args, **kwargs)
+            for key, val in items.iteritems():
+                items[key] = self._intern(key, val)
+            args = (items,)
+            kwargs = {}
+
         dict.update(self, *args, **kwargs)
         if self.has_cache:
             self.cache.update(*args, **kwargs)
@@ -164,6 +227,7 @@ class IndexHash(dict):
 
     def clear(self):
         dict.clear(self)
+        self._release_interned()
 
         self._size=0
 
@@ -175,6 +239,10 @@ class IndexHash(dict):
 
         dict.__delitem__(self,key)
 
+        if key in self._interned:
+            self._interned.remove(key)
+            self._interner.release(key)
+
 
 
 
@@ -499,6 +567,9 @@ class ObjectContainer(object):
 
         obj.Modified = False
 
+        # Keep the element so that an unchanged object need not be hashed again on commit
+        obj._structure_element = element
+
         # Make a note in the element of the child links as well!
         for child in obj.ChildLinks:
             element.ChildLinks.add(child.key)
@@ -582,6 +653,17 @@ class Repository(ObjectContainer):
         to level 2 LRU caching in the workbench.
         """
 
+        self.last_commit_stats = None
+        """
+        Instrumentation for the last commit: nodes visited, serialized, hashed and reused, bytes hashed and wall time
+        """
+
+        self._pending_arrival = None
+        """
+        A lazily unpacked message defers the commit which records its state on arrival. Holds the comment and the
+        structure element of the root object until the commit is needed - see _commit_arrival.
+        """
+
 
 
         ### Structures for managing associations to a repository:
@@ -780,6 +862,7 @@ class Repository(ObjectContainer):
         """
         Convience method to access the branches from the mutable head (dotgit object)
         """
+        self._commit_arrival()
         return self._dotgit.branches
 
 
@@ -788,6 +871,7 @@ class Repository(ObjectContainer):
         """
         Convenience method to access the current commit
         """
+        self._commit_arrival()
         if self._detached_head:
             log.warn('This repository is currently a detached head. The current commit is not at the head of a branch.')
 
@@ -816,6 +900,7 @@ class Repository(ObjectContainer):
 
     def current_branch_key(self):
 
+        self._commit_arrival()
         if self._detached_head:
             log.warn('This repository is currently a detached head. The current commit is not at the head of a branch.')
 
@@ -832,7 +917,9 @@ class Repository(ObjectContainer):
         ## Need to check and then clear the workspace???
         #if not self.status == self.UPTODATE:
         #    raise Exception, 'Can not create new branch while the workspace is dirty'
-        
+
+        self._commit_arrival()
+
         if self._current_branch != None and len(self._current_branch.commitrefs)==0:
             # Unless this is an uninitialized repository it is an error to create
             # a new branch from one which has no commits yet...
@@ -927,6 +1014,8 @@ class Repository(ObjectContainer):
 
 
         log.debug('checkout: branchname - "%s", commit id - "%s", older_than - "%s", excluded_types - %s' % (branchname, commit_id, older_than, excluded_types))
+        self._commit_arrival()
+
         if self.status == self.MODIFIED:
             raise RepositoryError('Can not checkout while the workspace is dirty')
             #What to do for uninitialized? 
@@ -1172,13 +1261,16 @@ class Repository(ObjectContainer):
         """
         Commit the current workspace structure
         """
-        
+        self._commit_arrival()
+
         # If the repo is in a valid state - make the commit even if it is up to date
         if self.status == self.MODIFIED or self.status == self.UPTODATE:
             structure={}
+            t_start = time.time()
 
-            # Reset the commit counter - used for debuging only
-            gpb_wrapper.WrapperType.recurse_counter.count=0
+            # Reset the commit counter - used for instrumentation and debugging
+            counter = gpb_wrapper.WrapperType.recurse_counter
+            counter.reset()
 
             self._workspace_root.RecurseCommit(structure)
 
@@ -1198,7 +1290,12 @@ class Repository(ObjectContainer):
             # update the hashed elements
             self.index_hash.update(structure)
 
+            stats = counter.stats()
+            stats['time'] = time.time() - t_start
+            self.last_commit_stats = stats
+
             log.debug('Commited repository - Comment: "%s"' % cref.comment)
+            log.debug('Commit stats - visited %(visited)d, serialized %(serialized)d, hashed %(hashed)d, reused %(reused)d, hashed bytes %(hashed_bytes)d, time %(time)f' % stats)
                             
         else:
             raise RepositoryError('Repository in invalid state to commit')
@@ -1208,12 +1305,46 @@ class Repository(ObjectContainer):
         return branch.commitrefs.GetLink(0).key
             
             
-    def _create_commit_ref(self, comment='', date=None):
+    def defer_arrival_commit(self, comment, root_element):
+        """
+        @brief Defer the commit recording the state of a lazily unpacked message until it is needed.
+        @param comment the comment for the commit
+        @param root_element the structure element of the root object as it arrived
+        """
+        self._pending_arrival = (comment, root_element)
+
+    def _commit_arrival(self):
+        """
+        Make the deferred arrival commit if there is one. The root object may have been modified since it arrived, so
+        the commit links to the root element rather than the workspace root.
+        """
+        pending = self._pending_arrival
+        if pending is None:
+            return
+        self._pending_arrival = None
+
+        comment, root_element = pending
+
+        structure = {}
+        if self._workspace_root.Modified:
+            cref = self._create_commit_ref(comment=comment, root_element=root_element)
+        else:
+            cref = self._create_commit_ref(comment=comment)
+
+        cref.RecurseCommit(structure)
+        cref.ReadOnly = True
+        self._commit_index[cref.MyId] = cref
+        self.index_hash.update(structure)
+
+        log.debug('Made deferred arrival commit - Comment: "%s"' % comment)
+
+    def _create_commit_ref(self, comment='', date=None, root_element=None):
         """
         @brief internal method to create commit references
         @param comment a string that describes this commit
         @param date the date to associate with this commit. If not given then 
         the current time is used.
+        @param root_element link the commit to this structure element instead of the current workspace root
         @retval a string which is the commit reference
         """
         # Now add a Commit Ref
@@ -1256,7 +1387,15 @@ class Repository(ObjectContainer):
                 pref.relationship = pref.Relationship.MERGEDFROM
             
         cref.comment = comment
-        cref.SetLinkByName('objectroot', self._workspace_root)            
+        if root_element is None:
+            cref.SetLinkByName('objectroot', self._workspace_root)
+        else:
+            link = cref.GetLink('objectroot')
+            link.key = root_element.key
+            link.type.object_id = root_element.type.object_id
+            link.type.version = root_element.type.version
+            link.isleaf = root_element.isleaf
+            cref.ChildLinks.add(link)
         
         # Clear the merge root and merged from
         self.merge = None
@@ -1275,7 +1414,8 @@ class Repository(ObjectContainer):
         It simply adds the parent ref to the repositories merged from list!
         
         """
-        
+        self._commit_arrival()
+
         if self.status == self.MODIFIED:
             log.warn('Merging while the workspace is dirty better to make a new commit first!')
             #What to do for uninitialized?
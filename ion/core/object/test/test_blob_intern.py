@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/test_blob_intern.py
+@brief Tests for the container level blob intern store
+"""
+
+from twisted.trial import unittest
+
+from ion.core.object import codec
+from ion.core.object import object_utils
+from ion.core.object import workbench
+from ion.core.object.blob_intern import BlobInternStore
+from ion.core.object.repository import IndexHash
+
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+
+
+class FakeElement(object):
+
+    def __init__(self, key, size):
+        self.key = key
+        self.size = size
+        self.ChildLinks = set()
+
+    def __sizeof__(self):
+        return self.size
+
+
+class BlobInternStoreTest(unittest.TestCase):
+
+    def test_intern_shares_and_counts(self):
+        store = BlobInternStore(100)
+
+        a1 = FakeElement('a', 10)
+        a2 = FakeElement('a', 10)
+        a2.ChildLinks.add('b')
+
+        self.assertIdentical(store.intern(a1), a1)
+        self.assertIdentical(store.intern(a2), a1)
+        self.assertEqual(a1.ChildLinks, set(['b']))
+        self.assertIdentical(store.get('a'), a1)
+        self.assertEqual(store.get('c'), None)
+
+        stats = store.stats()
+        self.assertEqual(stats['items'], 1)
+        self.assertEqual(stats['references'], 3)
+        self.assertEqual(stats['size'], 10)
+        self.assertEqual(stats['saved_size'], 20)
+        self.assertEqual(stats['deduplicated'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+        store.release('a')
+        store.release('a')
+        self.assertEqual(store.stats()['saved_size'], 0)
+
+        # The last release leaves the element idle - it can still be found
+        store.release('a')
+        stats = store.stats()
+        self.assertEqual(stats['items'], 0)
+        self.assertEqual(stats['idle_items'], 1)
+        self.assertEqual(store.has_key('a'), True)
+        self.assertIdentical(store.peek('a'), a1)
+        self.assertIdentical(store.get('a'), a1)
+        self.assertEqual(store.stats()['items'], 1)
+
+    def test_byte_limit(self):
+        store = BlobInternStore(25)
+
+        store.intern(FakeElement('a', 10))
+        store.intern(FakeElement('b', 10))
+
+        # Referenced elements are never dropped - this one does not fit
+        self.assertEqual(store.intern(FakeElement('c', 10)), None)
+        self.assertEqual(store.stats()['rejected'], 1)
+
+        # Idle elements are dropped oldest first to make room
+        store.release('a')
+        store.release('b')
+        c = FakeElement('c', 10)
+        self.assertIdentical(store.intern(c), c)
+
+        self.assertEqual(store.has_key('a'), False)
+        self.assertEqual(store.has_key('b'), True)
+        stats = store.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['size'], 20)
+
+    def test_index_hash_sharing(self):
+        store = BlobInternStore(100)
+
+        ih1 = IndexHash()
+        ih1.interner = store
+        ih2 = IndexHash()
+        ih2.interner = store
+
+        a1 = FakeElement('a', 10)
+        ih1['a'] = a1
+        ih2['a'] = FakeElement('a', 10)
+        self.assertIdentical(ih2['a'], a1)
+
+        # A third index hash finds it without it being set
+        ih3 = IndexHash()
+        ih3.interner = store
+        self.assertEqual(ih3.has_key('a'), True)
+        self.assertIdentical(ih3.get('a'), a1)
+        self.assertEqual(store.stats()['references'], 3)
+
+        ih1.clear()
+        del ih2['a']
+        ih3.clear()
+
+        stats = store.stats()
+        self.assertEqual(stats['references'], 0)
+        self.assertEqual(stats['idle_items'], 1)
+
+    def test_intern_framed_element(self):
+        wb = workbench.WorkBench('No Process Test')
+        repo = wb.create_repository(PERSON_TYPE)
+        repo.root_object.name = 'David'
+        repo.commit()
+
+        serialized = codec.pack_structure(repo.root_object, framed=True)
+        head, obj_dict = codec._unpack_container(serialized)
+
+        store = BlobInternStore(10**6)
+        for key, wse in obj_dict.items():
+            self.assertEqual(wse.Materialized, False)
+
+            # The interned element holds a copy of its value rather than the message buffer
+            self.assertIdentical(store.intern(wse), wse)
+            self.assertEqual(wse.Materialized, True)
+            self.assertEqual(wse._buf, None)
+            self.assertEqual(wse.value, repo.index_hash[key].value)
@@ -75,6 +75,84 @@ class CodecTest(unittest.TestCase):
         self.assertEqual(res.person[0],self.ab.person[0])
 
 
+    def test_pack_eq_unpack_framed(self):
+
+        serialized = codec.pack_structure(self.ab, framed=True)
+        self.assertTrue(serialized.startswith(codec.FRAMED_CONTAINER_MAGIC))
+
+        res = codec.unpack_structure(serialized)
+
+        self.assertEqual(res,self.ab)
+        self.assertEqual(res.person[0],self.ab.person[0])
+
+    def test_framed_container_lazy(self):
+
+        serialized = codec.pack_structure(self.ab, framed=True)
+
+        head, obj_dict = codec._unpack_container(serialized)
+        self.assertEqual(len(obj_dict), 3)
+
+        for key, wse in obj_dict.items():
+            self.assertEqual(wse.key, key)
+            # Checking the key does not copy the value out of the buffer
+            self.assertEqual(wse.sha1, key)
+            self.assertEqual(wse.Materialized, False)
+
+            self.assertEqual(wse.value, self.repo.index_hash[key].value)
+            self.assertEqual(wse.Materialized, True)
+            self.assertEqual(wse.isleaf, self.repo.index_hash[key].isleaf)
+
+        # Both formats unpack to the same elements
+        gpb_head, gpb_dict = codec._unpack_container(codec.pack_structure(self.ab, framed=False))
+        self.assertEqual(gpb_head.key, head.key)
+        self.assertEqual(set(gpb_dict.keys()), set(obj_dict.keys()))
+
+    def test_unpack_framed_error(self):
+
+        serialized = codec.pack_structure(self.ab, framed=True)
+
+        self.assertRaises(codec.CodecError,codec.unpack_structure, serialized[:-5])
+        self.assertRaises(codec.CodecError,codec.unpack_structure, codec.FRAMED_CONTAINER_MAGIC + 'junk')
+
+    def test_lazy_unpack(self):
+
+        serialized = codec.pack_structure(self.ab)
+        head_key = self.ab.MyId
+
+        res = codec.unpack_structure(serialized, lazy=True)
+        repo = res.Repository
+
+        # Only the root object is loaded and there is no commit yet
+        self.assertEqual(len(repo._workspace), 1)
+        self.assertEqual(len(repo._commit_index), 0)
+
+        # Linked objects are loaded on first access
+        self.assertEqual(res.person[0],self.ab.person[0])
+        self.assertEqual(len(repo._workspace), 2)
+
+        self.assertEqual(res, self.ab)
+
+        # Modify the content before anything needs the arrival commit
+        res.person[1].name = 'Michael'
+        repo.commit('Changed a name')
+
+        # The arrival commit still records the content as it arrived
+        arrival = repo.commit_head.parentrefs[0].commitref
+        self.assertEqual(arrival.GetLink('objectroot').key, head_key)
+        self.assertEqual(arrival.comment, 'Message for you Sir!')
+        self.assertNotEqual(repo.commit_head.GetLink('objectroot').key, head_key)
+
+    def test_lazy_unpack_commit_head(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        res = codec.unpack_structure(serialized, lazy=True)
+
+        # Asking for the commit makes it
+        cref = res.Repository.commit_head
+        self.assertEqual(cref.GetLink('objectroot').key, self.ab.MyId)
+        self.assertEqual(res.Repository.status, res.Repository.UPTODATE)
+
     def test_unpack_error(self):
 
         self.assertRaises(codec.CodecError,codec.unpack_structure,'junk that is not a serialized container!')
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/test_object_utils.py
+@brief Tests for the GPB type registry snapshot and the lazy import of proto modules
+"""
+
+import os
+import stat
+import tempfile
+
+from twisted.trial import unittest
+
+from net.ooici.play import addressbook_pb2
+
+from ion.core.object import object_utils
+
+
+class RegistrySnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'registry')
+
+        self.id_to_class = object_utils.gpb_id_to_class
+        self.id_to_module = object_utils.gpb_id_to_module
+
+    def tearDown(self):
+        object_utils.gpb_id_to_class = self.id_to_class
+        object_utils.gpb_id_to_module = self.id_to_module
+
+        os.remove(self.path)
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_round_trip(self):
+        object_utils.write_registry_snapshot(self.path, 'net', 'abc',
+                                             {20001: addressbook_pb2.Person, 20002: addressbook_pb2.AddressBook})
+
+        snapshot = object_utils.read_registry_snapshot(self.path, 'net', 'abc')
+        self.assertEqual(snapshot, {20001: ('net.ooici.play.addressbook_pb2', 'Person'),
+                                    20002: ('net.ooici.play.addressbook_pb2', 'AddressBook')})
+
+        # A snapshot of other proto modules is not used
+        self.assertEqual(object_utils.read_registry_snapshot(self.path, 'net', 'def'), None)
+
+        # Only modules in the root package are imported from a snapshot
+        f = open(self.path, 'a')
+        f.write('20003 os path\n')
+        f.close()
+        self.assertEqual(object_utils.read_registry_snapshot(self.path, 'net', 'abc'), None)
+
+    def test_write_replaces_snapshot(self):
+        # A file left at the old fixed temporary name is not written through
+        stale = '%s.%d' % (self.path, os.getpid())
+        os.symlink(os.path.join(os.path.dirname(self.path), 'elsewhere'), stale)
+        try:
+            object_utils.write_registry_snapshot(self.path, 'net', 'abc', {20001: addressbook_pb2.Person})
+            object_utils.write_registry_snapshot(self.path, 'net', 'abc', {20002: addressbook_pb2.AddressBook})
+        finally:
+            os.remove(stale)
+
+        # Nothing but the snapshot is left in the directory
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['registry'])
+        self.assertEqual(object_utils.read_registry_snapshot(self.path, 'net', 'abc'),
+                         {20002: ('net.ooici.play.addressbook_pb2', 'AddressBook')})
+
+    def test_lazy_import(self):
+        object_utils.write_registry_snapshot(self.path, 'net', 'abc', {20001: addressbook_pb2.Person})
+
+        object_utils.gpb_id_to_class = {}
+        object_utils.gpb_id_to_module = object_utils.read_registry_snapshot(self.path, 'net', 'abc')
+
+        person_type = object_utils.create_type_identifier(object_id=20001, version=1)
+        self.assertIdentical(object_utils.get_gpb_class_from_type_id(person_type), addressbook_pb2.Person)
+        self.assertEqual(object_utils.gpb_id_to_module, {})
+        self.assertIdentical(object_utils.gpb_id_to_class[20001], addressbook_pb2.Person)
+
+        self.assertRaises(object_utils.ObjectUtilException, object_utils.get_gpb_class_from_type_id, 20002)
+
+
+class UserTempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        if not hasattr(os, 'getuid'):
+            raise unittest.SkipTest('No user ids on this platform')
+
+        self.tempdir = tempfile.tempdir
+        tempfile.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(tempfile.tempdir, 'ion-%d' % os.getuid())
+
+    def tearDown(self):
+        if os.path.isdir(self.directory):
+            os.rmdir(self.directory)
+        os.rmdir(tempfile.tempdir)
+        tempfile.tempdir = self.tempdir
+
+    def test_private_directory(self):
+        self.assertEqual(object_utils._get_user_temp_dir(), self.directory)
+        self.assertEqual(stat.S_IMODE(os.stat(self.directory).st_mode), 0700)
+
+        # An existing private directory is used again
+        self.assertEqual(object_utils._get_user_temp_dir(), self.directory)
+
+    def test_shared_directory(self):
+        os.mkdir(self.directory)
+        os.chmod(self.directory, 0777)
+        self.assertEqual(object_utils._get_user_temp_dir(), None)
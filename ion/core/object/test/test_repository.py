@@ -599,6 +599,50 @@ class RepositoryTest(unittest.TestCase):
 
 
 
+    @defer.inlineCallbacks
+    def test_commit_stats(self):
+
+        repo, ab = self.wb.init_repository(ADDRESSLINK_TYPE)
+
+        p = repo.create_object(PERSON_TYPE)
+        p.name='David'
+        p.id = 5
+        ab.owner = p
+        ab.person.add()
+        ab.person[0] = p
+
+        p = repo.create_object(PERSON_TYPE)
+        p.name='John'
+        p.id = 78
+        ab.person.add()
+        ab.person[1] = p
+
+        repo.commit(comment='first commit')
+        # The address book, two people and the commit ref
+        self.assertEqual(repo.last_commit_stats['hashed'], 4)
+        self.assertEqual(repo.last_commit_stats['reused'], 0)
+        self.assertTrue(repo.last_commit_stats['hashed_bytes'] > 0)
+
+        # Modifying one person only rehashes the dirty path
+        ab.person[1].name = 'Michael'
+        repo.commit(comment='second commit')
+        self.assertEqual(repo.last_commit_stats['visited'], 3)
+        self.assertEqual(repo.last_commit_stats['hashed'], 3)
+
+        # Setting the same value again only hashes the new commit ref
+        ab.person[1].name = 'Michael'
+        repo.commit(comment='third commit')
+        self.assertEqual(repo.last_commit_stats['hashed'], 1)
+        self.assertEqual(repo.last_commit_stats['reused'], 2)
+
+        # Elements loaded by a checkout are reused as well
+        ab = yield repo.checkout(branchname='master')
+        ab.owner.name = 'David'
+        repo.commit(comment='fourth commit')
+        self.assertEqual(repo.last_commit_stats['hashed'], 1)
+        self.assertEqual(repo.last_commit_stats['reused'], 2)
+
+
     @defer.inlineCallbacks
     def test_lost_objects(self):
         repo, ab = self.wb.init_repository(ADDRESSLINK_TYPE)
@@ -20,6 +20,7 @@ from net.ooici.play import addressbook_pb2
 from ion.core.object import gpb_wrapper
 from ion.core.object import workbench
 from ion.core.object import object_utils
+from ion.core.ioninit import request
 
 # For testing the message based ops of the workbench
 from ion.core.process.process import ProcessFactory, Process
@@ -269,6 +270,38 @@ class WorkBenchTest(unittest.TestCase):
 
 
 
+    def test_cache_pins_repository_in_use(self):
+
+        self.repo.commit('junk')
+        self.repo.cached = True
+        self.repo.convid_context = 'conv-a'
+
+        key = self.repo.repository_key
+        self.wb._repo_users.clear()
+
+        # A second conversation picks up the repository while the first is still open
+        request.workbench_context = ['conv-b']
+        try:
+            self.assertEqual(self.wb.get_repository(key), self.repo)
+        finally:
+            del request.workbench_context
+
+        # The first conversation ends - the repository is cached but pinned for the second
+        self.wb.manage_workbench_cache('conv-a')
+        self.assertIn(key, self.wb._repo_cache)
+        self.assertEqual(self.wb._repo_cache.is_pinned(key), True)
+
+        # Overfill the cache - the pinned repository is not evicted
+        self.wb._repo_cache.limit = 1
+        self.wb._repo_cache.set('other', 'value', 1)
+        self.assertIn(key, self.wb._repo_cache)
+
+        # The second conversation ends - the repository can be evicted
+        self.wb.manage_workbench_cache('conv-b')
+        self.assertNotIn(key, self.wb._repo_cache)
+        self.assertEqual(self.wb._repo_users, {})
+
+
 class WorkBenchProcess(Process):
     """
     A test process which has the ops of the workbench
@@ -425,6 +458,32 @@ class WorkBenchProcessTest(IonTestCase):
         self.assertNotIn(old_key, repo2.index_hash.keys())
 
 
+    @defer.inlineCallbacks
+    def test_pull_delta(self):
+
+        # Must make the repo persistent to compare the result
+        self.repo1.persistent = True
+
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+        first_count = len(result.blob_elements)
+
+        self.repo1.root_object.title = 'New Addressbook'
+        self.repo1.commit('An updated addressbook')
+
+        # The second pull only carries the blobs which changed
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+        self.assertEqual(len(result.commit_elements), 1)
+        self.assertTrue(len(result.blob_elements) < first_count)
+
+        repo2 = self.proc2.workbench.get_repository(self.repo1.repository_key)
+        ab = yield repo2.checkout('master')
+
+        self.assertEqual(self.repo1.commit_head, repo2.commit_head)
+        self.assertEqual(self.repo1.root_object, repo2.root_object)
+
+
     @defer.inlineCallbacks
     def test_pull_latest_checkout(self):
 
@@ -617,6 +676,57 @@ class WorkBenchProcessTest(IonTestCase):
         self.assertEqual(self.repo1.root_object, repo2.root_object)
 
 
+    @defer.inlineCallbacks
+    def test_push_shared_blobs(self):
+
+        # A second addressbook with the same owner shares the person blobs with the first
+        repo = self.proc1.workbench.create_repository(ADDRESSLINK_TYPE)
+        p = repo.create_object(PERSON_TYPE)
+        p.name='David'
+        p.id = 5
+        p.email = 'd@s.com'
+        ph = p.phone.add()
+        ph.type = p.PhoneType.WORK
+        ph.number = '123 456 7890'
+        repo.root_object.owner = p
+        repo.root_object.title = 'another addressbook'
+        repo.commit('Shares the owner')
+
+        keys1 = set(self.proc1.workbench.list_repository_blobs(self.repo1))
+        keys2 = set(self.proc1.workbench.list_repository_blobs(repo))
+        shared = keys1.intersection(keys2)
+        self.assertNotEqual(len(shared), 0)
+
+        # Each key is listed once per batch
+        batches = self.proc1.workbench._batch_push_repositories([self.repo1, repo], 10000)
+        self.assertEqual(len(batches), 1)
+        listed = []
+        for batch_repo, keys in batches[0]:
+            listed.extend(keys)
+        self.assertEqual(len(listed), len(keys1.union(keys2)))
+        self.assertEqual(set(listed), keys1.union(keys2))
+
+        # A byte limit smaller than either repository sends each in a message of its own
+        batches = self.proc1.workbench._batch_push_repositories([self.repo1, repo], 10000, 1)
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(set(batches[0][0][1]), keys1)
+        self.assertEqual(set(batches[1][0][1]), keys2)
+
+        # A limit large enough for both keeps them in one message
+        total = self.proc1.workbench._blob_bytes(self.repo1, keys1) + \
+                self.proc1.workbench._blob_bytes(repo, keys2.difference(keys1))
+        batches = self.proc1.workbench._batch_push_repositories([self.repo1, repo], 10000, total)
+        self.assertEqual(len(batches), 1)
+
+        result = yield self.proc1.workbench.push(self.proc2.id.full, [self.repo1, repo])
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        for pushed in (self.repo1, repo):
+            repo2 = self.proc2.workbench.get_repository(pushed.repository_key)
+            yield repo2.checkout('master')
+            self.assertEqual(pushed.root_object, repo2.root_object)
+
+
     @defer.inlineCallbacks
     def test_push_two(self):
 
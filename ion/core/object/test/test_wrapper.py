@@ -147,6 +147,18 @@ class WrapperMethodsTest(unittest.TestCase):
         self.fail('Attribute Error not raised by invalid delete request')
 
 
+    def test_slots(self):
+        ab = gpb_wrapper.Wrapper._create_object(ADDRESSBOOK_TYPE)
+
+        # The wrapper classes are slotted - no instance dictionary and no unknown attributes
+        if gpb_wrapper.CONF.getValue('VALIDATE_ATTRS', True):
+            self.failIf(hasattr(ab, '__dict__'))
+            self.assertRaises(AttributeError, setattr, ab, 'not_a_field', 'value')
+
+        ab.title = 'Slotted'
+        self.assertEqual(ab.title, 'Slotted')
+        self.assertEqual(type(ab)._str_gpbs, gpb_wrapper.CONF.getValue('STR_GPBS', False))
+
     def test_myid(self):
 
 
@@ -898,7 +910,55 @@ class TestSpecializedCdmMethods(unittest.TestCase):
         FindAttributeIndexByName is transitively tested by
         test_SetAttribute* methods.  This is sufficient testing for now
         """
-    
+
+    def test_find_by_name_after_changes(self):
+        """
+        The name lookup maps must follow changes to the repeated fields after a lookup
+        """
+        group = self.ds.root_group
+        DT = group.DataType
+
+        att1 = group.AddAttribute('atrib1', DT.STRING, 'val1')
+        self.assertIdentical(att1, group.FindAttributeByName('atrib1'))
+        self.assertEqual(False, group.HasAttribute('atrib2'))
+
+        # A miss keeps the map
+        name_map = group._source._name_maps['attributes']
+        self.assertEqual(False, group.HasAttribute('atrib3'))
+        self.assertIdentical(name_map, group._source._name_maps['attributes'])
+
+        # Add after a lookup
+        att2 = group.AddAttribute('atrib2', DT.STRING, 'val2')
+        self.assertIdentical(att2, group.FindAttributeByName('atrib2'))
+        self.assertEqual(1, group.FindAttributeIndexByName('atrib2'))
+
+        # Remove shifts the index of the following attributes
+        group.RemoveAttribute('atrib1')
+        self.assertEqual(False, group.HasAttribute('atrib1'))
+        self.assertEqual(0, group.FindAttributeIndexByName('atrib2'))
+
+        # Rename in place - the rename drops the maps of the group which links to the attribute
+        att2.name = 'renamed'
+        self.assertEqual(None, group._source._name_maps)
+        self.assertIdentical(att2, group.FindAttributeByName('renamed'))
+        self.assertRaises(OOIObjectError, group.FindAttributeByName, 'atrib2')
+
+        att2.name = 'renamed_again'
+        self.assertEqual(0, group.FindAttributeIndexByName('renamed_again'))
+        self.assertRaises(OOIObjectError, group.FindAttributeIndexByName, 'renamed')
+
+        # Replace a link
+        dim = group.AddDimension('dim1', 10)
+        var1 = group.AddVariable('var1', DT.DOUBLE, [dim])
+        self.assertIdentical(var1, group.FindVariableByName('var1'))
+        var2 = self.repo.create_object(object_utils.CDM_VARIABLE_TYPE)
+        var2.name = 'var2'
+        var2.data_type = DT.DOUBLE
+        group.variables.SetLink(0, var2)
+        self.assertRaises(OOIObjectError, group.FindVariableByName, 'var1')
+        self.assertIdentical(var2, group.FindVariableByName('var2'))
+        self.assertEqual(0, group.FindVariableIndexByName('var2'))
+
     def test_SetAttribute_for_group(self):
         # Seed the group with an attribute for testing
         string_vals = ['val1', 'val2', 'val3']
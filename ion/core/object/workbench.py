@@ -32,13 +32,17 @@ import weakref
 # Static entry point for "thread local" context storage during request
 # processing, eg. to retaining user-id from request message
 from ion.core.ioninit import request
+from ion.core import ioninit
 from net.ooici.core.container import container_pb2
 
 
 from ion.util.cache import LRUDict
+from ion.util.bloom import BloomFilter, BloomFilterError
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+CONF = ioninit.config(__name__)
+
 
 STRUCTURE_ELEMENT_TYPE = object_utils.create_type_identifier(object_id=1, version=1)
 STRUCTURE_TYPE = object_utils.create_type_identifier(object_id=2, version=1)
@@ -76,11 +80,39 @@ DATA_CHUNK_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=57, vers
 GET_OBJECT_REQUEST_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=55, version=1)
 GET_OBJECT_REPLY_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=56, version=1)
 
+# Message header carrying a bloom filter of the blob keys a puller already has
+PULL_HAVE_FILTER_HEADER = 'pull-have-filter'
+
 class WorkBenchError(ApplicationError):
     """
     An exception class for errors that occur in the Object WorkBench class
     """
 
+def pull_have_filter(headers):
+    """
+    @brief Get the bloom filter of the blob keys the puller already has from the headers of a pull request
+    @retval a BloomFilter or None if the puller did not send one
+    """
+    value = headers.get(PULL_HAVE_FILTER_HEADER) if headers else None
+    if not value:
+        return None
+
+    try:
+        return BloomFilter.loads(str(value))
+    except BloomFilterError, ex:
+        log.warn('Ignoring the blob filter of a pull request: %s' % str(ex))
+        return None
+
+def excluded_type_filter(excluded_types):
+    """
+    @brief Create a filter method for _get_blobs which excludes links to the given types
+    @param excluded_types an iterable of GPBType objects
+    @retval a callable which returns true if the link should be fetched
+    @note Compares (object_id, version) tuples so that it works for link wrappers and light weight link references alike
+    """
+    excluded = set((t.object_id, t.version) for t in excluded_types)
+    return lambda x: (x.type.object_id, x.type.version) not in excluded
+
 class WorkBench(object):
     
     def __init__(self, process, cache_size=10**7):
@@ -96,12 +128,27 @@ class WorkBench(object):
         # A Cache of repositories that holds upto a certain size between op message calls.
         self._repo_cache = LRUDict(cache_size, use_size=True)
 
+        # The conversations using each repository - a cached repository is pinned while any of them is open
+        self._repo_users = {}
+
 
         """
         A cache - shared between repositories for hashed objects
         """  
         self._workbench_cache = weakref.WeakValueDictionary()
 
+        """
+        The blob intern store of the container - shared between the workbenches of all its processes
+        """
+        blob_intern = getattr(getattr(process, 'container', None), 'blob_intern', None)
+        if blob_intern is not None and not blob_intern.enabled:
+            blob_intern = None
+        self._blob_intern = blob_intern
+
+        # Send a summary of the blobs a repository already has when pulling it again
+        self._pull_filter = CONF.getValue('pull_filter', False)
+        self._pull_filter_error_rate = float(CONF.getValue('pull_filter_error_rate', 0.01))
+
         #@TODO Consider using an index store in the Workbench to keep a cache of associations and keep track of objects
 
     def __str__(self):
@@ -118,6 +165,7 @@ class WorkBench(object):
             retstr += "\t%s: ih %d, cached %s, persistent %s, conv %s\n" %(k, len(v.index_hash), v.cached, v.persistent, v.convid_context)
 
         retstr += "++ LRU RepoCache, (len:%d)\n" % len(self._repo_cache.keys())
+        retstr += "\tstats: %s\n" % self.cache_stats()
         for k, v in self._repo_cache.iteritems():
             retstr += "\t%s: ih %d, cached %s, persistent %s,conv %s\n" %(k, len(v.index_hash), v.cached, v.persistent, v.convid_context)
 
@@ -241,7 +289,30 @@ class WorkBench(object):
             except KeyError, ke:
                 log.debug('Repository key "%s" not found in cache' % rkey)
 
+        if repo is not None:
+            self._add_repository_user(repo.repository_key)
+
         return repo
+
+    def _add_repository_user(self, key):
+        """
+        @Brief Record that the conversation of the current request context is using a repository
+        """
+        wc = request.get('workbench_context', [])
+        if wc:
+            self._repo_users.setdefault(key, set()).add(wc[-1])
+
+    def _release_repository_users(self, convid_context):
+        """
+        @Brief Release the repositories used by a conversation which has ended. A cached repository is unpinned
+        once no open conversation is using it.
+        """
+        for key, users in self._repo_users.items():
+            users.discard(convid_context)
+            if not users:
+                del self._repo_users[key]
+                if self._repo_cache.is_pinned(key):
+                    self._repo_cache.unpin(key)
         
     def list_repositories(self):
         """
@@ -290,6 +361,11 @@ class WorkBench(object):
         # Move it to the cached repositories
         self._repo_cache[key] = repo
 
+        # Conversations may still hold the repository - do not let the cache clear it under them. The pin is
+        # released by manage_workbench_cache when the last of them ends.
+        if key in self._repo_users:
+            self._repo_cache.pin(key)
+
 
     def manage_workbench_cache(self, convid_context=None):
         """
@@ -314,6 +390,30 @@ class WorkBench(object):
                 else:
                     self.cache_repository(repo)
 
+        self._release_repository_users(convid_context)
+
+        log.debug('Workbench repository cache stats: %s' % self.cache_stats())
+        if self._blob_intern is not None:
+            log.debug('Container blob intern store stats: %s' % self._blob_intern.stats())
+
+    def local_blob_keys(self, keys):
+        """
+        @Brief Find the keys which are held in this workbench or in the container blob intern store
+        @param keys a set of blob keys
+        @retval the subset of keys which need not be fetched from another process
+        """
+        local_keys = set(key for key in keys if key in self._workbench_cache)
+        if self._blob_intern is not None:
+            local_keys.update(key for key in keys if self._blob_intern.has_key(key))
+        return local_keys
+
+    def cache_stats(self):
+        """
+        @Brief Report the hit, miss and eviction counts and the size of the level two repository cache
+        @retval a dictionary, see LRUDict.stats
+        """
+        return self._repo_cache.stats()
+
 
     def clear(self):
         """
@@ -329,6 +429,7 @@ class WorkBench(object):
 
         #The cache knows to clear its content objects
         self._repo_cache.clear()
+        self._repo_users.clear()
 
         # these are just strings
         self._repository_nicknames.clear()
@@ -345,11 +446,14 @@ class WorkBench(object):
 
         self._repos[repo.repository_key] = repo
         repo.index_hash.cache = self._workbench_cache
+        if self._blob_intern is not None:
+            repo.index_hash.interner = self._blob_intern
         repo._process = self._process
 
         wc = request.get('workbench_context',[])
 
         repo.convid_context = pu.get_last_or_default(wc, 'Default Context')
+        self._add_repository_user(repo.repository_key)
 
        
     def reference_repository(self, repo_key, current_state=False):
@@ -432,11 +536,7 @@ class WorkBench(object):
 
         response = yield self._process.message_client.create_instance(BLOBS_MESSAGE_TYPE)
 
-        def filtermethod(x):
-            """
-            Returns true if the passed in link's type is not in the excluded_types list of the passed in message.
-            """
-            return (x.type not in content.excluded_types)
+        filtermethod = excluded_type_filter(content.excluded_types)
 
         # this is inherited by DatastoreWorkbench, which requires the _get_blobs call be a deferred, whereas here it is not.
         # tldr; maybeDeferred necessary.
@@ -502,12 +602,16 @@ class WorkBench(object):
                 exobj.version = extype.version
 
 
+        pull_headers = None
+        if get_head_content and not cloning and self._pull_filter:
+            pull_headers = self._pull_have_headers(repo)
+
         log.info('Before pull - requesting workbench status:')
         log.info(str(self))
 
 
         try:
-            result, headers, msg = yield self._process.rpc_send(targetname,'pull', pullmsg)
+            result, headers, msg = yield self._process.rpc_send(targetname,'pull', pullmsg, headers=pull_headers)
         except ReceivedApplicationError, re:
 
             log.info('ReceivedApplicationError', str(re))
@@ -566,6 +670,19 @@ class WorkBench(object):
 
 
 
+    def _pull_have_headers(self, repo):
+        """
+        @Brief Summarize the blobs a repository already has in a bloom filter header for a pull request
+        @retval a dictionary of message headers or None if the repository is empty
+        """
+        keys = self.list_repository_blobs(repo)
+        if not keys:
+            return None
+
+        bloom = BloomFilter(len(keys), self._pull_filter_error_rate)
+        bloom.update(keys)
+        return {PULL_HAVE_FILTER_HEADER:bloom.dumps()}
+
     @defer.inlineCallbacks
     def op_pull(self,request, headers, msg):
         """
@@ -624,15 +741,17 @@ class WorkBench(object):
 
             keys = [x.GetLink('objectroot').key for x in repo.current_heads()]
 
-            def filtermethod(x):
-                """
-                Returns true if the passed in link's type is not in the excluded_types list of the passed in message.
-                """
-                return (x.type not in request.excluded_types)
+            filtermethod = excluded_type_filter(request.excluded_types)
 
             blobs = self._get_blobs(response.Repository, keys, filtermethod)
 
+            # Leave out what the puller already has - if the filter is wrong it will fetch the blob on checkout
+            have = pull_have_filter(headers)
+
             for element in blobs.itervalues():
+                if have is not None and element.key in have:
+                    continue
+
                 link = response.blob_elements.add()
                 obj = response.Repository._wrap_message_object(element._element)
 
@@ -710,11 +829,19 @@ class WorkBench(object):
 
 
     @defer.inlineCallbacks
-    def push(self, origin, repo_or_repos):
+    def push(self, origin, repo_or_repos, max_batch_keys=None, max_batch_bytes=None):
         """
         Push the current state of the repository.
         When the operation is complete - the transfer of all objects in the
         repository is complete.
+
+        A list of repositories is sent in as few push messages as possible. Each message lists at most
+        max_batch_keys distinct blob keys (default from the push_batch_keys config) holding at most
+        max_batch_bytes of blobs (default from the push_batch_bytes config), so a blob shared by
+        repositories in the same batch is only transferred once. A repository over either limit is sent in a
+        message of its own.
+
+        @retval the reply to the first push message which did not succeed, otherwise the reply to the last
         """
 
         log.info('push - start')
@@ -743,22 +870,89 @@ class WorkBench(object):
 
         instances = list(repositories_and_associations)
 
+        if max_batch_keys is None:
+            max_batch_keys = CONF.getValue('push_batch_keys', 10000)
+        if max_batch_bytes is None:
+            max_batch_bytes = CONF.getValue('push_batch_bytes', 16777216)
 
-        # Create push message
-        pushmsg = yield self._process.message_client.create_instance(PUSH_MESSAGE_TYPE)
+        batches = self._batch_push_repositories(instances, max_batch_keys, max_batch_bytes)
 
+        # Push every batch - the result reports the first batch that failed
+        result = None
+        for batch in batches:
+            batch_result = yield self._push_batch(targetname, batch)
+            if result is None or result.MessageResponseCode == result.ResponseCodes.OK:
+                result = batch_result
 
-        #Iterate the list and build the message to send
+        log.info('push - complete: %d repositories in %d messages' % (len(instances), len(batches)))
+
+        defer.returnValue(result)
+
+    def _batch_push_repositories(self, instances, max_batch_keys, max_batch_bytes=None):
+        """
+        Split the repositories to push into batches with at most max_batch_keys distinct blob keys and, if
+        max_batch_bytes is not None, at most max_batch_bytes of blobs.
+        The keys listed for a repository are only those not already listed for an earlier repository in the
+        same batch. The receiver finds the shared blobs through its workbench cache.
+        @retval a list of lists of (repository, blob keys) tuples
+        """
+        batches = []
+        batch = []
+        batch_keys = set()
+        batch_bytes = 0
         for instance in instances:
 
             # Just in case this thing is an instance object
             repo = instance.Repository
 
-            commit_head = repo.commit_head
-            if commit_head is None:
+            if repo.commit_head is None:
                 log.warning('No commits found in repository during push: \n' + str(repo))
                 raise WorkBenchError('Can not push a repository which has no commits!')
 
+            keys = self.list_repository_blobs(repo)
+            new_keys = [key for key in keys if key not in batch_keys]
+            new_bytes = self._blob_bytes(repo, new_keys)
+
+            if batch and (len(batch_keys) + len(new_keys) > max_batch_keys or
+                          (max_batch_bytes is not None and batch_bytes + new_bytes > max_batch_bytes)):
+                batches.append(batch)
+                batch = []
+                batch_keys = set()
+                batch_bytes = 0
+                new_keys = keys
+                new_bytes = self._blob_bytes(repo, keys)
+
+            batch.append((repo, new_keys))
+            batch_keys.update(new_keys)
+            batch_bytes += new_bytes
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _blob_bytes(self, repo, keys):
+        """
+        The serialized size of the blobs a repository holds for a list of keys
+        """
+        size = 0
+        for key in keys:
+            element = repo.index_hash.get(key)
+            if element is not None:
+                size += element.__sizeof__()
+        return size
+
+    @defer.inlineCallbacks
+    def _push_batch(self, targetname, batch):
+        """
+        Send one push message for a batch of repositories
+        """
+        # Create push message
+        pushmsg = yield self._process.message_client.create_instance(PUSH_MESSAGE_TYPE)
+
+        #Iterate the list and build the message to send
+        for repo, keys in batch:
+
             repostate = pushmsg.repositories.add()
 
             repostate.repository_key = repo.repository_key
@@ -771,7 +965,7 @@ class WorkBench(object):
             obj = repostate.Repository._wrap_message_object(head_element._element)
             repostate.repo_head_element = obj
 
-            repostate.blob_keys.extend(self.list_repository_blobs(repo))
+            repostate.blob_keys.extend(keys)
 
         try:
             result, headers, msg = yield self._process.rpc_send(targetname,'push', pushmsg)
@@ -782,11 +976,7 @@ class WorkBench(object):
             log.debug('ReceivedError', str(re))
             raise WorkBenchError('Push returned an exception! "%s"' % re.msg_content)
 
-
-        log.info('push - complete')
-
         defer.returnValue(result)
-        # @TODO - check results?
 
         
     @defer.inlineCallbacks
@@ -819,15 +1009,12 @@ class WorkBench(object):
             # Get the set of keys in repostate that are not in repo_keys
             need_keys = set(repostate.blob_keys).difference(repo_keys)
 
-            workbench_keys = set(self._workbench_cache.keys())
-
-            local_keys = workbench_keys.intersection(need_keys)
+            local_keys = self.local_blob_keys(need_keys)
 
             for key in local_keys:
-                try:
-                    repo.index_hash.get(key)
+                if repo.index_hash.get(key) is not None:
                     need_keys.remove(key)
-                except KeyError, ke:
+                else:
                     log.info('Key disappeared - get it from the remote after all')
                     
             if len(need_keys) > 0:
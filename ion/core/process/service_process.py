@@ -36,6 +36,11 @@ class ServiceProcess(Process):
     # Service declaration, to be set by the subclass
     declare = {}
 
+    # Dispatch mode of the service name receiver ('thread' or 'reactor'), None for the configured default.
+    # A service whose operations wait on other messages for a long time should use 'reactor' so that it does
+    # not hold a thread pool thread per operation in progress.
+    svc_dispatch_mode = None
+
     def __init__(self, *args, **kwargs):
         """
         Initializes base service. The default service name is taken from the
@@ -62,7 +67,8 @@ class ServiceProcess(Process):
                 group=self.receiver.group,
                 process=self, # David added this - is it a good idea?
                 handler=self.receive,
-                error_handler=self.receive_error)
+                error_handler=self.receive_error,
+                dispatch_mode=self.svc_dispatch_mode)
         self.add_receiver(self.svc_receiver)
 
     @defer.inlineCallbacks
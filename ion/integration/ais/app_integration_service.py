@@ -17,6 +17,9 @@ import logging
 from twisted.internet import defer
 import time
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 from ion.core.object import object_utils
 from ion.core.process.process import ProcessFactory
 from ion.core.process.service_process import ServiceProcess, ServiceClient
@@ -85,8 +88,14 @@ class AppIntegrationService(ServiceProcess):
     def slc_init(self):
         self.metadataCache = MetadataCache(self)
         log.debug('Instantiated AIS Metadata Cache Object')
-        yield self.metadataCache.loadDataSets()
-        yield self.metadataCache.loadDataSources()
+        #
+        # Requests are served while the cache is warming up; a request for an
+        # entry which is not yet loaded waits for it.
+        #
+        self.metadataCacheWarmUp = self.metadataCache.warmUp()
+        self.metadataCacheWarmUp.addErrback(self._warmUpFailed)
+        if CONF.getValue('wait_for_warmup', False):
+            yield self.metadataCacheWarmUp
 
         log.debug('instantiating DataResourceUpdateEventSubscriber')
         self.subscriber = DataResourceUpdateEventSubscriber(self, process = self)
@@ -106,6 +115,10 @@ class AppIntegrationService(ServiceProcess):
     def getMetadataCache(self):
         return self.metadataCache
 
+    def _warmUpFailed(self, reason):
+        log.error('AIS Metadata Cache warm-up failed: %s' % str(reason))
+        return False
+
     @defer.inlineCallbacks
     def op_findDataResources(self, content, headers, msg):
         """
@@ -29,8 +29,18 @@ from ion.services.dm.inventory.association_service import PREDICATE_OBJECT_QUERY
 from ion.services.coi.datastore_bootstrap.ion_preload_config import TYPE_OF_ID, \
     DATASET_RESOURCE_TYPE_ID, DATASOURCE_RESOURCE_TYPE_ID, HAS_A_ID, OWNED_BY_ID
 
+from ion.integration.ais.common.spatial_temporal_index import SpatialTemporalIndex
+
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 PREDICATE_REFERENCE_TYPE = object_utils.create_type_identifier(object_id=25, version=1)
 
+#
+# The data arrays are not part of the metadata; do not pull them
+#
+CDM_BOUNDED_ARRAY_TYPE = object_utils.create_type_identifier(object_id=10021, version=1)
+
 #
 # Data Set Metadata Constants
 #
@@ -83,6 +93,12 @@ class MetadataCache(object):
     
     __metadata = {}
 
+    #
+    # The spatial and temporal extent of the cached data sets; kept with the
+    # metadata
+    #
+    __dSetIndex = SpatialTemporalIndex()
+
     def __init__(self, ais):
         log.info('MetadataCache.__init__()')
 
@@ -92,13 +108,37 @@ class MetadataCache(object):
         self.ac = AssociationClient(proc = ais)
 
         #
-        # A lock to ensure exclusive access to cache when updating
+        # A lock for each cache entry to ensure exclusive access to the entry
+        # when updating; entries of different resources are updated
+        # concurrently
+        #
+        self.__entryLocks = {}
+
+        #
+        # While a warm-up is finding the resources to cache, the entries are
+        # not yet locked; requests wait for it
         #
-        self.cacheLock = {}
-        self.cacheLock = defer.DeferredLock()
+        self.__discovering = 0
+        self.__discoveryWaiters = []
+
+        #
+        # The number of resources loaded at the same time by a warm-up
+        #
+        self.warmUpConcurrency = int(CONF.getValue('warmup_concurrency', 8))
+
+
+    def warmUp(self):
+        """
+        Find all the data set and data source resources and load their
+        metadata, a bounded number of resources at a time.  The entries
+        become available one by one as they are loaded; a request for an
+        entry which is not yet loaded waits for it.  Returns a deferred which
+        fires with True once all the resources are loaded.
+        """
+        return self.__warmUp([(DATASET_RESOURCE_TYPE_ID, self.__putDSetMetadata),
+                              (DATASOURCE_RESOURCE_TYPE_ID, self.__putDSourceMetadata)])
 
 
-    @defer.inlineCallbacks
     def loadDataSets(self):
         """
         Find all resources of type DATASET_RESOURCE_TYPE_ID and load their
@@ -106,29 +146,9 @@ class MetadataCache(object):
         the metadata if the data set is in the Active (Private) or
         Commissioned (Public) state.
         """
+        return self.__warmUp([(DATASET_RESOURCE_TYPE_ID, self.__putDSetMetadata)])
 
-        # Get the list of dataset resource IDs
-        dSetResults = yield self.__findResourcesOfType(DATASET_RESOURCE_TYPE_ID)
-        if dSetResults == None:
-            log.error('Error finding dataset resources.')
-            defer.returnValue(False)
-
-        numDSets =  len(dSetResults.idrefs)          
-        log.debug('Found ' + str(numDSets) + ' datasets.')
 
-        yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSets):
-            yield self.__putDSetMetadata(dSetResults.idrefs[i].key)
-            i = i + 1
-
-        self.__unlockCache()
-            
-        defer.returnValue(True)
-
-
-    @defer.inlineCallbacks
     def loadDataSources(self):
         """
         Find all resources of type DATASOURCE_RESOURCE_TYPE_ID and load their
@@ -136,28 +156,7 @@ class MetadataCache(object):
         the metadata if the data source is in the Active (Private) or
         Commissioned (Public) state.
         """
-
-
-        
-        # Get the list of datasource resource IDs
-        dSourceResults = yield self.__findResourcesOfType(DATASOURCE_RESOURCE_TYPE_ID)
-        if dSourceResults == None:
-            log.error('Error finding datasource resources.')
-            defer.returnValue(False)
-
-        numDSources =  len(dSourceResults.idrefs)          
-        log.debug('Found ' + str(numDSources) + ' datasources.')
-
-        yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSources):
-            yield self.__putDSourceMetadata(dSourceResults.idrefs[i].key)
-            i = i + 1
-
-        self.__unlockCache()
-            
-        defer.returnValue(True)
+        return self.__warmUp([(DATASOURCE_RESOURCE_TYPE_ID, self.__putDSourceMetadata)])
 
     @defer.inlineCallbacks
     def getDSet(self, dSetID):
@@ -169,7 +168,7 @@ class MetadataCache(object):
         
         log.debug('getDSet')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSetID)
                     
         try:
             metadata = self.__metadata[dSetID]
@@ -179,7 +178,7 @@ class MetadataCache(object):
             log.error('Metadata not found for datasetID: ' + dSetID)
             returnValue = None
 
-        self.__unlockCache()
+        self.__unlockEntry(dSetID)
         
         defer.returnValue(returnValue)
 
@@ -193,7 +192,7 @@ class MetadataCache(object):
         
         log.debug('getDSetMetadata')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSetID)
                     
         try:
             metadata = self.__metadata[dSetID]
@@ -203,11 +202,39 @@ class MetadataCache(object):
             log.error('Metadata not found for datasetID: ' + dSetID)
             returnValue = None
 
-        self.__unlockCache()
+        self.__unlockEntry(dSetID)
         
         defer.returnValue(returnValue)
 
 
+    @defer.inlineCallbacks
+    def filterDSetsByBounds(self, dSetIDs, bounds):
+        """
+        Use the spatial and temporal index of the cached data sets to drop the
+        data sets in the given list of resource IDs (dSetIDs) which can not be
+        within the given loaded SpatialTemporalBounds.  The order of the list
+        is kept.  The data sets which are left still need to be tested with
+        bounds.isInBounds; data sets which are not cached are left in the list.
+        """
+
+        log.debug('filterDSetsByBounds')
+
+        #
+        # Data sets which are not yet loaded are not in the index; they are
+        # kept in the list
+        #
+        yield self.__waitForDiscovery()
+
+        candidates = self.__dSetIndex.candidates(bounds)
+        if candidates is None:
+            returnValue = list(dSetIDs)
+        else:
+            returnValue = [dSetID for dSetID in dSetIDs if dSetID in candidates or dSetID not in self.__dSetIndex]
+            log.debug('filterDSetsByBounds: %d of %d datasets may be in bounds' % (len(returnValue), len(dSetIDs)))
+
+        defer.returnValue(returnValue)
+
+
     @defer.inlineCallbacks
     def putDSetMetadata(self, dSetID):
         """
@@ -218,11 +245,11 @@ class MetadataCache(object):
         
         log.debug('putDSetMetadata')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSetID)
 
         yield self.__putDSetMetadata(dSetID)
 
-        self.__unlockCache()
+        self.__unlockEntry(dSetID)
                     
     
     @defer.inlineCallbacks
@@ -234,7 +261,7 @@ class MetadataCache(object):
         
         log.debug('deleteDSetMetadata')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSetID)
 
         try:
             #
@@ -245,12 +272,13 @@ class MetadataCache(object):
             dSet.Repository.persistent = False
 
             self.__metadata.pop(dSetID)
+            self.__dSetIndex.remove(dSetID)
             returnValue = True
         except KeyError:
             log.error('deleteDSetMetadata: datasetID ' + dSetID + ' not cached')
             returnValue = False
                     
-        self.__unlockCache()
+        self.__unlockEntry(dSetID)
         
         defer.returnValue(returnValue)
 
@@ -265,7 +293,7 @@ class MetadataCache(object):
         
         log.debug('getDSource for: ' + dSourceID)
                     
-        yield self.__lockCache()
+        yield self.__lockEntry(dSourceID)
 
         try:
             metadata = self.__metadata[dSourceID]
@@ -275,7 +303,7 @@ class MetadataCache(object):
             log.error('Metadata not found for datasetID: ' + dSourceID)
             returnValue = None
 
-        self.__unlockCache()
+        self.__unlockEntry(dSourceID)
             
         defer.returnValue(returnValue)            
         
@@ -287,7 +315,7 @@ class MetadataCache(object):
         represented by the given ResourceID (dSourceID).
         """
         
-        yield self.__lockCache()
+        yield self.__lockEntry(dSourceID)
 
         log.debug('getDSourceMetadata')
                     
@@ -299,7 +327,7 @@ class MetadataCache(object):
             log.error('Metadata not found for datasetID: ' + dSourceID)
             returnValue = None
 
-        self.__unlockCache()
+        self.__unlockEntry(dSourceID)
             
         defer.returnValue(returnValue)
     
@@ -314,11 +342,11 @@ class MetadataCache(object):
         
         log.debug('putDSourceMetadata')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSourceID)
 
         dSource = yield self.__putDSourceMetadata(dSourceID)
 
-        self.__unlockCache()
+        self.__unlockEntry(dSourceID)
                     
 
     @defer.inlineCallbacks
@@ -330,7 +358,7 @@ class MetadataCache(object):
         
         log.debug('deleteDSourceMetadata')
 
-        yield self.__lockCache()
+        yield self.__lockEntry(dSourceID)
         
         try:
             #
@@ -346,7 +374,7 @@ class MetadataCache(object):
             log.error('deleteDSourceMetadata: datasourceID ' + dSourceID + ' not cached')
             returnValue = False
 
-        self.__unlockCache()
+        self.__unlockEntry(dSourceID)
         
         defer.returnValue(returnValue)
 
@@ -360,12 +388,21 @@ class MetadataCache(object):
         log.debug('getAssociatedSource() entry')
 
         try:
-            dSet = yield self.rc.get_instance(dSetID)
+            dSet = yield self.rc.get_instance(dSetID, excluded_types=[CDM_BOUNDED_ARRAY_TYPE])
             
         except ResourceClientError:    
             log.error('Error getting dataset instance for datasetID: %s!' %(dSetID))
             defer.returnValue(None)
-            
+
+        dSourceID = yield self.__getAssociatedSource(dSet)
+        defer.returnValue(dSourceID)
+
+
+    @defer.inlineCallbacks
+    def __getAssociatedSource(self, dSet):
+        """
+        Get the data source associated with the given data set instance.
+        """
         try:
             results = yield self.ac.find_associations(obj=dSet, predicate_or_predicates=HAS_A_ID)
 
@@ -393,22 +430,108 @@ class MetadataCache(object):
 
 
     @defer.inlineCallbacks
-    def __lockCache(self):
+    def __warmUp(self, resourceTypes):
+        """
+        Find the resources of each of the given (resourceType, putMethod)
+        pairs, lock their entries and load them with the put method through a
+        pipeline of at most warmUpConcurrency loads.
+        """
+
+        log.info('Metadata cache warm-up starting')
+
+        returnValue = True
+        entries = []
+
+        self.__discovering = self.__discovering + 1
+        try:
+            results = yield defer.DeferredList([self.__findResourcesOfType(resourceType) for resourceType, put in resourceTypes],
+                                               consumeErrors=True)
+
+            for (resourceType, put), (success, resources) in zip(resourceTypes, results):
+                if not success or resources is None:
+                    log.error('Error finding resources of type %s.' % str(resourceType))
+                    returnValue = False
+                    continue
+
+                log.debug('Found %d resources of type %s.' % (len(resources.idrefs), str(resourceType)))
+                #
+                # Lock the entries before anyone can ask for them; they are
+                # released as they are loaded
+                #
+                for idref in resources.idrefs:
+                    entries.append((idref.key, put, self.__acquireEntry(idref.key)))
+        finally:
+            self.__discovering = self.__discovering - 1
+            if self.__discovering == 0:
+                waiters = self.__discoveryWaiters
+                self.__discoveryWaiters = []
+                for waiter in waiters:
+                    waiter.callback(None)
+
+        semaphore = defer.DeferredSemaphore(max(1, self.warmUpConcurrency))
+        yield defer.DeferredList([semaphore.run(self.__warmUpEntry, resID, put, locked) for resID, put, locked in entries])
+
+        log.info('Metadata cache warm-up loaded %d resources' % len(entries))
+
+        defer.returnValue(returnValue)
+
+
+    @defer.inlineCallbacks
+    def __warmUpEntry(self, resID, put, locked):
+        """
+        Load one entry locked by __warmUp, and release it
+        """
+        yield locked
+        try:
+            yield put(resID)
+        except Exception, ex:
+            log.exception('Error loading metadata for resource %s: %s' % (resID, str(ex)))
+
+        self.__unlockEntry(resID)
+
+
+    def __waitForDiscovery(self):
+        """
+        Return a deferred which fires when no warm-up is finding resources
+        """
+        if self.__discovering == 0:
+            return defer.succeed(None)
+
+        waiter = defer.Deferred()
+        self.__discoveryWaiters.append(waiter)
+        return waiter
+
+
+    def __acquireEntry(self, resID):
+        lock = self.__entryLocks.get(resID)
+        if lock is None:
+            lock = self.__entryLocks[resID] = defer.DeferredLock()
+        return lock.acquire()
+
+
+    @defer.inlineCallbacks
+    def __lockEntry(self, resID):
         """
-        Lock the cache to insure exclusive access while updating
+        Lock the cache entry for the given resource ID to insure exclusive
+        access while updating.  If a warm-up is running, wait until it has
+        locked the entries it is going to load.
         """
         
-        log.debug('__lockCache')
-        yield self.cacheLock.acquire()
+        log.debug('__lockEntry')
+        yield self.__waitForDiscovery()
+        yield self.__acquireEntry(resID)
 
 
-    def __unlockCache(self):
+    def __unlockEntry(self, resID):
         """
-        Lock the cache to insure exclusive access while updating
+        Unlock the cache entry for the given resource ID
         """
         
-        log.debug('__unlockCache')
-        self.cacheLock.release()
+        log.debug('__unlockEntry')
+        lock = self.__entryLocks[resID]
+        lock.release()
+        if not lock.locked and not lock.waiting:
+            del self.__entryLocks[resID]
 
 
     @defer.inlineCallbacks
@@ -422,10 +545,10 @@ class MetadataCache(object):
         log.debug('__putDSetMetadata')
 
         try:
-            dSet = yield self.rc.get_instance(dSetID)
+            dSet = yield self.rc.get_instance(dSetID, excluded_types=[CDM_BOUNDED_ARRAY_TYPE])
             yield self.__loadDSetMetadata(dSet)
         except ResourceClientError:    
-            log.error('Data set %s (LCS: %s) being updated but was never cached!' %(dSetID, dSet.LifeCycleState))
+            log.error('Data set %s being updated but was never cached!' %(dSetID))
 
     
     @defer.inlineCallbacks
@@ -442,7 +565,7 @@ class MetadataCache(object):
             dSource = yield self.rc.get_instance(dSourceID)
             self.__loadDSourceMetadata(dSource)
         except ResourceClientError:    
-            log.error('Data source %s (LCS: %s) being updated but was never cached!' %(dSetID, dSource.LifeCycleState))
+            log.error('Data source %s being updated but was never cached!' %(dSourceID))
 
 
     @defer.inlineCallbacks
@@ -468,7 +591,7 @@ class MetadataCache(object):
             #
             dSet.Repository.persistent = True
             dSetMetadata[DSET] = dSet
-            dSetMetadata[DSOURCE_ID] = yield self.getAssociatedSource(dSet.ResourceIdentity)
+            dSetMetadata[DSOURCE_ID] = yield self.__getAssociatedSource(dSet)
             dSetMetadata[RESOURCE_ID] = dSet.ResourceIdentity
             dSetMetadata[OWNER_ID] = yield self.__getAssociatedOwner(dSet.ResourceIdentity)
             for attrib in dSet.root_group.attributes:
@@ -513,6 +636,7 @@ class MetadataCache(object):
             # Store this dSetMetadata in the dictionary, indexed by the resourceID
             #
             self.__metadata[dSet.ResourceIdentity] = dSetMetadata
+            self.__dSetIndex.add(dSet.ResourceIdentity, dSetMetadata)
     
             if log.getEffectiveLevel() <= logging.DEBUG:
                 self.__printMetadata(dSet)
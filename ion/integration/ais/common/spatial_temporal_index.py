@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/common/spatial_temporal_index.py
+@brief An in-memory index of the spatial and temporal extent of the cached
+data sets.  Each dimension (latitude, longitude, vertical and time) keeps the
+minimum and the maximum of every data set in a sorted list, so that the data
+sets which may be within a SpatialTemporalBounds can be found with a binary
+search instead of testing the metadata of every data set.
+"""
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+import time, datetime
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from ion.util.procutils import isnan
+from ion.integration.ais.common.spatial_temporal_bounds import MIN_LATITUDE, MAX_LATITUDE, \
+     MIN_LONGITUDE, MAX_LONGITUDE, MIN_VERTICAL, MAX_VERTICAL
+
+#
+# Dimension names, and the metadata keys of their minimum and maximum
+#
+LATITUDE  = 'latitude'
+LONGITUDE = 'longitude'
+VERTICAL  = 'vertical'
+TIME      = 'time'
+
+DIMENSIONS = {LATITUDE  : ('ion_geospatial_lat_min', 'ion_geospatial_lat_max'),
+              LONGITUDE : ('ion_geospatial_lon_min', 'ion_geospatial_lon_max'),
+              VERTICAL  : ('ion_geospatial_vertical_min', 'ion_geospatial_vertical_max'),
+              TIME      : ('ion_time_coverage_start', 'ion_time_coverage_end')}
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+NUMBER_TYPES = (int, long, float, Decimal)
+
+#
+# The two kinds of constraint a bound puts on a dimension
+#
+MIN_AT_MOST  = 'min_at_most'
+MAX_AT_LEAST = 'max_at_least'
+
+
+class _SortedEndpoints(object):
+    """
+    The values of one end of the extent of the data sets in a dimension, in
+    sorted order, with the ID of the data set for each value.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.ids = []
+
+    def add(self, value, dSetID):
+        i = bisect_right(self.values, value)
+        self.values.insert(i, value)
+        self.ids.insert(i, dSetID)
+
+    def remove(self, value, dSetID):
+        i = bisect_left(self.values, value)
+        stop = bisect_right(self.values, value)
+        while i < stop:
+            if self.ids[i] == dSetID:
+                del self.values[i]
+                del self.ids[i]
+                return
+            i = i + 1
+
+    def countAtMost(self, value):
+        return bisect_right(self.values, value)
+
+    def countAtLeast(self, value):
+        return len(self.values) - bisect_left(self.values, value)
+
+    def idsAtMost(self, value):
+        return self.ids[:bisect_right(self.values, value)]
+
+    def idsAtLeast(self, value):
+        return self.ids[bisect_left(self.values, value):]
+
+
+class _Dimension(object):
+    """
+    The minimums and maximums of the data sets in one dimension.  Data sets
+    which do not have a valid extent in the dimension are kept aside; they
+    are candidates for every search so that the bounds test can decide.
+    """
+
+    def __init__(self):
+        self.mins = _SortedEndpoints()
+        self.maxs = _SortedEndpoints()
+        self.unindexed = set()
+
+    def count(self, kind, value):
+        if kind == MIN_AT_MOST:
+            return self.mins.countAtMost(value) + len(self.unindexed)
+        else:
+            return self.maxs.countAtLeast(value) + len(self.unindexed)
+
+    def ids(self, kind, value):
+        if kind == MIN_AT_MOST:
+            ids = set(self.mins.idsAtMost(value))
+        else:
+            ids = set(self.maxs.idsAtLeast(value))
+        ids.update(self.unindexed)
+        return ids
+
+
+class SpatialTemporalIndex(object):
+    """
+    Index of the spatial and temporal extent of data set metadata, keyed by
+    the data set resource ID.
+    """
+
+    def __init__(self):
+        self.__extents = {}
+        self.__dimensions = {}
+        for name in DIMENSIONS:
+            self.__dimensions[name] = _Dimension()
+
+    def __len__(self):
+        return len(self.__extents)
+
+    def __contains__(self, dSetID):
+        return dSetID in self.__extents
+
+    def add(self, dSetID, dSetMetadata):
+        """
+        Index the extent of the data set represented by the given resource ID
+        (dSetID); any previous entry for the data set is replaced.
+        """
+        if dSetID in self.__extents:
+            self.remove(dSetID)
+
+        extent = {}
+        for name, (minKey, maxKey) in DIMENSIONS.iteritems():
+            extent[name] = self.__getExtent(name, dSetMetadata, minKey, maxKey)
+
+        self.__extents[dSetID] = extent
+        for name, dimension in self.__dimensions.iteritems():
+            if extent[name] is None:
+                dimension.unindexed.add(dSetID)
+            else:
+                dimension.mins.add(extent[name][0], dSetID)
+                dimension.maxs.add(extent[name][1], dSetID)
+
+    def remove(self, dSetID):
+        """
+        Remove the data set represented by the given resource ID (dSetID)
+        from the index; return False if it was not indexed.
+        """
+        extent = self.__extents.pop(dSetID, None)
+        if extent is None:
+            return False
+
+        for name, dimension in self.__dimensions.iteritems():
+            if extent[name] is None:
+                dimension.unindexed.discard(dSetID)
+            else:
+                dimension.mins.remove(extent[name][0], dSetID)
+                dimension.maxs.remove(extent[name][1], dSetID)
+        return True
+
+    def clear(self):
+        self.__init__()
+
+    def candidates(self, bounds):
+        """
+        Find the data sets which may be within the given loaded
+        SpatialTemporalBounds.  Every data set which is in bounds is in the
+        result, but the result may hold data sets which are not; use
+        bounds.isInBounds on the candidates.  Returns None if the bounds do
+        not restrict the search; all the data sets are candidates.
+        """
+        constraints = self.__getConstraints(bounds)
+        if not constraints:
+            return None
+
+        #
+        # Start from the constraint which matches the fewest data sets, and
+        # check the other constraints against the indexed extent of each
+        # candidate
+        #
+        counts = [(self.__dimensions[name].count(kind, value), i) for i, (name, kind, value) in enumerate(constraints)]
+        count, first = min(counts)
+        name, kind, value = constraints[first]
+        candidates = self.__dimensions[name].ids(kind, value)
+        log.debug('SpatialTemporalIndex: %d of %d data sets are candidates by %s' % (len(candidates), len(self.__extents), name))
+
+        others = constraints[:first] + constraints[first + 1:]
+        if not others:
+            return candidates
+
+        result = set()
+        for dSetID in candidates:
+            extent = self.__extents[dSetID]
+            for name, kind, value in others:
+                dimExtent = extent[name]
+                if dimExtent is None:
+                    continue
+                if kind == MIN_AT_MOST:
+                    if dimExtent[0] > value:
+                        break
+                elif dimExtent[1] < value:
+                    break
+            else:
+                result.add(dSetID)
+
+        return result
+
+    def __getExtent(self, name, dSetMetadata, minKey, maxKey):
+        """
+        Get the (min, max) of the data set in the given dimension, or None if
+        the metadata does not have a valid extent for it.
+        """
+        try:
+            dimMin = dSetMetadata[minKey]
+            dimMax = dSetMetadata[maxKey]
+            if name == TIME:
+                dimMin = time.mktime(datetime.datetime.strptime(dimMin, TIME_FORMAT).timetuple())
+                dimMax = time.mktime(datetime.datetime.strptime(dimMax, TIME_FORMAT).timetuple())
+                #
+                # The time bounds test relies on the start being before the
+                # end; leave it to the test for any other data set
+                #
+                if dimMin > dimMax:
+                    return None
+            #
+            # Only numbers other than NaN (float or Decimal) can be kept in
+            # the sorted endpoints; bisect raises on a Decimal NaN
+            #
+            for value in (dimMin, dimMax):
+                if not isinstance(value, NUMBER_TYPES) or isnan(value):
+                    return None
+        except (KeyError, ValueError, TypeError, ArithmeticError):
+            return None
+
+        return (dimMin, dimMax)
+
+    def __getConstraints(self, bounds):
+        """
+        Get the constraints on the extent of a data set that follow from each
+        test made by SpatialTemporalBounds.isInBounds.
+        """
+        constraints = []
+        b = bounds.bounds
+
+        if bounds.filterByLatitude:
+            if bounds.bIsMinLatitudeSet:
+                constraints.append((LATITUDE, MIN_AT_MOST, b[MAX_LATITUDE]))
+            if bounds.bIsMaxLatitudeSet:
+                constraints.append((LATITUDE, MAX_AT_LEAST, b[MIN_LATITUDE]))
+
+        if bounds.filterByLongitude:
+            if bounds.bIsMinLongitudeSet:
+                constraints.append((LONGITUDE, MAX_AT_LEAST, b[MIN_LONGITUDE]))
+            if bounds.bIsMaxLongitudeSet:
+                constraints.append((LONGITUDE, MIN_AT_MOST, b[MAX_LONGITUDE]))
+
+        #
+        # The test is the same for depth and altitude
+        #
+        if bounds.filterByVertical:
+            if bounds.bIsMinVerticalSet:
+                constraints.append((VERTICAL, MIN_AT_MOST, b[MAX_VERTICAL]))
+            if bounds.bIsMaxVerticalSet:
+                constraints.append((VERTICAL, MAX_AT_LEAST, b[MIN_VERTICAL]))
+
+        #
+        # A data set is in the time bounds if it covers either end of the
+        # bounds or is within them; for a start before the end that means it
+        # starts before the bounds end and ends after the bounds start
+        #
+        if bounds.filterByTime and b['minTime'] <= b['maxTime']:
+            constraints.append((TIME, MIN_AT_MOST, b['maxTime']))
+            constraints.append((TIME, MAX_AT_LEAST, b['minTime']))
+
+        return constraints
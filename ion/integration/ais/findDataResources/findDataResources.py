@@ -328,6 +328,13 @@ class FindDataResources(object):
         bounds = SpatialTemporalBounds()
         bounds.loadBounds(msg.message_parameters_reference)
         #userID = msg.message_parameters_reference.user_ooi_id       
+        dSetIDs = [dSetRef.key for dSetRef in dSetList]
+        if self.bUseMetadataCache:
+            #
+            # Only visit the datasets which the spatial temporal index of the
+            # cache finds may be in bounds
+            #
+            dSetIDs = yield self.metadataCache.filterDSetsByBounds(dSetIDs, bounds)
         #
         # Now iterate through the list if dataset resource IDs and for each ID:
         #   - get the dataset instance
@@ -338,10 +345,8 @@ class FindDataResources(object):
         #   - if so:
         #     - add the metadata to the response GPB
         #        
-        i = 0
         j = 0
-        while i < len(dSetList):
-            dSetResID = dSetList[i].key
+        for dSetResID in dSetIDs:
             log.debug('Working on dataset: ' + dSetResID)
 
             if self.bUseMetadataCache:            
@@ -457,8 +462,6 @@ class FindDataResources(object):
                 if log.getEffectiveLevel() <= logging.DEBUG:
                     if 'title' in dSetMetadata.keys():
                         log.debug('dataset %s is OUT OF bounds <-------------' % (dSetMetadata['title']))
-            
-            i = i + 1
 
         defer.returnValue(rspMsg)        
         log.debug('__getDataResources exit')
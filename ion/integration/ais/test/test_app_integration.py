@@ -21,7 +21,8 @@ from ion.core.exception import ReceivedApplicationError
 from ion.core.data.storage_configuration_utility import COMMIT_CACHE
 from ion.services.coi.datastore_bootstrap.ion_preload_config import MYOOICI_USER_ID, \
                                                                     HAS_A_ID, \
-                                                                    ANONYMOUS_USER_ID
+                                                                    ANONYMOUS_USER_ID, \
+                                                                    SAMPLE_PROFILE_DATASET_ID
 
 from ion.services.coi.resource_registry.resource_client import ResourceClient, ResourceClientError
 from ion.services.coi.resource_registry.association_client import AssociationClient, AssociationClientError
@@ -32,6 +33,7 @@ from ion.services.coi.datastore import ION_DATASETS_CFG, PRELOAD_CFG, ION_AIS_RE
 
 from ion.test.iontest import IonTestCase
 
+from ion.integration.ais import app_integration_service
 from ion.integration.ais.app_integration_service import AppIntegrationServiceClient
 #from ion.integration.ais.findDataResources import DataResourceUpdateEventSubscriber
 
@@ -303,6 +305,36 @@ class AppIntegrationTest(IonTestCase):
             log.error('test_notificationSet: No datasets returned!')
         
 
+    @defer.inlineCallbacks
+    def test_waitForWarmUp(self):
+        """
+        With wait_for_warmup set, an AIS finishes spawning only once its
+        metadata cache is loaded
+        """
+        conf = app_integration_service.CONF
+        class WaitForWarmUpConf(object):
+            def getValue(self, key, default=None):
+                if key == 'wait_for_warmup':
+                    return True
+                return conf.getValue(key, default)
+
+        app_integration_service.CONF = WaitForWarmUpConf()
+        try:
+            yield self._spawn_processes([{'name':'app_integration_wait',
+                                          'module':'ion.integration.ais.app_integration_service',
+                                          'class':'AppIntegrationService'}])
+        finally:
+            app_integration_service.CONF = conf
+
+        pid = yield self.sup.get_child_id('app_integration_wait')
+        ais = self._get_procinstance(pid)
+        self.assertEqual(ais.metadataCacheWarmUp.called, True)
+
+        # Requests are served without waiting
+        d = ais.getMetadataCache().getDSetMetadata(SAMPLE_PROFILE_DATASET_ID)
+        self.assertEqual(d.called, True)
+
+
     @defer.inlineCallbacks
     def test_findDataResources(self):
 
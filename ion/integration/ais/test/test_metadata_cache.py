@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/test/test_metadata_cache.py
+@brief Test the per entry locking of the AIS metadata cache while it warms up.
+The resource lookups and loads are replaced with deferreds fired by the tests.
+"""
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from ion.core.process.process import Process
+from ion.integration.ais.common.metadata_cache import MetadataCache, DSET
+from ion.integration.ais.common.spatial_temporal_index import SpatialTemporalIndex
+from ion.services.coi.datastore_bootstrap.ion_preload_config import DATASET_RESOURCE_TYPE_ID, DATASOURCE_RESOURCE_TYPE_ID
+
+
+class FakeIdRef(object):
+
+    def __init__(self, key):
+        self.key = key
+
+
+class FakeResources(object):
+
+    def __init__(self, keys):
+        self.idrefs = [FakeIdRef(key) for key in keys]
+
+
+class FakeRepository(object):
+
+    def __init__(self):
+        self.persistent = True
+
+
+class FakeDSet(object):
+
+    def __init__(self, resID, version):
+        self.ResourceIdentity = resID
+        self.version = version
+        self.Repository = FakeRepository()
+
+
+class MetadataCacheWarmUpTest(unittest.TestCase):
+
+    def setUp(self):
+        cache = MetadataCache(Process())
+
+        # The metadata and the index are class attributes - give each test its own
+        cache._MetadataCache__metadata = {}
+        cache._MetadataCache__dSetIndex = SpatialTemporalIndex()
+
+        cache._MetadataCache__findResourcesOfType = self._find
+        cache._MetadataCache__putDSetMetadata = self._put
+        cache._MetadataCache__putDSourceMetadata = self._put
+
+        self.cache = cache
+        self.finds = {}
+        self.puts = []
+        self.versions = {}
+
+    def _find(self, resourceType):
+        d = defer.Deferred()
+        self.finds[resourceType] = d
+        return d
+
+    def _put(self, resID):
+        d = defer.Deferred()
+        self.puts.append((resID, d))
+        return d
+
+    def _load(self, resID):
+        """
+        Complete the oldest outstanding load of the given resource
+        """
+        for i, (key, d) in enumerate(self.puts):
+            if key == resID:
+                del self.puts[i]
+                version = self.versions.get(resID, 0) + 1
+                self.versions[resID] = version
+                self.cache._MetadataCache__metadata[resID] = {DSET:FakeDSet(resID, version)}
+                d.callback(None)
+                return
+        self.fail('No load outstanding for %s' % resID)
+
+    def _discover(self, dsets, dsources=()):
+        self.finds[DATASET_RESOURCE_TYPE_ID].callback(FakeResources(dsets))
+        self.finds[DATASOURCE_RESOURCE_TYPE_ID].callback(FakeResources(dsources))
+
+    def _result(self, d):
+        results = []
+        d.addCallback(results.append)
+        self.assertEqual(len(results), 1, 'The deferred has not fired')
+        return results[0]
+
+    def test_requests_wait_for_discovery_and_their_entry(self):
+        warm = self.cache.warmUp()
+
+        # Nothing is known yet - a request waits rather than reporting the entry missing
+        get_a = self.cache.getDSetMetadata('a')
+        self.assertEqual(get_a.called, False)
+
+        self._discover(['a', 'b'], ['s'])
+        self.assertEqual(get_a.called, False)
+
+        get_b = self.cache.getDSet('b')
+        get_s = self.cache.getDSourceMetadata('s')
+
+        # A loaded entry is served while the others are still loading
+        self._load('b')
+        self.assertEqual(self._result(get_b).ResourceIdentity, 'b')
+        self.assertEqual(get_a.called, False)
+        self.assertEqual(get_s.called, False)
+
+        self._load('a')
+        self.assertEqual(self._result(get_a)[DSET].ResourceIdentity, 'a')
+
+        self._load('s')
+        self.assertEqual(self._result(get_s)[DSET].ResourceIdentity, 's')
+
+        self.assertEqual(self._result(warm), True)
+        self.assertEqual(self.cache._MetadataCache__entryLocks, {})
+
+    def test_get_put_delete_of_one_entry_during_warmup(self):
+        warm = self.cache.warmUp()
+        self._discover(['a'])
+
+        # Issued while the warm-up holds the entry - they run one at a time in order
+        get1 = self.cache.getDSet('a')
+        put = self.cache.putDSetMetadata('a')
+        get2 = self.cache.getDSet('a')
+        delete = self.cache.deleteDSetMetadata('a')
+        get3 = self.cache.getDSet('a')
+
+        self._load('a')
+        self.assertEqual(self._result(get1).version, 1)
+        self.assertEqual(self._result(warm), True)
+
+        # The put holds the entry until its load completes
+        self.assertEqual(put.called, False)
+        self.assertEqual(get2.called, False)
+        self.assertEqual(delete.called, False)
+
+        self._load('a')
+        self._result(put)
+        self.assertEqual(self._result(get2).version, 2)
+        self.assertEqual(self._result(delete), True)
+        self.assertEqual(self._result(get3), None)
+
+        self.assertEqual(self.cache._MetadataCache__entryLocks, {})
+
+    def test_request_after_discovery_does_not_wait_for_other_entries(self):
+        self.cache.warmUp()
+        self._discover(['a'])
+
+        # An entry the warm-up did not find is not locked
+        get_c = self.cache.getDSet('c')
+        self.assertEqual(self._result(get_c), None)
+
+        # A delete of an entry which is still loading waits for the load
+        delete = self.cache.deleteDSetMetadata('a')
+        self.assertEqual(delete.called, False)
+        self._load('a')
+        self.assertEqual(self._result(delete), True)
+
+    def test_warmup_concurrency(self):
+        self.cache.warmUpConcurrency = 2
+        warm = self.cache.warmUp()
+        self._discover(['a', 'b', 'c', 'd', 'e'])
+
+        loaded = []
+        while self.puts:
+            self.assertEqual(len(self.puts) <= 2, True)
+            resID = self.puts[0][0]
+            self._load(resID)
+            loaded.append(resID)
+
+        self.assertEqual(sorted(loaded), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(self._result(warm), True)
+
+    def test_failed_load_releases_entry(self):
+        warm = self.cache.warmUp()
+        self._discover(['a'])
+
+        get_a = self.cache.getDSet('a')
+        resID, d = self.puts.pop(0)
+        d.errback(Exception('Load failed'))
+
+        self.assertEqual(self._result(get_a), None)
+        self.assertEqual(self._result(warm), True)
+        self.assertEqual(self.cache._MetadataCache__entryLocks, {})
+        self.flushLoggedErrors()
+
+    def test_failed_discovery(self):
+        warm = self.cache.warmUp()
+        get_a = self.cache.getDSet('a')
+
+        self.finds[DATASET_RESOURCE_TYPE_ID].callback(None)
+        self.finds[DATASOURCE_RESOURCE_TYPE_ID].callback(FakeResources([]))
+
+        # Waiting requests are released and the warm-up reports the failure
+        self.assertEqual(self._result(get_a), None)
+        self.assertEqual(self._result(warm), False)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/test/test_spatial_temporal_index.py
+@brief Test the spatial temporal index of the AIS metadata cache against a
+linear scan with SpatialTemporalBounds.isInBounds
+"""
+
+import random
+from decimal import Decimal
+
+from twisted.trial import unittest
+
+from ion.integration.ais.common.spatial_temporal_bounds import SpatialTemporalBounds
+from ion.integration.ais.common.spatial_temporal_index import SpatialTemporalIndex
+
+
+class FakeBoundsMessage(object):
+    """
+    Stand in for the bounds fields of an AIS request message
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def IsFieldSet(self, name):
+        return name in self.__dict__
+
+
+class SpatialTemporalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.metadata = {}
+        self.index = SpatialTemporalIndex()
+        for i in range(500):
+            self.metadata['dset_%d' % i] = self._makeMetadata()
+        for dSetID, dSetMetadata in self.metadata.iteritems():
+            self.index.add(dSetID, dSetMetadata)
+
+    def _makeTime(self):
+        return '%04d-%02d-%02dT00:00:00Z' % (random.randint(2000, 2010), random.randint(1, 12), random.randint(1, 28))
+
+    def _makeRange(self, low, high):
+        values = sorted([random.uniform(low, high), random.uniform(low, high)])
+        return Decimal(str(round(values[0], 2))), Decimal(str(round(values[1], 2)))
+
+    def _makeMetadata(self):
+        dSetMetadata = {}
+        dSetMetadata['ion_geospatial_lat_min'], dSetMetadata['ion_geospatial_lat_max'] = self._makeRange(-90, 90)
+        dSetMetadata['ion_geospatial_lon_min'], dSetMetadata['ion_geospatial_lon_max'] = self._makeRange(-180, 180)
+        dSetMetadata['ion_geospatial_vertical_min'], dSetMetadata['ion_geospatial_vertical_max'] = self._makeRange(0, 1000)
+        times = sorted([self._makeTime(), self._makeTime()])
+        if random.random() < 0.05:
+            # Some data sets have times which can not be parsed
+            times[0] = 'unknown'
+        dSetMetadata['ion_time_coverage_start'], dSetMetadata['ion_time_coverage_end'] = times
+        return dSetMetadata
+
+    def _makeBounds(self):
+        fields = {}
+        if random.random() < 0.7:
+            fields['minLatitude'], fields['maxLatitude'] = [float(v) for v in self._makeRange(-90, 90)]
+        if random.random() < 0.7:
+            fields['minLongitude'], fields['maxLongitude'] = [float(v) for v in self._makeRange(-180, 180)]
+        if random.random() < 0.5:
+            fields['minVertical'], fields['maxVertical'] = [float(v) for v in self._makeRange(0, 1000)]
+            fields['posVertical'] = random.choice(['up', 'down'])
+        if random.random() < 0.7:
+            fields['minTime'], fields['maxTime'] = sorted([self._makeTime(), self._makeTime()])
+
+        bounds = SpatialTemporalBounds()
+        bounds.loadBounds(FakeBoundsMessage(**fields))
+        return bounds
+
+    def _checkBounds(self, bounds):
+        expected = set([dSetID for dSetID, dSetMetadata in self.metadata.iteritems() if bounds.isInBounds(dSetMetadata)])
+
+        candidates = self.index.candidates(bounds)
+        if candidates is None:
+            candidates = set(self.metadata.keys())
+        found = set([dSetID for dSetID in candidates if bounds.isInBounds(self.metadata[dSetID])])
+
+        self.assertEqual(found, expected)
+        return len(candidates)
+
+    def test_candidates(self):
+        visited = 0
+        for i in range(100):
+            visited += self._checkBounds(self._makeBounds())
+
+        # The index should save visiting most of the data sets
+        self.assertTrue(visited < 100 * len(self.metadata) / 2)
+
+    def test_remove(self):
+        for i in range(250):
+            dSetID = 'dset_%d' % i
+            self.assertEqual(self.index.remove(dSetID), True)
+            del self.metadata[dSetID]
+        self.assertEqual(self.index.remove('dset_0'), False)
+        self.assertEqual(len(self.index), 250)
+        self.assertEqual('dset_0' in self.index, False)
+
+        # Replace the extent of some of the rest
+        for i in range(250, 300):
+            dSetID = 'dset_%d' % i
+            self.metadata[dSetID] = self._makeMetadata()
+            self.index.add(dSetID, self.metadata[dSetID])
+
+        for i in range(20):
+            self._checkBounds(self._makeBounds())
+
+    def test_unindexed_extent(self):
+        # Extents which can not be sorted are left to the bounds test
+        dSetMetadata = self._makeMetadata()
+        dSetMetadata['ion_geospatial_lat_min'] = Decimal('NaN')
+        dSetMetadata['ion_geospatial_lon_max'] = float('nan')
+        dSetMetadata['ion_geospatial_vertical_min'] = 'unknown'
+        self.index.add('dset_bad', dSetMetadata)
+        self.assertEqual('dset_bad' in self.index, True)
+
+        for fields in [{'minLatitude':-10.0, 'maxLatitude':10.0},
+                       {'minLongitude':-10.0, 'maxLongitude':10.0},
+                       {'minVertical':10.0, 'maxVertical':20.0, 'posVertical':'down'}]:
+            bounds = SpatialTemporalBounds()
+            bounds.loadBounds(FakeBoundsMessage(**fields))
+            self.assertEqual('dset_bad' in self.index.candidates(bounds), True)
+
+        self.assertEqual(self.index.remove('dset_bad'), True)
+        self.assertEqual(len(self.index), len(self.metadata))
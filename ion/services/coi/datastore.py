@@ -10,6 +10,11 @@ there but resource types are not...
 
 """
 import math
+import struct
+try:
+    import numpy
+except ImportError:
+    numpy = None
 from ion.core.object.object_utils import CDM_ARRAY_INT32_TYPE, CDM_ARRAY_INT64_TYPE, CDM_ARRAY_UINT64_TYPE, CDM_ARRAY_FLOAT32_TYPE, CDM_ARRAY_FLOAT64_TYPE, CDM_ARRAY_STRING_TYPE, CDM_ARRAY_OPAQUE_TYPE, CDM_ARRAY_UINT32_TYPE, ARRAY_STRUCTURE_TYPE
 from ion.util.cache import LRUDict
 
@@ -28,7 +33,7 @@ from types import FunctionType
 
 from ion.core.object import object_utils
 from ion.core.object import gpb_wrapper, repository
-from ion.core.object.workbench import WorkBench, WorkBenchError, PUSH_MESSAGE_TYPE, PULL_MESSAGE_TYPE, PULL_RESPONSE_MESSAGE_TYPE, BLOBS_REQUSET_MESSAGE_TYPE, REQUEST_COMMIT_BLOBS_MESSAGE_TYPE, BLOBS_MESSAGE_TYPE, GET_OBJECT_REQUEST_MESSAGE_TYPE, GET_OBJECT_REPLY_MESSAGE_TYPE, GPBTYPE_TYPE, DATA_REQUEST_MESSAGE_TYPE, DATA_REPLY_MESSAGE_TYPE, DATA_CHUNK_MESSAGE_TYPE
+from ion.core.object.workbench import WorkBench, WorkBenchError, PUSH_MESSAGE_TYPE, PULL_MESSAGE_TYPE, PULL_RESPONSE_MESSAGE_TYPE, BLOBS_REQUSET_MESSAGE_TYPE, REQUEST_COMMIT_BLOBS_MESSAGE_TYPE, BLOBS_MESSAGE_TYPE, GET_OBJECT_REQUEST_MESSAGE_TYPE, GET_OBJECT_REPLY_MESSAGE_TYPE, GPBTYPE_TYPE, DATA_REQUEST_MESSAGE_TYPE, DATA_REPLY_MESSAGE_TYPE, DATA_CHUNK_MESSAGE_TYPE, excluded_type_filter, pull_have_filter
 from ion.core.data import store
 from ion.core.data import cassandra
 #from ion.core.data import cassandra_bootstrap
@@ -69,6 +74,159 @@ RESOURCE_TYPE = object_utils.create_type_identifier(object_id=1102, version=1)
 
 CDM_BOUNDED_ARRAY_TYPE = object_utils.create_type_identifier(object_id=10021, version=1)
 
+# Child link index - stored next to each non leaf blob so that _get_blobs can follow links without loading the object
+# Each link is packed as a fixed header (key length, type object_id, type version, isleaf) followed by the key
+CHILD_LINK_FORMAT = '!HiiB'
+CHILD_LINK_SIZE = struct.calcsize(CHILD_LINK_FORMAT)
+
+class LinkTypeRef(object):
+    """
+    Light weight stand in for the GPBType of a link read from a child link index
+    """
+    __slots__ = ('object_id', 'version')
+
+    def __init__(self, object_id, version):
+        self.object_id = object_id
+        self.version = version
+
+class ChildLinkRef(object):
+    """
+    Light weight stand in for a link read from a child link index
+    """
+    __slots__ = ('key', 'type', 'isleaf')
+
+    def __init__(self, key, type, isleaf):
+        self.key = key
+        self.type = type
+        self.isleaf = isleaf
+
+def pack_child_links(links):
+    """
+    @brief Encode the child links of an object as a compact index
+    @param links an iterable of link wrappers or ChildLinkRef objects
+    @retval a string
+    """
+    parts = []
+    for link in links:
+        key = link.key
+        parts.append(struct.pack(CHILD_LINK_FORMAT, len(key), link.type.object_id, link.type.version, bool(link.isleaf)))
+        parts.append(key)
+    return ''.join(parts)
+
+def unpack_child_links(index):
+    """
+    @brief Decode a child link index created by pack_child_links
+    @param index a string
+    @retval a list of ChildLinkRef objects
+    """
+    links = []
+    offset = 0
+    end = len(index)
+    while offset < end:
+        keylen, object_id, version, isleaf = struct.unpack_from(CHILD_LINK_FORMAT, index, offset)
+        offset += CHILD_LINK_SIZE
+        links.append(ChildLinkRef(index[offset:offset + keylen], LinkTypeRef(object_id, version), bool(isleaf)))
+        offset += keylen
+    if offset != end:
+        raise DataStoreWorkBenchError('Invalid child link index - truncated link entry')
+    return links
+
+# Extraction engines for op_extract_data - numpy requires the numpy package, legacy is the pure python strip copier
+EXTRACT_ENGINE_NUMPY = 'numpy'
+EXTRACT_ENGINE_LEGACY = 'legacy'
+
+# numpy dtype for each ndarray type - string and opaque arrays are held as python objects
+EXTRACT_DTYPES = {CDM_ARRAY_INT32_TYPE.object_id:'int32',
+                  CDM_ARRAY_UINT32_TYPE.object_id:'uint32',
+                  CDM_ARRAY_INT64_TYPE.object_id:'int64',
+                  CDM_ARRAY_UINT64_TYPE.object_id:'uint64',
+                  CDM_ARRAY_FLOAT32_TYPE.object_id:'float32',
+                  CDM_ARRAY_FLOAT64_TYPE.object_id:'float64',
+                  CDM_ARRAY_STRING_TYPE.object_id:'object',
+                  CDM_ARRAY_OPAQUE_TYPE.object_id:'object'}
+
+def extract_target_shape(sizes, strides):
+    """
+    @brief The shape of an extraction result
+    As in the legacy engine, a dimension has floor(size / stride) entries, so when the size is not a multiple
+    of the stride the last index the stride would select is dropped.
+    @param sizes the requested size in each dimension
+    @param strides the stride in each dimension
+    @retval a list with the number of selected indices in each dimension
+    """
+    return [size // stride for size, stride in zip(sizes, strides)]
+
+def extract_strided_slices(target_range, src_range, strides, targetshape):
+    """
+    @brief Convert the intersection of a bounded array with a request into a pair of slice tuples
+    @param target_range a list of (start, end) tuples per dimension relative to the request origin
+    @param src_range a list of (start, end) tuples per dimension relative to the bounded array origin
+    @param strides the stride in each dimension - indices are selected relative to the request origin
+    @param targetshape the shape of the extraction result, from extract_target_shape
+    @retval a tuple (target slices, source slices), or None if the stride selects nothing in this bounded array
+    """
+    target_slices = []
+    src_slices = []
+    for (tstart, tend), (sstart, send), stride, extent in zip(target_range, src_range, strides, targetshape):
+        # first and last indices selected by the stride within the intersection and the result
+        first = -(-tstart // stride)
+        last = min((tend - 1) // stride, extent - 1)
+        if first > last:
+            return None
+        target_slices.append(slice(first, last + 1))
+        src_slices.append(slice(sstart + first * stride - tstart, sstart + last * stride - tstart + 1, stride))
+    return tuple(target_slices), tuple(src_slices)
+
+def extract_slabs(targetshape, chunk_size):
+    """
+    @brief Split an extraction result into slabs of whole rows of the first dimension
+    Each slab holds at most chunk_size elements, or a single row if a row is larger than that.
+    @param targetshape the shape of the extraction result
+    @param chunk_size the number of elements per chunk
+    @retval a list of (first row, end row) tuples
+    """
+    if len(targetshape) == 0:
+        return [(0, 1)]
+    row_size = reduce(lambda x, y: x*y, targetshape[1:], 1)
+    if row_size == 0:
+        return []
+    rows = max(1, chunk_size // row_size)
+    return [(start, min(start + rows, targetshape[0])) for start in xrange(0, targetshape[0], rows)]
+
+def extract_clip_slices(target_slices, src_slices, start, end):
+    """
+    @brief Restrict a pair of slice tuples from extract_strided_slices to the rows of a slab
+    @param target_slices the target slices, relative to the whole result
+    @param src_slices the source slices
+    @param start the first row of the slab
+    @param end the end row of the slab
+    @retval a tuple (target slices, source slices) relative to the slab, or None if they miss the slab
+    """
+    if len(target_slices) == 0:
+        return target_slices, src_slices
+    tslice = target_slices[0]
+    sslice = src_slices[0]
+    first = max(tslice.start, start)
+    last = min(tslice.stop, end)
+    if first >= last:
+        return None
+    stride = sslice.step
+    src_start = sslice.start + (first - tslice.start) * stride
+    src_stop = sslice.start + (last - 1 - tslice.start) * stride + 1
+    return ((slice(first - start, last - start),) + target_slices[1:],
+            (slice(src_start, src_stop, stride),) + src_slices[1:])
+
+def extract_chunks(target, chunk_size):
+    """
+    @brief Generate fixed size chunks of the flattened extraction result
+    @param target the numpy result array
+    @param chunk_size the number of elements per chunk
+    @retval yields (start index, list of values)
+    """
+    flat = target.reshape(-1)
+    for start in xrange(0, flat.size, chunk_size):
+        yield start, flat[start:start + chunk_size].tolist()
+
 class NDArrayWrap(object):
     """
     Helper object which wraps an ndarray GPB object.
@@ -91,7 +249,9 @@ class NDArrayWrap(object):
         self._getblobs = getblobs
 
         self._ndarray = None
-        self._size = reduce(lambda x,y:x*y, [x.size for x in bounds]) * itembytes
+        self._array = None
+        self._shape = [x.size for x in bounds]
+        self._size = reduce(lambda x,y:x*y, self._shape, 1) * itembytes
 
     def __sizeof__(self):
         """
@@ -125,6 +285,20 @@ class NDArrayWrap(object):
 
     value = property(_get_value)
 
+    @defer.inlineCallbacks
+    def get_array(self, dtype):
+        """
+        Loads/retrieves the ndarray as a numpy array shaped to the bounds of the bounded array.
+        The wrapped GPB object is released once it has been converted.
+        """
+        if self._array is None:
+            value = yield self.value
+            self._array = numpy.array(value[:], dtype=dtype).reshape(self._shape)
+            self._ndarray = None
+            self.clear()
+
+        defer.returnValue(self._array)
+
 class NDArrayLRUDict(LRUDict):
     """
     Custom least-recently-used dictionary cache object for holding NDarrays.
@@ -148,16 +322,38 @@ class NDArrayLRUDict(LRUDict):
         Even if the ndarray is actually too large to store in the cache, it will still give you
         back the ndarray object to work with this one time.
         """
-        if not self.has_key(key):
-            ndarray = NDArrayWrap(key, self._repo, bounds, itembytes, getblobs)
-            self[key] = ndarray
-            log.debug("LRUDict loading, item size %d, lru now %d items %d bytes total" % (ndarray._size, len(self.keys()), self.total_size))
-        else:
-            ndarray = self.get(key)
+        ndarray = self._get_wrap(key, bounds, itembytes, getblobs)
 
-        value = yield ndarray.value
+        # Pin the entry so that it is not evicted while it loads
+        self.pin(key)
+        try:
+            value = yield ndarray.value
+        finally:
+            self.unpin(key)
         defer.returnValue(value)
 
+    @defer.inlineCallbacks
+    def get_ndarray_array(self, key, bounds, itembytes, getblobs, dtype):
+        """
+        Gets an ndarray as a numpy array, see get_ndarray_value.
+        """
+        ndarray = self._get_wrap(key, bounds, itembytes, getblobs)
+
+        self.pin(key)
+        try:
+            array = yield ndarray.get_array(dtype)
+        finally:
+            self.unpin(key)
+        defer.returnValue(array)
+
+    def _get_wrap(self, key, bounds, itembytes, getblobs):
+        ndarray = self.get(key)
+        if ndarray is None:
+            ndarray = NDArrayWrap(key, self._repo, bounds, itembytes, getblobs)
+            self.set(key, ndarray, ndarray._size)
+            log.debug("LRUDict loading, item size %d, lru now %d items %d bytes total" % (ndarray._size, len(self), self.total_size))
+        return ndarray
+
 class DataStoreWorkBenchError(WorkBenchError):
     """
     An Exception class for errors in the data store workbench
@@ -173,6 +369,20 @@ class DataStoreWorkbench(WorkBench):
         self._blob_store = blob_store
         self._commit_store = commit_store
 
+        self._blob_batch_size = max(1, int(CONF.getValue('blob_batch_size', 200)))
+        self._blob_pipeline_depth = max(1, int(CONF.getValue('blob_pipeline_depth', 4)))
+
+        self._push_fetch_batch_keys = max(1, int(CONF.getValue('push_fetch_batch_keys', 1000)))
+
+        # Keep a child link index next to each blob if the store supports it
+        self._link_index = store.ILinkIndexStore.providedBy(blob_store)
+
+        self._extract_engine = CONF.getValue('extract_engine', EXTRACT_ENGINE_NUMPY)
+        if self._extract_engine == EXTRACT_ENGINE_NUMPY and numpy is None:
+            log.warn('The numpy package is not available - using the legacy extract_data engine')
+            self._extract_engine = EXTRACT_ENGINE_LEGACY
+        self._extract_chunk_size = int(CONF.getValue('extract_chunk_size', 15000))
+
 
     def pull(self, *args, **kwargs):
 
@@ -182,68 +392,198 @@ class DataStoreWorkbench(WorkBench):
 
         raise NotImplementedError("The Datastore Service can not Push")
 
-    @defer.inlineCallbacks
     def _get_blobs(self, repo, startkeys, filtermethod=None):
         """
         Common blob fetching helper method.
         Used by checkout and pull.
 
+        Missing keys are fetched from the blob store in batches of at most blob_batch_size keys with at most
+        blob_pipeline_depth batches in flight. Links from each batch are followed as soon as it arrives. If the
+        blob store keeps a child link index the links are read from it rather than by loading each object.
+
         @param  repo            Repository for the response.
         @param  startkeys       The keys that should start the fetching process.
         @param  filtermethod    A callable to be applied to all children of fetched items. If the callable returns true,
                                 the item is included.
 
-        @returns                A dictionary of keys => blobs.
+        @returns                A deferred which fires with a dictionary of keys => blobs.
         """
-        # Slightly different machinary here than in the workbench - Could be made more similar?
         blobs={}
-        keys_to_get=set(startkeys)
         def_filter = lambda x: True
         filtermethod = filtermethod or def_filter
 
-        while len(keys_to_get) > 0:
-            new_links_to_get = set()
+        seen = set()
+        pending = []
+        finished = defer.Deferred()
+        state = {'in_flight':0, 'launching':False}
+
+        def visit(keys):
+            # Use a stack rather than recursion - elements already in the repository are followed immediately
+            stack = list(keys)
+            while stack:
+                key = stack.pop()
+                if key in seen:
+                    continue
+                seen.add(key)
 
-            def_list = []
-            #@TODO - put some error checking here so that we don't overflow due to a stupid request!
-            for key in keys_to_get:
-                # Short cut if we have already got it!
                 wse = repo.index_hash.get(key)
+                if wse is None:
+                    pending.append(key)
+                    continue
 
-                if wse:
-                    blobs[wse.key]=wse
-                    # get the object
+                blobs[wse.key]=wse
+                if not wse.isleaf:
+                    # get the object so we can find its children
                     obj = repo._load_element(wse)
+                    stack.extend(link.key for link in obj.ChildLinks if filtermethod(link))
+
+        def launch():
+            # Guard against re-entry when a store fires its deferred synchronously
+            if state['launching'] or finished.called:
+                return
+            state['launching'] = True
+            try:
+                # Stop issuing batches as soon as one has failed - a store may errback synchronously
+                while pending and state['in_flight'] < self._blob_pipeline_depth and not finished.called:
+                    batch = pending[:self._blob_batch_size]
+                    del pending[:self._blob_batch_size]
+
+                    state['in_flight'] += 1
+                    d = self._fetch_blob_batch(batch)
+                    d.addCallback(received, batch)
+                    d.addErrback(failed)
+            finally:
+                state['launching'] = False
+
+            if state['in_flight'] == 0 and not pending and not finished.called:
+                finished.callback(blobs)
+
+        def received(result, batch):
+            state['in_flight'] -= 1
+            if finished.called:
+                # An earlier batch failed - drop the late results
+                return
+            values, link_index = result
+
+            children = []
+            for key in batch:
+                blob = values.get(key)
+                if blob is None:
+                    raise DataStoreWorkBenchError('Blob not found in the blob store: %s' % object_utils.sha1_to_hex(key))
 
-                    # only add new items to get if they meet our criteria, meaning they are not in the excluded type list
-                    new_links_to_get.update(obj.ChildLinks)
-                else:
-                    def_list.append(self._blob_store.get(key))
-
-
-            result_list = []
-            if def_list:
-                result_list = yield defer.DeferredList(def_list)
-
-            for result, blob in result_list:
-                assert result==True, 'Error getting link from blob store!'
                 wse = gpb_wrapper.StructureElement.parse_structure_element(blob)
                 blobs[wse.key]=wse
 
                 # Add it to the repository index
                 repo.index_hash[wse.key] = wse
 
-                # load the object so we can find its children
-                obj = repo._load_element(wse)
+                if wse.isleaf:
+                    continue
+
+                index = link_index.get(key)
+                if index is not None:
+                    links = unpack_child_links(index)
+                    wse.ChildLinks.update(link.key for link in links)
+                else:
+                    # No index for this blob - load the object so we can find its children
+                    links = repo._load_element(wse).ChildLinks
+
+                children.extend(link.key for link in links if filtermethod(link))
+
+            visit(children)
+            launch()
+
+        def failed(reason):
+            if not finished.called:
+                pending[:] = []
+                finished.errback(reason)
+
+        visit(startkeys)
+        launch()
+
+        return finished
+
+    def _fetch_blob_batch(self, keys):
+        """
+        Get a batch of blobs and their child link indices from the blob store
+        @param keys a list of blob keys
+        @retval a deferred which fires with a tuple of dictionaries (values, link index)
+        """
+        def_list = [self._blob_store.multi_get(keys)]
+        if self._link_index:
+            def_list.append(self._blob_store.multi_get_child_links(keys))
 
-                new_links_to_get.update(obj.ChildLinks)
+        def gather(result_list):
+            values = result_list[0][1]
+            link_index = result_list[1][1] if len(result_list) > 1 else {}
+            return values, link_index
 
-            keys_to_get.clear()
-            for link in new_links_to_get:
-                if not blobs.has_key(link.key) and filtermethod(link):
-                    keys_to_get.add(link.key)
+        d = defer.DeferredList(def_list, fireOnOneErrback=True, consumeErrors=True)
+        d.addCallback(gather)
+        return d
 
-        defer.returnValue(blobs)
+    def _put_blobs(self, elements):
+        """
+        Put blobs in the blob store in a single batch along with the index of their child links
+        @param elements a list of (repository, structure element) tuples - the repository is used to find the child links
+        @retval a deferred for the success of the put
+        """
+        items = {}
+        child_links = {}
+        for repo, element in elements:
+            if element.key in items:
+                continue
+
+            items[element.key] = element.serialize()
+
+            if self._link_index and not element.isleaf:
+                obj = repo._load_element(element)
+                child_links[element.key] = pack_child_links(obj.ChildLinks)
+
+        if self._link_index:
+            return self._blob_store.multi_put(items, child_links)
+        return self._blob_store.multi_put(items)
+
+    def _fetch_push_blobs(self, address, keys):
+        """
+        Fetch the blobs needed for a push from the pushing process in messages of at most push_fetch_batch_keys keys
+        @param address the reply-to address of the push
+        @param keys a set of keys to fetch
+        @retval a deferred which fires with a dictionary of key to structure element
+        """
+        return self._fetch_push_blob_batches(address, list(keys))
+
+    @defer.inlineCallbacks
+    def _fetch_push_blob_batches(self, address, keys):
+        elements = {}
+
+        # Blobs held by other processes in the container need not be sent again
+        if self._blob_intern is not None:
+            remote_keys = []
+            for key in keys:
+                element = self._blob_intern.peek(key)
+                if element is None:
+                    remote_keys.append(key)
+                else:
+                    elements[key] = element
+            keys = remote_keys
+
+        for start in xrange(0, len(keys), self._push_fetch_batch_keys):
+            blobs_request = yield self._process.message_client.create_instance(BLOBS_REQUSET_MESSAGE_TYPE)
+            blobs_request.blob_keys.extend(keys[start:start + self._push_fetch_batch_keys])
+
+            try:
+                blobs_msg = yield self.fetch_blobs(address, blobs_request)
+            except ReceivedError, re:
+
+               log.debug('ReceivedError', str(re))
+               raise DataStoreWorkBenchError('Fetch Objects returned an exception! "%s"' % re.msg_content)
+
+            for se in blobs_msg.blob_elements:
+                element = gpb_wrapper.StructureElement(se.GPBMessage)
+                elements[element.key] = element
+
+        defer.returnValue(elements)
 
     @defer.inlineCallbacks
     def _resolve_repo_state(self, repository_key, fail_if_not_found=True):
@@ -383,15 +723,17 @@ class DataStoreWorkbench(WorkBench):
             keys = [x.GetLink('objectroot').key for x in repo.current_heads()]
 
 
-            def filtermethod(x):
-                """
-                Returns true if the passed in link's type is not in the excluded_types list of the passed in message.
-                """
-                return (x.type not in request.excluded_types)
+            filtermethod = excluded_type_filter(request.excluded_types)
 
             blobs = yield self._get_blobs(response.Repository, keys, filtermethod)
 
+            # Leave out what the puller already has - if the filter is wrong it will fetch the blob on checkout
+            have = pull_have_filter(headers)
+
             for element in blobs.values():
+                if have is not None and element.key in have:
+                    continue
+
                 link = response.blob_elements.add()
                 obj = response.Repository._wrap_message_object(element._element)
 
@@ -419,7 +761,11 @@ class DataStoreWorkbench(WorkBench):
         new_commits={}
 
         # A list of the blobs received - does not matter what repo they are in - just jam them into the store
-        new_blob_keys =[]
+        new_blobs =[]
+
+        # The keys each repository needs from the pushing process, and the union of them
+        repo_needs = []
+        all_need_keys = set()
 
 
         for repostate in pushmsg.repositories:
@@ -522,32 +868,33 @@ class DataStoreWorkbench(WorkBench):
                 result_blob_list = yield defer.DeferredList(def_blob_list)
 
                 # Remove
-                for key, res1, have_blob, res2, have_commit in zip(key_list, result_blob_list, result_commit_list):
+                for key, (res1, have_blob), (res2, have_commit) in zip(key_list, result_blob_list, result_commit_list):
 
                     if have_blob or have_commit:
                         need_keys.remove(key)
 
-            if len(need_keys) > 0:
-                blobs_request = yield self._process.message_client.create_instance(BLOBS_REQUSET_MESSAGE_TYPE)
-                blobs_request.blob_keys.extend(need_keys)
+            repo_needs.append((repo, repostate, need_keys))
+            all_need_keys.update(need_keys)
 
-                try:
-                    blobs_msg = yield self.fetch_blobs(headers.get('reply-to'), blobs_request)
-                except ReceivedError, re:
+        # Fetch the blobs needed by all the repositories in the push at once - shared blobs are only fetched once
+        elements = {}
+        if all_need_keys:
+            elements = yield self._fetch_push_blobs(headers.get('reply-to'), all_need_keys)
 
-                   log.debug('ReceivedError', str(re))
-                   raise DataStoreWorkBenchError('Fetch Objects returned an exception! "%s"' % re.msg_content)
+        for repo, repostate, need_keys in repo_needs:
 
+            for key in need_keys:
+                element = elements.get(key)
+                if element is None:
+                    raise DataStoreWorkBenchError('Fetch Objects did not return a required blob!', pushmsg.ResponseCodes.NOT_FOUND)
 
-                for se in blobs_msg.blob_elements:
-                    # Put the new objects in the repository
-                    element = gpb_wrapper.StructureElement(se.GPBMessage)
-                    repo.index_hash[element.key] = element
+                # Put the new objects in the repository
+                repo.index_hash[element.key] = element
 
-                    if element.type == COMMIT_TYPE:
-                        new_commits[repo.repository_key].append(element.key)
-                    else:
-                        new_blob_keys.append(element.key)
+                if element.type == COMMIT_TYPE:
+                    new_commits[repo.repository_key].append(element.key)
+                else:
+                    new_blobs.append((repo, element))
 
 
             # Move over the new head object
@@ -559,25 +906,17 @@ class DataStoreWorkbench(WorkBench):
             # Now merge the state!
             self._update_repo_to_head(repo,new_head)
 
-        # Put any new blobs
-        def_list = []
-        for key in new_blob_keys:
-
-            element = self._workbench_cache.get(key)
+        # Put any new blobs in one batch
+        if new_blobs:
+            yield self._put_blobs(new_blobs)
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
-        yield defer.DeferredList(def_list)
-        # @TODO - check the results - for what?
 
+        # now put all the new commits, heads and head updates in one batch
+        commit_items = {}
+        commit_attributes = {}
 
-        # now put any new commits that are not at the head
-        def_list = []
-
-        # list of the keys which are no longer heads
-        clear_head_list=[]
-
-        # list of the new heads to push at the same time
-        new_head_list=[]
+        # the keys which are no longer heads
+        clear_heads = {}
         for repo_key, commit_keys in new_commits.items():
             # Get the updated repository
             repo = self.get_repository(repo_key)
@@ -640,15 +979,10 @@ class DataStoreWorkbench(WorkBench):
                 # get the wrapped structure element to put in...
                 wse = self._workbench_cache.get(key)
 
+                commit_items[key] = wse.serialize()
+                commit_attributes[key] = attributes
 
-                if key not in head_keys:
-
-                    defd = self._commit_store.put(key = key,
-                                       value = wse.serialize(),
-                                       index_attributes = attributes)
-                    def_list.append(defd)
-
-                else:
+                if key in head_keys:
 
                     # We know it is a head - but we need to get the branch name again
                     for branch in  repo.branches:
@@ -660,10 +994,6 @@ class DataStoreWorkbench(WorkBench):
                             else:
                                 attributes[BRANCH_NAME] = ','.join([attributes[BRANCH_NAME],branch.branchkey])
 
-
-
-                    new_head_list.append({'key':key, 'value':wse.serialize(), 'index_attributes':attributes})
-
             # Get the current head list
             q = Query()
             q.add_predicate_eq(REPOSITORY_KEY, repo_key)
@@ -673,28 +1003,12 @@ class DataStoreWorkbench(WorkBench):
 
             for key, columns in rows.items():
                 if key not in head_keys:
-                    clear_head_list.append(key)
-
                     # Any commit which is currently a head will have the correct branch names set.
                     # Just delete the branch names for the ones that are no longer heads.
+                    clear_heads[key] = {BRANCH_NAME:''}
 
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
-
-        def_list = []
-        for new_head in new_head_list:
-
-            def_list.append(self._commit_store.put(**new_head))
-
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
-
-        def_list = []
-        for key in clear_head_list:
-
-            def_list.append(self._commit_store.update_index(key=key, index_attributes={BRANCH_NAME:''}))
-
-        yield defer.DeferredList(def_list)
+        if commit_items or clear_heads:
+            yield self._commit_store.multi_put(commit_items, commit_attributes, clear_heads)
 
         #import pprint
         #print 'After update to heads'
@@ -803,9 +1117,10 @@ class DataStoreWorkbench(WorkBench):
 
         # This is simpler than a push - all of these are guaranteed to be new objects!
         def_list = []
-        for key, element in repo.index_hash.items():
+        def_list.append(self._put_blobs([(repo, element) for element in repo.index_hash.values()]))
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
+        commit_items = {}
+        commit_attributes = {}
 
 
         # any objects in the data structure that were transmitted have already
@@ -860,15 +1175,10 @@ class DataStoreWorkbench(WorkBench):
             # get the wrapped structure element to put in...
             wse = self._workbench_cache.get(key)
 
+            commit_items[key] = wse.serialize()
+            commit_attributes[key] = attributes
 
-            if key not in head_keys:
-
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
-
-            else:
+            if key in head_keys:
 
                 # We know it is a head - but we need to get the branch name again
                 for branch in  repo.branches:
@@ -880,12 +1190,8 @@ class DataStoreWorkbench(WorkBench):
                         else:
                             attributes[BRANCH_NAME] = ','.join([attributes[BRANCH_NAME],branch.branchkey])
 
-
-                # Now commit it!
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
+        # Now commit them all at once!
+        def_list.append(self._commit_store.multi_put(commit_items, commit_attributes))
         return defer.DeferredList(def_list)
 
 
@@ -1039,6 +1345,13 @@ class DataStoreWorkbench(WorkBench):
         CHUNK_FACTOR = 15000 #LRU_DICT_LIMIT / ITEM_SIZE       # chunk factor is expressed in # of items, not bytes
         log.debug("LRU Cache Limit set at %d bytes, CHUNK_FACTOR is %d elements" % (LRU_DICT_LIMIT, CHUNK_FACTOR))
 
+        if self._extract_engine == EXTRACT_ENGINE_NUMPY:
+            yield self._extract_data_numpy(request, bounded_includes_list, ITEM_SIZE, LRU_DICT_LIMIT, repo)
+
+            self._process.reply_ok(message, response)
+            log.info("/op_extract_data")
+            return
+
         # ===================================================================
         # STEP 2: Compress/Optimize bounded_includes_list for overlap
         # ===================================================================
@@ -1209,10 +1522,107 @@ class DataStoreWorkbench(WorkBench):
 
             # send this message to the passed in routing key
             yield self._send_data_chunk(request.data_routing_key, chunkmsg)
-            
+
+        log.debug("Extract data ndarray cache stats: %s" % ndarray_cache.stats())
+
         self._process.reply_ok(message, response)
         log.info("/op_extract_data")
         
+    @defer.inlineCallbacks
+    def _extract_data_numpy(self, request, bounded_includes_list, itembytes, cache_limit, repo):
+        """
+        Numpy extraction engine for op_extract_data. Each matching bounded array is viewed as an array of its
+        bounds and copied into the result with a single strided slice. The result is built and sent one slab of
+        rows at a time, in chunks of at most extract_chunk_size elements, so memory use is bounded by the chunk
+        size rather than the size of the request.
+
+        @param  request                 The DataRequestMessage.
+        @param  bounded_includes_list   A list of (bounded array, target range, source range) tuples.
+        @param  itembytes               Number of bytes per item, used to size the ndarray cache.
+        @param  cache_limit             The size of the ndarray cache in bytes.
+        @param  repo                    The repository to load the ndarrays into.
+        """
+        if len(bounded_includes_list) == 0:
+            return
+
+        strides = [x.stride or 1 for x in request.request_bounds]
+        targetshape = extract_target_shape([x.size for x in request.request_bounds], strides)
+
+        ndarray_type = bounded_includes_list[0][0].GetLink('ndarray').type
+        dtype = EXTRACT_DTYPES.get(ndarray_type.object_id, 'object')
+
+        # Convert the intersections to slices once, ordered by their first row in the result
+        slice_list = []
+        for ba, target_range, src_range in bounded_includes_list:
+            slices = extract_strided_slices(target_range, src_range, strides, targetshape)
+            if slices is not None:
+                slice_list.append((ba, slices[0], slices[1]))
+        if targetshape:
+            slice_list.sort(key=lambda item: item[1][0].start)
+
+        # Only one slab of the result is held in memory at a time, as in the legacy engine
+        slabs = extract_slabs(targetshape, self._extract_chunk_size)
+        row_size = reduce(lambda x, y: x*y, targetshape[1:], 1)
+        seq_max = 0
+        for start, end in slabs:
+            seq_max += ((end - start) * row_size + self._extract_chunk_size - 1) // self._extract_chunk_size
+        log.debug("Numpy extraction: result shape %s, %d slabs, %d chunks" % (targetshape, len(slabs), seq_max))
+
+        ndarray_cache = NDArrayLRUDict(cache_limit, repo)
+
+        # Converted arrays are held until the last slab that reads them, so an array larger than the cache
+        # is not evicted and converted again for every slab it spans
+        in_use = {}
+
+        seq_number = 0
+        for start, end in slabs:
+            slabshape = [end - start] + targetshape[1:] if targetshape else []
+            target = numpy.empty(slabshape, dtype=dtype)
+            filled = numpy.zeros(slabshape, dtype=bool)
+
+            for ba, target_slices, src_slices in slice_list:
+                if targetshape and target_slices[0].start >= end:
+                    break
+                clipped = extract_clip_slices(target_slices, src_slices, start, end)
+                if clipped is None:
+                    continue
+
+                key = ba.GetLink('ndarray').key
+                source = in_use.get(key)
+                if source is None:
+                    source = yield ndarray_cache.get_ndarray_array(key, ba.bounds, itembytes, self._get_blobs, dtype)
+                    in_use[key] = source
+
+                target[clipped[0]] = source[clipped[1]]
+                filled[clipped[0]] = True
+
+            if targetshape:
+                for ba, target_slices, src_slices in slice_list:
+                    if target_slices[0].start >= end:
+                        break
+                    if target_slices[0].stop <= end:
+                        in_use.pop(ba.GetLink('ndarray').key, None)
+
+            if not filled.all():
+                raise DataStoreWorkBenchError("Data extraction did not properly fill in all members of response ndarray!")
+
+            for offset, values in extract_chunks(target, self._extract_chunk_size):
+
+                chunkmsg = yield self._process.message_client.create_instance(DATA_CHUNK_MESSAGE_TYPE)
+                chunkmsg.seq_number = seq_number
+                chunkmsg.seq_max = seq_max
+                chunkmsg.start_index = start * row_size + offset
+                chunkmsg.done = seq_number == seq_max - 1
+
+                chunkndarray = chunkmsg.CreateObject(ndarray_type)
+                chunkndarray.value.extend(values)
+                chunkmsg.ndarray = chunkndarray
+
+                yield self._send_data_chunk(request.data_routing_key, chunkmsg)
+                seq_number += 1
+
+        log.debug("Extract data ndarray cache stats: %s" % ndarray_cache.stats())
+
     @defer.inlineCallbacks
     def _send_data_chunk(self, data_routing_key, chunkmsg):
         """
@@ -1352,11 +1762,7 @@ class DataStoreWorkbench(WorkBench):
 
         link = commit.GetLink('objectroot')
 
-        def filtermethod(x):
-            """
-            Returns true if the passed in link's type is not in the excluded_object_types list of the passed in message.
-            """
-            return x.type not in request.excluded_object_types
+        filtermethod = excluded_type_filter(request.excluded_object_types)
 
         # get blobs, update into response repository so we don't have to copy
         blobs = yield self._get_blobs(response.Repository, [link.key], filtermethod)
@@ -24,6 +24,7 @@ from ion.test.iontest import IonTestCase
 
 from ion.core.object import object_utils
 from ion.core.object import workbench
+from ion.core.object import repository
 
 from ion.core.data import cassandra_bootstrap
 from ion.core.data import storage_configuration_utility
@@ -33,7 +34,8 @@ from ion.core.data.storage_configuration_utility import BLOB_CACHE, COMMIT_CACHE
 
 from telephus.cassandra.ttypes import InvalidRequestException
 
-from ion.services.coi.datastore import ION_DATASETS_CFG, PRELOAD_CFG, ID_CFG, DataStoreClient, CDM_BOUNDED_ARRAY_TYPE
+from ion.services.coi import datastore
+from ion.services.coi.datastore import ION_DATASETS_CFG, PRELOAD_CFG, ID_CFG, DataStoreClient, CDM_BOUNDED_ARRAY_TYPE, unpack_child_links
 # Pick three to test existence
 from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_A_ID, DATASET_RESOURCE_TYPE_ID, ROOT_USER_ID, NAME_CFG, CONTENT_ARGS_CFG, PREDICATE_CFG, ION_RESOURCE_TYPES_CFG, ION_PREDICATES_CFG, ION_IDENTITIES_CFG
 
@@ -143,6 +145,51 @@ class DataStoreTest(IonTestCase):
         log.info('DataStore1 Push addressbook to DataStore1: complete')
 
 
+    @defer.inlineCallbacks
+    def test_push_many(self):
+
+        repo_keys = [self.repo_key]
+        for i in range(3):
+            repo = self.wb1.workbench.create_repository(person_type)
+            repo.root_object.name = 'Person %d' % i
+            repo.root_object.id = i
+            repo.commit()
+            repo_keys.append(repo.repository_key)
+
+        repos = [self.wb1.workbench.get_repository(key) for key in repo_keys]
+
+        # All in one message
+        result = yield self.wb1.workbench.push('datastore', repos)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # Commit again and push with a batch limit that forces a message per repository
+        for i, repo in enumerate(repos[1:]):
+            repo.root_object.email = 'p%d@s.com' % i
+            repo.commit()
+
+        result = yield self.wb1.workbench.push('datastore', repos, max_batch_keys=1)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        self.wb1.workbench.clear()
+        self.ds1.workbench.clear()
+
+        for i, key in enumerate(repo_keys[1:]):
+            result = yield self.wb1.workbench.pull('datastore', key)
+            self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+            repo = self.wb1.workbench.get_repository(key)
+            person = yield repo.checkout('master')
+            self.assertEqual(person.name, 'Person %d' % i)
+            self.assertEqual(person.email, 'p%d@s.com' % i)
+
+        result = yield self.wb1.workbench.pull('datastore', self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        repo = self.wb1.workbench.get_repository(self.repo_key)
+        ab = yield repo.checkout('master')
+        self.assertEqual(ab.title,'Datastore Addressbook')
+
+
     @defer.inlineCallbacks
     def test_existence(self):
 
@@ -173,6 +220,65 @@ class DataStoreTest(IonTestCase):
         self.assertEqual(is_there,True)
 
 
+    @defer.inlineCallbacks
+    def test_child_link_index(self):
+
+        result = yield self.wb1.workbench.push_by_name('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        blob_store = self.ds1.workbench._blob_store
+        repo = self.wb1.workbench.get_repository(self.repo_key)
+
+        # Every non leaf blob that was pushed has an index of its child links
+        for key, element in repo.index_hash.iteritems():
+            if element.isleaf or element.type.object_id == repository.COMMIT_TYPE.object_id:
+                continue
+
+            links = yield blob_store.multi_get_child_links([key])
+            self.assertNotEqual(links[key], None)
+
+            obj = repo._load_element(element)
+            self.assertEqual(set(link.key for link in unpack_child_links(links[key])),
+                             set(link.key for link in obj.ChildLinks))
+
+        # Fetch using the index with a batch size that forces several round trips
+        self.ds1.workbench._blob_batch_size = 1
+        self.wb1.workbench.clear()
+        self.ds1.workbench.clear()
+
+        result = yield self.wb1.workbench.pull('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        repo = self.wb1.workbench.get_repository(self.repo_key)
+        ab = yield repo.checkout('master')
+
+        self.assertEqual(ab.title,'Datastore Addressbook')
+        self.assertEqual(ab.person[1].name,'John')
+
+
+    @defer.inlineCallbacks
+    def test_get_blobs_stops_on_failure(self):
+
+        result = yield self.wb1.workbench.push_by_name('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        keys = self.wb1.workbench.get_repository(self.repo_key).index_hash.keys()
+        self.assertTrue(len(keys) > 1)
+
+        ds_wb = self.ds1.workbench
+        ds_wb._blob_batch_size = 1
+
+        calls = []
+        def fetch_fails(batch):
+            calls.append(batch)
+            return defer.fail(datastore.DataStoreWorkBenchError('Fetch failed'))
+        ds_wb._fetch_blob_batch = fetch_fails
+
+        # The first batch fails synchronously - no further batches may be issued
+        yield self.failUnlessFailure(ds_wb._get_blobs(repository.Repository(), keys), datastore.DataStoreWorkBenchError)
+        self.assertEqual(len(calls), 1)
+
+
     def test_pull_invalid(self):
 
         yield self.failUnlessFailure(self.wb1.workbench.pull('datastore', 'foobar'), workbench.WorkBenchError)
@@ -1274,3 +1380,172 @@ class DataStoreExtractDataTest(IonTestCase):
         # now the next index in our returned array
         nextidx = 10 * 10
         self.failUnlessEquals(int(bigndarray[nextidx]), nextval)
+
+
+class ExtractSlicesTest(unittest.TestCase):
+    """
+    Tests of the numpy extract_data engine helpers
+    """
+    if datastore.numpy is None:
+        skip = 'The numpy package is not installed'
+
+    def test_strided_slices_across_bas(self):
+        numpy = datastore.numpy
+
+        # a 2-D array split into two bounded arrays along the first dimension
+        data = numpy.arange(8 * 5).reshape((8, 5))
+        bas = [(0, 3), (3, 8)]
+
+        # request rows 1-7, columns 1-4 with a stride of 2 in both dimensions
+        origin = [1, 1]
+        size = [7, 4]
+        strides = [2, 2]
+
+        targetshape = datastore.extract_target_shape(size, strides)
+        target = numpy.empty(targetshape, dtype=data.dtype)
+        self.assertEqual(list(target.shape), [3, 2])
+
+        for start, end in bas:
+            isec_start = max(start, origin[0])
+            isec_end = min(end, origin[0] + size[0])
+            target_range = [(isec_start - origin[0], isec_end - origin[0]), (0, size[1])]
+            src_range = [(isec_start - start, isec_end - start), (origin[1], origin[1] + size[1])]
+
+            target_slices, src_slices = datastore.extract_strided_slices(target_range, src_range, strides, targetshape)
+            target[target_slices] = data[start:end][src_slices]
+
+        # like the legacy engine, the last row the stride selects (row 7) is dropped
+        self.assertEqual(target.tolist(), data[1:7:2, 1:5:2].tolist())
+
+    def test_target_shape_matches_legacy(self):
+        # floor(size / stride) entries in each dimension, as in DataStoreWorkbench._get_slices
+        self.assertEqual(datastore.extract_target_shape([7, 4, 3, 1], [2, 2, 1, 2]), [3, 2, 3, 0])
+
+        # the stride would select indices 0, 2, 4 and 6 - only the first three fit in the result
+        self.assertEqual(datastore.extract_strided_slices([(0, 7)], [(0, 7)], [2], [3]),
+                         ((slice(0, 3),), (slice(0, 5, 2),)))
+
+        # a bounded array holding only the dropped index contributes nothing
+        self.assertEqual(datastore.extract_strided_slices([(6, 7)], [(0, 1)], [2], [3]), None)
+
+    def test_strided_slices_select_nothing(self):
+        # the stride steps over the single row this bounded array holds
+        self.assertEqual(datastore.extract_strided_slices([(1, 2)], [(0, 1)], [2], [1]), None)
+
+    def test_chunks(self):
+        numpy = datastore.numpy
+        target = numpy.arange(10).reshape((2, 5))
+
+        chunks = list(datastore.extract_chunks(target, 4))
+        self.assertEqual(chunks, [(0, [0, 1, 2, 3]), (4, [4, 5, 6, 7]), (8, [8, 9])])
+
+    def test_slabs(self):
+        numpy = datastore.numpy
+
+        # the same request as test_strided_slices_across_bas, built one slab at a time
+        data = numpy.arange(8 * 5).reshape((8, 5))
+        bas = [(0, 3), (3, 8)]
+        origin = [1, 1]
+        size = [7, 4]
+        strides = [2, 2]
+
+        targetshape = datastore.extract_target_shape(size, strides)
+        slabs = datastore.extract_slabs(targetshape, 5)
+        self.assertEqual(slabs, [(0, 2), (2, 3)])
+
+        # a row larger than the chunk size gets a slab of its own
+        self.assertEqual(datastore.extract_slabs([3, 10], 4), [(0, 1), (1, 2), (2, 3)])
+        self.assertEqual(datastore.extract_slabs([], 4), [(0, 1)])
+
+        result = []
+        for start, end in slabs:
+            target = numpy.empty([end - start] + targetshape[1:], dtype=data.dtype)
+            for ba_start, ba_end in bas:
+                isec_start = max(ba_start, origin[0])
+                isec_end = min(ba_end, origin[0] + size[0])
+                target_range = [(isec_start - origin[0], isec_end - origin[0]), (0, size[1])]
+                src_range = [(isec_start - ba_start, isec_end - ba_start), (origin[1], origin[1] + size[1])]
+
+                target_slices, src_slices = datastore.extract_strided_slices(target_range, src_range, strides, targetshape)
+                clipped = datastore.extract_clip_slices(target_slices, src_slices, start, end)
+                if clipped is None:
+                    continue
+                target[clipped[0]] = data[ba_start:ba_end][clipped[1]]
+            result.extend(target.tolist())
+
+        self.assertEqual(result, data[1:7:2, 1:5:2].tolist())
+
+    @defer.inlineCallbacks
+    def test_engine_keeps_arrays_across_slabs(self):
+        numpy = datastore.numpy
+        data = numpy.arange(8 * 5, dtype='float64').reshape((8, 5))
+
+        class FakeLink(object):
+            def __init__(self, key):
+                self.key = key
+                self.type = CDM_ARRAY_FLOAT64_TYPE
+
+        class FakeBA(object):
+            def __init__(self, key):
+                self.link = FakeLink(key)
+                self.bounds = None
+            def GetLink(self, name):
+                return self.link
+
+        conversions = []
+        class NoCache(object):
+            # an ndarray cache too small to hold anything - every lookup converts the array again
+            def __init__(self, limit, repo):
+                pass
+            def get_ndarray_array(self, key, bounds, itembytes, getblobs, dtype):
+                conversions.append(key)
+                return defer.succeed(data[key[0]:key[1]])
+            def stats(self):
+                return {}
+
+        class FakeArray(object):
+            def __init__(self):
+                self.value = []
+
+        class FakeChunk(object):
+            def CreateObject(self, type):
+                return FakeArray()
+
+        class FakeClient(object):
+            def create_instance(self, type):
+                chunk = FakeChunk()
+                chunk.ndarray = None
+                return defer.succeed(chunk)
+
+        class FakeProcess(object):
+            message_client = FakeClient()
+
+        class FakeBound(object):
+            def __init__(self, origin, size):
+                self.origin = origin
+                self.size = size
+                self.stride = 1
+
+        class FakeRequest(object):
+            request_bounds = [FakeBound(0, 8), FakeBound(0, 5)]
+            data_routing_key = 'extract_test'
+
+        wb = datastore.DataStoreWorkbench.__new__(datastore.DataStoreWorkbench)
+        wb._process = FakeProcess()
+        wb._extract_chunk_size = 5
+        sent = []
+        wb._send_data_chunk = lambda key, chunkmsg: sent.append(chunkmsg)
+
+        # two bounded arrays of 3 and 5 rows, sent one row per slab
+        includes = [(FakeBA((0, 3)), [(0, 3), (0, 5)], [(0, 3), (0, 5)]),
+                    (FakeBA((3, 8)), [(3, 8), (0, 5)], [(0, 5), (0, 5)])]
+
+        ndarray_cache = datastore.NDArrayLRUDict
+        datastore.NDArrayLRUDict = NoCache
+        try:
+            yield wb._extract_data_numpy(FakeRequest(), includes, 8, 0, None)
+        finally:
+            datastore.NDArrayLRUDict = ndarray_cache
+
+        self.assertEqual(conversions, [(0, 3), (3, 8)])
+        self.assertEqual(len(sent), 8)
@@ -7,13 +7,15 @@
 """
 
 from ion.core.object import object_utils
-from ion.core.messaging.message_client import MessageClient
-from twisted.internet import defer
+from ion.core.object import codec
+from ion.core.messaging.message_client import MessageClient, MessageInstance
+from twisted.internet import defer, reactor
 from ion.services.dm.distribution.publisher_subscriber import Publisher, Subscriber
 from ion.core import ioninit
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
+CONF = ioninit.config(__name__)
 
 import time
 
@@ -57,6 +59,9 @@ LOGGING_ERROR_EVENT_ID = 3002
 LOGGING_CRITICAL_EVENT_ID = 3001
 DATABLOCK_EVENT_ID = 4001
 
+# Key in the content of a message holding a batch of serialized event messages
+EVENT_BATCH_KEY = 'event_batch'
+
 
 class EventPublisher(Publisher):
     """
@@ -98,6 +103,14 @@ class EventPublisher(Publisher):
           Alternatly, you may set the field in two steps:
               msg = yield SomePublisher.create_event()
               msg.direction = msg.Direction.EAST        # using the enum as defined in the message
+
+    Batching:
+        A publisher created with batch=True does not send each event as it is published. The events for a
+        topic are held until batch_size of them are waiting or batch_interval seconds have passed, and are then
+        sent in one message. With coalesce=True only the latest event waiting for each topic is kept, which
+        suits state events where only the current state matters. EventSubscriber unpacks batches and calls
+        ondata once for each event. Pending events are sent when the publisher is terminated, or by calling
+        flush.
     """
 
     msg_type = None
@@ -121,17 +134,30 @@ class EventPublisher(Publisher):
         
         return "%s.%s" % (str(self.event_id), str(origin))
         
-    def __init__(self, xp_name=None, routing_key=None, process=None, origin="unknown", *args, **kwargs):
+    def __init__(self, xp_name=None, routing_key=None, process=None, origin="unknown", batch=False, batch_size=None,
+                 batch_interval=None, coalesce=False, *args, **kwargs):
         """
         Initializer override.
         Sets defaults for the EventPublisher.
 
         @param origin   Sets the origin used in the topic when publishing the event.
                         This can be overridden when calling publish.
+        @param batch    If True, events are gathered and sent in batches.
+        @param batch_size   Number of events waiting on a topic which causes the batch to be sent.
+        @param batch_interval   Seconds after the first event of a batch is published until the batch is sent.
+        @param coalesce If True, only the latest waiting event is sent for each topic. Implies batch.
         """
         self._origin = origin
         self._mc = MessageClient(proc=process)
 
+        self._batch = batch or coalesce
+        self._batch_size = int(batch_size or CONF.getValue('batch_size', 100))
+        self._batch_interval = float(batch_interval or CONF.getValue('batch_interval', 0.5))
+        self._coalesce = coalesce
+
+        self._pending = {}              # routing key -> list of serialized event messages waiting to be sent
+        self._flush_call = None         # delayed call which sends the pending events
+
         xp_name = xp_name or get_events_exchange_point()
         routing_key = routing_key or "unknown"
 
@@ -208,10 +234,75 @@ class EventPublisher(Publisher):
         assert origin and origin != "unknown", 'Error - No origin publishing event message:\n %s' % str(event_msg)
 
         routing_key=self.topic(origin)
+
+        if self._batch:
+            yield self._add_to_batch(event_msg, routing_key)
+            return
+
         log.debug("Publishing message to %s" % routing_key)
 
         yield self.publish(event_msg, routing_key=routing_key)
 
+    def _add_to_batch(self, event_msg, routing_key):
+        """
+        Hold an event until its batch is sent. Sends the batch for the routing key if it is full, otherwise makes
+        sure the pending events are sent after the batch interval.
+
+        The event is serialized now: its repository is cleared from the workbench when the current operation
+        of the process completes, which may be before the batch is sent.
+        """
+        # As the ObjectCodecInterceptor does when it packs a message
+        event_msg.Repository.index_hash.has_cache = False
+        try:
+            serialized = codec.pack_structure(event_msg)
+        finally:
+            event_msg.Repository.index_hash.has_cache = True
+
+        if self._coalesce:
+            self._pending[routing_key] = [serialized]
+        else:
+            self._pending.setdefault(routing_key, []).append(serialized)
+
+        if len(self._pending[routing_key]) >= self._batch_size:
+            return self._send_batch(routing_key, self._pending.pop(routing_key))
+
+        if self._flush_call is None:
+            self._flush_call = reactor.callLater(self._batch_interval, self._flush_later)
+
+        return defer.succeed(None)
+
+    def _flush_later(self):
+        self._flush_call = None
+        d = self.flush()
+        d.addErrback(lambda failure: log.error('Error sending batched events: %s' % str(failure)))
+
+    @defer.inlineCallbacks
+    def flush(self):
+        """
+        Sends all pending batched events.
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        pending = self._pending
+        self._pending = {}
+
+        for routing_key, events in pending.iteritems():
+            yield self._send_batch(routing_key, events)
+
+    def _send_batch(self, routing_key, events):
+        """
+        Sends a batch of serialized events in one message.
+        """
+        log.debug("Publishing batch of %d events to %s" % (len(events), routing_key))
+
+        return self.publish({EVENT_BATCH_KEY:events}, routing_key=routing_key)
+
+    def on_terminate(self, *args, **kwargs):
+        return self.flush()
+
     @defer.inlineCallbacks
     def create_and_publish_event(self, **kwargs):
         """
@@ -472,6 +563,35 @@ class EventSubscriber(Subscriber):
         log.debug("Listening to events on %s" % self._binding_key)
         yield Subscriber.on_activate(self, *args, **kwargs)
 
+    def _receive_handler(self, data, msg):
+        """
+        Calls ondata for each event of a batch sent by a batching EventPublisher, or once for a single event.
+        """
+        content = data.get('content', None)
+        if not isinstance(content, dict) or EVENT_BATCH_KEY not in content:
+            return Subscriber._receive_handler(self, data, msg)
+
+        msg.ack()
+        return self._receive_batch(data, content[EVENT_BATCH_KEY])
+
+    @defer.inlineCallbacks
+    def _receive_batch(self, data, batch):
+        log.debug("Received batch of %d events" % len(batch))
+
+        for serialized in batch:
+            event_msg = codec.unpack_structure(serialized)
+            if hasattr(event_msg, 'ObjectType') and event_msg.ObjectType == codec.ION_MESSAGE_TYPE:
+                event_msg = MessageInstance(event_msg.Repository)
+
+            # As the receiver does for the content of a single event message
+            self._process.workbench.put_repository(event_msg.Repository)
+
+            event_data = data.copy()
+            event_data['content'] = event_msg
+            event_data['encoding'] = codec.ION_R1_GPB
+
+            yield defer.maybeDeferred(self.ondata, event_data)
+
 class ResourceLifecycleEventSubscriber(EventSubscriber):
     """
     Event Notification Subscriber for Resource lifecycle events. Used as a concrete derived class, and as a base for
@@ -15,7 +15,7 @@ from ion.services.dm.distribution.publisher_subscriber import PublisherFactory,
 from ion.services.dm.distribution.events import EventPublisher, ResourceLifecycleEventPublisher, ProcessLifecycleEventPublisher, \
                                                 EventSubscriber, ResourceLifecycleEventSubscriber, ProcessLifecycleEventSubscriber, \
                                                 InfoLoggingEventPublisher, InfoLoggingEventSubscriber, \
-                                                RESOURCE_LIFECYCLE_EVENT_ID
+                                                RESOURCE_LIFECYCLE_EVENT_ID, EVENT_BATCH_KEY
 
 from ion.test.iontest import IonTestCase
 from ion.core import ioninit
@@ -233,6 +233,91 @@ class TestEventPublisher(IonTestCase):
         self.assertEqual(testsub.msgs[0]['content'].name, u"TestEvent")
         
 
+    @defer.inlineCallbacks
+    def test_batch_publish(self):
+        """
+        Test a batching publisher sends a batch when it is full, and the rest when it is flushed.
+        """
+        pub1 = ResourceLifecycleEventPublisher(process=self._proc, origin="species", batch=True, batch_size=3, batch_interval=60)
+        yield pub1.initialize()
+        yield pub1.activate()
+
+        sent = []
+        def fake_publish(data, routing_key=""):
+            sent.append((routing_key, data))
+            return defer.succeed(True)
+
+        pub1.publish = fake_publish
+
+        for i in range(4):
+            yield pub1.create_and_publish_event(name="event %d" % i)
+
+        self.failUnlessEquals(len(sent), 1)
+        self.failUnlessEquals(sent[0][0], "%s.species" % str(RESOURCE_LIFECYCLE_EVENT_ID))
+        self.failUnlessEquals(len(sent[0][1][EVENT_BATCH_KEY]), 3)
+
+        yield pub1.flush()
+        self.failUnlessEquals(len(sent), 2)
+        self.failUnlessEquals(len(sent[1][1][EVENT_BATCH_KEY]), 1)
+
+        # Nothing left to send
+        yield pub1.flush()
+        self.failUnlessEquals(len(sent), 2)
+
+    @defer.inlineCallbacks
+    def test_coalesce_publish(self):
+        """
+        Test a coalescing publisher sends only the latest event for each origin.
+        """
+        pub1 = ResourceLifecycleEventPublisher(process=self._proc, coalesce=True, batch_interval=60)
+        yield pub1.initialize()
+        yield pub1.activate()
+
+        sent = []
+        def fake_publish(data, routing_key=""):
+            sent.append((routing_key, data))
+            return defer.succeed(True)
+
+        pub1.publish = fake_publish
+
+        yield pub1.create_and_publish_event(origin="orig1", state=ResourceLifecycleEventPublisher.State.NEW)
+        yield pub1.create_and_publish_event(origin="orig1", state=ResourceLifecycleEventPublisher.State.ACTIVE)
+        yield pub1.create_and_publish_event(origin="orig2", state=ResourceLifecycleEventPublisher.State.READY)
+
+        yield pub1.terminate()
+
+        batches = dict(sent)
+        self.failUnlessEquals(len(batches), 2)
+        self.failUnlessEquals(len(batches["%s.orig1" % str(RESOURCE_LIFECYCLE_EVENT_ID)][EVENT_BATCH_KEY]), 1)
+        self.failUnlessEquals(len(batches["%s.orig2" % str(RESOURCE_LIFECYCLE_EVENT_ID)][EVENT_BATCH_KEY]), 1)
+
+    @defer.inlineCallbacks
+    def test_batch_subscribe(self):
+        """
+        Push a batch of events through an event topic and make sure the subscriber gets each of them.
+        """
+        subproc = Process()
+        yield subproc.spawn()
+        test_origin = "%s.%s" % ("chan1", str(subproc.id))
+        testsub = QuickEventSubscriber(origin=test_origin,
+                                       process=subproc)
+        yield testsub.initialize()
+        yield testsub.activate()
+        yield pu.asleep(1.0)
+
+        pub1 = InfoLoggingEventPublisher(process=self._proc,
+                                         origin=test_origin, batch=True, batch_size=10, batch_interval=0.2)
+        yield pub1.initialize()
+        yield pub1.activate()
+
+        for i in range(3):
+            yield pub1.create_and_publish_event(name="TestEvent%d" % i)
+
+        # Pause for the batch interval and to make sure we catch the message
+        yield pu.asleep(1.0)
+        self.assertEqual([msg['content'].name for msg in testsub.msgs], [u"TestEvent0", u"TestEvent1", u"TestEvent2"])
+
+
 class TestEventSubscriber(IonTestCase):
     """
     Tests the EventSubscriber and derived classes.
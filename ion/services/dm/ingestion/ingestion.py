@@ -13,6 +13,7 @@ To test this with the Java CC!
 """
 
 import time, calendar
+from bisect import bisect_left, bisect_right
 from ion.services.dm.distribution.events import DatasetSupplementAddedEventPublisher, DatasourceUnavailableEventPublisher, DatasetChangeEventPublisher
 import ion.util.ionlog
 from twisted.internet import defer, reactor
@@ -26,10 +27,12 @@ from ion.core.process.service_process import ServiceProcess, ServiceClient
 import ion.util.procutils as pu
 
 from ion.core.messaging.message_client import MessageClient
+from ion.core.messaging.receiver import DISPATCH_REACTOR
 from ion.services.coi.resource_registry.resource_client import ResourceClient, ResourceClientError
 from ion.services.dm.distribution.publisher_subscriber import Subscriber, PublisherFactory
 
 from ion.core.object.cdm_methods import attribute_merge
+from ion.core.object.cdm_methods.variables import _get_bounded_array_index
 
 from ion.core.exception import ApplicationError
 
@@ -39,7 +42,7 @@ from ion.services.coi import datastore
 
 from ion.core.exception import ReceivedApplicationError, ReceivedError, ReceivedContainerError
 
-from ion.core.object.gpb_wrapper import OOIObjectError
+from ion.core.object.gpb_wrapper import OOIObjectError, FramedStructureElement
 
 from ion.core import ioninit
 from ion.core.object import object_utils
@@ -101,6 +104,183 @@ EM_TIMESTEPS    = 'number_of_timesteps'
 EM_ERROR        = 'error_explanation'
 
 
+# Seconds in the units of CF time coordinates - "<units> since <date>"
+TIME_UNIT_SECONDS = {'second':1, 'seconds':1, 'sec':1, 'secs':1, 's':1,
+                     'minute':60, 'minutes':60, 'min':60, 'mins':60,
+                     'hour':3600, 'hours':3600, 'hr':3600, 'hrs':3600, 'h':3600,
+                     'day':86400, 'days':86400, 'd':86400}
+
+TIME_ORIGIN_FORMATS = ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+
+def parse_time_units(units):
+    """
+    Parse the units of a CF time coordinate, like "hours since 1970-01-01 00:00:00"
+    @retval a tuple (seconds per unit, origin in seconds since the epoch), or None if the units can not be parsed
+    """
+    if not units:
+        return None
+
+    parts = str(units).strip().split(None, 2)
+    if len(parts) != 3 or parts[1].lower() != 'since' or parts[0].lower() not in TIME_UNIT_SECONDS:
+        return None
+
+    # Some of the datasets have a doubled separator in the time of the origin - "1970-01-01 00:00::00"
+    origin = parts[2].strip().replace('::', ':')
+    # Drop a trailing time zone of UTC
+    for suffix in (' UTC', ' utc', ' GMT', ' 0:00', ' 00:00', ' +0000', ' Z'):
+        if origin.endswith(suffix):
+            origin = origin[:-len(suffix)]
+            break
+
+    for format in TIME_ORIGIN_FORMATS:
+        try:
+            origin_seconds = calendar.timegm(time.strptime(origin, format))
+        except ValueError:
+            continue
+        return TIME_UNIT_SECONDS[parts[0].lower()], origin_seconds
+
+    return None
+
+
+class IngestSession(object):
+    """
+    The state of one ingestion: the dataset and data source being ingested, the subscriber on the ingest topic,
+    the timeout and the deferred which op_ingest waits on until recv_done or an error ends the ingestion.
+    """
+
+    def __init__(self, dataset_id, datasource_id):
+        self.dataset_id = dataset_id
+        self.datasource_id = datasource_id
+
+        self.topic = None
+        self.subscriber = None
+        self.timeoutcb = None
+
+        self.dataset = None
+        self.data_source = None
+
+        # Writes the ndarrays of the received chunks to the datastore
+        self.chunks = None
+
+        self.deferred = defer.Deferred()       # waited on by op_ingest to signal end of ingestion
+
+    def __str__(self):
+        return 'IngestSession(dataset_id=%s, datasource_id=%s)' % (self.dataset_id, self.datasource_id)
+
+
+class ChunkPipeline(object):
+    """
+    Writes the ndarrays of the chunks received during an ingestion to the datastore. The structure elements of
+    the ndarrays are buffered - not objects of the chunk message repository, which is cleared after each chunk -
+    and put in batches of up to batch_bytes bytes or batch_size ndarrays, with at most max_writes put_blobs
+    requests in flight. Adding an ndarray when the buffer is full and all the writes are in flight waits for
+    a write to complete - the chunk is not acked until then, which holds back the publisher.
+    """
+
+    def __init__(self, mc, dsc, batch_bytes=None, batch_size=None, max_writes=None):
+        """
+        @param mc the message client used to create the blobs messages
+        @param dsc the datastore client used to put them
+        """
+        self.mc = mc
+        self.dsc = dsc
+
+        self.batch_bytes = batch_bytes or int(CONF.getValue('chunk_batch_bytes', 4 * 1024 * 1024))
+        self.batch_size = batch_size or int(CONF.getValue('chunk_batch_size', 100))
+
+        self._writes = defer.DeferredSemaphore(max_writes or int(CONF.getValue('chunk_max_writes', 4)))
+        self._in_flight = []
+
+        self._buffer = []
+        self._buffer_bytes = 0
+
+        # The first write which failed - the ingestion fails with it
+        self._error = None
+
+    def add(self, element, nbytes):
+        """
+        Buffer the ndarray of a chunk
+        @param element the structure element of the ndarray
+        @param nbytes the size of its serialized value
+        @retval a deferred which fires when the pipeline can take another ndarray
+        """
+        self.check()
+
+        self._buffer.append(element)
+        self._buffer_bytes += nbytes
+
+        if self._buffer_bytes >= self.batch_bytes or len(self._buffer) >= self.batch_size:
+            return self.flush()
+        return defer.succeed(None)
+
+    @defer.inlineCallbacks
+    def flush(self):
+        """
+        Start a write of the buffered ndarrays. Fires when the write is in flight, not when it completes.
+        """
+        if not self._buffer:
+            return
+
+        batch = self._buffer
+        nbytes = self._buffer_bytes
+        self._buffer = []
+        self._buffer_bytes = 0
+
+        yield self._writes.acquire()
+
+        log.debug('Writing a batch of %d ndarrays (%d bytes) to the datastore' % (len(batch), nbytes))
+        d = defer.maybeDeferred(self._write, batch)
+        self._in_flight.append(d)
+        d.addErrback(self._write_failed)
+        d.addBoth(self._write_done, d)
+
+    @defer.inlineCallbacks
+    def drain(self):
+        """
+        Write the buffered ndarrays and wait for all the writes to complete
+        @raise IngestionError if any of the writes failed
+        """
+        yield self.flush()
+
+        while self._in_flight:
+            yield defer.DeferredList(list(self._in_flight))
+
+        self.check()
+
+    def check(self):
+        """
+        @raise IngestionError if a write failed
+        """
+        if self._error is not None:
+            raise self._error
+
+    @defer.inlineCallbacks
+    def _write(self, batch):
+        blobs_msg = yield self.mc.create_instance(BLOBS_MESSAGE_TYPE)
+        for element in batch:
+            link = blobs_msg.blob_elements.add()
+            obj = blobs_msg.Repository._wrap_message_object(element._element)
+            link.SetLink(obj)
+
+        try:
+            yield self.dsc.put_blobs(blobs_msg)
+        except ReceivedError, re:
+            log.error(re)
+            raise IngestionError('Could not put blob in received chunk to the datastore.')
+
+    def _write_failed(self, failure):
+        log.error('Writing received chunks to the datastore failed: %s' % str(failure.value))
+        if self._error is None:
+            if isinstance(failure.value, IngestionError):
+                self._error = failure.value
+            else:
+                self._error = IngestionError('Could not put blob in received chunk to the datastore: %s' % str(failure.value))
+
+    def _write_done(self, result, d):
+        self._in_flight.remove(d)
+        self._writes.release()
+        return result
 
 
 class IngestionService(ServiceProcess):
@@ -111,6 +291,10 @@ class IngestionService(ServiceProcess):
     # Declaration of service
     declare = ServiceProcess.service_declare(name='ingestion', version='0.1.0', dependencies=[])
 
+    # op_ingest waits for the whole ingestion - in thread dispatch it would hold a thread pool thread per session
+    # and max_sessions ingestions could leave no thread for the messages they wait on
+    svc_dispatch_mode = DISPATCH_REACTOR
+
     # Declare the excluded types for repository operations
     excluded_data_array_types = (CDM_SINT_ARRAY_TYPE, CDM_UINT_ARRAY_TYPE, CDM_LSINT_ARRAY_TYPE, CDM_LUINT_ARRAY_TYPE,
                                  CDM_DOUBLE_ARRAY_TYPE, CDM_FLOAT_ARRAY_TYPE, CDM_STRING_ARRAY_TYPE,
@@ -128,7 +312,11 @@ class IngestionService(ServiceProcess):
 
         self.op_fetch_blobs = self.workbench.op_fetch_blobs
 
-        self._defer_ingest = defer.Deferred()       # waited on by op_ingest to signal end of ingestion
+        # The ingestions in progress by ingest topic
+        self._sessions = {}
+
+        # Ingestions beyond the limit wait for one of the others to complete
+        self._session_limit = defer.DeferredSemaphore(int(CONF.getValue('max_sessions', 10)))
 
         self.rc = ResourceClient(proc=self)
         self.mc = MessageClient(proc=self)
@@ -137,9 +325,6 @@ class IngestionService(ServiceProcess):
 
         self.dsc = datastore.DataStoreClient(proc=self)
 
-        self.dataset = None
-        self.data_source = None
-
         log.info('IngestionService.__init__()')
 
     @defer.inlineCallbacks
@@ -223,17 +408,42 @@ class IngestionService(ServiceProcess):
         log.debug("TODO: _ingest_data_topic_valid")
         return True
 
+    def _begin_session(self, content):
+        """
+        Register the session of a new ingestion before anything is pulled for it
+        @retval an IngestSession registered under its ingest topic
+        @raise IngestionError if the dataset is already being ingested
+        """
+        # TODO: replace this from the msg itself with just dataset id
+        ingest_data_topic = content.dataset_id
+
+        if ingest_data_topic in self._sessions:
+            raise IngestionError('The dataset "%s" is already being ingested' % content.dataset_id,
+                                 content.ResponseCodes.BAD_REQUEST)
+
+        session = IngestSession(content.dataset_id, content.datasource_id)
+        session.topic = ingest_data_topic
+        self._sessions[ingest_data_topic] = session
+
+        return session
+
     @defer.inlineCallbacks
-    def _prepare_ingest(self, content):
+    def _prepare_ingest(self, content, session=None):
         """
         Factor out the preparation for ingestion so that we can unit test functionality
+        @param session the session from _begin_session, or None for a session which is not registered
+        @retval an IngestSession with the dataset and data source checked out
         """
 
         log.debug('_prepare_ingest - Start')
 
+        if session is None:
+            session = IngestSession(content.dataset_id, content.datasource_id)
+        session.chunks = ChunkPipeline(self.mc, self.dsc)
+
         # Get the current state of the dataset:
         try:
-            self.dataset = yield self.rc.get_instance(content.dataset_id, excluded_types=[CDM_BOUNDED_ARRAY_TYPE])
+            session.dataset = yield self.rc.get_instance(content.dataset_id, excluded_types=[CDM_BOUNDED_ARRAY_TYPE])
 
         except ResourceClientError, rce:
            log.exception('Could not get dataset resource!')
@@ -242,7 +452,7 @@ class IngestionService(ServiceProcess):
         log.info('Got dataset resource')
 
         try:
-            self.data_source = yield self.rc.get_instance(content.datasource_id)
+            session.data_source = yield self.rc.get_instance(content.datasource_id)
         except ResourceClientError, rce:
            log.exception('Could not get datasource resource!')
            raise IngestionError('Could not get the datasource resource from the datastore')
@@ -252,60 +462,69 @@ class IngestionService(ServiceProcess):
 
         # Get the bounded arrays but not the ndarrays
         ba_links = []
-        for var in self.dataset.root_group.variables:
+        for var in session.dataset.root_group.variables:
             var_links = var.content.bounded_arrays.GetLinks()
             ba_links.extend(var_links)
 
-        yield self.dataset.Repository.fetch_links(ba_links)
+        yield session.dataset.Repository.fetch_links(ba_links)
 
         log.debug('_prepare_ingest - Complete')
 
-        defer.returnValue(None)
+        defer.returnValue(session)
 
     @defer.inlineCallbacks
-    def _setup_ingestion_topic(self, content):
+    def _setup_ingestion_topic(self, session, content):
 
         log.debug('_setup_ingestion_topic - Start')
 
-        # TODO: replace this from the msg itself with just dataset id
-        ingest_data_topic = content.dataset_id
+        # The topic was reserved by _begin_session
+        ingest_data_topic = session.topic
 
         # TODO: validate ingest_data_topic
         valid = self._ingest_data_topic_valid(ingest_data_topic)
         if not valid:
             log.error("Invalid data ingestion topic (%s), allowing it for now TODO" % ingest_data_topic)
 
+        def handle_ingestion_msg(payload, msg):
+            return self._handle_ingestion_msg(ingest_data_topic, payload, msg)
+
         log.info('Setting up ingest topic for communication with a Dataset Agent: "%s"' % ingest_data_topic)
-        self._subscriber = self.IngestSubscriber(handleref=self._handle_ingestion_msg,
-                                                 xp_name="magnet.topic",
-                                                 binding_key=ingest_data_topic,
-                                                 process=self)
-        yield self.register_life_cycle_object(self._subscriber) # move subscriber to active state
+        session.subscriber = self.IngestSubscriber(handleref=handle_ingestion_msg,
+                                                   xp_name="magnet.topic",
+                                                   binding_key=ingest_data_topic,
+                                                   process=self)
+        yield self.register_life_cycle_object(session.subscriber) # move subscriber to active state
 
         log.debug('_setup_ingestion_topic - Complete')
 
         defer.returnValue(ingest_data_topic)
 
     @defer.inlineCallbacks
-    def _handle_ingestion_msg(self, payload, msg):
+    def _handle_ingestion_msg(self, ingest_data_topic, payload, msg):
         """
-        Handles recv_dataset, recv_chunk, recv_done
+        Handles recv_dataset, recv_chunk, recv_done for the ingestion on the given topic
 
         This code is basically Process.receive, but without the conversation/user-id business which comprises most
         of that. It also adds proper error handling in the context of the ingestion, so if one of these messages
         triggers one, it will error out of the op_ingest call appropriately.
         """
 
+        session = self._sessions.get(ingest_data_topic)
+        if session is None:
+            log.warn('Received an ingestion message on topic "%s" which has no ingestion in progress' % ingest_data_topic)
+            yield msg.ack()
+            return
+
         try:
             opname = payload.get('op', '')
             content = payload.get('content', '')    # should be None, but this is how Process' receive does it
 
             if opname == 'recv_dataset':
-                yield self._ingest_op_recv_dataset(content, payload, msg)
+                yield self._ingest_op_recv_dataset(session, content, payload, msg)
             elif opname == 'recv_chunk':
-                yield self._ingest_op_recv_chunk(content, payload, msg)
+                yield self._ingest_op_recv_chunk(session, content, payload, msg)
             elif opname == 'recv_done':
-                yield self._ingest_op_recv_done(content, payload, msg)
+                yield self._ingest_op_recv_done(session, content, payload, msg)
             else:
                 raise IngestionError('Unknown operation specified')
 
@@ -315,12 +534,17 @@ class IngestionService(ServiceProcess):
             yield msg.ack()
 
             # all error handling goes back to op_ingest
-            self._defer_ingest.errback(ex)
+            if session.deferred.called:
+                log.error('Error in %s after the ingestion ended: %s' % (str(session), str(ex)))
+            else:
+                session.deferred.errback(ex)
 
     @defer.inlineCallbacks
     def op_ingest(self, content, headers, msg):
         """
         Start the ingestion process by setting up necessary
+        Each ingestion has its own session; at most max_sessions ingestions run at the same time in a process,
+        the others wait for one to complete. A second ingestion of a dataset is refused before anything is pulled.
         @TODO NO MORE MAGNET.TOPIC
         """
         log.info('op_ingest - Start')
@@ -329,19 +553,30 @@ class IngestionService(ServiceProcess):
             raise IngestionError('Expected message type PerformIngestRequest, received %s'
                                  % str(content), content.ResponseCodes.BAD_REQUEST)
 
-        yield self._prepare_ingest(content)
+        session = self._begin_session(content)
 
-        log.info('Created dataset details, Now setup subscriber...')
+        yield self._session_limit.run(self._perform_ingest, session, content, headers, msg)
 
-        ingest_data_topic = yield self._setup_ingestion_topic(content)
+    @defer.inlineCallbacks
+    def _perform_ingest(self, session, content, headers, msg):
+
+        try:
+            yield self._prepare_ingest(content, session)
+
+            log.info('Created dataset details, Now setup subscriber...')
+
+            ingest_data_topic = yield self._setup_ingestion_topic(session, content)
+        except:
+            yield self._end_session(session)
+            raise
 
 
         def _timeout():
             log.info("Timed out in op_perform_ingest")
-            self._defer_ingest.errback(IngestionError('Time out in communication between the JAW and the Ingestion service', content.ResponseCodes.TIMEOUT))
+            session.deferred.errback(IngestionError('Time out in communication between the JAW and the Ingestion service', content.ResponseCodes.TIMEOUT))
 
         log.info('Setting up ingest timeout with value: %i' % content.ingest_service_timeout)
-        self.timeoutcb = reactor.callLater(content.ingest_service_timeout, _timeout)
+        session.timeoutcb = reactor.callLater(content.ingest_service_timeout, _timeout)
 
         log.info(
             'Notifying caller that ingest is ready by invoking op_ingest_ready() using routing key: "%s"' % content.reply_to)
@@ -357,11 +592,11 @@ class IngestionService(ServiceProcess):
         # get pushed via errback to here. We mostly just want them to go through the usual exception stack, but
         # we should send out a failure notification before we do so.
         try:
-            ingest_res = yield self._defer_ingest    # wait for other commands to finish the actual ingestion
+            ingest_res = yield session.deferred    # wait for other commands to finish the actual ingestion
         except Exception, ex:
 
             # we have to notify that there is a failure, so get details and setup the dict to pass to notify_ingest.
-            data_details = self.get_data_details(content)
+            data_details = self.get_data_details(session, content)
             ingest_res={EM_ERROR:'Ingestion Failed: %s' % str(ex.message)}
             ingest_res.update(data_details)
 
@@ -381,19 +616,10 @@ class IngestionService(ServiceProcess):
                 raise ex
 
         finally:
-            # we finished waiting (either success/failure/timeout), cancel the timeout if active
-            if self.timeoutcb.active():
-                self.timeoutcb.cancel()
-
-            # reset ingestion deferred so we can use it again
-            self._defer_ingest = defer.Deferred()
-
-            # remove subscriber, deactivate it
-            self._registered_life_cycle_objects.remove(self._subscriber)
-            yield self._subscriber.terminate()
-            self._subscriber = None
+            # we finished waiting (either success/failure/timeout), remove the session
+            yield self._end_session(session)
 
-        data_details = self.get_data_details(content)
+        data_details = self.get_data_details(session, content)
 
         if isinstance(ingest_res, dict):
             ingest_res.update(data_details)
@@ -409,30 +635,30 @@ class IngestionService(ServiceProcess):
 
             # Don't change life cycle state - yet...
             #data_source.ResourceLifeCycleState = data_source.INACTIVE
-            #self.dataset.ResourceLifeCycleState = self.dataset.INACTIVE
+            #session.dataset.ResourceLifeCycleState = session.dataset.INACTIVE
 
         else:
             log.info("Ingest succeeded!")
 
-            resources.append(self.dataset)
+            resources.append(session.dataset)
 
             # If the dataset / source is new 
-            if self.dataset.ResourceLifeCycleState == self.dataset.NEW:
+            if session.dataset.ResourceLifeCycleState == session.dataset.NEW:
 
                 log.info('Fetching datasource id - %s - to set life cycle state' % content.datasource_id)
                 data_source = yield self.rc.get_instance(content.datasource_id)
 
-                if self.data_source.is_public == True:
+                if session.data_source.is_public == True:
 
                     data_source.ResourceLifeCycleState = data_source.COMMISSIONED
-                    self.dataset.ResourceLifeCycleState = self.dataset.COMMISSIONED
+                    session.dataset.ResourceLifeCycleState = session.dataset.COMMISSIONED
 
                 else:
 
                     data_source.ResourceLifeCycleState = data_source.ACTIVE
-                    self.dataset.ResourceLifeCycleState = self.dataset.ACTIVE
+                    session.dataset.ResourceLifeCycleState = session.dataset.ACTIVE
 
-                resources.append(self.data_source)
+                resources.append(session.data_source)
 
 
 
@@ -443,9 +669,6 @@ class IngestionService(ServiceProcess):
 
         yield self._notify_ingest(ingest_res)
 
-        self.dataset=None
-        self.data_source = None
-
         # now reply ok to the original message
         yield self.reply_ok(msg)
 
@@ -453,10 +676,29 @@ class IngestionService(ServiceProcess):
 
         log.info('op_ingest - Complete')
 
+    @defer.inlineCallbacks
+    def _end_session(self, session):
+        """
+        Cancel the timeout of an ingestion, deactivate its subscriber and forget the session
+        """
+        if session.timeoutcb is not None and session.timeoutcb.active():
+            session.timeoutcb.cancel()
+
+        if session.topic is not None and self._sessions.get(session.topic) is session:
+            del self._sessions[session.topic]
 
-    def get_data_details(self, content):
+        # remove subscriber, deactivate it
+        if session.subscriber is not None:
+            subscriber = session.subscriber
+            session.subscriber = None
+            if subscriber in self._registered_life_cycle_objects:
+                self._registered_life_cycle_objects.remove(subscriber)
+            yield subscriber.terminate()
+
+
+    def get_data_details(self, session, content):
         try:
-            att = self.dataset.root_group.FindAttributeByName('title')
+            att = session.dataset.root_group.FindAttributeByName('title')
             title = att.GetValue()
         except OOIObjectError, oe:
             log.warn('No title attribute found in Dataset: "%s"' % content.dataset_id)
@@ -464,7 +706,7 @@ class IngestionService(ServiceProcess):
 
 
         try:
-            att = self.dataset.root_group.FindAttributeByName('references')
+            att = session.dataset.root_group.FindAttributeByName('references')
             references = att.GetValue()
         except OOIObjectError, oe:
             log.warn('No title attribute found in Dataset: "%s"' % content.dataset_id)
@@ -508,12 +750,12 @@ class IngestionService(ServiceProcess):
 
 
     @defer.inlineCallbacks
-    def _ingest_op_recv_dataset(self, content, headers, msg):
+    def _ingest_op_recv_dataset(self, session, content, headers, msg):
 
         log.info('_ingest_op_recv_dataset - Start')
 
         log.info('Adding 30 seconds to timeout')
-        self.timeoutcb.delay(30)
+        session.timeoutcb.delay(30)
 
         log.info(headers)
 
@@ -521,15 +763,15 @@ class IngestionService(ServiceProcess):
             raise IngestionError('Expected message type CDM Dataset Type, received %s'
                                  % str(content), content.ResponseCodes.BAD_REQUEST)
 
-        if self.dataset is None:
+        if session.dataset is None:
             raise IngestionError('Calling recv_dataset in an invalid state. No Dataset checked out to ingest.')
 
-        if self.dataset.Repository.status is not self.dataset.Repository.UPTODATE:
+        if session.dataset.Repository.status is not session.dataset.Repository.UPTODATE:
             raise IngestionError('Calling recv_dataset in an invalid state. Dataset is already modified.')
 
-        self.dataset.CreateUpdateBranch(content.MessageObject)
+        session.dataset.CreateUpdateBranch(content.MessageObject)
 
-        group = self.dataset.root_group
+        group = session.dataset.root_group
 
         # Clear any bounded arrays which are empty. Create content field if it is not present
         for var in group.variables:
@@ -548,7 +790,7 @@ class IngestionService(ServiceProcess):
                         else:
                             i += 1
             else:
-                var.content = self.dataset.CreateObject(CDM_ARRAY_STRUCTURE_TYPE)
+                var.content = session.dataset.CreateObject(CDM_ARRAY_STRUCTURE_TYPE)
 
         yield msg.ack()
 
@@ -556,51 +798,35 @@ class IngestionService(ServiceProcess):
 
 
     @defer.inlineCallbacks
-    def _ingest_op_recv_chunk(self, content, headers, msg):
+    def _ingest_op_recv_chunk(self, session, content, headers, msg):
 
         log.info('_ingest_op_recv_chunk - Start')
 
         log.info('Adding 30 seconds to timeout')
-        self.timeoutcb.delay(30)
+        session.timeoutcb.delay(30)
         # this is NOT rpc
         if content.MessageType != SUPPLEMENT_MSG_TYPE:
             raise IngestionError('Expected message type SupplementMessageType, received %s'
                                  % str(content), content.ResponseCodes.BAD_REQUEST)
             
-        if self.dataset is None:
+        if session.dataset is None:
             raise IngestionError('Calling recv_chunk in an invalid state. No Dataset checked out to ingest.')
 
-        if self.dataset.ResourceLifeCycleState is not self.dataset.UPDATE:
+        if session.dataset.ResourceLifeCycleState is not session.dataset.UPDATE:
             raise IngestionError('Calling recv_chunk in an invalid state. Dataset is not on an update branch!')
 
         # OOIION-191: sanity check field dataset_id disabled as DatasetAgent does not have the information when making these messages.
-        #if content.dataset_id != self.dataset.ResourceIdentity:
+        #if content.dataset_id != session.dataset.ResourceIdentity:
         #    raise IngestionError('Calling recv_chunk with a dataset that does not match the received chunk!.')
 
 
         # Get the group out of the datset
-        group = self.dataset.root_group
+        group = session.dataset.root_group
 
         # get the bounded array out of the message
         ba = content.bounded_array
 
-
-        # Create a blobs message to send to the datastore with the ndarray
-        blobs_msg = yield self.mc.create_instance(BLOBS_MESSAGE_TYPE)
-        ndarray_element = content.Repository.index_hash.get(ba.ndarray.MyId)
-        obj = content.Repository._wrap_message_object(ndarray_element._element)
-
-        link = blobs_msg.blob_elements.add()
-        link.SetLink(obj)
-
-        # Put it to the datastore
-        try:
-            yield self.dsc.put_blobs(blobs_msg)
-        except ReceivedError, re:
-            log.error(re)
-            raise IngestionError('Could not put blob in received chunk to the datastore.')
-
-        # Now add the bounded array, but not the ndarray to the dataset in the ingestion service
+        # Add the bounded array, but not the ndarray to the dataset in the ingestion service
         log.debug('Adding content to variable name: %s' % content.variable_name)
         try:
             var = group.FindVariableByName(content.variable_name)
@@ -612,13 +838,21 @@ class IngestionService(ServiceProcess):
         my_ba = ba_link.Repository.copy_object(ba, deep_copy=False)
         ba_link.SetLink(my_ba)
 
+        # Queue the ndarray to be written to the datastore - this waits when the pipeline is full. The element is
+        # buffered rather than an object of the message repository, which the receiver clears after this op.
+        ndarray_element = content.Repository.index_hash.get(ba.ndarray.MyId)
+        if isinstance(ndarray_element, FramedStructureElement) and not ndarray_element.Materialized:
+            # Copy the value out of the message buffer rather than hold the whole message until the write
+            ndarray_element._element
+        yield session.chunks.add(ndarray_element, len(ndarray_element.value))
+
         yield msg.ack()
 
         log.info('_ingest_op_recv_chunk - Complete')
 
 
     @defer.inlineCallbacks
-    def _ingest_op_recv_done(self, content, headers, msg):
+    def _ingest_op_recv_done(self, session, content, headers, msg):
         """
         @TODO deal with FMRC datasets and supplements
         """
@@ -626,7 +860,7 @@ class IngestionService(ServiceProcess):
         log.info('_ingest_op_recv_done - Start')
 
         log.info('Cancelling timeout!')
-        self.timeoutcb.cancel()
+        session.timeoutcb.cancel()
 
         log.info(headers)
         
@@ -639,6 +873,10 @@ class IngestionService(ServiceProcess):
             raise IngestionError('Expected message type Data Acquasition Complete Message Type, received %s'
                                  % str(content), content.ResponseCodes.BAD_REQUEST)
 
+        # All the chunks must be in the datastore before the dataset which refers to them is
+        log.info('Waiting for the received chunks to be written to the datastore')
+        yield session.chunks.drain()
+
 
 
         if content.status != content.StatusCode.OK:
@@ -663,18 +901,19 @@ class IngestionService(ServiceProcess):
 
             #@TODO ask dave for help here - how can I chain these callbacks?
 
-            if self.data_source.aggregation_rule == self.data_source.AggregationRule.OVERLAP:
+            data_source = session.data_source
+            if data_source.aggregation_rule == data_source.AggregationRule.OVERLAP:
 
-                result = yield self._merge_overlapping_supplement()
+                result = yield self._merge_overlapping_supplement(session)
 
-            elif self.data_source.aggregation_rule == self.data_source.AggregationRule.OVERWRITE:
+            elif data_source.aggregation_rule == data_source.AggregationRule.OVERWRITE:
 
-                result = yield self._merge_overwrite_supplement()
+                result = yield self._merge_overwrite_supplement(session)
 
 
-            elif self.data_source.aggregation_rule == self.data_source.AggregationRule.FMRC:
+            elif data_source.aggregation_rule == data_source.AggregationRule.FMRC:
 
-                result = yield self._merge_fmrc_supplement()
+                result = yield self._merge_fmrc_supplement(session)
 
 
 
@@ -683,86 +922,284 @@ class IngestionService(ServiceProcess):
 
 
         # trigger the op_perform_ingest to complete!
-        self._defer_ingest.callback(result)
+        session.deferred.callback(result)
 
         log.info('_ingest_op_recv_done - Complete')
 
 
 
 
-    @defer.inlineCallbacks
-    def _merge_overwrite_supplement(self):
+    def _merge_overwrite_supplement(self, session):
+        """
+        The supplement replaces the values of the dataset from its start time to its end, the values after
+        it are kept
+        """
+        log.debug('_merge_overwrite_supplement')
 
+        return self._merge_replacing_supplement(session, truncate=False)
 
-        log.debug('_merge_overlapping_supplement - Start')
 
-        raise NotImplementedError('OVERWRITE Supplement updates are not yet supported')
+    def _merge_fmrc_supplement(self, session):
+        """
+        The supplement is a new forecast run - it replaces the values of the dataset from its start time and
+        the forecast of the previous run after it
+        """
+        log.debug('_merge_fmrc_supplement')
+
+        return self._merge_replacing_supplement(session, truncate=True)
 
 
     @defer.inlineCallbacks
-    def _merge_fmrc_supplement(self):
+    def _merge_replacing_supplement(self, session, truncate):
+        """
+        Merge a supplement which replaces part of the dataset on the aggregation dimension. The replaced range
+        holds the values of the dataset from the start to the end time of the supplement, which need not be as
+        many as the timesteps of the supplement. Only the bounded arrays of the dataset which intersect the
+        replaced range are removed or trimmed - they are found with the bounded array index of each variable - and
+        the bounded arrays of the supplement are added after them.
+        @param truncate if True the dataset ends with the supplement, otherwise values after it are kept
+        """
 
+        log.debug('_merge_replacing_supplement - Start')
 
-        log.debug('_merge_overlapping_supplement - Start')
+        root, merge_root, merge_agg_dim, result = yield self._begin_merge(session)
+
+        supplement_length = merge_agg_dim.length
+        supplement_stime = result[EM_START_DATE] / 1000
+        supplement_etime = result[EM_END_DATE] / 1000
+
+        agg_dim = None
+        try:
+            agg_dim = root.FindDimensionByName(merge_agg_dim.name)
+        except OOIObjectError, oe:
+            log.debug('No Dimension found in current dataset:' + str(oe))
+
+        agg_offset = 0
+        agg_length = supplement_length
+        if agg_dim is not None:
+            agg_offset = yield self._find_aggregation_offset(session, root, agg_dim, supplement_stime)
+            log.info('Aggregation offset of the supplement in the current dataset: %d' % agg_offset)
+
+            # The replaced range ends after the last value of the dataset which is not after the supplement
+            replace_end = None
+            shift = 0
+            if truncate:
+                agg_length = agg_offset + supplement_length
+            else:
+                replace_end = yield self._find_aggregation_offset(session, root, agg_dim, supplement_etime, after=True)
+                log.info('End of the range replaced by the supplement in the current dataset: %d' % replace_end)
+
+                # The values after the replaced range move by the difference in length
+                shift = supplement_length - (replace_end - agg_offset)
+                agg_length = agg_dim.length + shift
+
+            # Remove the replaced range from the variables on the aggregation dimension
+            for var in root.variables:
+                if len(var.shape) == 0 or var.shape[0].name != agg_dim.name or not var.IsFieldSet('content'):
+                    continue
+                yield self._remove_aggregated_range(session, var, agg_offset, replace_end, shift)
+
+        self._merge_dimensions(root, merge_root, merge_agg_dim, agg_length)
 
-        raise NotImplementedError('FMRC Supplement updates are not yet supported')
+        for merge_var in merge_root.variables:
+            var_name = merge_var.name
+
+            try:
+                var = root.FindVariableByName(var_name)
+            except OOIObjectError, oe:
+                log.debug(oe)
+                log.info('Variable %s does not yet exist in the dataset!' % var_name)
+
+                v_link = root.variables.add()
+                v_link.SetLink(merge_var)
+                continue
 
+            if merge_agg_dim not in merge_var.shape:
+                log.info('Nothing to merge on variable %s which does not share the aggregation dimension' % var_name)
+                continue
+
+            for merge_ba in merge_var.content.bounded_arrays:
+                ba = var.Repository.copy_object(merge_ba, deep_copy=False)
+
+                ba.bounds[0].origin += agg_offset
+
+                ba_link = var.content.bounded_arrays.add()
+                ba_link.SetLink(ba)
+
+            log.info('Merged Variable %s into the dataset!' % var_name)
+
+            self._check_variable_attributes(var, merge_var)
+
+        self._merge_global_attributes(root, merge_root, result, replace_end=truncate)
+
+        log.debug('_merge_replacing_supplement - Complete')
+
+        defer.returnValue(result)
 
 
     @defer.inlineCallbacks
-    def _merge_overlapping_supplement(self):
+    def _find_aggregation_offset(self, session, root, agg_dim, supplement_stime, after=False):
+        """
+        Find the index on the aggregation dimension of the first value of the dataset which is not before the
+        given time of the supplement. The bounded arrays of the time coordinate are searched by their origin and
+        only the ndarrays of the ones visited by the search are fetched.
+        @param after if True find the first value which is after the given time instead
+        """
+        try:
+            string_time = root.FindAttributeByName('ion_time_coverage_end')
+            current_etime = calendar.timegm(time.strptime(string_time.GetValue(), '%Y-%m-%dT%H:%M:%SZ'))
+            if current_etime < supplement_stime:
+                log.info('The supplement starts after the end of the dataset')
+                defer.returnValue(agg_dim.length)
+        except OOIObjectError, oe:
+            log.debug(oe)
 
+        try:
+            time_var = root.FindVariableByName(agg_dim.name)
+        except OOIObjectError, oe:
+            raise IngestionError('Can not replace part of a dataset without a coordinate variable for the aggregation dimension "%s"' % agg_dim.name)
+
+        time_units = parse_time_units(time_var.GetUnits())
+        if time_units is None:
+            raise IngestionError('Can not parse the units of the time coordinate "%s": "%s"' % (agg_dim.name, time_var.GetUnits()))
+        scale, origin = time_units
+
+        yield self._get_bounded_arrays(session, time_var.content)
+        bounded_arrays = sorted(time_var.content.bounded_arrays, key=lambda ba: ba.bounds[0].origin)
+
+        # Find the first bounded array which ends at or after (or just after) the time
+        values = {}
+        low = 0
+        high = len(bounded_arrays)
+        while low < high:
+            mid = (low + high) // 2
+            ndarray = yield self._get_ndarray(session, bounded_arrays[mid])
+            values[mid] = [value * scale + origin for value in ndarray.value]
+            if values[mid] and (values[mid][-1] > supplement_stime or (not after and values[mid][-1] == supplement_stime)):
+                high = mid
+            else:
+                low = mid + 1
 
-        log.debug('_merge_overlapping_supplement - Start')
+        if low == len(bounded_arrays):
+            defer.returnValue(agg_dim.length)
 
-        # A little sanity check on entering recv_done...
-        if len(self.dataset.Repository.branches) != 2:
-            raise IngestionError('The dataset is in a bad state - there should be two branches in the repository state on entering recv_done.', 500)
+        if after:
+            defer.returnValue(bounded_arrays[low].bounds[0].origin + bisect_right(values[low], supplement_stime))
+        defer.returnValue(bounded_arrays[low].bounds[0].origin + bisect_left(values[low], supplement_stime))
 
 
-        # Commit the current state of the supplement - ingest of new content is complete
-        self.dataset.Repository.commit('Ingest received complete notification.')
+    @defer.inlineCallbacks
+    def _get_bounded_arrays(self, session, content):
+        """
+        Fetch the bounded arrays of a variable content which are not loaded - they are excluded when the
+        dataset is checked out
+        """
+        repo = session.dataset.Repository
+        links = [link for link in content.bounded_arrays.GetLinks() if link.key not in repo.index_hash]
+        if links:
+            yield repo.fetch_links(links)
 
-        # The current branch on entering recv done is the supplement branch
-        merge_branch = self.dataset.Repository.current_branch_key()
 
-        # Merge it with the current state of the dataset in the datastore
-        yield self.dataset.MergeWith(branchname=merge_branch, parent_branch='master')
+    @defer.inlineCallbacks
+    def _get_ndarray(self, session, ba):
+        """
+        Get the ndarray of a bounded array of the dataset, fetching it from the datastore if it is not loaded
+        """
+        repo = session.dataset.Repository
+        link = ba.GetLink('ndarray')
+        if link.key not in repo.index_hash:
+            yield repo.fetch_links([link])
 
-        #Remove the head for the supplement - there is only one current state once the merge is complete!
-        self.dataset.Repository.remove_branch(merge_branch)
+        defer.returnValue(ba.ndarray)
 
 
-        # Get the root group of the current state of the dataset
-        root = self.dataset.root_group
+    @defer.inlineCallbacks
+    def _remove_aggregated_range(self, session, var, start, end, shift=0):
+        """
+        Remove the values of a variable in the range [start, end) of the aggregation dimension (its first
+        dimension). Bounded arrays inside the range are removed, the ones which cross its ends are replaced by
+        the parts outside of it. Bounded arrays before the range are not touched.
+        @param end the end of the range, None for the end of the variable
+        @param shift the amount to move the values after the range by on the aggregation dimension
+        """
+        content = var.content
+        rank = len(var.shape)
+        yield self._get_bounded_arrays(session, content)
+        index = _get_bounded_array_index(content)
+
+        positions = index.intersecting([start] + [None] * (rank - 1), [end] + [None] * (rank - 1))
+        log.debug('Replacing %d of %d bounded arrays in variable %s' % (len(positions), len(index), var.name))
+
+        # Work from the end so that deleting does not move the positions still to do
+        for position in reversed(positions):
+            ba = content.bounded_arrays[position]
+            ba_start = ba.bounds[0].origin
+            ba_end = ba_start + ba.bounds[0].size
+
+            keep = []
+            if ba_start < start:
+                keep.append((ba_start, start))
+            if end is not None and ba_end > end:
+                keep.append((end, ba_end))
+
+            if not keep:
+                del content.bounded_arrays[position]
+                continue
+
+            ndarray = yield self._get_ndarray(session, ba)
+            parts = [self._slice_bounded_array(session, ba, ndarray, part_start, part_end) for part_start, part_end in keep]
+
+            content.bounded_arrays.SetLink(position, parts[0])
+            for part in parts[1:]:
+                part_link = content.bounded_arrays.add()
+                part_link.SetLink(part)
+
+        if end is None or shift == 0:
+            return
+
+        # Move the bounded arrays after the range - a copy is moved, the bounded array may be shared
+        index = _get_bounded_array_index(content)
+        for position in index.intersecting([end] + [None] * (rank - 1), [None] * rank):
+            ba = content.bounded_arrays[position]
+            moved = var.Repository.copy_object(ba, deep_copy=False)
+            moved.bounds[0].origin += shift
+            content.bounded_arrays.SetLink(position, moved)
+
+
+    def _slice_bounded_array(self, session, ba, ndarray, start, end):
+        """
+        Create a bounded array with the values of ba in the range [start, end) of its first dimension
+        """
+        inner = 1
+        for bounds in ba.bounds[1:]:
+            inner *= bounds.size
+        offset = start - ba.bounds[0].origin
 
-        # Get the root group of the supplement we are merging
-        merge_root = self.dataset.Merge[0].root_group
+        part = session.dataset.CreateObject(CDM_BOUNDED_ARRAY_TYPE)
+        for bounds in ba.bounds:
+            part_bounds = part.bounds.add()
+            part_bounds.origin = bounds.origin
+            part_bounds.size = bounds.size
+        part.bounds[0].origin = start
+        part.bounds[0].size = end - start
 
-        log.info('Starting Find Dimension LooP')
+        part.ndarray = session.dataset.CreateObject(ndarray.ObjectType)
+        part.ndarray.value.extend(ndarray.value[offset * inner:(end - start + offset) * inner])
 
-        # Determine the inner most dimension on which we are aggregating
-        dimension_order = []
-        for merge_var in merge_root.variables:
+        return part
 
-            # Add each dimension in reverse order so that the inside dimension is always in front... to determine the time aggregation dimension
-            for merge_dim in reversed(merge_var.shape):
 
-                if merge_dim not in dimension_order:
-                    dimension_order.insert(0, merge_dim)
 
-        #print 'FINAL DIMENSION ORDER:'
-        #print [ dim.name for dim in dimension_order]
+    @defer.inlineCallbacks
+    def _merge_overlapping_supplement(self, session):
 
-        # This is the inner most!
-        merge_agg_dim = dimension_order[0]
 
-        log.info('Merge aggregation dimension name is: %s' % merge_agg_dim.name)
+        log.debug('_merge_overlapping_supplement - Start')
 
+        root, merge_root, merge_agg_dim, result = yield self._begin_merge(session)
 
         supplement_length = merge_agg_dim.length
-
-        result = {EM_TIMESTEPS:supplement_length}
+        supplement_stime = result[EM_START_DATE] / 1000
 
         agg_offset = 0
         try:
@@ -773,23 +1210,6 @@ class IngestionService(ServiceProcess):
         except OOIObjectError, oe:
             log.debug('No Dimension found in current dataset:' + str(oe))
 
-        # Get the start time of the supplement
-        try:
-            string_time = merge_root.FindAttributeByName('ion_time_coverage_start')
-            supplement_stime = calendar.timegm(time.strptime(string_time.GetValue(), '%Y-%m-%dT%H:%M:%SZ'))
-
-            string_time = merge_root.FindAttributeByName('ion_time_coverage_end')
-            supplement_etime = calendar.timegm(time.strptime(string_time.GetValue(), '%Y-%m-%dT%H:%M:%SZ'))
-
-            result.update({EM_START_DATE:supplement_stime*1000,
-                           EM_END_DATE:supplement_etime*1000})
-
-        except OOIObjectError, oe:
-            log.debug('No start time attribute found in dataset supplement!' + str(oe))
-            raise IngestionError('No start time attribute found in dataset supplement!')
-            # this is an error - the attribute must be present to determine how to append the data supplement time coordinate!
-
-
         # Get the end time of the current dataset
         try:
             string_time = root.FindAttributeByName('ion_time_coverage_end')
@@ -813,31 +1233,7 @@ class IngestionService(ServiceProcess):
             log.info('Aggregation offset unchanged - dataset has no ion_time_coverage_end.')
             # This is not an error - it is a new dataset.
 
-        ###
-        ### Add the dimensions from the supplement to the current state if they are not already there
-        ###
-        merge_dims = {}
-        for merge_dim in merge_root.dimensions:
-            merge_dims[merge_dim.name] = merge_dim
-
-        dims = {}
-        for dim in root.dimensions:
-            dims[dim.name] = dim
-
-        if merge_dims.keys() != dims.keys():
-            if len(dims) != 0:
-                raise IngestionError('Can not ingest supplement with different dimensions than the dataset')
-            else:
-                for merge_dim in merge_root.dimensions:
-                    dim_link = root.dimensions.add()
-                    dim_link.SetLink(merge_dim)
-
-        else:
-            # We are appending an existing dataset - adjust the length of the aggregation dimension
-            agg_dim = dims[merge_agg_dim.name]
-            agg_dim.length = agg_offset + supplement_length
-            log.info('Setting the aggregation dimension %s to %d' % (agg_dim.name, agg_dim.length))
-
+        self._merge_dimensions(root, merge_root, merge_agg_dim, agg_offset + supplement_length)
 
         for merge_var in merge_root.variables:
             var_name = merge_var.name
@@ -876,27 +1272,150 @@ class IngestionService(ServiceProcess):
 
             log.info('Merged Variable %s into the dataset!' % var_name)
 
-            
-            merge_att_ids = set()
-            for merge_att in merge_var.attributes:
-                merge_att_ids.add(merge_att.MyId)
+            self._check_variable_attributes(var, merge_var)
 
-            att_ids = set()
-            for att in var.attributes:
-                att_ids.add(att.MyId)
+        self._merge_global_attributes(root, merge_root, result)
+
+        log.debug('_merge_overlapping_supplement - Complete')
+
+        defer.returnValue(result)
+
+
+    @defer.inlineCallbacks
+    def _begin_merge(self, session):
+        """
+        Commit the supplement received in an ingestion and merge it with the current state of the dataset
+        @retval a tuple of the root group of the dataset, the root group of the supplement, the aggregation
+        dimension of the supplement and the result of the ingestion so far
+        """
 
-            if att_ids != merge_att_ids:
+        # A little sanity check on entering recv_done...
+        if len(session.dataset.Repository.branches) != 2:
+            raise IngestionError('The dataset is in a bad state - there should be two branches in the repository state on entering recv_done.', 500)
 
-                for merge_att in merge_var.attributes:
-                    log.error('Merge Att: %s, %s, %s' % (merge_att.name, str(merge_att.GetValue()), base64.encodestring(merge_att.MyId)[0:-1]))
 
-                for att in var.attributes:
-                    log.error('Att: %s, %s, %s' % (att.name, str(att.GetValue()), base64.encodestring(att.MyId)[0:-1]))
+        # Commit the current state of the supplement - ingest of new content is complete
+        session.dataset.Repository.commit('Ingest received complete notification.')
 
-                #@TODO turn this error detection back on!
-                #raise ImportError('Variable %s attributes are not the same in the supplement!' % var_name)
+        # The current branch on entering recv done is the supplement branch
+        merge_branch = session.dataset.Repository.current_branch_key()
 
+        # Merge it with the current state of the dataset in the datastore
+        yield session.dataset.MergeWith(branchname=merge_branch, parent_branch='master')
+
+        #Remove the head for the supplement - there is only one current state once the merge is complete!
+        session.dataset.Repository.remove_branch(merge_branch)
 
+
+        # Get the root group of the current state of the dataset
+        root = session.dataset.root_group
+
+        # Get the root group of the supplement we are merging
+        merge_root = session.dataset.Merge[0].root_group
+
+        log.info('Starting Find Dimension LooP')
+
+        # Determine the inner most dimension on which we are aggregating
+        dimension_order = []
+        for merge_var in merge_root.variables:
+
+            # Add each dimension in reverse order so that the inside dimension is always in front... to determine the time aggregation dimension
+            for merge_dim in reversed(merge_var.shape):
+
+                if merge_dim not in dimension_order:
+                    dimension_order.insert(0, merge_dim)
+
+        #print 'FINAL DIMENSION ORDER:'
+        #print [ dim.name for dim in dimension_order]
+
+        # This is the inner most!
+        merge_agg_dim = dimension_order[0]
+
+        log.info('Merge aggregation dimension name is: %s' % merge_agg_dim.name)
+
+
+        result = {EM_TIMESTEPS:merge_agg_dim.length}
+
+        # Get the start time of the supplement
+        try:
+            string_time = merge_root.FindAttributeByName('ion_time_coverage_start')
+            supplement_stime = calendar.timegm(time.strptime(string_time.GetValue(), '%Y-%m-%dT%H:%M:%SZ'))
+
+            string_time = merge_root.FindAttributeByName('ion_time_coverage_end')
+            supplement_etime = calendar.timegm(time.strptime(string_time.GetValue(), '%Y-%m-%dT%H:%M:%SZ'))
+
+            result.update({EM_START_DATE:supplement_stime*1000,
+                           EM_END_DATE:supplement_etime*1000})
+
+        except OOIObjectError, oe:
+            log.debug('No start time attribute found in dataset supplement!' + str(oe))
+            raise IngestionError('No start time attribute found in dataset supplement!')
+            # this is an error - the attribute must be present to determine how to append the data supplement time coordinate!
+
+        defer.returnValue((root, merge_root, merge_agg_dim, result))
+
+
+    def _merge_dimensions(self, root, merge_root, merge_agg_dim, agg_length):
+        """
+        Add the dimensions of the supplement to a new dataset, or set the length of the aggregation dimension
+        of an existing one
+        """
+        ###
+        ### Add the dimensions from the supplement to the current state if they are not already there
+        ###
+        merge_dims = {}
+        for merge_dim in merge_root.dimensions:
+            merge_dims[merge_dim.name] = merge_dim
+
+        dims = {}
+        for dim in root.dimensions:
+            dims[dim.name] = dim
+
+        if merge_dims.keys() != dims.keys():
+            if len(dims) != 0:
+                raise IngestionError('Can not ingest supplement with different dimensions than the dataset')
+            else:
+                for merge_dim in merge_root.dimensions:
+                    dim_link = root.dimensions.add()
+                    dim_link.SetLink(merge_dim)
+
+        else:
+            # We are updating an existing dataset - adjust the length of the aggregation dimension
+            agg_dim = dims[merge_agg_dim.name]
+            agg_dim.length = agg_length
+            log.info('Setting the aggregation dimension %s to %d' % (agg_dim.name, agg_dim.length))
+
+
+    def _check_variable_attributes(self, var, merge_var):
+        """
+        Log the attributes of a variable which differ from the ones in the supplement
+        """
+        merge_att_ids = set()
+        for merge_att in merge_var.attributes:
+            merge_att_ids.add(merge_att.MyId)
+
+        att_ids = set()
+        for att in var.attributes:
+            att_ids.add(att.MyId)
+
+        if att_ids != merge_att_ids:
+
+            for merge_att in merge_var.attributes:
+                log.error('Merge Att: %s, %s, %s' % (merge_att.name, str(merge_att.GetValue()), base64.encodestring(merge_att.MyId)[0:-1]))
+
+            for att in var.attributes:
+                log.error('Att: %s, %s, %s' % (att.name, str(att.GetValue()), base64.encodestring(att.MyId)[0:-1]))
+
+            #@TODO turn this error detection back on!
+            #raise ImportError('Variable %s attributes are not the same in the supplement!' % var.name)
+
+
+    def _merge_global_attributes(self, root, merge_root, result, replace_end=False):
+        """
+        Merge the global attributes of the supplement into the dataset
+        @param replace_end if True the time coverage end of the dataset is taken from the supplement, otherwise
+        it is the later of the two
+        """
         # @TODO Get the vertical positive 'direction!' Deal with attributes accordingly.
 
 
@@ -936,7 +1455,10 @@ class IngestionService(ServiceProcess):
                     root.MergeAttLesser(att_name, merge_root)
 
                 elif att_name == 'ion_time_coverage_end':
-                    root.MergeAttGreater(att_name, merge_root)
+                    if replace_end:
+                        root.MergeAttSrc(att_name, merge_root)
+                    else:
+                        root.MergeAttGreater(att_name, merge_root)
 
                 elif att_name == 'ion_geospatial_lat_min':
                     root.MergeAttLesser(att_name, merge_root)
@@ -1045,11 +1567,6 @@ class IngestionService(ServiceProcess):
                 log.exception('Attribute merger failed for global attribute "%s".  Cause: %s' % (att_name, str(ex)))
 
 
-        log.debug('_merge_overlapping_supplement - Complete')
-
-        defer.returnValue(result)
-
-
 class IngestionClient(ServiceClient):
     """
     Class for the client accessing the resource registry.
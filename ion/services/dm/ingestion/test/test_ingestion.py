@@ -8,6 +8,8 @@
 from ion.core.exception import ReceivedApplicationError, ReceivedContainerError
 from ion.services.dm.distribution.publisher_subscriber import Subscriber
 
+import time
+
 import ion.util.ionlog
 from ion.util.iontime import IonTime
 
@@ -23,7 +25,7 @@ from ion.services.dm.distribution.events import DatasourceUnavailableEventSubscr
 
 
 from ion.core.process import process
-from ion.services.dm.ingestion.ingestion import IngestionClient, SUPPLEMENT_MSG_TYPE, CDM_DATASET_TYPE, DAQ_COMPLETE_MSG_TYPE, PERFORM_INGEST_MSG_TYPE, CREATE_DATASET_TOPICS_MSG_TYPE, EM_URL, EM_ERROR, EM_TITLE, EM_DATASET, EM_END_DATE, EM_START_DATE, EM_TIMESTEPS, EM_DATA_SOURCE
+from ion.services.dm.ingestion.ingestion import IngestionClient, IngestionError, ChunkPipeline, parse_time_units, SUPPLEMENT_MSG_TYPE, CDM_DATASET_TYPE, DAQ_COMPLETE_MSG_TYPE, PERFORM_INGEST_MSG_TYPE, CREATE_DATASET_TOPICS_MSG_TYPE, EM_URL, EM_ERROR, EM_TITLE, EM_DATASET, EM_END_DATE, EM_START_DATE, EM_TIMESTEPS, EM_DATA_SOURCE
 from ion.test.iontest import IonTestCase
 
 from ion.services.coi.datastore_bootstrap.dataset_bootstrap import bootstrap_profile_dataset, BOUNDED_ARRAY_TYPE, FLOAT32ARRAY_TYPE, bootstrap_byte_array_dataset
@@ -37,6 +39,9 @@ DATASET_TYPE = create_type_identifier(object_id=10001, version=1)
 DATASOURCE_TYPE = create_type_identifier(object_id=4503, version=1)
 GROUP_TYPE = create_type_identifier(object_id=10020, version=1)
 
+# The first time of the profile dataset - bootstrap_profile_dataset supplement n covers the hour after n hours
+PROFILE_START_TIME = 1280102520
+
 
 CONF = ioninit.config(__name__)
 
@@ -49,6 +54,115 @@ class FakeDelayedCall(object):
     def delay(self, int):
         pass
 
+class FakeElement(object):
+
+    def __init__(self, value):
+        self._element = value
+
+
+class FakeBlobsMessage(object):
+
+    class Link(object):
+        def SetLink(self, value):
+            self.value = value
+
+    class FakeRepository(object):
+        def _wrap_message_object(self, value):
+            return value
+
+    def __init__(self):
+        self.links = []
+        self.Repository = self.FakeRepository()
+
+    @property
+    def blob_elements(self):
+        return self
+
+    def add(self):
+        link = self.Link()
+        self.links.append(link)
+        return link
+
+
+class FakeMessageClient(object):
+
+    def create_instance(self, type_id):
+        return defer.succeed(FakeBlobsMessage())
+
+
+class FakeDataStoreClient(object):
+
+    def __init__(self):
+        self.puts = []
+
+    def put_blobs(self, msg):
+        d = defer.Deferred()
+        self.puts.append(([link.value for link in msg.links], d))
+        return d
+
+
+class ChunkPipelineTest(unittest.TestCase):
+    """
+    Test the batching and back pressure of the chunk pipeline without a datastore
+    """
+
+    def setUp(self):
+        self.dsc = FakeDataStoreClient()
+        self.pipeline = ChunkPipeline(FakeMessageClient(), self.dsc, batch_bytes=1000, batch_size=2, max_writes=2)
+
+    def test_batches(self):
+        fired = []
+        for i in range(4):
+            self.pipeline.add(FakeElement('ndarray_%d' % i), 10).addCallback(fired.append)
+        self.assertEqual(len(fired), 4)
+        self.assertEqual([values for values, d in self.dsc.puts], [['ndarray_0', 'ndarray_1'], ['ndarray_2', 'ndarray_3']])
+
+        # A large ndarray fills the batch by size - both writes are in flight so the add waits
+        self.pipeline.add(FakeElement('big'), 5000).addCallback(fired.append)
+        self.assertEqual(len(fired), 4)
+        self.assertEqual(len(self.dsc.puts), 2)
+
+        self.dsc.puts[0][1].callback(None)
+        self.assertEqual(len(fired), 5)
+        self.assertEqual(self.dsc.puts[2][0], ['big'])
+
+        # Drain writes the rest and waits for all the writes
+        self.pipeline.add(FakeElement('last'), 10)
+        drained = []
+        self.pipeline.drain().addCallback(drained.append)
+        self.assertEqual(drained, [])
+        self.dsc.puts[1][1].callback(None)
+        self.dsc.puts[2][1].callback(None)
+        self.assertEqual(self.dsc.puts[3][0], ['last'])
+        self.assertEqual(drained, [])
+        self.dsc.puts[3][1].callback(None)
+        self.assertEqual(drained, [None])
+
+    def test_failed_write(self):
+        self.pipeline.add(FakeElement('ndarray_0'), 10)
+        self.pipeline.add(FakeElement('ndarray_1'), 10)
+        self.dsc.puts[0][1].errback(ReceivedContainerError({}, {'errmsg':'Datastore failure'}))
+
+        self.assertRaises(IngestionError, self.pipeline.add, FakeElement('ndarray_2'), 10)
+        return self.failUnlessFailure(self.pipeline.drain(), IngestionError)
+
+
+class ParseTimeUnitsTest(unittest.TestCase):
+
+    def test_parse_time_units(self):
+
+        self.assertEqual(parse_time_units('seconds since 1970-01-01T00:00:00Z'), (1, 0))
+        self.assertEqual(parse_time_units('hours since 1970-01-02 00:00:00'), (3600, 86400))
+        self.assertEqual(parse_time_units('days since 1970-01-01'), (86400, 0))
+        self.assertEqual(parse_time_units('Minutes since 1970-01-01 00:01 UTC'), (60, 60))
+        self.assertEqual(parse_time_units('seconds since 1970-01-01 00:00::00'), (1, 0))
+
+        self.assertEqual(parse_time_units('degrees_north'), None)
+        self.assertEqual(parse_time_units('fortnights since 1970-01-01'), None)
+        self.assertEqual(parse_time_units('hours since yesterday'), None)
+        self.assertEqual(parse_time_units(None), None)
+
+
 class IngestionTest(IonTestCase):
     """
     Testing service operations of the ingestion service.
@@ -156,9 +270,9 @@ class IngestionTest(IonTestCase):
 
 
 
-        yield self.ingest._prepare_ingest(content)
+        session = yield self.ingest._prepare_ingest(content)
 
-        self.ingest.timeoutcb = FakeDelayedCall()
+        session.timeoutcb = FakeDelayedCall()
 
         #print '\n\n\n Got Dataset in Ingest \n\n\n\n'
 
@@ -169,7 +283,7 @@ class IngestionTest(IonTestCase):
         #print '\n\n\n Filled out message with a dataset \n\n\n\n'
 
         # Call the op of the ingest process directly
-        yield self.ingest._ingest_op_recv_dataset(cdm_dset_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_dataset(session, cdm_dset_msg, '', self.fake_msg())
 
         # ==========
         # Can't use messaging and client because the send returns before the op is complete so the result is untestable.
@@ -177,7 +291,7 @@ class IngestionTest(IonTestCase):
         #yield pu.asleep(1)
         # ==========
 
-        self.assertEqual(self.ingest.dataset.ResourceLifeCycleState, self.ingest.dataset.UPDATE)
+        self.assertEqual(session.dataset.ResourceLifeCycleState, session.dataset.UPDATE)
 
 
 
@@ -194,11 +308,11 @@ class IngestionTest(IonTestCase):
         content.dataset_id = SAMPLE_PROFILE_DATASET_ID
         content.datasource_id = SAMPLE_PROFILE_DATA_SOURCE_ID
 
-        yield self.ingest._prepare_ingest(content)
+        session = yield self.ingest._prepare_ingest(content)
 
-        self.ingest.timeoutcb = FakeDelayedCall()
+        session.timeoutcb = FakeDelayedCall()
 
-        self.ingest.dataset.CreateUpdateBranch()
+        session.dataset.CreateUpdateBranch()
 
         #print '\n\n\n Got Dataset in Ingest \n\n\n\n'
 
@@ -207,13 +321,60 @@ class IngestionTest(IonTestCase):
 
         for var in var_list:
 
-            yield self.create_and_test_variable_chunk(var)
+            yield self.create_and_test_variable_chunk(session, var)
 
 
     @defer.inlineCallbacks
-    def create_and_test_variable_chunk(self, var_name):
+    def test_recv_chunk_through_subscriber(self):
+        """
+        Send a chunk on the ingestion topic - the receiver clears the chunk message repository after the op, before
+        the buffered ndarray is written to the datastore
+        """
+        content = yield self.ingest.mc.create_instance(PERFORM_INGEST_MSG_TYPE)
+        content.dataset_id = SAMPLE_PROFILE_DATASET_ID
+        content.datasource_id = SAMPLE_PROFILE_DATA_SOURCE_ID
+
+        session = self.ingest._begin_session(content)
+        yield self.ingest._prepare_ingest(content, session)
+        session.timeoutcb = FakeDelayedCall()
+        session.dataset.CreateUpdateBranch()
+        topic = yield self.ingest._setup_ingestion_topic(session, content)
+
+        # Fires when the receiver has cleared the workbench after the op
+        cleared = defer.Deferred()
+        manage_workbench_cache = self.ingest.workbench.manage_workbench_cache
+        def notify_manage_workbench_cache(*args, **kwargs):
+            manage_workbench_cache(*args, **kwargs)
+            if not cleared.called:
+                cleared.callback(None)
+        self.ingest.workbench.manage_workbench_cache = notify_manage_workbench_cache
+
+        supplement_msg = yield self.proc.message_client.create_instance(SUPPLEMENT_MSG_TYPE)
+        supplement_msg.dataset_id = SAMPLE_PROFILE_DATASET_ID
+        supplement_msg.variable_name = 'salinity'
+        self.create_chunk(supplement_msg)
+        ndarray_key = supplement_msg.bounded_array.ndarray.MyId
 
-        group = self.ingest.dataset.root_group
+        try:
+            yield self.proc.send(topic, 'recv_chunk', supplement_msg)
+            yield cleared
+        finally:
+            del self.ingest.workbench.manage_workbench_cache
+
+        # The batch is not full - the ndarray is still buffered
+        self.assertEqual(session.deferred.called, False)
+        self.failIf(self.datastore.b_store.has_key(ndarray_key))
+
+        yield session.chunks.drain()
+        self.failUnless(self.datastore.b_store.has_key(ndarray_key))
+
+        yield self.ingest._end_session(session)
+
+
+    @defer.inlineCallbacks
+    def create_and_test_variable_chunk(self, session, var_name):
+
+        group = session.dataset.root_group
         var = group.FindVariableByName(var_name)
         starting_bounded_arrays  = var.content.bounded_arrays[:]
 
@@ -224,7 +385,10 @@ class IngestionTest(IonTestCase):
         self.create_chunk(supplement_msg)
 
         # Call the op of the ingest process directly
-        yield self.ingest._ingest_op_recv_chunk(supplement_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_chunk(session, supplement_msg, '', self.fake_msg())
+
+        # Wait for the ndarray to be written to the datastore
+        yield session.chunks.drain()
 
         updated_bounded_arrays = var.content.bounded_arrays[:]
 
@@ -232,8 +396,8 @@ class IngestionTest(IonTestCase):
         self.assertEqual(len(updated_bounded_arrays), len(starting_bounded_arrays)+1)
 
         # The bounded array but not the ndarray should be in the ingestion service dataset
-        self.assertIn(supplement_msg.bounded_array.MyId, self.ingest.dataset.Repository.index_hash)
-        self.assertNotIn(supplement_msg.bounded_array.ndarray.MyId, self.ingest.dataset.Repository.index_hash)
+        self.assertIn(supplement_msg.bounded_array.MyId, session.dataset.Repository.index_hash)
+        self.assertNotIn(supplement_msg.bounded_array.ndarray.MyId, session.dataset.Repository.index_hash)
 
         # The datastore should now have this ndarray
         self.failUnless(self.datastore.b_store.has_key(supplement_msg.bounded_array.ndarray.MyId))
@@ -290,23 +454,67 @@ class IngestionTest(IonTestCase):
         content.dataset_id = SAMPLE_PROFILE_DATASET_ID
         content.datasource_id = SAMPLE_PROFILE_DATA_SOURCE_ID
 
-        yield self.ingest._prepare_ingest(content)
+        session = yield self.ingest._prepare_ingest(content)
 
-        self.ingest.timeoutcb = FakeDelayedCall()
+        session.timeoutcb = FakeDelayedCall()
 
         # Now fake the receipt of the dataset message
         cdm_dset_msg = yield self.ingest.mc.create_instance(CDM_DATASET_TYPE)
         yield bootstrap_profile_dataset(cdm_dset_msg, supplement_number=1, random_initialization=True)
 
         # Call the op of the ingest process directly
-        yield self.ingest._ingest_op_recv_dataset(cdm_dset_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_dataset(session, cdm_dset_msg, '', self.fake_msg())
 
 
         complete_msg = yield self.ingest.mc.create_instance(DAQ_COMPLETE_MSG_TYPE)
 
         complete_msg.status = complete_msg.StatusCode.OK
-        yield self.ingest._ingest_op_recv_done(complete_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_done(session, complete_msg, '', self.fake_msg())
+
+
+    @defer.inlineCallbacks
+    def test_ingest_sessions(self):
+        """
+        Test that ingestion messages are routed by topic and that a dataset is only ingested once at a time
+        """
+        content = yield self.ingest.mc.create_instance(PERFORM_INGEST_MSG_TYPE)
+        content.dataset_id = SAMPLE_PROFILE_DATASET_ID
+        content.datasource_id = SAMPLE_PROFILE_DATA_SOURCE_ID
 
+        session = self.ingest._begin_session(content)
+        yield self.ingest._prepare_ingest(content, session)
+        topic = yield self.ingest._setup_ingestion_topic(session, content)
+        self.assertIdentical(self.ingest._sessions[topic], session)
+
+        # A second ingestion of the same dataset is refused before anything is pulled
+        get_instance = self.ingest.rc.get_instance
+        pulls = []
+        def counting_get_instance(*args, **kwargs):
+            pulls.append(args)
+            return get_instance(*args, **kwargs)
+        self.ingest.rc.get_instance = counting_get_instance
+        try:
+            yield self.failUnlessFailure(self.ingest.op_ingest(content, {}, self.fake_msg()), IngestionError)
+        finally:
+            del self.ingest.rc.get_instance
+        self.assertEqual(pulls, [])
+        self.assertIdentical(self.ingest._sessions[topic], session)
+
+        # A message on a topic with no ingestion is acknowledged and dropped
+        acked = []
+        class ack_msg(object):
+            def ack(self):
+                acked.append(True)
+        yield self.ingest._handle_ingestion_msg('not_an_ingest_topic', {'op':'recv_done', 'content':None}, ack_msg())
+        self.assertEqual(acked, [True])
+        self.assertEqual(session.deferred.called, False)
+
+        # An error in a message on the topic ends the session it belongs to
+        yield self.ingest._handle_ingestion_msg(topic, {'op':'bad_op', 'content':None}, ack_msg())
+        yield self.failUnlessFailure(session.deferred, IngestionError)
+
+        yield self.ingest._end_session(session)
+        self.assertNotIn(topic, self.ingest._sessions)
 
 
     @defer.inlineCallbacks
@@ -384,9 +592,9 @@ class IngestionTest(IonTestCase):
         content.dataset_id = new_dataset_id
         content.datasource_id = new_datasource_id
 
-        yield self.ingest._prepare_ingest(content)
+        session = yield self.ingest._prepare_ingest(content)
 
-        self.ingest.timeoutcb = FakeDelayedCall()
+        session.timeoutcb = FakeDelayedCall()
 
         # Now fake the receipt of the dataset message
         cdm_dset_msg = yield self.ingest.mc.create_instance(CDM_DATASET_TYPE)
@@ -395,7 +603,7 @@ class IngestionTest(IonTestCase):
         log.info('Calling Receive Dataset')
 
         # Call the op of the ingest process directly
-        yield self.ingest._ingest_op_recv_dataset(cdm_dset_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_dataset(session, cdm_dset_msg, '', self.fake_msg())
 
         log.info('Calling Receive Dataset: Complete')
 
@@ -404,7 +612,7 @@ class IngestionTest(IonTestCase):
         log.info('Calling Receive Done')
 
         complete_msg.status = complete_msg.StatusCode.OK
-        yield self.ingest._ingest_op_recv_done(complete_msg, '', self.fake_msg())
+        yield self.ingest._ingest_op_recv_done(session, complete_msg, '', self.fake_msg())
 
         log.info('Calling Receive Done: Complete!')
 
@@ -412,6 +620,226 @@ class IngestionTest(IonTestCase):
 
 
 
+    @defer.inlineCallbacks
+    def _prepare_replacing_ingest(self, aggregation_rule, hours=(2, 3)):
+        """
+        Create a profile dataset with timesteps at 0 and 1 hours in one bounded array and at the given hours in a
+        second, and a data source with the given aggregation rule
+        @retval the session of an ingestion of the dataset
+        """
+        t0 = PROFILE_START_TIME
+
+        new_dataset_id = 'D4F1B5A2-3C1E-4B7A-9E0C-6A2B8F1D7C35'
+        def create_dataset(dataset, *args, **kwargs):
+            """
+            Add a second bounded array with more timesteps to the profile dataset
+            """
+            bootstrap_profile_dataset(dataset, supplement_number=0, random_initialization=False)
+            root = dataset.root_group
+            root.SetDimension('time', 2 + len(hours))
+            root.SetAttribute('ion_time_coverage_end', [time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t0 + int(hours[-1] * 3600)))])
+
+            for var_name, values in (('time', [t0 + int(hour * 3600) for hour in hours]),
+                                     ('salinity', [31.0 + 0.1 * i for i in range(3 * len(hours))])):
+                var = root.FindVariableByName(var_name)
+                first = var.content.bounded_arrays[0]
+
+                ba = dataset.CreateObject(BOUNDED_ARRAY_TYPE)
+                for i in range(len(first.bounds)):
+                    ba.bounds.add()
+                    ba.bounds[i].origin = first.bounds[i].origin
+                    ba.bounds[i].size = first.bounds[i].size
+                ba.bounds[0].origin = 2
+                ba.ndarray = dataset.CreateObject(first.ndarray.ObjectType)
+                ba.ndarray.value.extend(values)
+
+                ba_link = var.content.bounded_arrays.add()
+                ba_link.SetLink(ba)
+            return True
+
+        data_set_description = {ID_CFG:new_dataset_id,
+                      TYPE_CFG:DATASET_TYPE,
+                      NAME_CFG:'Profile dataset for testing replacing supplements',
+                      DESCRIPTION_CFG:'A profile dataset with two bounded arrays',
+                      CONTENT_CFG:create_dataset,
+                      }
+        self.datastore._create_resource(data_set_description)
+        dset_res = self.datastore.workbench.get_repository(new_dataset_id)
+
+        new_datasource_id = '8E2C6F4B-1A7D-4C93-B5E8-0F3D9A6B2E71'
+        def create_datasource(datasource, *args, **kwargs):
+            """
+            Create a data source with the aggregation rule of the test
+            """
+            datasource.source_type = datasource.SourceType.NETCDF_S
+            datasource.request_type = datasource.RequestType.DAP
+            datasource.base_url = "http://not_a_real_url.edu"
+            datasource.max_ingest_millis = 6000
+            datasource.registration_datetime_millis = IonTime().time_ms
+            datasource.ion_title = "Profile Data Source"
+            datasource.ion_description = "Data source for testing replacing supplements"
+            datasource.aggregation_rule = getattr(datasource.AggregationRule, aggregation_rule)
+            return True
+
+        data_source_description = {ID_CFG:new_datasource_id,
+                      TYPE_CFG:DATASOURCE_TYPE,
+                      NAME_CFG:'datasource for testing replacing supplements',
+                      DESCRIPTION_CFG:'A datasource with a replacing aggregation rule',
+                      CONTENT_CFG:create_datasource,
+                      }
+        self.datastore._create_resource(data_source_description)
+        dsource_res = self.datastore.workbench.get_repository(new_datasource_id)
+
+        yield self.datastore.workbench.flush_repo_to_backend(dset_res)
+        yield self.datastore.workbench.flush_repo_to_backend(dsource_res)
+
+        content = yield self.ingest.mc.create_instance(PERFORM_INGEST_MSG_TYPE)
+        content.dataset_id = new_dataset_id
+        content.datasource_id = new_datasource_id
+
+        session = yield self.ingest._prepare_ingest(content)
+        session.timeoutcb = FakeDelayedCall()
+
+        defer.returnValue(session)
+
+    @defer.inlineCallbacks
+    def _ingest_replacing_supplement(self, session):
+        """
+        Ingest the profile supplement for the second hour - it starts at the second timestep of the dataset
+        @retval the root group of the dataset
+        """
+        cdm_dset_msg = yield self.ingest.mc.create_instance(CDM_DATASET_TYPE)
+        yield bootstrap_profile_dataset(cdm_dset_msg, supplement_number=1, random_initialization=False)
+        yield self.ingest._ingest_op_recv_dataset(session, cdm_dset_msg, '', self.fake_msg())
+
+        complete_msg = yield self.ingest.mc.create_instance(DAQ_COMPLETE_MSG_TYPE)
+        complete_msg.status = complete_msg.StatusCode.OK
+        yield self.ingest._ingest_op_recv_done(session, complete_msg, '', self.fake_msg())
+
+        defer.returnValue(session.dataset.root_group)
+
+    def _bounds(self, var):
+        """
+        @retval the (origin, size) on the first dimension of the bounded arrays of a variable, in order of origin
+        """
+        return sorted((ba.bounds[0].origin, ba.bounds[0].size) for ba in var.content.bounded_arrays)
+
+    def _bounded_array_at(self, var, origin):
+        for ba in var.content.bounded_arrays:
+            if ba.bounds[0].origin == origin:
+                return ba
+        self.fail('No bounded array at %d in variable %s' % (origin, var.name))
+
+    def _coverage(self, root):
+        return (root.FindAttributeByName('ion_time_coverage_start').GetValue(),
+                root.FindAttributeByName('ion_time_coverage_end').GetValue())
+
+    def _time_string(self, hours):
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(PROFILE_START_TIME + hours * 3600))
+
+    @defer.inlineCallbacks
+    def test_find_aggregation_offset(self):
+        session = yield self._prepare_replacing_ingest('OVERWRITE')
+        root = session.dataset.root_group
+        agg_dim = root.FindDimensionByName('time')
+
+        t0 = PROFILE_START_TIME
+        expected = [(t0 - 60, 0), (t0, 0), (t0 + 3600, 1), (t0 + 5400, 2), (t0 + 7200, 2),
+                    (t0 + 10800, 3), (t0 + 10860, 4)]
+        for stime, offset in expected:
+            result = yield self.ingest._find_aggregation_offset(session, root, agg_dim, stime)
+            self.assertEqual(result, offset)
+
+        # The first value after the time
+        expected = [(t0 - 60, 0), (t0, 1), (t0 + 3600, 2), (t0 + 5400, 2), (t0 + 7200, 3),
+                    (t0 + 10800, 4), (t0 + 10860, 4)]
+        for etime, offset in expected:
+            result = yield self.ingest._find_aggregation_offset(session, root, agg_dim, etime, after=True)
+            self.assertEqual(result, offset)
+
+    @defer.inlineCallbacks
+    def test_remove_aggregated_range(self):
+        session = yield self._prepare_replacing_ingest('OVERWRITE')
+        root = session.dataset.root_group
+
+        # Both bounded arrays cross the ends of the range - they are trimmed
+        salinity = root.FindVariableByName('salinity')
+        yield self.ingest._remove_aggregated_range(session, salinity, 1, 3)
+        self.assertEqual(self._bounds(salinity), [(0, 1), (3, 1)])
+
+        ba = self._bounded_array_at(salinity, 0)
+        self.assertEqual(ba.bounds[1].size, 3)
+        for value, expected in zip(ba.ndarray.value, [29.82, 29.74, 29.85]):
+            self.assertAlmostEqual(value, expected, 5)
+
+        ba = self._bounded_array_at(salinity, 3)
+        self.assertEqual(ba.bounds[1].size, 3)
+        for value, expected in zip(ba.ndarray.value, [31.3, 31.4, 31.5]):
+            self.assertAlmostEqual(value, expected, 5)
+
+        # The second bounded array is inside a range to the end - it is removed
+        time_var = root.FindVariableByName('time')
+        yield self.ingest._remove_aggregated_range(session, time_var, 2, None)
+        self.assertEqual(self._bounds(time_var), [(0, 2)])
+
+    @defer.inlineCallbacks
+    def test_overwrite_supplement(self):
+        session = yield self._prepare_replacing_ingest('OVERWRITE')
+        root = yield self._ingest_replacing_supplement(session)
+
+        # The supplement replaces the second and third timesteps, the fourth is kept
+        self.assertEqual(root.FindDimensionByName('time').length, 4)
+
+        time_var = root.FindVariableByName('time')
+        self.assertEqual(self._bounds(time_var), [(0, 1), (1, 2), (3, 1)])
+        self.assertEqual(list(self._bounded_array_at(time_var, 0).ndarray.value), [PROFILE_START_TIME])
+        self.assertEqual(list(self._bounded_array_at(time_var, 3).ndarray.value), [PROFILE_START_TIME + 3 * 3600])
+
+        salinity = root.FindVariableByName('salinity')
+        self.assertEqual(self._bounds(salinity), [(0, 1), (1, 2), (3, 1)])
+
+        self.assertEqual(self._coverage(root), (self._time_string(0), self._time_string(3)))
+
+    @defer.inlineCallbacks
+    def test_overwrite_supplement_length_differs(self):
+        # The dataset has a half hourly timestep - three of its timesteps are in the hours of the supplement
+        session = yield self._prepare_replacing_ingest('OVERWRITE', hours=(1.5, 2, 3))
+        root = yield self._ingest_replacing_supplement(session)
+
+        # The two timesteps of the supplement replace those three, the last is kept after them
+        self.assertEqual(root.FindDimensionByName('time').length, 4)
+
+        time_var = root.FindVariableByName('time')
+        self.assertEqual(self._bounds(time_var), [(0, 1), (1, 2), (3, 1)])
+        self.assertEqual(list(self._bounded_array_at(time_var, 0).ndarray.value), [PROFILE_START_TIME])
+        self.assertEqual(list(self._bounded_array_at(time_var, 3).ndarray.value), [PROFILE_START_TIME + 3 * 3600])
+
+        salinity = root.FindVariableByName('salinity')
+        self.assertEqual(self._bounds(salinity), [(0, 1), (1, 2), (3, 1)])
+        ba = self._bounded_array_at(salinity, 3)
+        for value, expected in zip(ba.ndarray.value, [31.6, 31.7, 31.8]):
+            self.assertAlmostEqual(value, expected, 5)
+
+        self.assertEqual(self._coverage(root), (self._time_string(0), self._time_string(3)))
+
+    @defer.inlineCallbacks
+    def test_fmrc_supplement(self):
+        session = yield self._prepare_replacing_ingest('FMRC')
+        root = yield self._ingest_replacing_supplement(session)
+
+        # The supplement replaces everything from the second timestep
+        self.assertEqual(root.FindDimensionByName('time').length, 3)
+
+        time_var = root.FindVariableByName('time')
+        self.assertEqual(self._bounds(time_var), [(0, 1), (1, 2)])
+        self.assertEqual(list(self._bounded_array_at(time_var, 0).ndarray.value), [PROFILE_START_TIME])
+
+        salinity = root.FindVariableByName('salinity')
+        self.assertEqual(self._bounds(salinity), [(0, 1), (1, 2)])
+
+        self.assertEqual(self._coverage(root), (self._time_string(0), self._time_string(2)))
+
+
     @defer.inlineCallbacks
     def test_notify(self):
 
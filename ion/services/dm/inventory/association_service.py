@@ -125,6 +125,9 @@ class AssociationService(ServiceProcess):
         # subject_keys is the set of keys for the associated subjects - to reject quickly any that are not present
         subject_keys = set()
 
+        # The association rows found for each pair
+        pair_rows = []
+
         first_pair = True
 
         for pair in predicate_object_query.pairs:
@@ -167,57 +170,32 @@ class AssociationService(ServiceProcess):
             q.add_predicate_eq(OBJECT_KEY, pair.object.key)
 
             rows = yield self.index_store.query(q)
+            pair_rows.append(rows)
 
-            # subject_pointers is the resulting set of pointers to the current state of the association subject
-            subjects_pointers = set()
-
-            current_keys = set()
-            for key, row in rows.items():
-
-
-                #@TODO - check for divergence and branches in the association and in the object - not just the subject
-
-                if not first_pair and row[SUBJECT_KEY] not in subject_keys:
-                    # The result we are looking for is an intersection operation. If this key is not here escape!
-                    continue
-                current_keys.add(row[SUBJECT_KEY])
-
-                # Get the latest commits for the Subject_Key
-                subject_query = store.Query()
-                # Get only the head or get all? Hmmm not sure...
-                subject_query.add_predicate_gt(BRANCH_NAME,'')
-                subject_query.add_predicate_eq(REPOSITORY_KEY,row[SUBJECT_KEY])
-                subject_heads = yield self.index_store.query(subject_query)
-
-                branches = []
-                for commit_key, commit_row in subject_heads.items():
+            current_keys = set([row[SUBJECT_KEY] for row in rows.itervalues()])
 
-                    if commit_row[BRANCH_NAME] in branches:
-                        raise NotImplementedError('Dealing with divergence in an associated Subject is not yet supported')
-
-                    else:
-                        branches.append(commit_row[BRANCH_NAME])
-
-                    if commit_row[BRANCH_NAME] == row[SUBJECT_BRANCH]:
-                        # We do not need to determine ancestry - the branch name is the same!
-
-                        # return the pointer to this commit - this is the latest version of the associated subject!
-                        totalkey = (row[SUBJECT_KEY] , row[SUBJECT_BRANCH])
-
-                        # Check to make sure we did not hit an inconsistent state where there appear to be two head commits on the association!
-                        subjects_pointers.add(totalkey)
-                    else:
-                        raise NotImplementedError('Dealing with associations to a subject with multiple branches is not yet supported')
-
-
-            # Now - at the end of the loop over the pairs - take the intersection with the current search results!
+            # The result we are looking for is an intersection operation - take it on the keys before looking at heads
             if first_pair:
-                subjects = subjects_pointers
                 subject_keys.update(current_keys)
                 first_pair = False
             else:
                 subject_keys.intersection_update(current_keys)
-                subjects.intersection_update(subjects_pointers)
+
+        if not first_pair:
+            #@TODO - check for divergence and branches in the association and in the object - not just the subject
+
+            # Get the latest commits for all the Subject_Keys in one query
+            subject_heads = yield self._get_heads(subject_keys)
+
+            for i, rows in enumerate(pair_rows):
+                # subject_pointers is the resulting set of pointers to the current state of the association subject
+                subjects_pointers = self._head_pointers(rows, subject_keys, subject_heads, SUBJECT_KEY, SUBJECT_BRANCH, 'Subject')
+
+                # Now take the intersection with the current search results!
+                if i == 0:
+                    subjects = subjects_pointers
+                else:
+                    subjects.intersection_update(subjects_pointers)
 
 
         # Now apply any search by type or lcs!
@@ -256,13 +234,13 @@ class AssociationService(ServiceProcess):
             new_set=set()
 
             # Assumption - the number of rows returned by the association search is much smaller than what will come from search by type or state!
-            for subject in subjects:
+            if subjects:
 
-                # There for, for each result - check and see if it meets the criteria by type and state...
+                # There for, check in one query which of the results meet the criteria by type and state...
                 q = store.Query()
 
-                # Test this repository key
-                q.add_predicate_eq(REPOSITORY_KEY, subject[0])
+                # Test these repository keys
+                q.add_predicate_in(REPOSITORY_KEY, [subject[0] for subject in subjects])
 
                 # Latest state
                 q.add_predicate_gt(BRANCH_NAME,'')
@@ -325,9 +303,12 @@ class AssociationService(ServiceProcess):
 
         first_pair = True
 
-        # subject_keys is the set of keys for the associated subjects - to reject quickly any that are not present
+        # object_keys is the set of keys for the associated objects - to reject quickly any that are not present
         object_keys = set()
 
+        # The association rows found for each pair
+        pair_rows = []
+
         for pair in subject_predicate_query.pairs:
 
 
@@ -345,54 +326,28 @@ class AssociationService(ServiceProcess):
             q.add_predicate_eq(SUBJECT_KEY, pair.subject.key)
 
             rows = yield self.index_store.query(q)
+            pair_rows.append(rows)
 
-            # subject_pointers is the resulting set of pointers to the current state of the association subject
-            objects_pointers = set()
-
-            current_keys=set()
-            for key, row in rows.items():
-
-                if not first_pair and row[OBJECT_KEY] not in object_keys:
-                    # The result we are looking for is an intersection operation. If this key is not her escape!
-                    continue
-
-                current_keys.add(row[OBJECT_KEY])
-
-                # Get the latest commits for the Subject_Key
-                object_query = store.Query()
-                # Get only the head or get all? Hmmm not sure...
-                object_query.add_predicate_gt(BRANCH_NAME,'')
-                object_query.add_predicate_eq(REPOSITORY_KEY,row[OBJECT_KEY])
-                object_heads = yield self.index_store.query(object_query)
-
-                branches = []
-                for commit_key, commit_row in object_heads.items():
-
-                    if commit_row[BRANCH_NAME] in branches:
-                        raise NotImplementedError('Dealing with divergence in an associated Object is not yet supported')
-
-                    else:
-                        branches.append(commit_row[BRANCH_NAME])
-
-                    if commit_row[BRANCH_NAME] == row[OBJECT_BRANCH]:
-                        # We do not need to determine ancestry - the branch name is the same!
-
-                        # return the pointer to this commit - this is the latest version of the associated subject!
-                        totalkey = (row[OBJECT_KEY] , row[OBJECT_BRANCH])
-
-                        # Check to make sure we did not hit an inconsistent state where there appear to be two head commits on the association!
-                        objects_pointers.add(totalkey)
-                    else:
-                        raise NotImplementedError('Dealing with associations to a Object with multiple branches is not yet supported')
+            current_keys = set([row[OBJECT_KEY] for row in rows.itervalues()])
 
-
-            # Now - at the end of the loop over the pairs - take the intersection with the current search results!
+            # The result we are looking for is an intersection operation - take it on the keys before looking at heads
             if first_pair:
-                objects = objects_pointers
                 object_keys.update(current_keys)
                 first_pair = False
             else:
                 object_keys.intersection_update(current_keys)
+
+        # Get the latest commits for all the Object_Keys in one query
+        object_heads = yield self._get_heads(object_keys)
+
+        for i, rows in enumerate(pair_rows):
+            # objects_pointers is the resulting set of pointers to the current state of the association object
+            objects_pointers = self._head_pointers(rows, object_keys, object_heads, OBJECT_KEY, OBJECT_BRANCH, 'Object')
+
+            # Now take the intersection with the current search results!
+            if i == 0:
+                objects = objects_pointers
+            else:
                 objects.intersection_update(objects_pointers)
 
         log.info('Found %s objects!' % len(objects))
@@ -414,6 +369,64 @@ class AssociationService(ServiceProcess):
 
 
 
+    @defer.inlineCallbacks
+    def _get_heads(self, repository_keys):
+        """
+        @brief Find the head commits of many repositories in one query
+        @param repository_keys a set of repository keys
+        @retval a dictionary of repository key to the list of the branch names of its head commits
+        """
+        heads = {}
+        if not repository_keys:
+            defer.returnValue(heads)
+
+        # Get only the head or get all? Hmmm not sure...
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME,'')
+        q.add_predicate_in(REPOSITORY_KEY, repository_keys)
+        rows = yield self.index_store.query(q)
+
+        for commit_key, commit_row in rows.iteritems():
+            heads.setdefault(commit_row[REPOSITORY_KEY], []).append(commit_row[BRANCH_NAME])
+
+        defer.returnValue(heads)
+
+    def _head_pointers(self, rows, keys, heads, key_column, branch_column, name):
+        """
+        @brief Make pointers to the current state of the associated subjects or objects
+        @param rows the association rows found for one pair
+        @param keys the set of associated keys in the intersection of all the pairs
+        @param heads the head branches of the associated repositories from _get_heads
+        @param key_column SUBJECT_KEY or OBJECT_KEY
+        @param branch_column SUBJECT_BRANCH or OBJECT_BRANCH
+        @retval a set of (key, branch) tuples
+        """
+        pointers = set()
+        for key, row in rows.iteritems():
+
+            if row[key_column] not in keys:
+                # The result we are looking for is an intersection operation. If this key is not here escape!
+                continue
+
+            branches = []
+            for branch_name in heads.get(row[key_column], ()):
+
+                if branch_name in branches:
+                    raise NotImplementedError('Dealing with divergence in an associated %s is not yet supported' % name)
+
+                else:
+                    branches.append(branch_name)
+
+                if branch_name == row[branch_column]:
+                    # We do not need to determine ancestry - the branch name is the same!
+
+                    # return the pointer to this commit - this is the latest version of the associated subject!
+                    pointers.add((row[key_column] , row[branch_column]))
+                else:
+                    raise NotImplementedError('Dealing with associations to a %s with multiple branches is not yet supported' % name)
+
+        return pointers
+
     @defer.inlineCallbacks
     def op_object_associations(self, object_reference, headers, msg):
         """
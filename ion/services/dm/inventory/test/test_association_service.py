@@ -35,6 +35,7 @@ from ion.services.coi.datastore_bootstrap.ion_preload_config import RESOURCE_TYP
 
 from ion.services.dm.inventory.association_service import AssociationServiceClient, ASSOCIATION_QUERY_MSG_TYPE
 from ion.services.dm.inventory.association_service import PREDICATE_OBJECT_QUERY_TYPE, IDREF_TYPE, SUBJECT_PREDICATE_QUERY_TYPE
+from ion.core.data.storage_configuration_utility import SUBJECT_KEY
 
 
 ASSOCIATION_TYPE = object_utils.create_type_identifier(object_id=13, version=1)
@@ -352,6 +353,64 @@ class AssociationServiceTest(IonTestCase):
 
 
 
+    @defer.inlineCallbacks
+    def test_association_query_count(self):
+        """
+        The heads of the associated subjects are found with one query - not one per association
+        """
+        pid = yield self.sup.get_child_id('association_service')
+        service = self._get_procinstance(pid)
+
+        queries = []
+        index_store = service.index_store
+        query = index_store.query
+        def counting_query(query_predicates):
+            d = query(query_predicates)
+            def count(rows):
+                queries.append(rows)
+                return rows
+            d.addCallback(count)
+            return d
+        index_store.query = counting_query
+
+        request = yield self.proc.message_client.create_instance(PREDICATE_OBJECT_QUERY_TYPE)
+
+        pair = request.pairs.add()
+        pref = request.CreateObject(PREDICATE_REFERENCE_TYPE)
+        pref.key = OWNED_BY_ID
+        pair.predicate = pref
+        type_ref = request.CreateObject(IDREF_TYPE)
+        type_ref.key = ANONYMOUS_USER_ID
+        pair.object = type_ref
+
+        pair = request.pairs.add()
+        pref = request.CreateObject(PREDICATE_REFERENCE_TYPE)
+        pref.key = TYPE_OF_ID
+        pair.predicate = pref
+        type_ref = request.CreateObject(IDREF_TYPE)
+        type_ref.key = DATASET_RESOURCE_TYPE_ID
+        pair.object = type_ref
+
+        try:
+            result = yield self.asc.get_subjects(request)
+        finally:
+            del index_store.query
+
+        key_list = [idref.key for idref in result.idrefs]
+        self.assertIn(SAMPLE_PROFILE_DATASET_ID, key_list)
+
+        # One association query for each of the two pairs and one query for the heads of all the subjects
+        self.assertEqual(len(queries), 3)
+
+        # Before - the same association queries, plus one heads query per association row of the first pair and
+        # one per row of the second pair whose subject was also found by the first
+        first_keys = set([row[SUBJECT_KEY] for row in queries[0].itervalues()])
+        second_matches = len([row for row in queries[1].itervalues() if row[SUBJECT_KEY] in first_keys])
+        before = 2 + len(queries[0]) + second_matches
+        log.info('Association query count: %d queries before, %d queries now' % (before, len(queries)))
+        self.assertEqual(before > len(queries), True)
+
+
     @defer.inlineCallbacks
     def test_association_by_owner_and_type_find_none(self):
 
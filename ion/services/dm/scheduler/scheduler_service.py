@@ -26,6 +26,7 @@ from ion.services.coi.attributestore import AttributeStoreClient
 from ion.core.messaging.message_client import MessageClient
 from ion.core.object import object_utils
 from ion.services.dm.distribution.events import TriggerEventPublisher, ScheduleEventPublisher
+from ion.services.dm.scheduler.timer_wheel import TimerWheel
 from ion.core.data.storage_configuration_utility import get_cassandra_configuration, STORAGE_PROVIDER, PERSISTENT_ARCHIVE
 
 from ion.util.iontime import IonTime
@@ -151,7 +152,8 @@ class SchedulerService(ServiceProcess):
                'user_id',
                'constant',
                'start_time',
-               'end_time'
+               'end_time',
+               'next_fire_time'
                ]
 
     COLUMN_FAMILY = "scheduler"
@@ -198,11 +200,21 @@ class SchedulerService(ServiceProcess):
 
         self.mc = MessageClient(proc=self)
 
-        # maps task_ids to IDelayedCall objects, popped off when callback is called, used to cancel tasks
-        self._callback_tasks = {}
+        # maps task_ids to their rows in the store, for the tasks scheduled in the wheel
+        self._task_defs = {}
+
+        # all tasks share one reactor callback, which fires every task that is due
+        self._wheel = TimerWheel(self._fire_tasks,
+                                 resolution=float(self.spawn_args.get('wheel_resolution', CONF.getValue('wheel_resolution', 0.1))),
+                                 max_rate=float(self.spawn_args.get('max_fire_rate', CONF.getValue('max_fire_rate', 0))))
+        self._jitter = float(self.spawn_args.get('fire_jitter', CONF.getValue('fire_jitter', 0)))
+
+        # set in slc_activate, if the store indexes next_fire_time
+        self._persist_next_fire = False
 
         # will move pub through the lifecycle states with the service
-        self.pub = ScheduleEventPublisher(process=self)
+        # the events fired in one callback of the wheel are sent in batches
+        self.pub = ScheduleEventPublisher(process=self, batch=True)
         self.add_life_cycle_object(self.pub)
 
     @defer.inlineCallbacks
@@ -220,14 +232,32 @@ class SchedulerService(ServiceProcess):
 
     @defer.inlineCallbacks
     def slc_activate(self):
+        # the next fire times are only persisted if the store indexes them
+        query_attributes = yield self.scheduled_events.get_query_attributes()
+        self._persist_next_fire = 'next_fire_time' in query_attributes
+        if not self._persist_next_fire:
+            log.info('Scheduler store does not index next_fire_time, next fire times will not be persisted')
+
         # get all items from the store
         query = Query()
         query.add_predicate_eq('constant', '1')
         rows = yield self.scheduled_events.query(query)
 
+        finished = []
         for task_id, tdef in rows.iteritems():
             log.debug("slc_activate: scheduling %s" % task_id)
-            self._schedule_event(int(tdef['start_time']), int(tdef['interval_seconds']), task_id)
+            self._task_defs[task_id] = tdef
+
+            # a persisted fire time which passed while the service was down fires at once
+            endtime = _parse_time(tdef['end_time'])
+            next_fire = _parse_time(tdef.get('next_fire_time'))
+            if next_fire is not None and (endtime is None or next_fire <= endtime):
+                self._wheel.schedule(task_id, next_fire / 1000.0, self._jitter)
+            elif self._schedule_event(_parse_time(tdef['start_time']), int(tdef['interval_seconds']), task_id,
+                                      endtime) is None:
+                finished.append(task_id)
+
+        yield self._remove_finished_tasks(finished)
 
     def slc_terminate(self):
         """
@@ -236,42 +266,47 @@ class SchedulerService(ServiceProcess):
         foreach task in op_query:
           rm_task(task)
         """
-        for k, v in self._callback_tasks.iteritems():
-            if v.active():
-                v.cancel()
+        self._wheel.stop()
 
-    def _schedule_event(self, starttime, interval, task_id):
+    def _schedule_event(self, starttime, interval, task_id, endtime=None):
         """
-        Helper method to schedule and record a callback in the service.
-        Used by op_add_task and on startup.
+        Helper method to schedule the next callback of a task in the timer wheel.
+        Used by op_add_task, on startup and after each callback.
 
         @param  starttime   The time to start the callbacks. This is used with the interval to calculate the
-                            first callback. If None is specified, will use now. Note: the first callback to
-                            occur will not happen immediatly, it will be after the first interval has elapsed,
+                            next callback, so that the callbacks of a task stay on the times starttime plus a
+                            multiple of the interval. If None is specified, will use now. Note: the first callback
+                            to occur will not happen immediatly, it will be after the first interval has elapsed,
                             whether starttime is specified or not. This parameter should be specified in UNIX
                             epoch format, in ms. You will have to convert the output from time.time() in Python, or
                             use the IonTime utility class.
         @param  interval    The interval to trigger scheduler events, in seconds.
         @param  task_id     The task_id to trigger.
+        @param  endtime     No callbacks are scheduled after this time, in UNIX epoch format in ms. None for no end.
+        @retval The time of the next callback in ms, or None if it would be after endtime and the task is done
         """
         assert interval and task_id and interval > 0
         curtime = IonTime().time_ms
         starttime = starttime or curtime
+        interval_ms = interval * 1000
 
-        # determine first callback time
-        diff = curtime - starttime
-        if diff > 0:
-            # we started a while ago, so just find what is remaining of the interval from now
-            lefttimems = diff % (interval * 1000)
-            calctime = interval - int(lefttimems / 1000)
+        # determine next callback time
+        if curtime >= starttime:
+            # we started a while ago, so find the end of the current interval
+            nexttime = starttime + ((curtime - starttime) // interval_ms + 1) * interval_ms
         else:
             # start time is in THE FUTURE
-            calctime = 0 - int(diff/1000) + interval
+            nexttime = starttime + interval_ms
+
+        if endtime is not None and nexttime > endtime:
+            log.debug("_schedule_event: task %s has passed its end time" % task_id)
+            self._wheel.cancel(task_id)
+            return None
 
-        log.debug("_schedule_event: calculated next callback time of %d" % calctime)
+        log.debug("_schedule_event: calculated next callback time of %d" % nexttime)
 
-        ccl = reactor.callLater(calctime, self._send_and_reschedule, task_id)
-        self._callback_tasks[task_id] = ccl
+        self._wheel.schedule(task_id, nexttime / 1000.0, self._jitter)
+        return nexttime
 
     @defer.inlineCallbacks
     def op_add_task(self, content, headers, msg):
@@ -310,8 +345,9 @@ class SchedulerService(ServiceProcess):
             else:
                 payload = None
             if content.IsFieldSet('end_time'):
-                log.warn("Scheduler does not handle end_time yet!")
                 endtime = content.end_time
+                if endtime <= (starttime or IonTime().time_ms):
+                    raise SchedulerError("end_time %d is not after the start time" % endtime, content.ResponseCodes.BAD_REQUEST)
             else:
                 endtime = None
             if content.IsFieldSet('user_id'):
@@ -339,22 +375,33 @@ class SchedulerService(ServiceProcess):
         resp.task_id    = task_id
         resp.origin     = desired_origin
 
+        # the callbacks of a task without a start time are counted from when it is added
+        starttime = starttime or IonTime().time_ms
+
         # extract content of message
-        self.scheduled_events.put(task_id,
-                                  task_id,  # ok to use for value? seems kind of silly
-                                  index_attributes={'task_id': task_id,
-                                                    'constant': '1',    # used for being able to pull all tasks
-                                                    'user_id': user_id,
-                                                    'start_time': str(starttime),
-                                                    'end_time': str(endtime),
-                                                    'interval_seconds': str(msg_interval),
-                                                    'desired_origin': desired_origin,
-                                                    'payload': payload})
-
-        # Now that task is stored into registry, add to messaging callback
+        tdef = {'task_id': task_id,
+                'constant': '1',    # used for being able to pull all tasks
+                'user_id': user_id,
+                'start_time': str(starttime),
+                'end_time': str(endtime),
+                'interval_seconds': str(msg_interval),
+                'desired_origin': desired_origin,
+                'payload': payload}
+
+        # add to messaging callback
         log.debug('Adding task to scheduler')
 
-        self._schedule_event(starttime, msg_interval, task_id)
+        nexttime = self._schedule_event(starttime, msg_interval, task_id, endtime)
+        if nexttime is None:
+            raise SchedulerError("end_time %d is before the first callback of the task" % endtime, content.ResponseCodes.BAD_REQUEST)
+        self._task_defs[task_id] = tdef
+
+        if self._persist_next_fire:
+            tdef['next_fire_time'] = str(nexttime)
+
+        self.scheduled_events.put(task_id,
+                                  task_id,  # ok to use for value? seems kind of silly
+                                  index_attributes=tdef)
 
         log.debug('Add completed OK')
 
@@ -363,8 +410,7 @@ class SchedulerService(ServiceProcess):
     @defer.inlineCallbacks
     def op_rm_task(self, content, headers, msg):
         """
-        Remove a task from the list/store. Will be dropped from the reactor
-        when the timer fires and _send_and_reschedule checks the registry.
+        Remove a task from the list/store and from the timer wheel.
         """
         task_id = content.task_id
 
@@ -375,9 +421,8 @@ class SchedulerService(ServiceProcess):
             return
 
         # if the task is active, remove it
-        if self._callback_tasks.has_key(task_id):
-            self._callback_tasks[task_id].cancel()
-            del self._callback_tasks[task_id]
+        self._wheel.cancel(task_id)
+        self._task_defs.pop(task_id, None)
 
         log.debug('Removing task_id %s from store...' % task_id)
         yield self.scheduled_events.remove(task_id)
@@ -392,27 +437,57 @@ class SchedulerService(ServiceProcess):
     # Internal methods
 
     @defer.inlineCallbacks
-    def _send_and_reschedule(self, task_id):
+    def _fire_tasks(self, task_ids):
         """
-        Check to see if we're still in the store - if not, we've been removed
-        and should abort the run.
+        Called by the timer wheel with all the tasks which are due. Reschedules each task, publishes its
+        event and sends the events as batches. The next fire times are persisted in one write to the store,
+        and tasks which have passed their end time are removed from it.
         """
-        log.debug('Worker activated for task %s' % task_id)
+        log.debug('Worker activated for %d tasks' % len(task_ids))
+
+        index_updates = {}
+        finished = []
+        for task_id in task_ids:
+            # tasks removed while the events of the batch were sent are dropped
+            tdef = self._task_defs.get(task_id)
+            if tdef is None:
+                continue
+
+            # rescheduled before sending, so a failed send does not drop the task
+            nexttime = self._schedule_event(_parse_time(tdef['start_time']), int(tdef['interval_seconds']), task_id,
+                                            _parse_time(tdef['end_time']))
+            if nexttime is None:
+                finished.append(task_id)
+            else:
+                index_updates[task_id] = {'next_fire_time': str(nexttime)}
+
+            try:
+                yield self._publish_task_event(tdef)
+            except Exception, ex:
+                log.exception('Error publishing event for task %s: %s' % (task_id, str(ex)))
 
-        q = Query()
-        q.add_predicate_eq('task_id', task_id)
+        yield self.pub.flush()
 
-        tdefs = yield self.scheduled_events.query(q)
-        assert len(tdefs) == 1
+        # tasks removed while the events were published must not be written back to the store
+        for task_id in index_updates.keys():
+            if task_id not in self._task_defs:
+                del index_updates[task_id]
 
-        tdef = tdefs.values()[0]
+        if self._persist_next_fire and index_updates:
+            yield self.scheduled_events.multi_put({}, index_updates=index_updates)
 
-        # pop callback object off of scheduled items
-        assert self._callback_tasks.has_key(task_id)
-        del self._callback_tasks[task_id]
+        finished = [task_id for task_id in finished if task_id in self._task_defs]
+        yield self._remove_finished_tasks(finished)
 
+        log.debug('%d tasks rescheduled, %d tasks finished' % (len(index_updates), len(finished)))
+
+    @defer.inlineCallbacks
+    def _publish_task_event(self, tdef):
+        """
+        Publishes the scheduler event of a task, with its payload.
+        """
         # deserialize and objectify payload
-        log.debug('Time to send to "%s", id "%s"' % (tdef['desired_origin'], task_id))
+        log.debug('Time to send to "%s", id "%s"' % (tdef['desired_origin'], tdef['task_id']))
 
         msg = yield self.pub.create_event(origin=tdef['desired_origin'],
                                           task_id=tdef['task_id'],
@@ -429,14 +504,27 @@ class SchedulerService(ServiceProcess):
 
         yield self.pub.publish_event(msg, origin=tdef['desired_origin'])
 
-        log.debug('Send completed, rescheduling %s' % task_id)
-
         self.workbench.cache_repository(msg.Repository)
 
-        # start time of None is fine, we just happened so we can be sure interval_seconds is just about right
-        self._schedule_event(None, int(tdef['interval_seconds']), task_id)
+    @defer.inlineCallbacks
+    def _remove_finished_tasks(self, task_ids):
+        """
+        Removes tasks which have passed their end time from the store.
+        """
+        for task_id in task_ids:
+            log.debug('Task %s has passed its end time, removing it from store' % task_id)
+            self._task_defs.pop(task_id, None)
+            yield self.scheduled_events.remove(task_id)
 
-        log.debug('Task %s rescheduled for %s seconds OK' % (task_id, tdef['interval_seconds']))
+
+def _parse_time(value):
+    """
+    @brief Times are kept in the store as strings, with 'None' for an unset time.
+    @retval The time in ms, or None
+    """
+    if value is None or value == 'None':
+        return None
+    return int(value)
 
 class SchedulerServiceClient(ServiceClient):
     """
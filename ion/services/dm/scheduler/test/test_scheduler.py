@@ -61,7 +61,7 @@ class SchedulerTest(IonTestCase):
         yield self._start_container()
 
         yield self._setup_store()
-        yield self._spawn_processes(services)
+        self.sup = yield self._spawn_processes(services)
 
         self.proc = Process(spawnargs={'proc-name':'SchedulerTestProcess'})
         yield self.proc.spawn()
@@ -238,6 +238,50 @@ class SchedulerTest(IonTestCase):
         yield sc.rm_task(msg_r)
         
 
+    @defer.inlineCallbacks
+    def test_rm_while_firing(self):
+        """
+        A task removed while the events of its batch are published is not written back to the store
+        """
+        mc = MessageClient(proc=self.proc)
+        sc = SchedulerServiceClient(proc=self.proc)
+
+        msg_a = yield mc.create_instance(ADDTASK_REQ_TYPE)
+        msg_a.desired_origin    = SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE
+        msg_a.interval_seconds  = 60
+        msg_a.payload           = msg_a.CreateObject(SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE_PAYLOAD_TYPE)
+        msg_a.payload.dataset_id = "TESTER"
+        msg_a.payload.datasource_id = "TWO"
+
+        resp_msg = yield sc.add_task(msg_a)
+        task_id = resp_msg.task_id
+
+        scheduler_id = yield self.sup.get_child_id('scheduler')
+        scheduler = self._get_procinstance(scheduler_id)
+        scheduler._persist_next_fire = True
+
+        # remove the task the way op_rm_task does, after its event is published
+        publish_task_event = scheduler._publish_task_event
+        @defer.inlineCallbacks
+        def publish_and_remove(tdef):
+            yield publish_task_event(tdef)
+            scheduler._wheel.cancel(task_id)
+            scheduler._task_defs.pop(task_id, None)
+            yield scheduler.scheduled_events.remove(task_id)
+        scheduler._publish_task_event = publish_and_remove
+
+        puts = []
+        multi_put = scheduler.scheduled_events.multi_put
+        def recording_multi_put(*args, **kwargs):
+            puts.append(kwargs.get('index_updates'))
+            return multi_put(*args, **kwargs)
+        scheduler.scheduled_events.multi_put = recording_multi_put
+
+        yield scheduler._fire_tasks([task_id])
+
+        self.failUnlessEquals(puts, [])
+        self.failIf(task_id in scheduler._task_defs)
+
     @defer.inlineCallbacks
     def test_future_start_time(self):
 
@@ -293,6 +337,54 @@ class SchedulerTest(IonTestCase):
         yield asleep(4)
         self.failUnless(len(self._notices) > 0, "Could be an intermittent failure, waiting for message delivery")
 
+    @defer.inlineCallbacks
+    def test_end_time(self):
+
+        mc = MessageClient(proc=self.proc)
+        sc = SchedulerServiceClient(proc=self.proc)
+
+        msg_a = yield mc.create_instance(ADDTASK_REQ_TYPE)
+        msg_a.desired_origin    = SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE
+        msg_a.interval_seconds  = 1
+
+        msg_a.payload           = msg_a.CreateObject(SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE_PAYLOAD_TYPE)
+        msg_a.payload.dataset_id = "THE END"
+        msg_a.payload.datasource_id = "IS NEAR"
+
+        # start now, end 2.5 sec from now: two messages at most
+        starttime = IonTime().time_ms
+        msg_a.start_time        = starttime
+        msg_a.end_time          = starttime + 2500
+
+        resp_msg = yield sc.add_task(msg_a)
+
+        yield asleep(4)
+        self.failUnless(len(self._notices) > 0, "Could be an intermittent failure, waiting for message delivery")
+        self.failUnless(len(self._notices) <= 2)
+
+        # the finished task has been removed, so it can be added again
+        msg_b = yield mc.create_instance(ADDTASK_REQ_TYPE)
+        msg_b.task_id           = resp_msg.task_id
+        msg_b.desired_origin    = SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE
+        msg_b.interval_seconds  = 30
+
+        resp_msg = yield sc.add_task(msg_b)
+        self.failIf(resp_msg.duplicate)
+
+        msg_r = yield mc.create_instance(RMTASK_REQ_TYPE)
+        msg_r.task_id = resp_msg.task_id
+        yield sc.rm_task(msg_r)
+
+        # an end time before the first message is refused
+        msg_c = yield mc.create_instance(ADDTASK_REQ_TYPE)
+        msg_c.desired_origin    = SCHEDULE_TYPE_PERFORM_INGESTION_UPDATE
+        msg_c.interval_seconds  = 30
+        msg_c.end_time          = IonTime().time_ms + 10000
+
+        scdef = sc.add_task(msg_c)
+        yield self.failUnlessFailure(scdef, ReceivedApplicationError)
+        self.failUnlessEquals(scdef.result.msg_content.MessageResponseCode, scdef.result.msg_content.ResponseCodes.BAD_REQUEST)
+
     @defer.inlineCallbacks
     def test_invalid_input(self):
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/scheduler/test/test_timer_wheel.py
+@test ion.services.dm.scheduler.timer_wheel Batched firing of scheduled tasks
+"""
+
+from twisted.internet import task
+from twisted.trial import unittest
+
+from ion.services.dm.scheduler.timer_wheel import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.fired = []
+
+    def _make_wheel(self, **kwargs):
+        return TimerWheel(lambda task_ids: self.fired.append(sorted(task_ids)), clock=self.clock, **kwargs)
+
+    def test_batch(self):
+        wheel = self._make_wheel(resolution=0.5)
+        wheel.schedule('a', 1001.25)
+        wheel.schedule('b', 1001.5)
+        wheel.schedule('c', 1003)
+
+        # one delayed call for the earliest tick
+        self.failUnlessEqual(len(self.clock.getDelayedCalls()), 1)
+
+        self.clock.advance(1.25)
+        self.failUnlessEqual(self.fired, [])
+
+        self.clock.advance(0.25)
+        self.failUnlessEqual(self.fired, [['a', 'b']])
+        self.failUnlessEqual(len(wheel), 1)
+
+        self.clock.advance(1.5)
+        self.failUnlessEqual(self.fired, [['a', 'b'], ['c']])
+        self.failUnlessEqual(len(wheel), 0)
+        self.failUnlessEqual(self.clock.getDelayedCalls(), [])
+
+    def test_cancel_reschedule(self):
+        wheel = self._make_wheel(resolution=0.5)
+        wheel.schedule('a', 1001)
+        wheel.schedule('b', 1001)
+        wheel.schedule('a', 1005)
+
+        self.failUnless(wheel.cancel('b'))
+        self.failIf(wheel.cancel('b'))
+
+        self.clock.advance(2)
+        self.failUnlessEqual(self.fired, [])
+        self.failUnless('a' in wheel)
+
+        self.clock.advance(3)
+        self.failUnlessEqual(self.fired, [['a']])
+
+        # times in the past fire at once
+        wheel.schedule('b', 900)
+        self.clock.advance(0)
+        self.failUnlessEqual(self.fired, [['a'], ['b']])
+
+        wheel.schedule('c', 1010)
+        wheel.stop()
+        self.failUnlessEqual(len(wheel), 0)
+        self.failUnlessEqual(self.clock.getDelayedCalls(), [])
+
+    def test_rate_limit(self):
+        wheel = self._make_wheel(resolution=0.5, max_rate=2)
+        for task_id in 'abcde':
+            wheel.schedule(task_id, 1001)
+
+        self.clock.advance(1)
+        self.failUnlessEqual([len(task_ids) for task_ids in self.fired], [2])
+
+        self.clock.pump([0.5, 0.5, 0.5, 0.5])
+        self.failUnlessEqual([len(task_ids) for task_ids in self.fired], [2, 1, 1, 1])
+        self.failUnlessEqual(len(wheel), 0)
+
+    def test_jitter(self):
+        wheel = self._make_wheel(resolution=0.25)
+        for i in range(20):
+            fire_time = wheel.schedule(i, 1001, jitter=2)
+            self.failUnless(1001 <= fire_time <= 1003)
+
+        self.clock.advance(0.75)
+        self.failUnlessEqual(self.fired, [])
+
+        self.clock.pump([0.25] * 9)
+        self.failUnlessEqual(sorted(sum(self.fired, [])), range(20))
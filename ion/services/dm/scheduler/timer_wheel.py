@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/scheduler/timer_wheel.py
+@package ion.services.dm.scheduler.timer_wheel Batched timer for the scheduler
+@brief Holds the next fire time of many tasks behind a single reactor delayed call, and fires all the tasks
+which are due in one callback.
+"""
+
+import heapq
+import math
+import random
+
+from twisted.internet import defer, reactor
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+
+class TimerWheel(object):
+    """
+    Schedules tasks by id at absolute fire times, in seconds since the epoch. Fire times are rounded up to
+    ticks of resolution seconds; the tasks due in a tick are kept in one slot and the ticks are kept in a heap,
+    so the reactor only ever holds one delayed call for the earliest tick.
+
+    When the delayed call fires, every task due by then is removed from the wheel and on_fire is called once
+    with the list of their ids. A task fires again only if it is scheduled again.
+
+    With a max_rate, at most max_rate tasks are fired per second, with bursts of up to max_rate tasks. Tasks
+    which are due but over the limit stay in the wheel, earliest first, and fire in the following callbacks.
+    """
+
+    def __init__(self, on_fire, resolution=0.1, max_rate=0, clock=None):
+        """
+        @param on_fire  Called with a list of the ids of the tasks which are due. May return a Deferred.
+        @param resolution   Seconds per tick of the wheel.
+        @param max_rate Maximum number of tasks fired per second, 0 for no limit.
+        @param clock    Provides callLater and seconds, the reactor by default.
+        """
+        assert resolution > 0, 'The resolution of the timer wheel must be positive'
+        self.on_fire = on_fire
+        self.resolution = float(resolution)
+        self.max_rate = float(max_rate or 0)
+        self.clock = clock or reactor
+
+        # task id to the tick it is scheduled in
+        self._tasks = {}
+        # tick to the set of ids of the tasks scheduled in it
+        self._slots = {}
+        # heap of the ticks which have slots
+        self._ticks = []
+
+        self._call = None
+
+        self._tokens = self.max_rate
+        self._tokens_time = self.clock.seconds()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def schedule(self, task_id, fire_time, jitter=0.0):
+        """
+        @brief Schedule a task, replacing its current fire time if it is already scheduled.
+        @param task_id  The id passed to on_fire.
+        @param fire_time    Time to fire the task, in seconds since the epoch. Times in the past fire in the next
+                            callback.
+        @param jitter   Up to this many seconds are added at random to the fire time, to spread out tasks with
+                        the same fire time.
+        @retval The time the task will fire, rounded up to a tick
+        """
+        if jitter:
+            fire_time += random.uniform(0, jitter)
+
+        # never fire early, whatever the rounding of the division
+        tick = int(math.ceil(fire_time / self.resolution))
+        if tick * self.resolution < fire_time:
+            tick += 1
+
+        self.cancel(task_id)
+
+        self._tasks[task_id] = tick
+        slot = self._slots.get(tick)
+        if slot is None:
+            slot = self._slots[tick] = set()
+            heapq.heappush(self._ticks, tick)
+        slot.add(task_id)
+
+        self._arm()
+        return tick * self.resolution
+
+    def cancel(self, task_id):
+        """
+        @brief Remove a task from the wheel.
+        @retval True if the task was scheduled
+        """
+        tick = self._tasks.pop(task_id, None)
+        if tick is None:
+            return False
+
+        # The tick stays in the heap and is skipped when it is reached
+        slot = self._slots[tick]
+        slot.discard(task_id)
+        if not slot:
+            del self._slots[tick]
+        return True
+
+    def stop(self):
+        """
+        @brief Cancel the delayed call and remove all the tasks.
+        """
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+        self._tasks.clear()
+        self._slots.clear()
+        del self._ticks[:]
+
+    def _next_tick(self):
+        """
+        @retval The earliest tick with tasks scheduled in it, or None
+        """
+        while self._ticks and self._ticks[0] not in self._slots:
+            heapq.heappop(self._ticks)
+        if self._ticks:
+            return self._ticks[0]
+        return None
+
+    def _arm(self, delay=None):
+        """
+        Makes sure the delayed call fires by the earliest tick, or after delay seconds if given.
+        """
+        if delay is None:
+            tick = self._next_tick()
+            if tick is None:
+                return
+            delay = max(0.0, tick * self.resolution - self.clock.seconds())
+
+        fire_at = self.clock.seconds() + delay
+        if self._call is not None and self._call.active():
+            if self._call.getTime() <= fire_at:
+                return
+            self._call.cancel()
+
+        self._call = self.clock.callLater(delay, self._fire)
+
+    def _take_tokens(self, now):
+        """
+        @retval The number of tasks which may fire now under the rate limit, or None for no limit
+        """
+        if not self.max_rate:
+            return None
+
+        self._tokens = min(max(self.max_rate, 1.0), self._tokens + (now - self._tokens_time) * self.max_rate)
+        self._tokens_time = now
+        return int(self._tokens)
+
+    def _fire(self):
+        """
+        Fires all the tasks which are due, as far as the rate limit allows, and arms the next callback.
+        """
+        self._call = None
+        now = self.clock.seconds()
+        limit = self._take_tokens(now)
+
+        due = []
+        while limit is None or len(due) < limit:
+            tick = self._next_tick()
+            if tick is None or tick * self.resolution > now:
+                break
+
+            slot = self._slots[tick]
+            while slot and (limit is None or len(due) < limit):
+                task_id = slot.pop()
+                del self._tasks[task_id]
+                due.append(task_id)
+            if not slot:
+                del self._slots[tick]
+
+        if limit is not None:
+            self._tokens -= len(due)
+
+        if due:
+            log.debug('Timer wheel firing %d tasks' % len(due))
+            d = defer.maybeDeferred(self.on_fire, due)
+            d.addErrback(lambda failure: log.error('Error firing scheduled tasks: %s' % str(failure)))
+
+        if limit is not None and len(due) == limit:
+            tick = self._next_tick()
+            if tick is not None and tick * self.resolution <= now:
+                # Still behind - wait until the rate limit allows another task
+                self._arm(max(self.resolution, (1.0 - (self._tokens - int(self._tokens))) / self.max_rate))
+                return
+
+        self._arm()
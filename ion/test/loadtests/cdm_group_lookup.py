@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/cdm_group_lookup.py
+@brief Microbenchmark of the find by name methods of CDM groups and variables in the lookups made by the
+ingestion supplement merge: every variable of the supplement is found in the dataset by name, and every
+attribute of the supplement is checked on the dataset. The supplement also has variables and attributes
+which the dataset does not, so some of the lookups miss. The name lookup maps of the wrappers are timed
+against the previous linear search of the repeated fields.
+Run it like this:
+python -m ion.test.loadtests.cdm_group_lookup -v 500 -a 20 -m 5
+"""
+
+import time
+from optparse import OptionParser
+
+from ion.core.object import workbench
+from ion.core.object.object_utils import CDM_DATASET_TYPE, OOIObjectError
+
+
+def make_dataset(wb, nvariables, nattributes):
+    """
+    Create a dataset with nvariables variables with nattributes attributes each
+    @retval the root group of the dataset
+    """
+    repo = wb.create_repository(CDM_DATASET_TYPE)
+    ds = repo.root_object
+    ds.MakeRootGroup()
+    root = ds.root_group
+
+    dim = root.AddDimension('time', 10)
+    for i in xrange(nattributes):
+        root.AddAttribute('global_att_%d' % i, root.DataType.STRING, 'value %d' % i)
+
+    for i in xrange(nvariables):
+        var = root.AddVariable('var_%d' % i, root.DataType.DOUBLE, [dim])
+        for j in xrange(nattributes):
+            var.AddAttribute('att_%d' % j, root.DataType.STRING, 'value %d' % j)
+
+    return root
+
+
+def legacy_find_variable(group, name):
+    for var in group.variables:
+        if var.name == name:
+            return var
+    return None
+
+
+def legacy_has_attribute(obj, name):
+    for att in obj.attributes:
+        if att.name == name:
+            return True
+    return False
+
+
+def mapped_find_variable(group, name):
+    try:
+        return group.FindVariableByName(name)
+    except OOIObjectError:
+        return None
+
+
+def mapped_has_attribute(obj, name):
+    return obj.HasAttribute(name)
+
+
+def merge_lookups(root, merge_root, find_variable, has_attribute):
+    """
+    The name lookups of a supplement merge
+    @retval the number of lookups made
+    """
+    count = 0
+    for merge_var in merge_root.variables:
+        var = find_variable(root, merge_var.name)
+        count += 1
+        if var is None:
+            # A new variable - the merge adds it whole
+            continue
+        for merge_att in merge_var.attributes:
+            has_attribute(var, merge_att.name)
+            count += 1
+
+    for merge_att in merge_root.attributes:
+        has_attribute(root, merge_att.name)
+        count += 1
+    return count
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-v", "--variables", dest="variables", type="int", default=500, help="Number of variables")
+    parser.add_option("-a", "--attributes", dest="attributes", type="int", default=20, help="Attributes per variable")
+    parser.add_option("-m", "--missing", dest="missing", type="int", default=5, help="Variables and attributes per variable only in the supplement")
+    (options, args) = parser.parse_args()
+
+    wb = workbench.WorkBench('Lookup benchmark')
+
+    t1 = time.time()
+    root = make_dataset(wb, options.variables, options.attributes)
+    merge_root = make_dataset(wb, options.variables + options.missing, options.attributes + options.missing)
+    print "Created two datasets with %d and %d variables in %f seconds" % (options.variables, options.variables + options.missing, time.time() - t1)
+
+    for engine_name, find_variable, has_attribute in (('legacy', legacy_find_variable, legacy_has_attribute),
+                                                      ('mapped', mapped_find_variable, mapped_has_attribute)):
+        t1 = time.time()
+        count = merge_lookups(root, merge_root, find_variable, has_attribute)
+        diff = time.time() - t1
+
+        print "%-7s %7d lookups in %f seconds: %.1f lookups/s" % (engine_name, count, diff, count / diff)
+
+
+if __name__ == '__main__':
+    main()
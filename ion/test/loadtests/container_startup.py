@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/container_startup.py
+@brief Benchmark of the import time of ion.core.ioninit, of the GPB type registry in
+ion.core.object.object_utils and of ion.core.bootstrap, in fresh python processes as a spawned container or
+worker sees it. Each run is made cold, without a registry snapshot so that every proto module is imported,
+and warm, with the snapshot written by the previous run so that proto modules are imported on first use.
+Run it like this:
+python -m ion.test.loadtests.container_startup -r 5
+"""
+
+import os
+import subprocess
+import sys
+from optparse import OptionParser
+
+from ion.core.object import object_utils
+
+STARTUP_SCRIPT = """
+import time
+t0 = time.time()
+import ion.core.ioninit
+t1 = time.time()
+import ion.core.object.object_utils
+t2 = time.time()
+import ion.core.bootstrap
+t3 = time.time()
+print t1 - t0, t2 - t1, t3 - t2
+"""
+
+
+def time_startup():
+    """
+    @retval the seconds to import ioninit, object_utils and bootstrap in a fresh process
+    """
+    proc = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT], stdout=subprocess.PIPE)
+    output = proc.communicate()[0]
+    return [float(value) for value in output.split()[-3:]]
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-r", "--runs", dest="runs", type="int", default=5, help="Number of runs of each kind")
+    (options, args) = parser.parse_args()
+
+    snapshot_path = object_utils.get_registry_snapshot_path()
+    if snapshot_path is None:
+        print "Registry snapshots are turned off in the configuration, timing cold starts only"
+
+    for engine_name in ('cold', 'warm'):
+        if engine_name == 'warm' and snapshot_path is None:
+            break
+
+        totals = [0.0, 0.0, 0.0]
+        for i in xrange(options.runs):
+            if engine_name == 'cold' and snapshot_path is not None and os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            times = time_startup()
+            totals = [total + t for total, t in zip(totals, times)]
+
+        ioninit_time, registry_time, bootstrap_time = [total / options.runs for total in totals]
+        print "%-5s ioninit %f s, object_utils %f s, bootstrap %f s, total %f s (mean of %d runs)" % \
+              (engine_name, ioninit_time, registry_time, bootstrap_time,
+               ioninit_time + registry_time + bootstrap_time, options.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/extract_data.py
+@brief Microbenchmark of the op_extract_data engines over synthetic 1-D to 4-D arrays in MB/s.
+The arrays are split into bounded arrays along the first dimension. Each engine starts from the python
+lists held by the ndarray GPB objects and ends with the lists put into the data chunks.
+Run it like this:
+python -m ion.test.loadtests.extract_data -n 1000000 -b 4 -s 2
+"""
+
+import time
+from optparse import OptionParser
+
+from ion.services.coi import datastore
+from ion.services.coi.datastore import DataStoreWorkbench, extract_target_shape, extract_strided_slices, extract_slabs, extract_clip_slices, extract_chunks
+
+ITEM_SIZE = 8
+
+
+def make_shape(rank, count):
+    """
+    A shape of the given rank with about count elements
+    """
+    side = max(2, int(round(count ** (1.0 / rank))))
+    return [side] * rank
+
+
+def make_bounded_arrays(shape, nbas):
+    """
+    Split an array of the given shape into bounded arrays along the first dimension
+    @retval list of (origin, size, values) for the first dimension
+    """
+    inner = reduce(lambda x, y: x*y, shape[1:], 1)
+    step = max(1, shape[0] // nbas)
+    bas = []
+    for origin in xrange(0, shape[0], step):
+        size = min(step, shape[0] - origin)
+        bas.append((origin, size, [float(v) for v in xrange(origin * inner, (origin + size) * inner)]))
+    return bas
+
+
+def intersections(shape, bas):
+    """
+    Request the whole array - returns (ba_shape, values, target range, source range) for each bounded array
+    """
+    result = []
+    for origin, size, values in bas:
+        ba_shape = [size] + shape[1:]
+        target_range = [(origin, origin + size)] + [(0, x) for x in shape[1:]]
+        src_range = [(0, size)] + [(0, x) for x in shape[1:]]
+        result.append((ba_shape, values, target_range, src_range))
+    return result
+
+
+def run_numpy(shape, isecs, strides, chunk_size):
+    numpy = datastore.numpy
+    targetshape = extract_target_shape(shape, strides)
+    slices = []
+    for ba_shape, values, target_range, src_range in isecs:
+        ba_slices = extract_strided_slices(target_range, src_range, strides, targetshape)
+        if ba_slices is not None:
+            # the engine keeps the converted arrays in its ndarray cache
+            source = numpy.array(values, dtype='float64').reshape(ba_shape)
+            slices.append((source, ba_slices[0], ba_slices[1]))
+
+    count = 0
+    for start, end in extract_slabs(targetshape, chunk_size):
+        target = numpy.empty([end - start] + targetshape[1:], dtype='float64')
+        for source, target_slices, src_slices in slices:
+            clipped = extract_clip_slices(target_slices, src_slices, start, end)
+            if clipped is None:
+                continue
+            target[clipped[0]] = source[clipped[1]]
+
+        for offset, chunk in extract_chunks(target, chunk_size):
+            count += len(chunk)
+    return count
+
+
+def run_legacy(shape, isecs, strides, chunk_size):
+    wb = DataStoreWorkbench.__new__(DataStoreWorkbench)
+    targetshape = list(shape)
+    result = {}
+    for ba_shape, values, target_range, src_range in isecs:
+        for targetslice, srcslice, stride in wb._get_slices(targetshape, ba_shape, target_range, src_range, strides):
+            strip = values[srcslice[0]:srcslice[1]]
+            if stride != 1:
+                strip = [d for i, d in enumerate(strip) if i % stride == 0]
+            result[targetslice[0]] = strip
+
+    count = 0
+    chunk = []
+    for start in sorted(result):
+        chunk.extend(result[start])
+        if len(chunk) >= chunk_size:
+            count += len(chunk)
+            chunk = []
+    return count + len(chunk)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--count", dest="count", type="int", default=10**6, help="Approximate number of elements per array")
+    parser.add_option("-b", "--bounded-arrays", dest="nbas", type="int", default=4, help="Number of bounded arrays per array")
+    parser.add_option("-s", "--stride", dest="stride", type="int", default=1, help="Stride in every dimension")
+    parser.add_option("-c", "--chunk-size", dest="chunk_size", type="int", default=15000, help="Elements per data chunk")
+    (options, args) = parser.parse_args()
+
+    engines = [('legacy', run_legacy)]
+    if datastore.numpy is not None:
+        engines.append(('numpy', run_numpy))
+    else:
+        print "numpy is not installed - only timing the legacy engine"
+
+    for rank in xrange(1, 5):
+        shape = make_shape(rank, options.count)
+        strides = [options.stride] * rank
+        isecs = intersections(shape, make_bounded_arrays(shape, options.nbas))
+
+        for name, engine in engines:
+            t1 = time.time()
+            count = engine(shape, isecs, strides, options.chunk_size)
+            diff = time.time() - t1
+
+            mbytes = count * ITEM_SIZE / float(2**20)
+            print "%d-D %-16s %-7s %9d elements in %f seconds: %.1f MB/s" % (rank, shape, name, count, diff, mbytes / diff)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/index_store.py
+@brief Microbenchmark of the in memory IndexStore with association service shaped queries.
+The store is loaded with commit rows like the ones the datastore writes for associations - most of them
+are old commits with an empty branch name. The queries are the ones the association service makes:
+predicate and object with the head commits only, and the heads of one repository.
+Each query is timed with the sorted index planner and with the previous scan of the branch name index.
+Run it like this:
+python -m ion.test.loadtests.index_store -n 100000 -q 1000
+"""
+
+import random
+import time
+from optparse import OptionParser
+
+from ion.core.data.store import IndexStore, Query
+from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS, REPOSITORY_KEY, BRANCH_NAME, \
+    SUBJECT_KEY, PREDICATE_KEY, OBJECT_KEY
+
+
+def load_store(nrows, nobjects, npredicates, commits_per_repo):
+    """
+    Fill a fresh IndexStore with association commit rows
+    @retval the store and the list of (repository, subject, predicate, object) of the associations
+    """
+    IndexStore.kvs = {}
+    IndexStore.indices = {}
+    ds = IndexStore(indices=COMMIT_INDEXED_COLUMNS)
+
+    associations = []
+    nrepos = max(1, nrows // commits_per_repo)
+    for i in xrange(nrepos):
+        repo = 'association_%d' % i
+        subject = 'subject_%d' % random.randrange(nrows)
+        predicate = 'predicate_%d' % random.randrange(npredicates)
+        obj = 'object_%d' % random.randrange(nobjects)
+        associations.append((repo, subject, predicate, obj))
+
+        for j in xrange(commits_per_repo):
+            attributes = {REPOSITORY_KEY:repo,
+                          SUBJECT_KEY:subject,
+                          PREDICATE_KEY:predicate,
+                          OBJECT_KEY:obj,
+                          # Only the last commit is a head
+                          BRANCH_NAME:'master' if j == commits_per_repo - 1 else ''}
+            ds.put('%s_commit_%d' % (repo, j), 'value', attributes)
+
+    return ds, associations
+
+
+def legacy_query(ds, query_predicates):
+    """
+    The query as it was before the sorted indices - every GT predicate scans the distinct values of the
+    attribute and the matching rows are copied
+    """
+    predicates = query_predicates.get_predicates()
+
+    preds_eq = [p for p in predicates if p[2] == Query.EQ]
+    k, v, pred = preds_eq.pop()
+    keys = set(ds.indices[k].get(v, set()))
+
+    for k, v, p in predicates:
+        kindex = ds.indices[k]
+        if p == Query.EQ:
+            keys.intersection_update(kindex.get(v, set()))
+        elif p == Query.GT:
+            matches = set()
+            for attr_val in kindex.keys():
+                if attr_val > v:
+                    matches.update(kindex.get(attr_val, set()))
+            keys.intersection_update(matches)
+
+    result = {}
+    for k in keys:
+        if ds.kvs.has_key(k):
+            result[k] = ds.kvs.get(k).copy()
+    return result
+
+
+def sorted_query(ds, query_predicates):
+    result = []
+    ds.query(query_predicates).addCallback(result.append)
+    return result[0]
+
+
+def make_queries(associations, nqueries):
+    queries = []
+    for i in xrange(nqueries):
+        repo, subject, predicate, obj = random.choice(associations)
+
+        q = Query()
+        q.add_predicate_eq(PREDICATE_KEY, predicate)
+        q.add_predicate_eq(OBJECT_KEY, obj)
+        q.add_predicate_gt(BRANCH_NAME, '')
+        queries.append(('predicate object heads', q))
+
+        q = Query()
+        q.add_predicate_eq(REPOSITORY_KEY, repo)
+        q.add_predicate_gt(BRANCH_NAME, '')
+        queries.append(('repository heads', q))
+    return queries
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--rows", dest="rows", type="int", default=10**5, help="Number of commit rows")
+    parser.add_option("-q", "--queries", dest="queries", type="int", default=1000, help="Number of queries of each kind")
+    parser.add_option("-o", "--objects", dest="objects", type="int", default=1000, help="Number of distinct objects")
+    parser.add_option("-p", "--predicates", dest="predicates", type="int", default=10, help="Number of distinct predicates")
+    parser.add_option("-c", "--commits", dest="commits", type="int", default=4, help="Commits per association repository")
+    (options, args) = parser.parse_args()
+
+    random.seed(0)
+
+    t1 = time.time()
+    ds, associations = load_store(options.rows, options.objects, options.predicates, options.commits)
+    print "Loaded %d rows in %f seconds" % (len(ds.kvs), time.time() - t1)
+
+    queries = make_queries(associations, options.queries)
+    names = sorted(set(name for name, q in queries))
+
+    for engine_name, engine in (('legacy', legacy_query), ('sorted', sorted_query)):
+        for name in names:
+            selected = [q for n, q in queries if n == name]
+            nrows = 0
+            t1 = time.time()
+            for q in selected:
+                nrows += len(engine(ds, q))
+            diff = time.time() - t1
+
+            print "%-7s %-24s %6d queries, %7d rows in %f seconds: %.1f queries/s" % (
+                engine_name, name, len(selected), nrows, diff, len(selected) / diff)
+
+
+if __name__ == '__main__':
+    main()
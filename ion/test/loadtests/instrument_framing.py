@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/instrument_framing.py
+@brief Microbenchmark of the framing of instrument output into lines and samples by the instrument drivers.
+The autosample output of the SBE49 simulator, with a status line after every few samples, is fed in
+fragments to the LineFramer of the drivers and to the previous framing of the SBE37 driver, which split
+the whole line buffer on each fragment and parsed all the buffered lines for samples on each fragment.
+Run it like this:
+python -m ion.test.loadtests.instrument_framing -n 20000 -f 64 -s 10
+"""
+
+import re
+import time
+from optparse import OptionParser
+
+from ion.agents.instrumentagents.instrument_driver import LineFramer, LineParser
+from ion.agents.instrumentagents.simulators.sim_SBE49 import Instrument
+
+NEWLINE = '\r\n'
+PROMPT = 'S>'
+BAD_COMMAND = '?cmd S>'
+
+# The converted decimal sample output of the simulator: temperature, conductivity, pressure, salinity
+SAMPLE_PATTERN = r'^#? *(-?\d+\.\d+), *(-?\d+\.\d+), *(-?\d+\.\d+)(, *(-?\d+\.\d+))?'
+
+
+def get_sample(match):
+    return {'temperature':float(match.group(1)),
+            'conductivity':float(match.group(2)),
+            'pressure':float(match.group(3))}
+
+
+def make_output(nsamples, status_every):
+    """
+    @retval the autosample output of the simulator for nsamples samples
+    """
+    instrument = Instrument()
+    output = []
+    for i in xrange(nsamples):
+        output.append(instrument.get_next_sample())
+        if status_every and i % status_every == 0:
+            output.append('status: %d samples' % i + NEWLINE)
+    return ''.join(output)
+
+
+class LegacyFramer(object):
+    """
+    The framing of the SBE37 driver gotData and _parse_sample_output before the LineFramer
+    """
+
+    def __init__(self):
+        self.regex = re.compile(SAMPLE_PATTERN)
+        self.line_buffer = ''
+        self.data_lines = []
+
+    def feed(self, data):
+        self.line_buffer += data
+
+        if NEWLINE in self.line_buffer:
+            lines = self.line_buffer.split(NEWLINE)
+            self.line_buffer = lines[-1]
+            self.data_lines += lines[0:-1]
+
+        if self.line_buffer.endswith(PROMPT):
+            self.data_lines.append(self.line_buffer.replace(PROMPT, ''))
+            self.line_buffer = PROMPT
+
+        samples = []
+        new_data_lines = []
+        for line in self.data_lines:
+            match = self.regex.match(line)
+            if match:
+                samples.append(get_sample(match))
+            else:
+                new_data_lines.append(line)
+        self.data_lines = new_data_lines
+        return samples
+
+
+def run(feed, output, fragment_size):
+    """
+    @retval the number of samples framed and the time taken
+    """
+    count = 0
+    t1 = time.time()
+    for i in xrange(0, len(output), fragment_size):
+        count += len(feed(output[i:i + fragment_size]))
+    return count, time.time() - t1
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--samples", dest="samples", type="int", default=20000, help="Number of samples")
+    parser.add_option("-f", "--fragment", dest="fragment", type="int", default=64, help="Bytes per fragment")
+    parser.add_option("-s", "--status-every", dest="status_every", type="int", default=10,
+                      help="Samples between status lines, 0 for none")
+    (options, args) = parser.parse_args()
+
+    output = make_output(options.samples, options.status_every)
+    print "Framing %d bytes of simulator output in fragments of %d bytes" % (len(output), options.fragment)
+
+    legacy = LegacyFramer()
+    framer = LineFramer(NEWLINE, prompts=[PROMPT, BAD_COMMAND], parsers=[LineParser(SAMPLE_PATTERN, get_sample)])
+
+    for engine_name, feed in (('legacy', legacy.feed), ('framer', lambda data: framer.feed(data)[1])):
+        count, diff = run(feed, output, options.fragment)
+        print "%-7s %7d samples in %f seconds: %.1f samples/s" % (engine_name, count, diff, count / diff)
+
+
+if __name__ == '__main__':
+    main()
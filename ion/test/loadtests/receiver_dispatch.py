@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/receiver_dispatch.py
+@brief Microbenchmark comparing Receiver dispatch modes in messages per second.
+Run it like this:
+python -m ion.test.loadtests.receiver_dispatch -n 5000 -c 0
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.messaging import receiver
+from ion.core.messaging.receiver import Receiver
+
+
+class BenchMessage(object):
+    """
+    Minimal stand in for a carrot message
+    """
+    def __init__(self, payload):
+        self.payload = payload
+        self._state = 'RECEIVED'
+
+    def ack(self):
+        self._state = 'ACK'
+        return defer.succeed(None)
+
+
+def handler(data, msg):
+    return msg.ack()
+
+
+@defer.inlineCallbacks
+def run_mode(mode, count, max_concurrent):
+    rec = Receiver('bench_%s' % mode, raw=True, handler=handler, dispatch_mode=mode, max_concurrent=max_concurrent)
+
+    msgs = [BenchMessage({'conv-id':'conv_%d' % i, 'protocol':'rpc', 'performative':'request'}) for i in xrange(count)]
+
+    t1 = time.time()
+    yield defer.DeferredList([rec.receive(msg) for msg in msgs])
+    t2 = time.time()
+
+    diff = t2 - t1
+    print "%-8s %d messages in %f seconds: %.1f msgs/sec" % (mode, count, diff, count / diff)
+
+
+@defer.inlineCallbacks
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--count", dest="count", type="int", default=5000, help="Number of messages per mode")
+    parser.add_option("-c", "--max-concurrent", dest="max_concurrent", type="int", default=0,
+                      help="Max messages in flight in reactor mode, 0 for unlimited")
+    (options, args) = parser.parse_args()
+
+    try:
+        yield run_mode(receiver.DISPATCH_THREAD, options.count, 0)
+        yield run_mode(receiver.DISPATCH_REACTOR, options.count, options.max_concurrent)
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    reactor.callWhenRunning(main)
+    reactor.run()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/supplement_merge.py
+@brief Microbenchmark of the replacing supplement merge of the ingestion service (OVERWRITE and FMRC updates):
+the search for the aggregation offset of the supplement and the removal of the replaced range from a
+variable. The index based merge is timed against a linear scan of all the values and bounded arrays of the
+dataset, for datasets of growing size and a supplement of fixed size.
+Run it like this:
+python -m ion.test.loadtests.supplement_merge -s 100 -n 100,1000,10000 -r 5
+"""
+
+import time
+from optparse import OptionParser
+
+from ion.core.object import workbench
+from ion.core.object.object_utils import CDM_DATASET_TYPE, create_type_identifier
+from ion.services.dm.ingestion.ingestion import IngestionService, IngestSession, parse_time_units
+
+CDM_ARRAY_STRUCTURE_TYPE = create_type_identifier(object_id=10025, version=1)
+CDM_BOUNDED_ARRAY_TYPE = create_type_identifier(object_id=10021, version=1)
+CDM_F64_ARRAY_TYPE = create_type_identifier(object_id=10014, version=1)
+
+TIME_UNITS = 'hours since 1970-01-01 00:00:00'
+
+
+class BenchmarkDataset(object):
+    """
+    Stands in for the resource instance of the dataset in the ingest session
+    """
+
+    def __init__(self, repo):
+        self.Repository = repo
+
+    def CreateObject(self, type_id):
+        return self.Repository.create_object(type_id)
+
+
+def make_dataset(wb, nbounded_arrays, size):
+    """
+    Create a dataset with a time coordinate of nbounded_arrays bounded arrays of size hourly values each
+    @retval the session for the dataset and its time variable
+    """
+    repo = wb.create_repository(CDM_DATASET_TYPE)
+    ds = repo.root_object
+    ds.MakeRootGroup()
+    root = ds.root_group
+
+    dim = root.AddDimension('time', nbounded_arrays * size)
+    var = root.AddVariable('time', root.DataType.DOUBLE, [dim])
+    var.AddAttribute('units', root.DataType.STRING, TIME_UNITS)
+
+    content = repo.create_object(CDM_ARRAY_STRUCTURE_TYPE)
+    for i in xrange(nbounded_arrays):
+        ba = repo.create_object(CDM_BOUNDED_ARRAY_TYPE)
+        ba.bounds.add()
+        ba.bounds[0].origin = i * size
+        ba.bounds[0].size = size
+
+        ba.ndarray = repo.create_object(CDM_F64_ARRAY_TYPE)
+        ba.ndarray.value.extend([float(value) for value in xrange(i * size, (i + 1) * size)])
+
+        ba_link = content.bounded_arrays.add()
+        ba_link.SetLink(ba)
+    var.content = content
+
+    session = IngestSession('benchmark dataset', 'benchmark datasource')
+    session.dataset = BenchmarkDataset(repo)
+    return session, root, dim, var
+
+
+def call(d):
+    """
+    Get the result of a deferred which has already fired - nothing is fetched from the datastore here
+    """
+    result = []
+    d.addBoth(result.append)
+    return result[0]
+
+
+def legacy_offset(var, stime):
+    scale, origin = parse_time_units(var.GetUnits())
+    offset = 0
+    for ba in var.content.bounded_arrays:
+        for value in ba.ndarray.value:
+            if value * scale + origin >= stime:
+                return offset
+            offset += 1
+    return offset
+
+
+def legacy_remove(var, start, end):
+    content = var.content
+    for position in reversed(range(len(content.bounded_arrays))):
+        ba = content.bounded_arrays[position]
+        ba_start = ba.bounds[0].origin
+        ba_end = ba_start + ba.bounds[0].size
+        if ba_end > start and (end is None or ba_start < end):
+            del content.bounded_arrays[position]
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-s", "--size", dest="size", type="int", default=100, help="Values per bounded array")
+    parser.add_option("-n", "--bounded-arrays", dest="bounded_arrays", default="100,1000,10000",
+                      help="Comma separated numbers of bounded arrays in the dataset")
+    parser.add_option("-r", "--replaced", dest="replaced", type="int", default=5,
+                      help="Number of bounded arrays replaced by the supplement")
+    (options, args) = parser.parse_args()
+
+    wb = workbench.WorkBench('Supplement merge benchmark')
+    ingest = IngestionService.__new__(IngestionService)
+
+    for nbounded_arrays in [int(n) for n in options.bounded_arrays.split(',')]:
+        replaced = min(options.replaced, nbounded_arrays)
+        start = (nbounded_arrays - replaced) * options.size + options.size / 2
+        end = start + replaced * options.size / 2
+        stime = start * 3600
+
+        for engine_name in ('legacy', 'indexed'):
+            session, root, dim, var = make_dataset(wb, nbounded_arrays, options.size)
+
+            t1 = time.time()
+            if engine_name == 'legacy':
+                offset = legacy_offset(var, stime)
+            else:
+                offset = call(ingest._find_aggregation_offset(session, root, dim, stime))
+            t2 = time.time()
+            if engine_name == 'legacy':
+                legacy_remove(var, offset, end)
+            else:
+                call(ingest._remove_aggregated_range(session, var, offset, end))
+            t3 = time.time()
+
+            assert offset == start, 'Wrong offset %d, expected %d' % (offset, start)
+
+            print "%-7s %6d bounded arrays: offset in %f seconds, remove range in %f seconds" % \
+                  (engine_name, nbounded_arrays, t2 - t1, t3 - t2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/wrapper_objects.py
+@brief Microbenchmark of the per object cost of the GPB Wrapper: wrappers created per second, scalar and
+composite field reads and writes per second, and the bytes held by each wrapper. The bytes of a wrapper are
+compared with those of an object holding the same instance attributes in an instance dictionary, as the
+wrappers did before they were slotted.
+Run it like this:
+python -m ion.test.loadtests.wrapper_objects -n 20000 -a 200000
+"""
+
+import sys
+import time
+from optparse import OptionParser
+
+from ion.core.object import workbench
+from ion.core.object import object_utils
+from ion.core.object.gpb_wrapper import Wrapper
+
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+ADDRESSBOOK_TYPE = object_utils.create_type_identifier(object_id=20002, version=1)
+
+# The instance attributes of a Wrapper before it was slotted, including the name mangled STR_GPBS setting
+LEGACY_ATTRIBUTES = tuple([name for name in Wrapper.__slots__ if name != '__weakref__']) + ('_Wrapper__no_string', '_init')
+
+
+class LegacyWrapperState(object):
+    """
+    Holds the instance attributes of a wrapper in an instance dictionary
+    """
+
+    def __init__(self):
+        for name in LEGACY_ATTRIBUTES:
+            setattr(self, name, None)
+
+
+def object_size(obj):
+    """
+    @retval the bytes of an object and its instance dictionary, or None before python 2.6
+    """
+    getsizeof = getattr(sys, 'getsizeof', None)
+    if getsizeof is None:
+        return None
+    size = getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += getsizeof(obj.__dict__)
+    return size
+
+
+def timed(label, count, func, *args):
+    t1 = time.time()
+    result = func(*args)
+    diff = time.time() - t1
+    print "%-28s %8d in %f seconds: %.1f per second" % (label, count, diff, count / diff)
+    return result
+
+
+def create_objects(repo, count):
+    return [repo.create_object(PERSON_TYPE) for i in xrange(count)]
+
+
+def add_persons(ab, count):
+    for i in xrange(count):
+        person = ab.person.add()
+        person.name = 'person %d' % i
+        person.id = i
+
+
+def read_scalars(persons, count):
+    n = len(persons)
+    for i in xrange(count):
+        persons[i % n].name
+
+
+def write_scalars(persons, count):
+    n = len(persons)
+    for i in xrange(count):
+        persons[i % n].id = i
+
+
+def read_composites(ab, count):
+    persons = ab.person
+    n = len(persons)
+    for i in xrange(count):
+        persons[i % n].name
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--objects", dest="objects", type="int", default=20000, help="Number of wrappers created")
+    parser.add_option("-a", "--accesses", dest="accesses", type="int", default=200000, help="Number of field accesses")
+    (options, args) = parser.parse_args()
+
+    wb = workbench.WorkBench('Wrapper benchmark')
+    repo = wb.create_repository(ADDRESSBOOK_TYPE)
+    ab = repo.root_object
+
+    persons = timed('create root objects', options.objects, create_objects, repo, options.objects)
+    timed('add composite elements', options.objects, add_persons, ab, options.objects)
+    timed('read scalar field', options.accesses, read_scalars, persons, options.accesses)
+    timed('write scalar field', options.accesses, write_scalars, persons, options.accesses)
+    timed('read composite element field', options.accesses, read_composites, ab, options.accesses)
+
+    size = object_size(persons[0])
+    legacy_size = object_size(LegacyWrapperState())
+    if size is None:
+        print "Bytes per object needs sys.getsizeof (python 2.6 or later)"
+    else:
+        print "Bytes per wrapper: %d slotted, %d with an instance dictionary" % (size, legacy_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/bloom.py
+@brief A compact bloom filter for sets of keys which can be sent in a message header.
+Membership tests may give false positives at about the requested error rate but never false negatives.
+"""
+
+import base64
+import math
+import struct
+from array import array
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+
+class BloomFilterError(Exception):
+    """
+    An exception class for bloom filters which can not be decoded
+    """
+
+
+class BloomFilter(object):
+    """
+    @brief Bloom filter over string keys. Keys which are sha1 digests (20 bytes) are used directly as the
+    source of the bit indices - other keys are hashed first.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        @param capacity the number of keys the filter is sized for
+        @param error_rate the false positive rate when the filter holds capacity keys
+        """
+        capacity = max(1, capacity)
+        nbits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.nbits = max(8, nbits)
+        self.nhashes = max(1, int(round(self.nbits / float(capacity) * math.log(2))))
+        self._bits = array('B', '\0' * ((self.nbits + 7) // 8))
+
+    def _indices(self, key):
+        if len(key) != 20:
+            key = sha1(key).digest()
+        h1, h2 = struct.unpack('!II', key[:8])
+        nbits = self.nbits
+        for i in xrange(self.nhashes):
+            yield (h1 + i * h2) % nbits
+
+    def add(self, key):
+        bits = self._bits
+        for index in self._indices(key):
+            bits[index >> 3] |= 1 << (index & 7)
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        bits = self._bits
+        for index in self._indices(key):
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def dumps(self):
+        """
+        @retval the filter as an ascii string, safe to use as a message header value
+        """
+        return '%d:%d:%s' % (self.nhashes, self.nbits, base64.b64encode(self._bits.tostring()))
+
+    @classmethod
+    def loads(cls, value):
+        """
+        @param value a string made by dumps
+        @retval a BloomFilter
+        """
+        try:
+            nhashes, nbits, bits = value.split(':', 2)
+            nhashes = int(nhashes)
+            nbits = int(nbits)
+            bits = array('B', base64.b64decode(bits))
+        except (ValueError, TypeError), ex:
+            raise BloomFilterError('Invalid bloom filter: %s' % str(ex))
+
+        if nhashes < 1 or nbits < 1 or len(bits) != (nbits + 7) // 8:
+            raise BloomFilterError('Invalid bloom filter: the number of bits does not match the header')
+
+        instance = cls.__new__(cls)
+        instance.nhashes = nhashes
+        instance.nbits = nbits
+        instance._bits = bits
+        return instance
@@ -5,7 +5,9 @@
 @author Adam R. Smith
 @brief Simple caching utilities.
 """
+from __future__ import with_statement
 
+import threading
 from time import time
 
 class memoize(object):
@@ -64,27 +66,43 @@ class LRUDict(object):
     Copyright 2003 Josiah Carlson.
     Modified by Adam R. Smith to support sizes and to be more dict-like.
     Licensed under the PSF License: http://docs.python.org/license.html
+
+    The size of each entry is computed once when it is inserted (or passed in using set) and only recomputed
+    by touch. Entries can be pinned to protect them from eviction while they are in use. Hit, miss and
+    eviction counts are available from stats.
     """
 
     class Node(object):
-        __slots__ = ['prev', 'next', 'me', 'size']
+        __slots__ = ['prev', 'next', 'me', 'size', 'pins']
         def __init__(self, prev, me, size=1):
             self.prev = prev
             self.me = me
             self.next = None
             self.size = size
+            self.pins = 0
 
 
-    def __init__(self, limit, pairs=None, use_size=False):
-        """ limit is either an integer item count or a size in bytes. """
+    def __init__(self, limit, pairs=None, use_size=False, max_items=None, on_evict=None):
+        """
+        @param limit either an integer item count or, if use_size is true, a size in bytes
+        @param pairs an optional list of (key, value) pairs to load
+        @param use_size size entries using their __sizeof__ method
+        @param max_items an optional item count limit, applied as well as a size limit
+        @param on_evict an optional callable, called with (key, value) for each evicted entry
+        """
 
         self.limit = max(limit, 1)
+        self.max_items = max_items
+        self.on_evict = on_evict
         self.d = {}
         self.first = None
         self.last = None
         self.use_size = use_size
         self.total_size = 0
 
+        self._lock = threading.RLock()
+        self.reset_stats()
+
         if pairs is None: pairs = []
         for key, value in pairs:
             self[key] = value
@@ -95,65 +113,111 @@ class LRUDict(object):
     def has_key(self, key):
         return key in self.d
 
-    def __getitem__(self, key):
-        a = self.d[key].me
-        self[a[0]] = a[1]
-        return a[1]
-
-    def __setitem__(self, key, val):
-        if key in self.d:
-            del self[key]
+    def __len__(self):
+        return len(self.d)
 
-        size = 1
+    def _size_of(self, val):
         if self.use_size and hasattr(val, '__sizeof__'):
-            size = val.__sizeof__()
-        self.total_size += size
+            return val.__sizeof__()
+        return 1
+
+    def _unlink(self, nobj):
+        if nobj.prev:
+            nobj.prev.next = nobj.next
+        else:
+            self.first = nobj.next
+        if nobj.next:
+            nobj.next.prev = nobj.prev
+        else:
+            self.last = nobj.prev
+        nobj.prev = None
+        nobj.next = None
 
-        nobj = LRUDict.Node(self.last, (key, val), size)
+    def _append(self, nobj):
+        nobj.prev = self.last
+        nobj.next = None
         if self.first is None:
             self.first = nobj
         if self.last:
             self.last.next = nobj
         self.last = nobj
-        self.d[key] = nobj
 
-        self.purge()
+    def __getitem__(self, key):
+        with self._lock:
+            nobj = self.d.get(key)
+            if nobj is None:
+                self.misses += 1
+                raise KeyError(key)
+
+            self.hits += 1
+            if nobj is not self.last:
+                self._unlink(nobj)
+                self._append(nobj)
+            return nobj.me[1]
 
-    def purge(self):
-        while self.total_size > self.limit:
-            if self.first == self.last:
-                self.first = None
-                self.last = None
-                self.total_size = 0
-                return
-
-            a = self.first
-            self.total_size -= a.size
-            a.next.prev = None
-            self.first = a.next
-            a.next = None
-
-            nobj = self.d[a.me[0]]
-            obj = nobj.me[1]
-            if hasattr(obj, 'clear'):
-                obj.clear()
-
-            del self.d[a.me[0]]
-            del a
+    def __setitem__(self, key, val):
+        self.set(key, val)
+
+    def set(self, key, val, size=None):
+        """
+        Insert or replace an entry.
+        @param size the size of the entry if it is already known, otherwise it is computed
+        """
+        if size is None:
+            size = self._size_of(val)
+
+        with self._lock:
+            pins = 0
+            if key in self.d:
+                pins = self.d[key].pins
+                del self[key]
+
+            nobj = LRUDict.Node(self.last, (key, val), size)
+            nobj.pins = pins
+            self._append(nobj)
+            self.d[key] = nobj
+            self.total_size += size
+            self.inserts += 1
+
+            self.purge()
+
+    def _over_limit(self):
+        return self.total_size > self.limit or (self.max_items is not None and len(self.d) > self.max_items)
 
-    def __delitem__(self, key):
-        nobj = self.d[key]
+    def purge(self):
+        """
+        Evict least recently used entries until the cache is within its limits. Pinned entries and the most
+        recently used entry are never evicted.
+        """
+        with self._lock:
+            nobj = self.first
+            while nobj is not None and nobj is not self.last and self._over_limit():
+                nxt = nobj.next
+                if nobj.pins == 0:
+                    self._evict(nobj)
+                nobj = nxt
+
+    def _evict(self, nobj):
+        key, obj = nobj.me
+
+        self._unlink(nobj)
+        del self.d[key]
         self.total_size -= nobj.size
 
-        if nobj.prev:
-            nobj.prev.next = nobj.next
-        else:
-            self.first = nobj.next
-        if nobj.next:
-            nobj.next.prev = nobj.prev
-        else:
-            self.last = nobj.prev
-        del self.d[key]
+        self.evictions += 1
+        self.evicted_size += nobj.size
+
+        if hasattr(obj, 'clear'):
+            obj.clear()
+
+        if self.on_evict is not None:
+            self.on_evict(key, obj)
+
+    def __delitem__(self, key):
+        with self._lock:
+            nobj = self.d.pop(key)
+            self.total_size -= nobj.size
+            self._unlink(nobj)
 
     def __iter__(self):
         cur = self.first
@@ -179,26 +243,55 @@ class LRUDict(object):
     def keys(self):
         return self.d.keys()
 
-    def pop(self, key):
-        obj = self.get(key)
-        del self[key]
-        return obj
+    def pop(self, key, *default):
+        with self._lock:
+            nobj = self.d.get(key)
+            if nobj is None:
+                self.misses += 1
+                if default:
+                    return default[0]
+                raise KeyError(key)
+
+            self.hits += 1
+            del self[key]
+            return nobj.me[1]
 
     def touch(self, key):
         """ Recalculate the size of the object at the given key, and update its access time. """
-        val = self[key]
-        if self.use_size and hasattr(val, '__sizeof__'):
-            old_size = val.size
-            val.size = val.__sizeof__()
-            self.total_size += val.size - old_size
-
-        self.purge()
-        return val
+        with self._lock:
+            val = self[key]
+            nobj = self.d[key]
+            size = self._size_of(val)
+            self.total_size += size - nobj.size
+            nobj.size = size
+
+            self.purge()
+            return val
+
+    def pin(self, key):
+        """ Protect the entry at the given key from eviction until it is unpinned. Pins are counted. """
+        with self._lock:
+            self.d[key].pins += 1
+
+    def unpin(self, key):
+        """ Release a pin on the entry at the given key - the cache is purged if it is over its limits. """
+        with self._lock:
+            nobj = self.d.get(key)
+            if nobj is not None and nobj.pins > 0:
+                nobj.pins -= 1
+                if nobj.pins == 0:
+                    self.purge()
+
+    def is_pinned(self, key):
+        nobj = self.d.get(key)
+        return nobj is not None and nobj.pins > 0
 
     def get(self, key, default=None):
-        if key in self.d:
-            return self[key]
-        return default
+        with self._lock:
+            if key in self.d:
+                return self[key]
+            self.misses += 1
+            return default
 
     def update(self, d):
         for k,v in d.iteritems():
@@ -206,16 +299,43 @@ class LRUDict(object):
 
     def clear(self):
 
-        for nobj in self.d.itervalues():
-            obj = nobj.me[1]
-
-            if hasattr(obj, 'clear'):
-                obj.clear()
-
-        self.d.clear()
-        self.total_size = 0
-        self.first = None
-        self.last = None
+        with self._lock:
+            for nobj in self.d.itervalues():
+                obj = nobj.me[1]
+
+                if hasattr(obj, 'clear'):
+                    obj.clear()
+
+            self.d.clear()
+            self.total_size = 0
+            self.first = None
+            self.last = None
+
+    def reset_stats(self):
+        """ Zero the hit, miss, insert and eviction counters. """
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.evicted_size = 0
+
+    def stats(self):
+        """
+        @retval a dictionary of the cache counters and its current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits':self.hits,
+                    'misses':self.misses,
+                    'hit_ratio':float(self.hits) / lookups if lookups else 0.0,
+                    'inserts':self.inserts,
+                    'evictions':self.evictions,
+                    'evicted_size':self.evicted_size,
+                    'items':len(self.d),
+                    'pinned':len([nobj for nobj in self.d.itervalues() if nobj.pins > 0]),
+                    'size':self.total_size,
+                    'limit':self.limit,
+                    'max_items':self.max_items}
 
 if __name__ == '__main__':
     def main():
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/test_bloom.py
+@brief Tests for the bloom filter
+"""
+
+from hashlib import sha1
+
+from twisted.trial import unittest
+
+from ion.util.bloom import BloomFilter, BloomFilterError
+
+
+def sha1bin(value):
+    return sha1(value).digest()
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_membership(self):
+        keys = [sha1bin(str(i)) for i in xrange(1000)]
+        bloom = BloomFilter(len(keys), 0.01)
+        bloom.update(keys)
+
+        for key in keys:
+            self.assertTrue(key in bloom)
+
+        # Other keys are rarely reported - allow a generous margin over the error rate
+        false_positives = sum(1 for i in xrange(1000, 11000) if sha1bin(str(i)) in bloom)
+        self.assertTrue(false_positives < 300)
+
+        # Short keys are hashed
+        bloom.add('abc')
+        self.assertTrue('abc' in bloom)
+
+    def test_dumps_loads(self):
+        keys = [sha1bin(str(i)) for i in xrange(100)]
+        bloom = BloomFilter(len(keys))
+        bloom.update(keys)
+
+        value = bloom.dumps()
+        self.assertEqual(value, str(value.encode('ascii')))
+
+        copy = BloomFilter.loads(unicode(value))
+        for key in keys:
+            self.assertTrue(key in copy)
+        self.assertEqual(copy.nbits, bloom.nbits)
+
+        self.assertRaises(BloomFilterError, BloomFilter.loads, 'junk')
+        self.assertRaises(BloomFilterError, BloomFilter.loads, '3:80:AAAA')
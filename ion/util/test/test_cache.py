@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/test_cache.py
+@brief Tests for the LRUDict cache
+"""
+
+from twisted.trial import unittest
+
+from ion.util.cache import LRUDict
+
+
+class ObjectWithSize(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.sized = 0
+        self.cleared = False
+
+    def __sizeof__(self):
+        self.sized += 1
+        return self.size
+
+    def clear(self):
+        self.cleared = True
+
+
+class LRUDictTest(unittest.TestCase):
+
+    def test_count_limit(self):
+        lru = LRUDict(3)
+        lru['a'] = 1
+        lru['b'] = 2
+        lru['c'] = 3
+        lru['a']
+        lru['d'] = 4
+
+        self.assertEqual(sorted(lru.keys()), ['a', 'c', 'd'])
+        self.assertEqual(len(lru), 3)
+
+    def test_size_computed_once(self):
+        lru = LRUDict(100, use_size=True)
+        obj = ObjectWithSize(25)
+        lru['a'] = obj
+
+        lru['a']
+        lru.get('a')
+        self.assertEqual(obj.sized, 1)
+        self.assertEqual(lru.total_size, 25)
+
+        # touch recalculates
+        obj.size = 40
+        lru.touch('a')
+        self.assertEqual(lru.total_size, 40)
+
+        # A size passed in is not computed
+        other = ObjectWithSize(10)
+        lru.set('b', other, 30)
+        self.assertEqual(other.sized, 0)
+        self.assertEqual(lru.total_size, 70)
+
+    def test_size_and_count_limits(self):
+        lru = LRUDict(100, use_size=True, max_items=2)
+        lru['a'] = ObjectWithSize(10)
+        lru['b'] = ObjectWithSize(10)
+        lru['c'] = ObjectWithSize(10)
+        self.assertEqual(sorted(lru.keys()), ['b', 'c'])
+
+        lru['d'] = ObjectWithSize(95)
+        self.assertEqual(lru.keys(), ['d'])
+        self.assertEqual(lru.total_size, 95)
+
+    def test_stats_and_eviction_callback(self):
+        evicted = []
+        lru = LRUDict(50, use_size=True, on_evict=lambda k, v: evicted.append(k))
+
+        a = ObjectWithSize(30)
+        lru['a'] = a
+        lru['b'] = ObjectWithSize(30)
+
+        self.assertEqual(evicted, ['a'])
+        self.assertEqual(a.cleared, True)
+
+        lru.get('b')
+        lru.get('a')
+        self.assertRaises(KeyError, lru.pop, 'a')
+        self.assertEqual(lru.pop('a', None), None)
+
+        stats = lru.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['inserts'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['evicted_size'], 30)
+        self.assertEqual(stats['items'], 1)
+        self.assertEqual(stats['size'], 30)
+
+        lru.reset_stats()
+        self.assertEqual(lru.stats()['hits'], 0)
+
+    def test_pinning(self):
+        lru = LRUDict(2)
+        lru['a'] = 1
+        lru.pin('a')
+        lru['b'] = 2
+        lru['c'] = 3
+
+        # b is evicted rather than the pinned a
+        self.assertEqual(sorted(lru.keys()), ['a', 'c'])
+        self.assertEqual(lru.is_pinned('a'), True)
+        self.assertEqual(lru.stats()['pinned'], 1)
+
+        # The pin survives replacing the value
+        lru['a'] = 4
+        lru['d'] = 5
+        self.assertEqual(sorted(lru.keys()), ['a', 'd'])
+
+        lru.unpin('a')
+        lru['e'] = 6
+        self.assertEqual(sorted(lru.keys()), ['d', 'e'])